@@ -46,3 +46,28 @@ class InValRdyRandStallAdapter (object):
 
     s.in_.rdy.next = ( s.data == None ) and ( s.rgen.random() > s.stall_prob )
 
+  # While empty, rdy is drawn again every cycle. Look ahead at the next
+  # draws (up to max_cycles) to find how long rdy keeps its value.
+
+  def idle_cycles( s, max_cycles=1024 ):
+
+    if s.in_.rdy and s.in_.val:
+      return 0
+
+    if s.data != None:
+      return None
+
+    rdy   = bool( s.in_.rdy )
+    state = s.rgen.getstate()
+    n     = 0
+    while n < max_cycles and ( s.rgen.random() > s.stall_prob ) == rdy:
+      n += 1
+    s.rgen.setstate( state )
+
+    return n
+
+  def skip_cycles( s, ncycles ):
+    if s.data == None:
+      for _ in xrange( ncycles ):
+        s.rgen.random()
+
@@ -59,6 +59,27 @@ class OutValRdyInelasticPipeAdapter (object):
         # Advance the pipeline
         s.pipe.advance()
 
+  # Number of cycles until the next item graduates from the pipeline,
+  # None if the pipeline is empty or stalled behind the output queue
+
+  def idle_cycles( s ):
+
+    if s.out_q.idle_cycles() == 0:
+      return 0
+
+    if s.nstages == 0 or s.out_q.full():
+      return None
+
+    stages = [ i for i, x in enumerate( s.pipe.data ) if x != None ]
+    if not stages:
+      return None
+
+    return s.nstages - 1 - stages[-1]
+
+  def skip_cycles( s, ncycles ):
+    if s.nstages != 0 and not s.out_q.full():
+      s.pipe.data.rotate( ncycles )
+
   def __str__( s ):
     if s.nstages > 0:
       return ''.join([ ("*" if x != None else ' ') for x in s.pipe.data ])
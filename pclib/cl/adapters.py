@@ -41,6 +41,9 @@ class InValRdyQueueAdapter (object):
       s.data.append( deepcopy(s.in_.msg) )
     s.in_.rdy.next = ( len( s.data ) != s.data.maxlen )
 
+  def idle_cycles( s ):
+    return 0 if s.in_.rdy and s.in_.val else None
+
 #-------------------------------------------------------------------------
 # OutValRdyQueueAdapter
 #-------------------------------------------------------------------------
@@ -75,3 +78,6 @@ class OutValRdyQueueAdapter (object):
       s.out.msg.next = s.data[0]
     s.out.val.next = ( len( s.data ) != 0 )
 
+  def idle_cycles( s ):
+    return 0 if s.out.rdy and s.out.val else None
+
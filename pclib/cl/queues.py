@@ -42,6 +42,7 @@ class InValRdyQueue( Model ):
   def __init__( s, dtype, size=1, pipe=False ):
     s.in_  = InValRdyBundle( dtype )
     s.data = deque( maxlen = size )
+    s.register_state( 'data' )
     s.deq  = s._pipe_deq if pipe else s._simple_deq
 
   def is_empty( s ):
@@ -77,6 +78,7 @@ class OutValRdyQueue( Model ):
   def __init__( s, dtype, size=1, bypass=False ):
     s.out  = OutValRdyBundle( dtype )
     s.data = deque( maxlen = size )
+    s.register_state( 'data' )
     s.enq  = s._bypass_enq if bypass else s._simple_enq
 
   def is_full( s ):
@@ -26,7 +26,7 @@ class RegisterFile( Model ):
       s.wr_data  = [ InPort( dtype )      for _ in range(wr_ports) ]
       s.wr_en    = [ InPort( 1 )          for _ in range(wr_ports) ]
 
-    s.regs = [ Wire( dtype ) for _ in range( nregs ) ]
+    s.regs = MemoryArray( nregs, dtype )
 
     #-------------------------------------------------------------------
     # Combinational read logic
@@ -52,7 +52,7 @@ class SRAMBitsComb_rst_1rw( Model ):
 
     # Memory array
 
-    s.mem         = [ Wire( data_nbits ) for x in xrange( num_entries ) ]
+    s.mem         = MemoryArray( num_entries, data_nbits )
 
   def elaborate_logic( s ):
     @s.combinational
@@ -65,8 +65,7 @@ class SRAMBitsComb_rst_1rw( Model ):
     def seq_logic():
 
       if   s.reset:
-        for i in xrange( s.num_entries ):
-          s.mem[ i ].next = s.reset_value
+        s.mem.next = s.reset_value
       elif s.wen:
         s.mem[ s.addr ].next = s.wdata
 
@@ -118,7 +117,7 @@ class SRAMBytesComb_rst_1rw( Model ):
 
     # Memory array
 
-    s.mem = [ Wire( s.data_nbits ) for x in xrange( num_entries ) ]
+    s.mem = MemoryArray( num_entries, s.data_nbits )
 
   def elaborate_logic( s ):
     @s.combinational
@@ -131,8 +130,7 @@ class SRAMBytesComb_rst_1rw( Model ):
     def seq_logic():
 
       if  s.reset:
-        for i in xrange( s.num_entries ):
-          s.mem[i].next = s.reset_value
+        s.mem.next = s.reset_value
 
       elif s.wen:
         for i in xrange( s.num_nbytes ):
@@ -46,6 +46,8 @@ class TestMemory( Model ):
 
     s.mem = bytearray( mem_nbytes )
 
+    s.register_state( 'mem', 'reqs_q', 'resps_q' )
+
     # Local constants
 
     s.mk_rd_resp   = mem_ifc_dtypes.resp.mk_rd
@@ -147,6 +149,33 @@ class TestMemory( Model ):
             raise Exception( "TestMemory doesn't know how to handle message type {}"
                              .format( memreq.type_ ) )
 
+  #-----------------------------------------------------------------------
+  # idle_cycles
+  #-----------------------------------------------------------------------
+  # Requests waiting in the input adapters are handled on the next tick,
+  # unless the response adapter is full and stalled. Otherwise we wait on
+  # the adapters.
+
+  def idle_cycles( s ):
+
+    nidle = None
+    for req_q, resp_q in zip( s.reqs_q, s.resps_q ):
+
+      resp_idle = resp_q.idle_cycles()
+      if not req_q.empty() and ( resp_idle is not None or not resp_q.full() ):
+        return 0
+
+      for n in ( req_q.idle_cycles(), resp_idle ):
+        if n is not None and ( nidle is None or n < nidle ):
+          nidle = n
+
+    return nidle
+
+  def skip_cycles( s, ncycles ):
+    for req_q, resp_q in zip( s.reqs_q, s.resps_q ):
+      req_q.skip_cycles( ncycles )
+      resp_q.skip_cycles( ncycles )
+
   #-----------------------------------------------------------------------
   # line_trace
   #-----------------------------------------------------------------------
@@ -332,3 +332,83 @@ def test_read_write_mem( dump_vcd ):
 
   assert result == data
 
+
+#-------------------------------------------------------------------------
+# Test Checkpoint
+#-------------------------------------------------------------------------
+# Restoring a checkpoint into a new simulator continues the simulation
+# exactly where the checkpoint was saved, including the queues, memory
+# contents and random stalls of the test memory and the test sources
+# and sinks.
+
+def test_checkpoint( tmpdir ):
+
+  msgs = random_msgs( 0x1000 )
+  path = str( tmpdir.join( 'mem.ckpt' ) )
+
+  def mk_sim():
+    th = TestHarness( 1, [ msgs[::2] ], [ msgs[1::2] ], 0.5, 4, 3, 14 )
+    th.elaborate()
+    return th, SimulationTool( th )
+
+  def run( th, sim ):
+    trace = []
+    while not th.done() and sim.ncycles < 5000:
+      trace.append( th.line_trace() )
+      sim.cycle()
+    assert th.done()
+    return trace, sim.ncycles
+
+  th, sim = mk_sim()
+  sim.reset()
+  for i in range( 40 ):
+    sim.cycle()
+
+  sim.save_checkpoint( path )
+  expected = run( th, sim )
+
+  th, sim = mk_sim()
+  sim.restore_checkpoint( path )
+  assert sim.ncycles == 42
+  assert run( th, sim ) == expected
+
+#-------------------------------------------------------------------------
+# Test skipping idle cycles
+#-------------------------------------------------------------------------
+
+@pytest.mark.parametrize( 'stall_prob, latency, src_delay, sink_delay', [
+  ( 0.0,  0, 40, 40 ),
+  ( 0.0, 20, 10, 40 ),
+  ( 0.5,  4,  3, 14 ),
+])
+def test_run_idle( stall_prob, latency, src_delay, sink_delay ):
+
+  msgs = random_msgs( 0x1000 )
+
+  def mk_sim():
+    th = TestHarness( 1, [ msgs[::2] ], [ msgs[1::2] ], stall_prob,
+                      latency, src_delay, sink_delay )
+    th.elaborate()
+    sim = SimulationTool( th )
+    sim.reset()
+    return th, sim
+
+  th, sim = mk_sim()
+  while not th.done() and sim.ncycles < 10000:
+    sim.cycle()
+  assert th.done()
+
+  th_run, sim_run = mk_sim()
+  cycles = []
+  cycle  = sim_run.cycle
+  def counting_cycle():
+    cycles.append( sim_run.ncycles )
+    cycle()
+  sim_run.cycle = counting_cycle
+
+  sim_run.run( 10000, stop_signal=th_run.done )
+  assert th_run.done()
+  assert sim_run.ncycles == sim.ncycles
+  assert th_run.mem.mem  == th.mem.mem
+  if stall_prob == 0:
+    assert len( cycles ) < sim.ncycles / 2
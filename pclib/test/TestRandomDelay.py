@@ -38,6 +38,8 @@ class TestRandomDelay( Model ):
     s.buf_full = False
     s.counter  = 0
 
+    s.register_state( 'rgen', 'buf', 'buf_full', 'counter' )
+
     #---------------------------------------------------------------------
     # Tick
     #---------------------------------------------------------------------
@@ -86,6 +88,20 @@ class TestRandomDelay( Model ):
       s.in_.rdy.next = ( s.counter == 0 ) and not s.buf_full
       s.out.val.next = ( s.counter == 0 ) and     s.buf_full
 
+  # While the counter runs down nothing else changes, so we can skip all
+  # but the last cycle before the counter reaches zero.
+
+  def idle_cycles( s ):
+    if s.max_random_delay == 0:
+      return None
+    if ( s.in_.val and s.in_.rdy ) or ( s.out.val and s.out.rdy ):
+      return 0
+    return s.counter - 1 if s.counter > 0 else None
+
+  def skip_cycles( s, ncycles ):
+    if s.max_random_delay != 0 and s.counter > 0:
+      s.counter -= ncycles
+
   def line_trace( s ):
 
     return "{} ({:2}) {}".format( s.in_, s.counter, s.out )
@@ -72,6 +72,9 @@ class TestSimpleMemory (Model):
     # Actual memory
     s.mem = bytearray( s.mem_nbytes )
 
+    s.register_state( 'mem', 'memreq_type', 'memreq_addr', 'memreq_len',
+                      'memreq_data' )
+
     # Connect memreq_msg port list to Unpack port list
     for i in range( nports ):
       s.connect( s.reqs[i].msg, s.memreq[i].bits )
@@ -24,6 +24,8 @@ class TestSimpleSink( Model ):
     s.msgs = deepcopy( msgs )
     s.idx  = 0
 
+    s.register_state( 'idx' )
+
     @s.tick
     def tick():
 
@@ -71,6 +73,10 @@ class TestSimpleSink( Model ):
         s.in_.rdy.next = False
         s.done   .next = True
 
+  # Nothing changes until the next input transaction
+
+  def idle_cycles( s ):
+    return 0 if s.in_.val and s.in_.rdy else None
 
   def line_trace( s ):
     return "{} ({:2})".format( s.in_, s.idx )
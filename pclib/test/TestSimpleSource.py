@@ -21,6 +21,8 @@ class TestSimpleSource( Model ):
     s.msgs = deepcopy( msgs )
     s.idx  = 0
 
+    s.register_state( 'idx' )
+
     @s.tick
     def tick():
 
@@ -64,6 +66,11 @@ class TestSimpleSource( Model ):
         s.out.val.next = False
         s.done   .next = True
 
+  # Nothing changes until the next output transaction
+
+  def idle_cycles( s ):
+    return 0 if s.out.val and s.out.rdy else None
+
   def line_trace( s ):
 
     return "({:2}) {}".format( s.idx, s.out )
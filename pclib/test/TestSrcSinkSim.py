@@ -44,15 +44,11 @@ class TestSrcSinkSim( object ):
     print()
 
     sim.reset()
-    while not self.model.done():
-      sim.print_line_trace()
-      sim.cycle()
+    sim.run( None, stop_signal=self.model.done, trace='every:1' )
 
     # Add a couple extra ticks so that the VCD dump is nicer
 
-    sim.cycle()
-    sim.cycle()
-    sim.cycle()
+    sim.run( 3 )
 
 #-------------------------------------------------------------------------
 # TestSourceSinkHarness
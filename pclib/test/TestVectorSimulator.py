@@ -56,8 +56,7 @@ class TestVectorSimulator( object ):
       if self.wait_cycles == 0:
         sim.eval_combinational()
       else:
-        for i in range(self.wait_cycles):
-          sim.cycle()
+        sim.run( self.wait_cycles )
 
       # Print the line trace
       sim.print_line_trace()
@@ -70,7 +69,5 @@ class TestVectorSimulator( object ):
 
     # Add a couple extra ticks so that the VCD dump is nicer
 
-    sim.cycle()
-    sim.cycle()
-    sim.cycle()
+    sim.run( 3 )
 
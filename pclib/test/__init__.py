@@ -16,4 +16,5 @@ from SparseMemoryImage   import SparseMemoryImage
 from test_utils import mk_test_case_table
 from test_utils import run_test_vector_sim
 from test_utils import run_sim
+from test_utils import run_sims
 
@@ -5,7 +5,10 @@
 
 from   pymtl       import *
 import collections
+import multiprocessing
 import re
+import time
+import traceback
 
 class RunTestVectorSimError( Exception ):
   pass
@@ -41,7 +44,15 @@ def mk_test_case_table( raw_test_case_table ):
 # run sim
 #-------------------------------------------------------------------------
 
-def run_sim( model, dump_vcd=None, test_verilog=False, max_cycles=5000 ):
+# The trace argument is passed on to SimulationTool.run(), by default
+# the line trace of every cycle is printed.
+
+def run_sim( model, dump_vcd=None, test_verilog=False, max_cycles=5000,
+             trace='every:1' ):
+  print()
+  _run_sim( model, dump_vcd, test_verilog, max_cycles, trace )
+
+def _run_sim( model, dump_vcd, test_verilog, max_cycles, trace ):
 
   # Setup the model
 
@@ -57,13 +68,10 @@ def run_sim( model, dump_vcd=None, test_verilog=False, max_cycles=5000 ):
   # Reset model
 
   sim.reset()
-  print()
 
   # Run simulation
 
-  while not model.done() and sim.ncycles < max_cycles:
-    sim.print_line_trace()
-    sim.cycle()
+  sim.run( max_cycles - sim.ncycles, stop_signal=model.done, trace=trace )
 
   # Force a test failure if we timed out
 
@@ -71,15 +79,21 @@ def run_sim( model, dump_vcd=None, test_verilog=False, max_cycles=5000 ):
 
   # Extra ticks to make VCD easier to read
 
-  sim.cycle()
-  sim.cycle()
-  sim.cycle()
+  sim.run( 3 )
+
+  return sim
 
 #-------------------------------------------------------------------------
 # run_test_vector_sim
 #-------------------------------------------------------------------------
 
 def run_test_vector_sim( model, test_vectors, dump_vcd=None, test_verilog=False ):
+  print ""
+  _run_test_vector_sim( model, test_vectors, dump_vcd, test_verilog,
+                        lambda sim: sim.print_line_trace() )
+
+def _run_test_vector_sim( model, test_vectors, dump_vcd, test_verilog,
+                          line_trace ):
 
   # First row in test vectors contains port names
 
@@ -106,7 +120,6 @@ def run_test_vector_sim( model, test_vectors, dump_vcd=None, test_verilog=False
   # Reset model
 
   sim.reset()
-  print ""
 
   # Run the simulation
 
@@ -134,7 +147,7 @@ def run_test_vector_sim( model, test_vectors, dump_vcd=None, test_verilog=False
 
     # Display line trace output
 
-    sim.print_line_trace()
+    line_trace( sim )
 
     # Check test outputs
 
@@ -172,7 +185,124 @@ def run_test_vector_sim( model, test_vectors, dump_vcd=None, test_verilog=False
 
   # Extra ticks to make VCD easier to read
 
-  sim.cycle()
-  sim.cycle()
-  sim.cycle()
+  sim.run( 3 )
+
+  return sim
 
+#-------------------------------------------------------------------------
+# run_sims
+#-------------------------------------------------------------------------
+# Run many simulations across a pool of worker processes. Each job is
+# either a model factory, run like run_sim( factory() ), or a tuple
+# ( factory, test_vectors ), run like run_test_vector_sim( factory(),
+# test_vectors ). Factories are called in the workers, which are forked
+# after the jobs are stored so that neither the factories nor anything
+# imported by the caller needs to be pickled or imported again.
+#
+# Returns one SimResult per job, in job order. If callback is given it
+# is called with each SimResult as soon as its job finishes. Jobs still
+# running or waiting when the global deadline (in seconds from the
+# call) expires are reported as failed. With workers=1 the jobs run
+# serially in the calling process, where the deadline is only checked
+# between jobs.
+
+SimResult = collections.namedtuple( 'SimResult',
+  'index name passed ncycles trace error elapsed' )
+
+_run_sims_jobs = None
+
+def run_sims( jobs, workers=None, test_verilog=False, max_cycles=5000,
+              deadline=None, trace_lines=10, callback=None ):
+
+  global _run_sims_jobs
+
+  jobs    = list( jobs )
+  workers = min( workers or multiprocessing.cpu_count(), len( jobs ) )
+  results = [ None ] * len( jobs )
+  end     = time.time() + deadline if deadline is not None else None
+
+  def finish( result ):
+    results[ result.index ] = result
+    if callback:
+      callback( result )
+
+  _run_sims_jobs = ( jobs, test_verilog, max_cycles, trace_lines )
+
+  try:
+
+    if workers <= 1:
+      for i in range( len( jobs ) ):
+        if end is not None and time.time() >= end:
+          break
+        finish( _run_sims_worker( i ) )
+
+    else:
+      pool = multiprocessing.Pool( workers )
+      try:
+        it = pool.imap_unordered( _run_sims_worker, range( len( jobs ) ) )
+        while True:
+          try:
+            if end is None:
+              result = it.next()
+            else:
+              result = it.next( max( end - time.time(), 0 ) )
+          except ( StopIteration, multiprocessing.TimeoutError ):
+            break
+          finish( result )
+      finally:
+        pool.terminate()
+        pool.join()
+
+  finally:
+    _run_sims_jobs = None
+
+  # Jobs without a result did not finish before the deadline
+
+  for i, result in enumerate( results ):
+    if result is None:
+      finish( SimResult( i, _job_name( jobs[i] ), False, 0, [],
+                         'deadline of {}s exceeded'.format( deadline ),
+                         0.0 ) )
+
+  return results
+
+#-------------------------------------------------------------------------
+# _run_sims_worker
+#-------------------------------------------------------------------------
+# Runs a single job of run_sims, keeping only the last trace_lines line
+# trace lines. Any exception is reported as a failure, including the
+# assertion raised when max_cycles is exceeded.
+
+def _run_sims_worker( index ):
+
+  jobs, test_verilog, max_cycles, trace_lines = _run_sims_jobs
+
+  job     = jobs[ index ]
+  factory = job[0] if isinstance( job, tuple ) else job
+  trace   = collections.deque( maxlen=trace_lines )
+  ncycles = [ 0 ]
+  start   = time.time()
+  error   = None
+
+  def line_trace( sim ):
+    ncycles[0] = sim.ncycles
+    trace.append( ( sim.ncycles, sim.model.line_trace() ) )
+
+  try:
+    model = factory()
+    if isinstance( job, tuple ):
+      sim = _run_test_vector_sim( model, job[1], None, test_verilog,
+                                  line_trace )
+    else:
+      sim = _run_sim( model, None, test_verilog, max_cycles, line_trace )
+    ncycles[0] = sim.ncycles
+  except Exception:
+    error = traceback.format_exc()
+
+  trace = [ "{:>3}: {}".format( n, line ) for n, line in trace ]
+  return SimResult( index, _job_name( job ), error is None, ncycles[0],
+                    trace, error, time.time() - start )
+
+def _job_name( job ):
+  factory = job[0] if isinstance( job, tuple ) else job
+  return getattr( factory, '__name__', None ) or repr( factory )
@@ -0,0 +1,124 @@
+#=========================================================================
+# test_utils_test.py
+#=========================================================================
+
+import pytest
+
+from functools  import partial
+
+from pymtl      import *
+from pclib.test import TestSource, TestSink, run_sims
+
+#-------------------------------------------------------------------------
+# TestHarness
+#-------------------------------------------------------------------------
+
+class TestHarness( Model ):
+
+  def __init__( s, src_msgs, sink_msgs, delay ):
+
+    s.src  = TestSource( 8, src_msgs,  delay )
+    s.sink = TestSink  ( 8, sink_msgs, delay )
+
+    s.connect( s.src.out, s.sink.in_ )
+
+  def done( s ):
+    return s.src.done and s.sink.done
+
+  def line_trace( s ):
+    return s.src.line_trace() + " > " + s.sink.line_trace()
+
+#-------------------------------------------------------------------------
+# Incr
+#-------------------------------------------------------------------------
+
+class Incr( Model ):
+
+  def __init__( s ):
+
+    s.in_ = InPort ( 8 )
+    s.out = OutPort( 8 )
+
+    @s.combinational
+    def logic():
+      s.out.value = s.in_ + 1
+
+  def line_trace( s ):
+    return "{} () {}".format( s.in_, s.out )
+
+msgs = [ 1, 2, 3, 4, 5, 6, 7, 8 ]
+
+test_vectors = [
+  # in_ out*
+  [ 'in_', 'out*' ],
+  [ 0,     1      ],
+  [ 5,     6      ],
+  [ 0xff,  0      ],
+]
+
+bad_test_vectors = [
+  [ 'in_', 'out*' ],
+  [ 0,     1      ],
+  [ 5,     7      ],
+]
+
+#-------------------------------------------------------------------------
+# test_run_sims
+#-------------------------------------------------------------------------
+
+@pytest.mark.parametrize( 'workers', [ 1, 3 ] )
+def test_run_sims( workers ):
+
+  jobs = [
+    partial( TestHarness, msgs, msgs, 0 ),
+    partial( TestHarness, msgs, msgs, 3 ),
+    partial( TestHarness, msgs, msgs[::-1], 0 ),
+    ( Incr, test_vectors ),
+    ( Incr, bad_test_vectors ),
+  ]
+
+  streamed = []
+  results  = run_sims( jobs, workers=workers, trace_lines=3,
+                       callback=streamed.append )
+
+  assert [ x.index  for x in results ] == range( len( jobs ) )
+  assert [ x.passed for x in results ] == [ True, True, False, True, False ]
+  assert sorted( streamed ) == sorted( results )
+
+  for result in results:
+    assert 0 < len( result.trace ) <= 3
+    assert result.ncycles > 0
+    assert ( result.error is None ) == result.passed
+
+  assert results[0].ncycles < results[1].ncycles
+  assert 'RunTestVectorSimError' in results[4].error
+
+#-------------------------------------------------------------------------
+# test_run_sims_max_cycles
+#-------------------------------------------------------------------------
+
+def test_run_sims_max_cycles():
+
+  results = run_sims( [ partial( TestHarness, msgs, msgs + [ 9 ], 0 ) ],
+                      workers=1, max_cycles=50 )
+
+  assert not results[0].passed
+  assert 'AssertionError' in results[0].error
+  assert results[0].ncycles == 49
+
+#-------------------------------------------------------------------------
+# test_run_sims_deadline
+#-------------------------------------------------------------------------
+
+def test_run_sims_deadline():
+
+  jobs = [
+    partial( TestHarness, msgs, msgs + [ 9 ], 0 ),
+    partial( TestHarness, msgs, msgs, 0 ),
+  ]
+
+  results = run_sims( jobs, workers=2, max_cycles=10**9, deadline=1 )
+
+  assert not results[0].passed
+  assert 'deadline' in results[0].error
+  assert results[1].passed
@@ -9,7 +9,7 @@ class PyMTLError( Exception ):
 #-----------------------------------------------------------------------
 
 from model.Model      import Model
-from model.signals    import Wire, InPort, OutPort
+from model.signals    import Wire, InPort, OutPort, MemoryArray
 from model.PortBundle import PortBundle, create_PortBundles
 
 #-----------------------------------------------------------------------
@@ -28,11 +28,13 @@ from datatypes.SignalValue import CreateWrappedClass
 # tools
 #-----------------------------------------------------------------------
 
-from tools.simulation.SimulationTool import SimulationTool
-from tools.translation.verilator_sim import TranslationTool
-from tools.translation.cpp_sim       import get_cpp
-from tools.integration.verilog       import VerilogModel
-from tools.integration.systemc       import SystemCModel
+from tools.simulation.SimulationTool      import SimulationTool
+from tools.simulation.BatchSimulationTool import BatchSimulationTool
+from tools.translation.verilator_sim      import TranslationTool
+from tools.translation.verilator_merge    import merge_verilated
+from tools.translation.cpp_sim            import get_cpp
+from tools.integration.verilog            import VerilogModel
+from tools.integration.systemc            import SystemCModel
 
 #-----------------------------------------------------------------------
 # py.test decorators
@@ -56,6 +58,9 @@ requires_iverilog  = _mark.skipif( not( _has('iverilog') ),
 requires_verilator = _mark.skipif( not( _has('verilator') ),
                                    reason='requires verilator' )
 
+requires_gxx       = _mark.skipif( not( _has('g++') ),
+                                   reason='requires g++' )
+
 #-----------------------------------------------------------------------
 # pymtl namespace
 #-----------------------------------------------------------------------
@@ -68,6 +73,7 @@ __all__ = [ # Model Construction
             'InPort',
             'OutPort',
             'Wire',
+            'MemoryArray',
             'PortBundle',
             'create_PortBundles',
             # Message Types
@@ -78,7 +84,9 @@ __all__ = [ # Model Construction
             'BitField',
             # Tools
             'SimulationTool',
+            'BatchSimulationTool',
             'TranslationTool',
+            'merge_verilated',
             # TEMPORARY
             'get_cpp',
             'CreateWrappedClass',
@@ -96,5 +104,6 @@ __all__ = [ # Model Construction
             'requires_vmh',
             'requires_iverilog',
             'requires_verilator',
+            'requires_gxx',
           ]
 
@@ -4,7 +4,11 @@
 
 from __future__ import print_function
 
-from Bits import Bits
+from Bits import Bits, _new_slice, _get_nbits
+
+# Cache of generated BitStruct classes, keyed on the BitStructDefinition
+# class and the arguments used to instantiate it.
+_bitstruct_classes = {}
 
 #=======================================================================
 # MetaBitStruct
@@ -51,11 +55,34 @@ class MetaBitStruct( type ):
   #
   #   http://stackoverflow.com/a/1633363
   #
+  # Generated classes are cached, so instantiating the same definition
+  # with the same (hashable) arguments again only creates a new instance.
+  #
   def __call__( self, *args, **kwargs ):
     #print( "- Meta CALL", args )   # DEBUG
 
+    assert not kwargs
+
+    try:
+      bitstruct_class, nbits = _bitstruct_classes[ ( self, args ) ]
+    except KeyError:
+      bitstruct_class, nbits = self._create_class( args )
+      _bitstruct_classes[ ( self, args ) ] = bitstruct_class, nbits
+    except TypeError:
+      bitstruct_class, nbits = self._create_class( args )
+
+    # Return an instance of the new BitStruct class
+    return bitstruct_class( nbits )
+
+  #---------------------------------------------------------------------
+  # _create_class
+  #---------------------------------------------------------------------
+  # Generate the BitStruct class for the given arguments, returns the
+  # class and its total bitwidth.
+  def _create_class( self, args ):
+
     # Instantiate the user-created BitStructDefinition class
-    def_inst = super( MetaBitStruct, self ).__call__( *args, **kwargs )
+    def_inst = super( MetaBitStruct, self ).__call__( *args )
 
     # Get all the members of type BitField from the BitStructDefinition
     # instance. Sort them by order of declaration (stored by the
@@ -78,7 +105,9 @@ class MetaBitStruct( type ):
     bitstruct_class._bitfields = {}
 
     # Transform attributes containing BitField objects into properties,
-    # when accessed they return slices of the underlying value
+    # when accessed they return slices of the underlying value. The
+    # accessors have the shift and mask of their field baked in rather
+    # than going through the generic __getitem__/__setitem__.
     for attr_name, bitfield in fields:
 
       # Calculate address range, update start_pos
@@ -90,37 +119,53 @@ class MetaBitStruct( type ):
       bitstruct_class._bitfields[ attr_name ] = addr
 
       # Create a getter to assign to the property
-      def create_getter( addr ):
-        return lambda self : self.__getitem__( addr )
+      def create_getter( start, nbits ):
+        mask = ( 1 << nbits ) - 1
+        def getter( self ):
+          return _new_slice( nbits, ( self._uint >> start ) & mask,
+                             self, start )
+        return getter
 
       # Create a setter to assign to the property
       # TODO: not needed when returning ConnectionSlice and accessing .value
-      def create_setter( addr ):
-        return lambda self, value: self.__setitem__( addr, value )
+      def create_setter( start, nbits ):
+        mask  = ( 1 << nbits ) - 1
+        clear = ~( mask << start )
+        def setter( self, value ):
+          value = int( value )
+          if not (nbits >= _get_nbits( value )):
+            raise ValueError(
+              'Provided value is too big to fit in slice [{}:{}] ({} bits)!\n'
+              '({} bits are needed to represent value = {} in two\'s '
+              'complement.)'.format( start, start + nbits, nbits,
+                                     _get_nbits(value), value )
+            )
+          self._uint = ( self._uint & clear ) | ( ( value & mask ) << start )
+        return setter
 
       # Add the property to the class
       setattr( bitstruct_class, attr_name,
-               property( create_getter( addr ),
-                         create_setter( addr )
+               property( create_getter( addr.start, bitfield.nbits ),
+                         create_setter( addr.start, bitfield.nbits )
                        )
              )
 
     if '__str__' in def_inst.__class__.__dict__:
       bitstruct_class.__str__ = def_inst.__class__.__dict__['__str__']
 
-    # Return an instance of the new BitStruct class
-    bitstruct_inst = bitstruct_class( nbits )
-
     # TODO: hack for verilog translation!
-    bitstruct_inst._module    = def_inst.__class__.__module__
-    bitstruct_inst._classname = def_inst.__class__.__name__
-    bitstruct_inst._instantiate = '{class_name}{args}'.format(
+    bitstruct_class._module    = def_inst.__class__.__module__
+    bitstruct_class._classname = def_inst.__class__.__name__
+    bitstruct_class._instantiate = '{class_name}{args}'.format(
         class_name = def_inst.__class__.__name__,
         args       = args,
     )
-    assert not kwargs
 
-    return bitstruct_inst
+    # Arguments used to instantiate the definition, so the class can be
+    # recreated in another process (e.g. when restoring a checkpoint)
+    bitstruct_class._args = args
+
+    return bitstruct_class, nbits
 
 #=======================================================================
 # BitStructDefinition
@@ -124,7 +124,6 @@ def test_bitstruct_call():
 # Test two instances with same params
 #-----------------------------------------------------------------------
 import pytest
-@pytest.mark.xfail
 def test_bitstruct_call():
 
   bits_a = Bits( 8 )
@@ -136,9 +135,29 @@ def test_bitstruct_call():
   type_a = MemMsg( 16, 32 )
   type_b = MemMsg( 16, 32 )
 
-  # Fails.  Each call to MemMsg uses metaclassed to build a new class.
-  # Possible fixes: caching?
+  # Generated classes are cached per definition class and arguments.
   assert type( type_a ) == type( type_b )
+  assert type_a is not type_b
+  assert type( MemMsg( 16, 64 ) ) != type( type_a )
+
+#-----------------------------------------------------------------------
+# Test field writes
+#-----------------------------------------------------------------------
+def test_bitstruct_field_write():
+
+  x = MemMsg( 16, 32 )
+
+  x.addr = 0xffff
+  x.len  = 3
+  assert x.addr == 0xffff
+  assert x.len  == 3
+  assert x.data == 0 and x.type_ == 0
+
+  x.addr = -1
+  assert x.addr == 0xffff
+
+  with pytest.raises( ValueError ):
+    x.len = 4
 
 #-----------------------------------------------------------------------
 # Check Combinational Logic
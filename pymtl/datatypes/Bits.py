@@ -15,12 +15,39 @@ def _get_nbits( N ):
   if N > 0: return N.bit_length()
   else:     return N.bit_length() + 1
 
+#-----------------------------------------------------------------------
+# _WidthInfo
+#-----------------------------------------------------------------------
+# Cache of the ( mask, min ) values for each bitwidth, shared by all Bits
+# objects of the same width. The max value is always equal to the mask.
+class _WidthInfo( dict ):
+  def __missing__( self, nbits ):
+    info = ( ( 1 << nbits ) - 1, -2**(nbits- 1) if nbits > 1 else 0 )
+    self[ nbits ] = info
+    return info
+
+_width_info = _WidthInfo()
+
 #-----------------------------------------------------------------------
 # Bits
 #-----------------------------------------------------------------------
 class Bits( SignalValue ):
   'Class emulating limited precision values of a fixed bitwidth.'
 
+  # Core fields are slotted. SignalValue does not define __slots__, so
+  # instances can still hold attributes added by the simulator, but the
+  # instance dict is only allocated when one is actually added: the
+  # temporaries created by arithmetic on Bits never allocate one.
+  __slots__ = ( 'nbits', '_uint', '_mask', '_min', '_max' )
+
+  # A Bits object always covers all of its bits and is its own target,
+  # BitSlice overrides both with per-instance values.
+  slice     = slice( None )
+
+  @property
+  def _target_bits( self ):
+    return self
+
   #---------------------------------------------------------------------
   # __init__
   #---------------------------------------------------------------------
@@ -35,10 +62,8 @@ class Bits( SignalValue ):
 
     # Set the nbits and bitmask (_mask) attributes
     self.nbits = nbits
-    self._max  = (2**nbits)- 1
-    self._min  = -2**(nbits- 1) if nbits > 1 else 0
-    self._mask = ( 1 << self.nbits ) - 1
-    self.slice = slice( None )
+    self._mask, self._min = _width_info[ nbits ]
+    self._max  = self._mask
 
     if not trunc and not (self._min <= value <= self._max):
       raise ValueError(
@@ -47,11 +72,9 @@ class Bits( SignalValue ):
         .format( self.nbits, _get_nbits(value), value )
       )
 
-    # Convert negative values into unsigned ints and store them
-    value_uint = value if ( value >= 0 ) else ( ~(-value) + 1 )
-    self._uint = value_uint & self._mask
-
-    self._target_bits = self
+    # Negative values are stored as their two's complement (masking a
+    # negative int does exactly this)
+    self._uint = value & self._mask
 
   #---------------------------------------------------------------------
   # __call__
@@ -189,8 +212,12 @@ class Bits( SignalValue ):
       start = addr.start
       stop  = addr.stop
 
-      # Open-ended range ( [:] ), return a copy of self
+      # Open-ended range ( [:] ), return a copy of self. Plain Bits
+      # only need their value copied, not any simulator state attached
+      # to the instance.
       if start is None and stop is None:
+        if type( self ) is Bits:
+          return _new_bits( self.nbits, self._uint )
         return copy.copy( self )
 
       # Open-ended range on left ( [:N] )
@@ -216,7 +243,7 @@ class Bits( SignalValue ):
       nbits = stop - start
       mask  = (1 << nbits) - 1
       value = (self._uint & (mask << start)) >> start
-      return BitSlice( nbits, value, target_bits = self, offset = start )
+      return _new_slice( nbits, value, self, start )
 
     # Handle integers
     else:
@@ -230,7 +257,7 @@ class Bits( SignalValue ):
 
       # Create a new Bits object containing the bit value and return it
       value = (self._uint & (1 << addr)) >> addr
-      return BitSlice( 1 , value, target_bits = self, offset = addr )
+      return _new_slice( 1, value, self, addr )
 
   #----------------------------------------------------------------------
   # __setitem__
@@ -330,22 +357,25 @@ class Bits( SignalValue ):
   # http://www1.pldworld.com/@xilinx/html/technote/TOOL/MANUAL/21i_doc/data/fndtn/ver/ver4_4.htm
 
   def __invert__( self ):
-    return Bits( self.nbits, ~self._uint, trunc=True )
+    return _new_bits( self.nbits, ~self._uint )
 
   def __add__( self, other ):
-    try:    return Bits( max( self.nbits, other.nbits), self._uint + other._uint, trunc=True )
-    except: return Bits( self.nbits,                    self._uint + other,       trunc=True )
+    if isinstance( other, Bits ):
+      return _new_bits( max( self.nbits, other.nbits ), self._uint + other._uint )
+    return _new_bits( self.nbits, int( self._uint + other ) )
 
   def __sub__( self, other ):
-    try:    return Bits( max( self.nbits, other.nbits), self._uint - other._uint, trunc=True )
-    except: return Bits( self.nbits,                    self._uint - other,       trunc=True )
+    if isinstance( other, Bits ):
+      return _new_bits( max( self.nbits, other.nbits ), self._uint - other._uint )
+    return _new_bits( self.nbits, int( self._uint - other ) )
 
   # TODO: what about multiplying Bits object with an object of other type
   # where the bitwidth of the other type is larger than the bitwidth of the
   # Bits object? ( applies to every other operator as well.... )
   def __mul__( self, other ):
-    try:    return Bits( 2*max( self.nbits, other.nbits), self._uint * other._uint, trunc=True )
-    except: return Bits( 2*self.nbits,                    self._uint * other,       trunc=True )
+    if isinstance( other, Bits ):
+      return _new_bits( 2*max( self.nbits, other.nbits ), self._uint * other._uint )
+    return _new_bits( 2*self.nbits, int( self._uint * other ) )
 
   def __radd__( self, other ):
     return self.__add__( other )
@@ -357,16 +387,19 @@ class Bits( SignalValue ):
     return self.__mul__( other )
 
   def __div__(self, other):
-    try:    return Bits( 2*max( self.nbits, other.nbits), self._uint / other._uint, trunc=True )
-    except: return Bits( 2*self.nbits,                    self._uint / other,       trunc=True )
+    if isinstance( other, Bits ):
+      return _new_bits( 2*max( self.nbits, other.nbits ), self._uint / other._uint )
+    return _new_bits( 2*self.nbits, int( self._uint / other ) )
 
   def __floordiv__(self, other):
-    try:    return Bits( 2*max( self.nbits, other.nbits), self._uint / other._uint, trunc=True )
-    except: return Bits( 2*self.nbits,                    self._uint / other,       trunc=True )
+    if isinstance( other, Bits ):
+      return _new_bits( 2*max( self.nbits, other.nbits ), self._uint / other._uint )
+    return _new_bits( 2*self.nbits, int( self._uint / other ) )
 
   def __mod__(self, other):
-    try:    return Bits( 2*max( self.nbits, other.nbits), self._uint % other._uint, trunc=True )
-    except: return Bits( 2*self.nbits,                    self._uint % other,       trunc=True )
+    if isinstance( other, Bits ):
+      return _new_bits( 2*max( self.nbits, other.nbits ), self._uint % other._uint )
+    return _new_bits( 2*self.nbits, int( self._uint % other ) )
 
   # TODO: implement these?
   # def __divmod__(self, other)
@@ -378,11 +411,11 @@ class Bits( SignalValue ):
 
   def __lshift__( self, other ):
     # Optimization to return 0 if shift amount is greater than self.nbits
-    if int( other ) >= self.nbits: return Bits( self.nbits, 0 )
-    return Bits( self.nbits, self._uint << int( other ), trunc=True )
+    if int( other ) >= self.nbits: return _new_bits( self.nbits, 0 )
+    return _new_bits( self.nbits, self._uint << int( other ) )
 
   def __rshift__( self, other ):
-    return Bits( self.nbits, self._uint >> int( other ) )
+    return _new_bits( self.nbits, self._uint >> int( other ) )
 
   # TODO: Not implementing reflective operators because its not clear
   #       how to determine width of other object in case of lshift
@@ -397,18 +430,21 @@ class Bits( SignalValue ):
 
   def __and__( self, other ):
     assert other >= 0
-    try:    return Bits( max( self.nbits, other.nbits), self._uint & other._uint, trunc=True )
-    except: return Bits( self.nbits,                    self._uint & other,       trunc=True )
+    if isinstance( other, Bits ):
+      return _new_bits( max( self.nbits, other.nbits ), self._uint & other._uint )
+    return _new_bits( self.nbits, int( self._uint & other ) )
 
   def __xor__( self, other ):
     assert other >= 0
-    try:    return Bits( max( self.nbits, other.nbits), self._uint ^ other._uint, trunc=True )
-    except: return Bits( self.nbits,                    self._uint ^ other,       trunc=True )
+    if isinstance( other, Bits ):
+      return _new_bits( max( self.nbits, other.nbits ), self._uint ^ other._uint )
+    return _new_bits( self.nbits, int( self._uint ^ other ) )
 
   def __or__( self, other ):
     assert other >= 0
-    try:    return Bits( max( self.nbits, other.nbits), self._uint | other._uint, trunc=True )
-    except: return Bits( self.nbits,                    self._uint | other,       trunc=True )
+    if isinstance( other, Bits ):
+      return _new_bits( max( self.nbits, other.nbits ), self._uint | other._uint )
+    return _new_bits( self.nbits, int( self._uint | other ) )
 
   def __rand__( self, other ):
     return self.__and__( other )
@@ -465,6 +501,37 @@ class Bits( SignalValue ):
     return Bits( new_width, self.int() )
 
 
+#-----------------------------------------------------------------------
+# _new_bits
+#-----------------------------------------------------------------------
+# Unchecked constructor used for the results of operators on Bits. The
+# value is truncated to nbits, skipping the argument conversion and
+# range checks done by Bits.__init__.
+def _new_bits( nbits, value ):
+  bits       = _object_new( Bits )
+  bits.nbits = nbits
+  bits._mask, bits._min = _width_info[ nbits ]
+  bits._max  = bits._mask
+  bits._uint = value & bits._mask
+  return bits
+
+#-----------------------------------------------------------------------
+# _new_slice
+#-----------------------------------------------------------------------
+# Unchecked constructor used when slicing Bits, value must already be
+# the nbits wide value of the slice.
+def _new_slice( nbits, value, target_bits, offset ):
+  bits       = _object_new( BitSlice )
+  bits.nbits = nbits
+  bits._mask, bits._min = _width_info[ nbits ]
+  bits._max  = bits._mask
+  bits._uint = value
+  bits._target_bits = target_bits
+  bits._offset      = offset
+  return bits
+
+_object_new = object.__new__
+
 #-----------------------------------------------------------------------
 # BitSlice
 #-----------------------------------------------------------------------
@@ -475,6 +542,8 @@ class Bits( SignalValue ):
 # update the value of BitSlices that point to it!
 class BitSlice( Bits ):
 
+  __slots__ = ( '_target_bits', '_offset' )
+
   #---------------------------------------------------------------------
   # __init__
   #---------------------------------------------------------------------
@@ -488,14 +557,25 @@ class BitSlice( Bits ):
     # specific bits we are slicing.
     self._target_bits = target_bits
     self._offset      = offset
-    self.slice        = slice( offset, offset + nbits )
-
-    # Take the notify_sim_* methods and the _slices function pointer list
-    # from the original Bits instance. This ensures writes to the BitSlice
-    # object made in a simulator will trigger the appropriate callbacks
-    # attached to the Bits instance.
-    self.notify_sim_comb_update = self._target_bits.notify_sim_comb_update
-    self.notify_sim_seq_update  = self._target_bits.notify_sim_seq_update
+
+  @property
+  def slice( self ):
+    return slice( self._offset, self._offset + self.nbits )
+
+  # Forward the notify_sim_* methods and the _slices function pointer
+  # list to the original Bits instance. This ensures writes to the
+  # BitSlice object made in a simulator will trigger the appropriate
+  # callbacks attached to the Bits instance. These are looked up on
+  # each write rather than copied when slicing, since most slices are
+  # only ever read.
+
+  @property
+  def notify_sim_comb_update( self ):
+    return self._target_bits.notify_sim_comb_update
+
+  @property
+  def notify_sim_seq_update( self ):
+    return self._target_bits.notify_sim_seq_update
 
   @property
   def _slices( self ):
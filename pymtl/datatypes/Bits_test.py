@@ -543,3 +543,45 @@ def test_slice_bits():
   assert data[ :x]   == 0b01
   with pytest.raises( IndexError ):
     assert data[x:x] == 0b1
+
+def test_operator_results():
+
+  a = Bits( 8, 0xf0 )
+  b = Bits( 4, 0x3  )
+
+  # Results of operators are plain Bits with the usual widths and masks
+  for x in [ a + b, a - b, a & b, a | 2, ~a, a << 2, a >> 2, a * b ]:
+    assert type( x ) is Bits
+    assert x._mask == x._max == 2**x.nbits - 1
+    assert x._min  == -2**(x.nbits - 1)
+    assert x[:] == x
+
+  assert ( a - 0xf1 ).uint() == 0xff
+  assert ( b - a    ).uint() == 0x13
+  assert ( a * 2    ).nbits  == 16
+
+  # Operator results start without any instance attributes, but arbitrary
+  # attributes can still be added
+  x = a + b
+  assert not x.__dict__
+  x.foo = 1
+  assert x.foo == 1
+
+def test_slice_results():
+
+  a = Bits( 8, 0b11001010 )
+
+  x = a[2:6]
+  assert x == 0b0010 and x.nbits == 4
+  assert x.slice == slice( 2, 6 )
+  assert a[7].slice == slice( 7, 8 )
+  assert a.slice == slice( None )
+
+  # Writing a slice updates the sliced Bits
+  x.value = 0b1111
+  assert a == 0b11111110
+
+  # Copies made with [:] are independent of the original
+  y = a[:]
+  y.value = 0
+  assert a == 0b11111110
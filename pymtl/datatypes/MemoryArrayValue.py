@@ -0,0 +1,229 @@
+#=======================================================================
+# MemoryArrayValue.py
+#=======================================================================
+# Module containing the MemoryArrayValue class.
+
+from Bits import Bits, _new_bits, _get_nbits, _object_new
+
+#-----------------------------------------------------------------------
+# MemoryArrayValue
+#-----------------------------------------------------------------------
+# Value type used by simulators in place of a MemoryArray. All entries
+# are stored as unsigned integers in a single list, and a SignalValue
+# for an entry is only created when the entry is accessed.
+#
+# Writes to .next are buffered until flop() is called, which applies
+# them and calls wake() with every reader of a changed entry. Readers
+# are recorded per entry by reads made while current_reader() returns
+# something other than None, and are forgotten once woken up, so a
+# reader is only woken up when an entry it read during its last
+# execution changes. Simulators hook into these by replacing the
+# notify_sim_seq_update, current_reader and wake attributes.
+class MemoryArrayValue( object ):
+
+  #---------------------------------------------------------------------
+  # __init__
+  #---------------------------------------------------------------------
+  def __init__( self, nentries, dtype ):
+
+    self.nentries = nentries
+    self.dtype    = dtype
+    self.nbits    = dtype.nbits
+
+    self._data    = [ dtype.uint() ] * nentries
+    self._pending = {}
+    self._fill    = None
+    self._readers = {}
+
+    self._entry_class = _get_entry_class( type( dtype ) )
+
+  #---------------------------------------------------------------------
+  # Simulator hooks
+  #---------------------------------------------------------------------
+  # Called when the first .next write of a cycle is buffered, returns
+  # the reader to record for reads, and wakes up a set of readers.
+
+  def notify_sim_seq_update( self ):
+    pass
+
+  def current_reader( self ):
+    return None
+
+  def wake( self, readers ):
+    pass
+
+  #---------------------------------------------------------------------
+  # __len__
+  #---------------------------------------------------------------------
+  def __len__( self ):
+    return self.nentries
+
+  #---------------------------------------------------------------------
+  # __iter__
+  #---------------------------------------------------------------------
+  def __iter__( self ):
+    for i in xrange( self.nentries ):
+      yield self[ i ]
+
+  #---------------------------------------------------------------------
+  # __getitem__
+  #---------------------------------------------------------------------
+  # Read an entry. The returned SignalValue holds the current value of
+  # the entry, writing its .next (or .value) writes the entry.
+  def __getitem__( self, index ):
+
+    index = int( index )
+    value = self._data[ index ]
+    if index < 0:
+      index += self.nentries
+
+    reader = self.current_reader()
+    if reader is not None:
+      try:
+        self._readers[ index ].add( reader )
+      except KeyError:
+        self._readers[ index ] = set([ reader ])
+
+    dtype       = self.dtype
+    entry       = _object_new( self._entry_class )
+    entry.nbits = dtype.nbits
+    entry._mask = dtype._mask
+    entry._min  = dtype._min
+    entry._max  = dtype._max
+    entry._uint = value
+    entry._memory = self
+    entry._index  = index
+    return entry
+
+  #---------------------------------------------------------------------
+  # next
+  #---------------------------------------------------------------------
+  # Writing .next writes all entries on the next flop(), replacing any
+  # other .next writes made before it.
+  @property
+  def next( self ):
+    return self
+  @next.setter
+  def next( self, value ):
+    value = self._check( value )
+    if not self._pending and self._fill is None:
+      self.notify_sim_seq_update()
+    self._pending.clear()
+    self._fill = value
+
+  n = next
+
+  #---------------------------------------------------------------------
+  # flop
+  #---------------------------------------------------------------------
+  # Apply all buffered .next writes. Returns True if any entry changed.
+  def flop( self ):
+
+    data    = self._data
+    readers = self._readers
+    changed = False
+
+    if self._fill is not None:
+      fill    = self._fill
+      changed = data.count( fill ) != self.nentries
+      for index in [ i for i in readers if data[ i ] != fill ]:
+        self.wake( readers.pop( index ) )
+      self._data = data = [ fill ] * self.nentries
+      self._fill = None
+
+    for index, value in self._pending.iteritems():
+      if data[ index ] != value:
+        data[ index ] = value
+        changed       = True
+        if index in readers:
+          self.wake( readers.pop( index ) )
+    self._pending.clear()
+
+    return changed
+
+  #---------------------------------------------------------------------
+  # uint_list
+  #---------------------------------------------------------------------
+  # Return the values of all entries as a list of unsigned integers.
+  def uint_list( self ):
+    return list( self._data )
+
+  #---------------------------------------------------------------------
+  # _write_next
+  #---------------------------------------------------------------------
+  def _write_next( self, index, value ):
+    if not self._pending and self._fill is None:
+      self.notify_sim_seq_update()
+    self._pending[ index ] = value
+
+  #---------------------------------------------------------------------
+  # _read_next
+  #---------------------------------------------------------------------
+  def _read_next( self, index ):
+    try:
+      return self._pending[ index ]
+    except KeyError:
+      return self._data[ index ] if self._fill is None else self._fill
+
+  #---------------------------------------------------------------------
+  # _write_value
+  #---------------------------------------------------------------------
+  def _write_value( self, index, value ):
+    if self._data[ index ] != value:
+      self._data[ index ] = value
+      if index in self._readers:
+        self.wake( self._readers.pop( index ) )
+
+  #---------------------------------------------------------------------
+  # _check
+  #---------------------------------------------------------------------
+  # Check that value fits in an entry, returning it as an unsigned int.
+  def _check( self, value ):
+    dtype = self.dtype
+    value = int( value )
+    if not ( dtype._min <= value <= dtype._max ):
+      raise ValueError(
+        'Value is too big to be represented with Bits({})!\n'
+        '({} bits are needed to represent value = {} in two\'s complement.)'
+        .format( self.nbits, _get_nbits(value), value )
+      )
+    return value & dtype._mask
+
+#-----------------------------------------------------------------------
+# _MemoryEntry
+#-----------------------------------------------------------------------
+# Mixin for the values returned when reading a MemoryArrayValue entry,
+# which forwards writes to the entry back to the memory. Slices of an
+# entry work like slices of any other Bits, since BitSlice writes go
+# through write_value/write_next and _next of the sliced value.
+class _MemoryEntry( object ):
+
+  __slots__ = ()
+
+  @property
+  def _next( self ):
+    return _new_bits( self.nbits, self._memory._read_next( self._index ) )
+
+  def write_next( self, value ):
+    self._memory._write_next( self._index, self._memory._check( value ) )
+
+  def write_value( self, value ):
+    self._uint = value = self._memory._check( value )
+    self._memory._write_value( self._index, value )
+
+#-----------------------------------------------------------------------
+# _get_entry_class
+#-----------------------------------------------------------------------
+# Entry classes derive from the class of the dtype of the memory, so
+# BitStruct fields can be accessed on entries. Classes are cached per
+# dtype class.
+_entry_classes = {}
+def _get_entry_class( dtype_class ):
+  try:
+    return _entry_classes[ dtype_class ]
+  except KeyError:
+    entry_class = type( 'MemoryEntry_' + dtype_class.__name__,
+                        ( _MemoryEntry, dtype_class ),
+                        { '__slots__' : ( '_memory', '_index' ) } )
+    _entry_classes[ dtype_class ] = entry_class
+    return entry_class
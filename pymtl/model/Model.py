@@ -12,6 +12,7 @@ translation into HDLs, etc).
 from metaclasses    import MetaCollectArgs
 from ConnectionEdge import ConnectionEdge, PyMTLConnectError
 from signals        import Signal, InPort, OutPort, Wire, Constant
+from signals        import MemoryArray
 from signal_lists   import PortList, WireList
 from PortBundle     import PortBundle
 from ..datatypes    import Bits
@@ -136,6 +137,7 @@ class Model( object ):
     inst._posedge_clk_blocks   = []
     inst._combinational_blocks = []
     inst._connections          = set()
+    inst._state_names          = []
 
     return inst
 
@@ -401,6 +403,60 @@ class Model( object ):
     func._model = self
     return func
 
+  #---------------------------------------------------------------------
+  # register_state
+  #---------------------------------------------------------------------
+  def register_state( self, *names ):
+    """Register attributes holding the Python state of a cycle-level
+    or functional-level model (queues, memories, counters, random number
+    generators...) to include in simulator checkpoints.
+
+    Signals are always checkpointed and do not need to be registered.
+
+    >>> s.data = deque( maxlen=2 )
+    >>> s.idx  = 0
+    >>> s.register_state( 'data', 'idx' )
+    """
+
+    self._state_names.extend( names )
+
+  #---------------------------------------------------------------------
+  # idle_cycles
+  #---------------------------------------------------------------------
+  def idle_cycles( self ):
+    """Returns how many of the following cycles the sequential blocks of
+    this model can skip, or None if there is no limit.
+
+    SimulationTool.run() only asks after a cycle in which no register
+    changed value, so the blocks see the same signal values as in the
+    last cycle. Models with @tick blocks should implement this method
+    (along with skip_cycles()) to return the number of cycles before
+    their next observable change, e.g. a counter running down. The
+    default assumes @tick blocks can never be skipped, and that
+    @posedge_clk blocks have no state other than signals. Models whose
+    @posedge_clk blocks update plain Python attributes or state hidden
+    in an external simulator must return 0 (or the cycles until their
+    next change), otherwise run() may skip over that state changing.
+
+    >>> def idle_cycles( s ):
+    >>>   return None if s.counter == 0 else s.counter - 1
+    """
+
+    return 0 if self._tick_blocks else None
+
+  #---------------------------------------------------------------------
+  # skip_cycles
+  #---------------------------------------------------------------------
+  def skip_cycles( self, ncycles ):
+    """Advance the Python state of this model over ncycles skipped
+    cycles, at most the number returned by idle_cycles().
+
+    >>> def skip_cycles( s, ncycles ):
+    >>>   s.counter -= ncycles
+    """
+
+    pass
+
   #-----------------------------------------------------------------------
   # line_trace
   #-----------------------------------------------------------------------
@@ -481,6 +537,14 @@ class Model( object ):
     """Get a list of all Wires defined in this model."""
     return self._wires
 
+  def get_memories( self ):
+    """Get a list of all MemoryArrays defined in this model."""
+    return self._memories
+
+  def get_state_names( self ):
+    """Get a list of the attributes registered with register_state()."""
+    return self._state_names
+
   def get_submodules( self ):
     """Get a list of all child Models instaniated in this model."""
     return self._submodules
@@ -532,6 +596,7 @@ class Model( object ):
 
     # Initialize lists for signals, submodules and connections
     current_model._wires          = []
+    current_model._memories       = []
     current_model._inports        = []
     current_model._outports       = []
     current_model._hports         = []
@@ -565,6 +630,11 @@ class Model( object ):
       obj.parent            = current_model
       current_model._wires += [ obj ]
 
+    elif isinstance( obj, MemoryArray ):
+      obj.name                 = name
+      obj.parent               = current_model
+      current_model._memories += [ obj ]
+
     elif isinstance( obj, InPort ):
       obj.name                = name
       obj.parent              = current_model
@@ -681,6 +751,25 @@ class Model( object ):
     for submodule in self._submodules:
       submodule._recurse_connections()
 
+  #---------------------------------------------------------------------
+  # _expand_memories
+  #---------------------------------------------------------------------
+  # Replace every MemoryArray in the design of a Model with the
+  # equivalent list of Wires. Used by tools which need a separate signal
+  # per entry, the model can no longer be simulated afterwards.
+  def _expand_memories( self ):
+    """Replace all MemoryArrays in the model with lists of Wires."""
+
+    for memory in self._memories:
+      wires = memory.to_wires()
+      setattr( self, memory.name, wires )
+      self._wires += wires
+    self._memories = []
+
+    # Recursively enter submodules
+    for submodule in self._submodules:
+      submodule._expand_memories()
+
   #---------------------------------------------------------------------
   # _connect_signal
   #---------------------------------------------------------------------
@@ -5,6 +5,7 @@
 hardware models."""
 
 from metaclasses      import MetaListConstructor
+from signal_lists     import WireList
 from ..datatypes.Bits import Bits
 
 #-----------------------------------------------------------------------
@@ -219,6 +220,80 @@ class Constant( Signal ):
     """Not sure why this equality check is needed..."""
     return self._signalvalue == other._signalvalue
 
+#-----------------------------------------------------------------------
+# MemoryArray
+#-----------------------------------------------------------------------
+class MemoryArray( object ):
+  """Array of storage elements, such as the entries of an SRAM or a
+  register file.
+
+  A MemoryArray behaves like a list of Wires inside concurrent blocks,
+  but simulators store all entries in a single compact array rather than
+  creating a separate net per entry. Entries may be read with
+  s.mem[ addr ] and written with s.mem[ addr ].next, and all entries
+  can be written at once with s.mem.next. MemoryArrays cannot be
+  structurally connected.
+  """
+
+  #---------------------------------------------------------------------
+  # __init__
+  #---------------------------------------------------------------------
+  def __init__( self, nentries, dtype ):
+    """Construct a new MemoryArray of nentries entries of type dtype.
+
+    Like Signals, dtype may be a SignalValue or an integer bitwidth:
+
+    >>> MemoryArray( 16, Bits( 32 ) )
+    >>> MemoryArray( 16, 32 )  # Equivalent to the above
+    """
+
+    if not nentries > 0:
+      raise ValueError( "The number of entries in a MemoryArray must be "
+                        "> 0!" )
+
+    is_int             = isinstance( dtype, int )
+    self.dtype         = dtype if not is_int else Bits( dtype )
+    self.nbits         = self.dtype.nbits
+    self.nentries      = nentries
+
+    self.name          = "NO NAME: not elaborated yet!"
+    self.parent        = None
+
+    self._signalvalue  = None
+
+  #---------------------------------------------------------------------
+  # __len__
+  #---------------------------------------------------------------------
+  def __len__( self ):
+    return self.nentries
+
+  #---------------------------------------------------------------------
+  # fullname
+  #---------------------------------------------------------------------
+  @property
+  def fullname( self ):
+    """Return MemoryArray name formatted as
+    "parent_model_name.memory_name"."""
+
+    parent_name = self.parent.name if self.parent else '?'
+    return "{}.{}".format( parent_name, self.name )
+
+  #---------------------------------------------------------------------
+  # to_wires
+  #---------------------------------------------------------------------
+  def to_wires( self ):
+    """Return a WireList containing one Wire per entry, named and
+    parented the same way elaboration names a list of Wires. Used by
+    tools which operate on individual signals (e.g. translation)."""
+
+    wires = WireList( Wire( self.dtype ) for _ in range( self.nentries ) )
+    wires.name    = self.name
+    wires._memory = self
+    for i, wire in enumerate( wires ):
+      wire.name   = "{}[{}]".format( self.name, i )
+      wire.parent = self.parent
+    return wires
+
 #-----------------------------------------------------------------------
 # _SignalSlice
 #-----------------------------------------------------------------------
@@ -7,6 +7,8 @@ import sys
 import shutil
 from subprocess import check_output, STDOUT, CalledProcessError
 
+from ..translation.cffi_helpers import create_cffi_module
+
 class SystemCEnvError( Exception ): pass
 class SystemCCompileError   ( Exception ): pass
 
@@ -93,6 +95,11 @@ def systemc_to_pymtl( model, obj_dir, include_dirs, sc_module_name,
   
   create_shared_lib( lib_file, c_wrapper_file, objs, include_dirs, obj_dir )
   
+  # The cdef only holds plain C declarations, so it doubles as the
+  # source of the CFFI extension module (API mode)
+  create_cffi_module( '_{}_sc'.format( model.class_name ), cdef, cdef,
+                      lib_file )
+  
   create_py_wrapper( model, py_wrapper_file, cdef )
 
 #-----------------------------------------------------------------------
@@ -265,7 +272,13 @@ void wr_{}({}_t* obj, const char* x)
     void destroy({sc_module_name}_t *obj);
 
     void sim({sc_module_name}_t *obj);
-    
+    '''.format( **vars() )
+  
+  # line_trace only exists with SystemC line tracing, and API mode
+  # resolves every declared function when loading the module
+  
+  if sclinetrace:
+    cdef += '''
     void line_trace({sc_module_name}_t *obj, char *str);
     '''.format( **vars() )
   
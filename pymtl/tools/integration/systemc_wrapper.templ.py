@@ -7,7 +7,8 @@
 import os
 
 from pymtl import *
-from cffi  import FFI
+
+from pymtl.tools.translation.cffi_helpers import load_cffi_module
 
 #-----------------------------------------------------------------------
 # {class_name}
@@ -15,18 +16,18 @@ from cffi  import FFI
 class {class_name}( Model ):
   id_ = 0
 
-  def __init__( s ):
+  # CFFI extension module (API mode) calling into the shared library
 
-    # initialize FFI, define the exposed interface
-    
-    s.ffi = FFI()
-    s.ffi.cdef('''{cdef}''')
+  _sc_module = load_cffi_module( '_{class_name}_sc', '.' )
 
-    # Import the shared library containing the model. We defer
-    # construction to the elaborate_logic function to allow the user to
-    # set the vcd_file.
+  def __init__( s ):
 
-    s._ffi = s.ffi.dlopen('./lib{class_name}_sc.so')
+    # Get the FFI and the exposed methods of the shared library
+    # containing the model. We defer construction to the
+    # elaborate_logic function to allow the user to set the vcd_file.
+
+    s.ffi  = s._sc_module.ffi
+    s._ffi = s._sc_module.lib
     s._m   = None
 
     # dummy class to emulate PortBundles
@@ -81,6 +82,12 @@ class {class_name}( Model ):
       {set_clock}
       {set_next}
 
+  # The state of the SystemC model is not visible to the simulator, so
+  # cycles can never be skipped
+
+  def idle_cycles( s ):
+    return 0
+
   def line_trace( s ):
     if {sclinetrace}:
       s._ffi.line_trace( s._m, s._line_trace_str )
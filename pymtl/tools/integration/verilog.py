@@ -49,16 +49,32 @@ class SomeMeta( MetaCollectArgs ):
     # >>> my_verilog_model = TranslationTool( MyVerilogModel( p1, p2 ) )
     #
 
-    # I think there is no way to turn on VCD dumping after the fact, so I
-    # think we have no choice but to always turn on VCD dumping for now
-    # if we are using Verilog import? -cbatten
+    # VCD dumping cannot be turned on after the fact, and building with
+    # tracing makes the verilated model much slower even when it does
+    # not dump, so we only build with tracing if it was asked for, either
+    # with vtrace or by setting vcd_file in the class. Once built with
+    # tracing, trace_on and trace_off select the cycles to dump.
 
-    inst.vcd_file = '__dummy__'
+    if inst.vtrace or getattr( inst, 'vcd_file', '' ):
+      inst.vcd_file = '__dummy__'
+    else:
+      inst.vcd_file = ''
 
     new_inst = TranslationTool( inst, lint=True )
 
     new_inst.vcd_file = None
 
+    # If vcd_file is only set after construction (e.g., with --dump-vcd
+    # in the test harness), the wrapper rebuilds the model with tracing
+    # when it is elaborated. The rebuild is cached like any other.
+
+    if not inst.vcd_file:
+      def build_traced():
+        traced = super( SomeMeta, self ).__call__( *args, **kwargs )
+        traced.vcd_file = '__dummy__'
+        return TranslationTool( traced, lint=True ).__class__
+      new_inst._build_traced = build_traced
+
     # TODO: THIS IS SUPER HACKY. FIXME
     # We hack the TranslationTool model in all kinds of awful ways to make
     # it look like the original VerilogModel. This ensures the the
@@ -73,6 +89,7 @@ class SomeMeta( MetaCollectArgs ):
     new_inst.modulename  = inst.modulename
     new_inst.sourcefile  = inst.sourcefile
     new_inst.vlinetrace  = inst.vlinetrace
+    new_inst.vtrace      = inst.vtrace
     new_inst._param_dict = inst._param_dict
     new_inst._port_dict  = inst._port_dict
 
@@ -107,6 +124,8 @@ class VerilogModel( Model ):
   Attributes:
     modulename  Name of the Verilog module to import.
     sourcefile  Location of the .v file containing the module.
+    vtrace      Build with Verilator tracing, so the model can dump a
+                VCD file (see trace_on and trace_off).
   """
   __metaclass__ = SomeMeta
 
@@ -114,6 +133,7 @@ class VerilogModel( Model ):
   sourcefile   = None
   vprefix      = None
   vlinetrace   = False
+  vtrace       = False
 
   _param_dict  = None
   _port_dict   = None
@@ -450,3 +450,25 @@ def test_lint_warning( dump_vcd, all_verilog ):
   ## test max
   #do_add( 2**nbits-1, 2**nbits-1, 1 )
 
+
+#-----------------------------------------------------------------------
+# test_dump_vcd
+#-----------------------------------------------------------------------
+# The test harness sets vcd_file after the VerilogModel was constructed
+# (and built without tracing), so it must be rebuilt with tracing.
+
+def test_dump_vcd( tmpdir ):
+
+  from pclib.test import run_test_vector_sim
+
+  vcd_file = str( tmpdir.join( 'EnResetRegVRTL.vcd' ) )
+
+  run_test_vector_sim( EnResetRegVRTL( 8, 3 ), [
+    'en d  q*',
+    [ 0, 1, 3 ],
+    [ 1, 2, 3 ],
+    [ 0, 4, 2 ],
+  ], dump_vcd=vcd_file )
+
+  assert tmpdir.join( 'EnResetRegVRTL.vcd' ).check()
+  assert tmpdir.listdir( 'EnResetRegVRTL.verilator*.vcd' )
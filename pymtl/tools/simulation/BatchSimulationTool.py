@@ -0,0 +1,1466 @@
+#=======================================================================
+# BatchSimulationTool.py
+#=======================================================================
+# Tool for simulating many independent copies (lanes) of a hardware
+# model at once.
+#
+# The model is elaborated a single time and the value of every net is
+# stored as a NumPy vector with one element per lane: a uint64 vector
+# for nets up to 64 bits wide, an object vector of Python ints for wider
+# nets. Each @combinational, @posedge_clk and @tick block is translated
+# once from its AST into straight-line NumPy code, so a single call to
+# cycle() advances every lane by one clock cycle.
+#
+# Only the translatable subset of Python is supported. In particular:
+#
+# - for loops must iterate over range()/xrange() with constant bounds
+#   and are fully unrolled
+# - if statements and conditional expressions whose condition depends
+#   on signal values are predicated, both sides are evaluated for all
+#   lanes and the results are merged with a mask
+# - lists of signals may be indexed by signal values, the selected
+#   element is muxed per lane
+# - early returns are only allowed where the condition does not depend
+#   on signal values
+#
+# Blocks using anything else (greenlets, method calls on signals, CL
+# adapters...) raise a BatchTranslationError when the tool is built.
+
+from __future__ import print_function
+
+import ast, _ast
+import collections
+import __builtin__
+
+import sim_utils
+
+from ..ast_helpers           import get_method_ast, get_closure_dict
+from ..translation           import visitors
+from ...model.signals        import Signal, Constant, _SignalSlice
+from ...datatypes.Bits       import Bits
+from ...datatypes            import helpers
+
+try:
+  import numpy as np
+except ImportError:
+  np = None
+
+#-----------------------------------------------------------------------
+# BatchTranslationError
+#-----------------------------------------------------------------------
+class BatchTranslationError( Exception ):
+  def __init__( self, message, lineno=None ):
+    super( BatchTranslationError, self ).__init__( message )
+    self.lineno = lineno
+
+#-----------------------------------------------------------------------
+# BatchSimulationTool
+#-----------------------------------------------------------------------
+# User visible class implementing a tool for simulating nlanes copies of
+# a hardware model in lockstep.
+#
+# Stimulus is applied and results are observed through write() and
+# read() rather than through the model's ports, the Signal objects of
+# the elaborated model only serve as handles for the nets they belong
+# to:
+#
+# >>> sim = BatchSimulationTool( lambda: Counter( 8 ), 1000 )
+# >>> sim.reset()
+# >>> sim.write( sim.model.en, numpy.random.randint( 2, size=1000 ) )
+# >>> sim.cycle()
+# >>> sim.read( sim.model.count )
+class BatchSimulationTool( object ):
+
+  #---------------------------------------------------------------------
+  # __init__
+  #---------------------------------------------------------------------
+  # Construct a simulator for nlanes copies of the model returned by
+  # model_factory. The model is elaborated if needed.
+  def __init__( self, model_factory, nlanes ):
+
+    if np is None:
+      raise ImportError( "{} requires numpy!"
+                         .format( self.__class__.__name__ ) )
+
+    if nlanes < 1:
+      raise ValueError( "Invalid number of lanes {}, expected at least "
+                        "one!".format( nlanes ) )
+
+    model = model_factory()
+    if not model.is_elaborated():
+      model.elaborate()
+
+    # MemoryArrays are simulated the same way as lists of Wires
+
+    model._expand_memories()
+
+    self.model   = model
+    self.nlanes  = nlanes
+    self.ncycles = 0
+
+    # Map every Signal in the design to the index of its net, and
+    # allocate one value vector per net. Signals are keyed by id() since
+    # Constants compare by value.
+
+    signals                 = sim_utils.collect_signals( model )
+    nets, slice_connections = sim_utils.signals_to_nets( signals )
+
+    self._net_index  = {}
+    self._net_nbits  = []
+    self._values     = []
+
+    for k, net in enumerate( nets ):
+      nbits = max( x.nbits for x in net )
+      value = 0
+      for x in net:
+        self._net_index[ id( x ) ] = k
+        if isinstance( x, Constant ):
+          value = int( x._signalvalue ) & ( ( 1 << nbits ) - 1 )
+      self._net_nbits.append( nbits )
+      self._values.append( self._full( nbits, value ) )
+
+    # Translate all blocks and slice connections, then generate the
+    # combinational and sequential evaluation functions.
+
+    codegen = _CodeGen( self )
+
+    self._comb, self._comb_cyclic = codegen.gen_comb( model,
+                                                      slice_connections )
+    self._seq = codegen.gen_seq( model )
+
+    # Division by zero yields zero instead of a warning per cycle
+
+    self._errstate = np.errstate( divide='ignore', invalid='ignore' )
+
+  #---------------------------------------------------------------------
+  # reset
+  #---------------------------------------------------------------------
+  # Sets the reset signal high on all lanes and cycles the simulator.
+  def reset( self ):
+    self.write( self.model.reset, 1 )
+    self.cycle()
+    self.cycle()
+    self.write( self.model.reset, 0 )
+
+  #---------------------------------------------------------------------
+  # cycle
+  #---------------------------------------------------------------------
+  # Advances all lanes by a single clock cycle: settles the
+  # combinational logic on the current inputs, executes all sequential
+  # blocks, flops their registers and settles the combinational logic
+  # again.
+  def cycle( self ):
+    with self._errstate:
+      self._eval_comb()
+      self._seq( self._values )
+      self._eval_comb()
+    self.ncycles += 1
+
+  #---------------------------------------------------------------------
+  # eval_combinational
+  #---------------------------------------------------------------------
+  # Evaluate all combinational logic on all lanes.
+  def eval_combinational( self ):
+    with self._errstate:
+      self._eval_comb()
+
+  #---------------------------------------------------------------------
+  # _eval_comb
+  #---------------------------------------------------------------------
+  # Levelized designs settle in a single pass over the blocks, designs
+  # with combinational cycles between blocks are iterated until no net
+  # changes.
+  def _eval_comb( self ):
+
+    values = self._values
+
+    if not self._comb_cyclic:
+      self._comb( values )
+      return
+
+    for i in xrange( 1000 ):
+      before = values[:]
+      self._comb( values )
+      if all( x is y or np.array_equal( x, y )
+              for x, y in zip( before, values ) ):
+        return
+
+    raise Exception( "Combinational logic in {} did not settle!"
+                     .format( self.model.class_name ) )
+
+  #---------------------------------------------------------------------
+  # write
+  #---------------------------------------------------------------------
+  # Write a port, wire or bitfield on all lanes. The value is either a
+  # single int/Bits applied to every lane, or a sequence/array with one
+  # value per lane.
+  def write( self, signal, value ):
+
+    k, start, nbits = self._lookup( signal )
+    net_nbits       = self._net_nbits[ k ]
+    mask            = ( 1 << nbits ) - 1
+    wide            = net_nbits > 64
+
+    if isinstance( value, ( int, long, Bits ) ):
+      new = self._full( net_nbits, int( value ) & mask )
+    else:
+      if len( value ) != self.nlanes:
+        raise ValueError( "Expected {} values, got {}!"
+                          .format( self.nlanes, len( value ) ) )
+      if not wide and isinstance( value, np.ndarray ) and \
+         value.dtype.kind in 'biu':
+        new = value.astype( np.uint64 ) & np.uint64( mask )
+      else:
+        new = np.array( [ int( x ) & mask for x in value ],
+                        dtype = object if wide else np.uint64 )
+
+    if start != 0 or nbits != net_nbits:
+      old   = self._values[ k ]
+      clear = ( ( 1 << net_nbits ) - 1 ) & ~( mask << start )
+      if wide:
+        new = ( old & clear ) | ( new << start )
+      else:
+        new = ( old & np.uint64( clear ) ) | ( new << np.uint64( start ) )
+
+    self._values[ k ] = new
+
+  #---------------------------------------------------------------------
+  # read
+  #---------------------------------------------------------------------
+  # Read a port, wire or bitfield. Returns a vector with the value of
+  # every lane, or the Bits value of a single lane if lane is provided.
+  def read( self, signal, lane=None ):
+
+    k, start, nbits = self._lookup( signal )
+    value           = self._values[ k ]
+    mask            = ( 1 << nbits ) - 1
+
+    if lane is not None:
+      return Bits( nbits, ( int( value[ lane ] ) >> start ) & mask )
+
+    if start != 0 or nbits != self._net_nbits[ k ]:
+      if self._net_nbits[ k ] > 64:
+        value = ( value >> start ) & mask
+        if nbits <= 64:
+          value = value.astype( np.uint64 )
+      else:
+        value = ( value >> np.uint64( start ) ) & np.uint64( mask )
+
+    return value.copy()
+
+  #---------------------------------------------------------------------
+  # _lookup
+  #---------------------------------------------------------------------
+  # Returns the net index, bit offset and bitwidth of a Signal or
+  # _SignalSlice.
+  def _lookup( self, signal ):
+
+    start, nbits = 0, signal.nbits
+    if isinstance( signal, _SignalSlice ):
+      start, nbits = _slice_bounds( signal.slice, signal._signal.nbits )
+      signal       = signal._signal
+
+    try:
+      return self._net_index[ id( signal ) ], start, nbits
+    except KeyError:
+      raise ValueError( "{} is not a signal of {}!"
+                        .format( signal, self.model.class_name ) )
+
+  #---------------------------------------------------------------------
+  # _full
+  #---------------------------------------------------------------------
+  # Create a value vector holding value on every lane.
+  def _full( self, nbits, value ):
+    if nbits > 64:
+      return np.array( [ value ] * self.nlanes, dtype=object )
+    return np.full( self.nlanes, value, dtype=np.uint64 )
+
+#=======================================================================
+# Block Translation
+#=======================================================================
+
+#-----------------------------------------------------------------------
+# _slice_bounds
+#-----------------------------------------------------------------------
+# Returns the start and width of the bits selected by addr (an int or a
+# slice) in a value of the provided bitwidth.
+def _slice_bounds( addr, nbits ):
+  if isinstance( addr, slice ):
+    start = int( addr.start ) if addr.start is not None else 0
+    stop  = int( addr.stop  ) if addr.stop  is not None else nbits
+    return start, stop - start
+  return int( addr ), 1
+
+#-----------------------------------------------------------------------
+# _Expr
+#-----------------------------------------------------------------------
+# A value known only at simulation time: code evaluating to a uint64
+# vector (nbits <= 64), an object vector (nbits > 64) or, if is_bool, a
+# bool vector holding a 1-bit value.
+class _Expr( object ):
+  def __init__( self, code, nbits, is_bool=False ):
+    self.code    = code
+    self.nbits   = nbits
+    self.is_bool = is_bool
+
+#-----------------------------------------------------------------------
+# _Mux
+#-----------------------------------------------------------------------
+# An element of a list selected by a value known only at simulation
+# time. Attribute and index accesses are applied to every item.
+class _Mux( object ):
+  def __init__( self, sel, items ):
+    self.sel   = sel
+    self.items = items
+
+#-----------------------------------------------------------------------
+# _is_static
+#-----------------------------------------------------------------------
+# Objects known at translation time, the elements of lists included.
+def _is_static( x ):
+  if isinstance( x, ( _Expr, _Mux, Signal, _SignalSlice ) ):
+    return False
+  if isinstance( x, ( list, tuple ) ):
+    return all( _is_static( y ) for y in x )
+  return True
+
+#-----------------------------------------------------------------------
+# _AnnotateNextWrites
+#-----------------------------------------------------------------------
+# AnnotateAssignments only recognizes x.next = ... as a sequential
+# update, also mark writes to slices and bitfields of x.next.
+class _AnnotateNextWrites( ast.NodeVisitor ):
+
+  def visit_Assign( self, node ):
+    self._annotate( node, node.targets[0] )
+
+  def visit_AugAssign( self, node ):
+    self._annotate( node, node.target )
+
+  def _annotate( self, node, target ):
+    while isinstance( target, ( _ast.Attribute, _ast.Subscript ) ):
+      if isinstance( target, _ast.Attribute ) and \
+         target.attr in ['next', 'n']:
+        node._is_blocking = False
+        return
+      target = target.value
+
+#-----------------------------------------------------------------------
+# ast_pipeline
+#-----------------------------------------------------------------------
+# Translation passes shared with the Verilog translator. Signal
+# references are left intact, they are resolved against the live model
+# by the _BlockTranslator.
+def ast_pipeline( tree, model, func ):
+
+  tree = visitors.AnnotateWithObjects( model, func ).visit( tree )
+  tree = visitors.RemoveModule       (             ).visit( tree )
+  tree = visitors.SimplifyDecorator  (             ).visit( tree )
+  tree = visitors.ExpandMemoryFill   (             ).visit( tree )
+  tree = visitors.AnnotateAssignments(             ).visit( tree )
+  _AnnotateNextWrites().visit( tree )
+  tree = visitors.RemoveValueNext    (             ).visit( tree )
+  tree = visitors.ThreeExprLoops     (             ).visit( tree )
+  tree = visitors.ConstantToSlice    (             ).visit( tree )
+
+  return tree
+
+#-----------------------------------------------------------------------
+# _CodeGen
+#-----------------------------------------------------------------------
+# Generates the combinational and sequential evaluation functions of a
+# BatchSimulationTool. The generated code reads and writes the list of
+# net value vectors _v; sequential blocks write .next values into a copy
+# _n of that list which is flopped once all blocks have executed.
+class _CodeGen( object ):
+
+  def __init__( self, sim ):
+    self.sim       = sim
+    self.namespace = {
+      '_np'     : np,
+      '_u64'    : np.uint64,
+      '_mux'    : _mux,
+      '_shl'    : _shl,
+      '_shr'    : _shr,
+      '_parity' : _parity,
+    }
+    self.consts    = {}
+    self.ntemps    = 0
+
+  #---------------------------------------------------------------------
+  # const
+  #---------------------------------------------------------------------
+  # Returns the name of a constant in the generated namespace, a uint64
+  # scalar for narrow contexts or a Python int for wide contexts.
+  def const( self, value, wide ):
+    value = int( value )
+    if not wide:
+      value &= ( 1 << 64 ) - 1
+    key = ( value, wide )
+    if key not in self.consts:
+      name = '_k{}'.format( len( self.consts ) )
+      self.namespace[ name ] = value if wide else np.uint64( value )
+      self.consts[ key ]     = name
+    return self.consts[ key ]
+
+  #---------------------------------------------------------------------
+  # temp
+  #---------------------------------------------------------------------
+  # Returns a fresh local variable name.
+  def temp( self, name='' ):
+    self.ntemps += 1
+    return '_t{}_{}'.format( self.ntemps, name )
+
+  #---------------------------------------------------------------------
+  # net
+  #---------------------------------------------------------------------
+  def net( self, signal ):
+    return self.sim._net_index[ id( signal ) ]
+
+  #---------------------------------------------------------------------
+  # gen_comb
+  #---------------------------------------------------------------------
+  # Translate every @combinational block and slice connection and
+  # generate a function evaluating them in levelized order. Returns the
+  # function and whether the blocks contain a cycle, in which case they
+  # are emitted in registration order.
+  def gen_comb( self, model, slice_connects ):
+
+    reads  = collections.OrderedDict()
+    writes = {}
+    code   = {}
+
+    for m in sim_utils._get_all_models( model ):
+      for func in m.get_combinational_blocks():
+        t = _BlockTranslator( self, m, func )
+        t.translate( 'combinational' )
+        reads [ t ] = t.reads
+        writes[ t ] = t.writes
+        code  [ t ] = t.lines
+
+    for c in slice_connects:
+      t = _BlockTranslator( self, model, None )
+      if not t.translate_slice_connection( c ):
+        continue
+      reads [ t ] = t.reads
+      writes[ t ] = t.writes
+      code  [ t ] = t.lines
+
+    schedule = sim_utils.levelize_blocks( reads, writes )
+    cyclic   = schedule is None
+    if cyclic:
+      schedule = list( reads )
+
+    lines = []
+    for t in schedule:
+      lines.extend( code[ t ] )
+
+    return self.gen_func( '_comb', [], lines ), cyclic
+
+  #---------------------------------------------------------------------
+  # gen_seq
+  #---------------------------------------------------------------------
+  # Translate every @tick and @posedge_clk block, in the order used by
+  # SimulationTool, and generate a function executing them followed by
+  # flopping every register written with .next.
+  def gen_seq( self, model ):
+
+    lines     = []
+    registers = set()
+
+    for m in sim_utils._get_all_models( model ):
+      for func in m.get_tick_blocks() + m.get_posedge_clk_blocks():
+        t = _BlockTranslator( self, m, func )
+        t.translate( 'tick', 'tick_cl', 'tick_rtl', 'posedge_clk' )
+        lines.extend( t.lines )
+        registers.update( t.seq_writes )
+
+    flop = [ '_v[{0}] = _n[{0}]'.format( k ) for k in sorted( registers ) ]
+
+    return self.gen_func( '_seq', [ '_n = _v[:]' ], lines + flop )
+
+  #---------------------------------------------------------------------
+  # gen_func
+  #---------------------------------------------------------------------
+  def gen_func( self, name, prologue, lines ):
+
+    body = prologue + lines or [ 'pass' ]
+    src  = 'def {}( _v ):\n'.format( name )
+    src += ''.join( '  {}\n'.format( x ) for x in body )
+
+    exec compile( src, '<batch {}>'.format( name ), 'exec' ) in \
+         self.namespace
+
+    func      = self.namespace[ name ]
+    func._src = src
+    return func
+
+#-----------------------------------------------------------------------
+# _BlockTranslator
+#-----------------------------------------------------------------------
+# Translates the AST of a single block into straight-line NumPy code.
+# Values are resolved recursively to either static Python objects
+# (model attributes, Signals, ints, Bits, lists...), which are looked up
+# at translation time, or to dynamic _Expr/_Mux values.
+class _BlockTranslator( object ):
+
+  def __init__( self, codegen, model, func ):
+
+    self.codegen    = codegen
+    self.model      = model
+    self.func       = func
+    self.lines      = []
+    self.reads      = set()
+    self.writes     = set()
+    self.seq_writes = set()
+    self.env        = {}
+    self.locals     = set()
+    self.closure    = {}
+    self.pred       = None
+    self.returned   = False
+    self.is_seq     = False
+
+  #---------------------------------------------------------------------
+  # translate
+  #---------------------------------------------------------------------
+  def translate( self, *decorators ):
+
+    func = self.func
+    name = '{}.{}'.format( self.model.name, func.func_name )
+
+    try:
+      tree, _ = get_method_ast( func )
+
+      # Names stored anywhere in the block are locals, like in Python
+
+      self.locals = set( x.id for x in ast.walk( tree )
+                         if isinstance( x, _ast.Name ) and
+                            isinstance( x.ctx, ( _ast.Store, _ast.Param ) ) )
+
+      tree    = ast_pipeline( tree, self.model, func )
+    except BatchTranslationError:
+      raise
+    except Exception as e:
+      raise BatchTranslationError( 'Cannot translate block {}: {}'
+                                   .format( name, e ),
+                                   getattr( e, 'lineno', None ) )
+
+    if tree.decorator_list[0] not in decorators:
+      raise BatchTranslationError(
+        'Cannot translate @{} block {}!'.format( tree.decorator_list[0],
+                                                 name ), tree.lineno )
+
+    self.is_seq = tree.decorator_list[0] != 'combinational'
+
+    # Default arguments are used to capture loop variables
+
+    args     = [ x.id for x in tree.args.args ]
+    defaults = func.func_defaults or ()
+    for arg, default in zip( args[len(args)-len(defaults):], defaults ):
+      self.env[ arg ] = default
+
+    self.closure = get_closure_dict( func ) if func.func_closure else {}
+
+    try:
+      self.lines.append( '# {}'.format( name ) )
+      self.body( tree.body )
+    except BatchTranslationError as e:
+      raise BatchTranslationError( 'Cannot translate block {}: {}'
+                                   .format( name, e ), e.lineno )
+
+  #---------------------------------------------------------------------
+  # translate_slice_connection
+  #---------------------------------------------------------------------
+  # Slice connections become single line blocks. Slices of constants are
+  # written once at construction. Returns False if no code is needed.
+  def translate_slice_connection( self, c ):
+
+    src  = c.src_node
+    dest = c.dest_node
+    if c.dest_slice is not None:
+      dest = _SignalSlice( dest, c.dest_slice )
+
+    if isinstance( src, Constant ):
+      self.codegen.sim.write( dest, src._signalvalue )
+      return False
+
+    if c.src_slice is not None:
+      src = _SignalSlice( src, c.src_slice )
+
+    self.store( dest, src, False, None )
+    return True
+
+  #=====================================================================
+  # Statements
+  #=====================================================================
+
+  def body( self, stmts ):
+    for stmt in stmts:
+      if self.returned:
+        return
+      handler = getattr( self, 'stmt_' + stmt.__class__.__name__, None )
+      if handler is None:
+        self.error( stmt, '{} statements are not supported!'
+                          .format( stmt.__class__.__name__ ) )
+      handler( stmt )
+
+  def stmt_Assign( self, node ):
+    self.assign( node.targets[0], self.expr( node.value ),
+                 not node._is_blocking, node )
+
+  def stmt_AugAssign( self, node ):
+    value = self.binop( node.op, self.expr( node.target ),
+                        self.expr( node.value ), node )
+    self.assign( node.target, value, not node._is_blocking, node )
+
+  def stmt_If( self, node ):
+
+    test = self.expr( node.test )
+
+    # Conditions known at translation time select a branch
+
+    if _is_static( test ):
+      self.body( node.body if test else node.orelse )
+      return
+
+    # Otherwise both branches are predicated
+
+    cond  = self.cond( test )
+    outer = self.pred
+
+    self.pred = self.and_pred( outer, cond )
+    self.body( node.body )
+    if node.orelse:
+      self.pred = self.and_pred( outer, '( ~{} )'.format( cond ) )
+      self.body( node.orelse )
+    self.pred = outer
+
+  def stmt_For( self, node ):
+
+    if node.orelse:
+      self.error( node, 'for/else is not supported!' )
+    if not isinstance( node.target, _ast.Name ):
+      self.error( node, 'Loop variable must be a single name!' )
+
+    bounds = [ self.expr( x ) for x in
+               ( node.iter.lower, node.iter.upper, node.iter.step ) ]
+    if not all( _is_static( x ) for x in bounds ):
+      self.error( node, 'Loop bounds must be constants!' )
+
+    for i in xrange( *[ int( x ) for x in bounds ] ):
+      if self.returned:
+        return
+      self.env[ node.target.id ] = i
+      self.body( node.body )
+
+  def stmt_Return( self, node ):
+    if node.value is not None:
+      self.error( node, 'Blocks cannot return values!' )
+    if self.pred is not None:
+      self.error( node, 'Returns depending on signal values are not '
+                        'supported!' )
+    self.returned = True
+
+  def stmt_Assert( self, node ):
+
+    test = self.expr( node.test )
+
+    if _is_static( test ):
+      if not test:
+        self.error( node, 'Assertion is always false!' )
+      return
+
+    # Only lanes executing the assert are checked
+
+    cond = self.cond( test )
+    if self.pred is not None:
+      cond = '( {} | ~{} )'.format( cond, self.pred )
+    self.lines.append( 'assert _np.all( {} ), {!r}'.format( cond,
+                       'Assertion failed in {}, line {}'.format(
+                         self.func.func_name, node.lineno ) ) )
+
+  def stmt_Pass( self, node ):
+    pass
+
+  def stmt_Expr( self, node ):
+    # Only docstrings have no side effects
+    if not isinstance( node.value, _ast.Str ):
+      self.error( node, 'Expression statements are not supported!' )
+
+  #---------------------------------------------------------------------
+  # assign
+  #---------------------------------------------------------------------
+  def assign( self, target, value, seq, node ):
+
+    if isinstance( target, _ast.Name ) and target.id in self.locals:
+      self.assign_temp( target.id, value, node )
+      return
+
+    if seq and not self.is_seq:
+      self.error( node, 'Cannot write .next in a combinational block!' )
+
+    self.store( self.expr( target ), value, seq, node )
+
+  #---------------------------------------------------------------------
+  # assign_temp
+  #---------------------------------------------------------------------
+  # Temporaries written under a predicate keep their old value on the
+  # other lanes if they were defined before.
+  def assign_temp( self, name, value, node ):
+
+    old = self.env.get( name )
+
+    if self.pred is not None and old is not None:
+      new   = self.value( value, node )
+      old   = self.value( old,   node )
+      nbits = self.width( new, old )
+      value = _Expr( '_np.where( {}, {}, {} )'.format( self.pred,
+                       self.fit( new, nbits ), self.fit( old, nbits ) ),
+                     nbits )
+
+    elif isinstance( value, ( Signal, _SignalSlice, _Mux ) ):
+      value = self.value( value, node )
+
+    if isinstance( value, _Expr ):
+      var = self.codegen.temp( name )
+      self.lines.append( '{} = {}'.format( var, value.code ) )
+      value = _Expr( var, value.nbits, value.is_bool )
+
+    self.env[ name ] = value
+
+  #---------------------------------------------------------------------
+  # store
+  #---------------------------------------------------------------------
+  # Write value to a Signal, _SignalSlice or _Mux of those, under the
+  # current predicate and the optional extra predicate.
+  def store( self, target, value, seq, node, extra=None ):
+
+    if isinstance( target, _Mux ):
+      sel = self.value( target.sel, node )
+      for i, item in enumerate( target.items ):
+        cond = '({} == {})'.format( self.code( sel, sel.nbits > 64 ),
+                                    self.codegen.const( i, sel.nbits > 64 ) )
+        if extra is not None:
+          cond = '({} & {})'.format( extra, cond )
+        self.store( item, value, seq, node, cond )
+      return
+
+    if isinstance( target, _SignalSlice ):
+      start, nbits = _slice_bounds( target.slice, target._signal.nbits )
+      signal       = target._signal
+    elif isinstance( target, Signal ):
+      start, nbits = 0, target.nbits
+      signal       = target
+    else:
+      self.error( node, 'Cannot assign to {}!'.format( target ) )
+
+    k         = self.codegen.net( signal )
+    net_nbits = self.codegen.sim._net_nbits[ k ]
+    wide      = net_nbits > 64
+    array     = '_n' if seq else '_v'
+    old       = '{}[{}]'.format( array, k )
+
+    if seq:
+      self.seq_writes.add( k )
+    else:
+      self.writes.add( k )
+
+    value = self.value( value, node )
+
+    # Compute the new value of the whole net
+
+    if start == 0 and nbits == net_nbits:
+      new = self.fit( value, nbits )
+      if isinstance( value, ( int, long, Bits ) ) and \
+         self.pred is None and extra is None:
+        new = '_np.full( {}, {}, {} )'.format( self.codegen.sim.nlanes,
+                new, 'object' if wide else '_u64' )
+
+    else:
+      clear = ( ( 1 << net_nbits ) - 1 ) & ~( ( ( 1 << nbits ) - 1 )
+                                              << start )
+      new   = '( ( {} & {} ) | ( {} << {} ) )'.format( old,
+                self.codegen.const( clear, wide ),
+                self.fit( value, nbits, net_nbits ),
+                self.codegen.const( start, wide ) )
+
+    pred = self.and_pred( self.pred, extra, emit=False )
+    if pred is not None:
+      new = '_np.where( {}, {}, {} )'.format( pred, new, old )
+
+    self.lines.append( '{} = {}'.format( old, new ) )
+
+  #=====================================================================
+  # Expressions
+  #=====================================================================
+
+  def expr( self, node ):
+    handler = getattr( self, 'expr_' + node.__class__.__name__, None )
+    if handler is None:
+      self.error( node, '{} expressions are not supported!'
+                        .format( node.__class__.__name__ ) )
+    return handler( node )
+
+  def expr_Num( self, node ):
+    return node.n
+
+  def expr_Str( self, node ):
+    return node.s
+
+  def expr_List( self, node ):
+    return [ self.expr( x ) for x in node.elts ]
+
+  expr_Tuple = expr_List
+
+  def expr_Name( self, node ):
+
+    name = node.id
+
+    if name in self.env:
+      return self.env[ name ]
+    if name in self.locals:
+      self.error( node, 'Local "{}" used before assignment!'.format( name ) )
+    if name in self.closure:
+      return self.closure[ name ]
+    if name in self.func.func_globals:
+      return self.func.func_globals[ name ]
+    if hasattr( __builtin__, name ):
+      return getattr( __builtin__, name )
+
+    self.error( node, 'Unknown name "{}"!'.format( name ) )
+
+  def expr_Attribute( self, node ):
+    return self.getattr( self.expr( node.value ), node.attr, node )
+
+  def expr_Subscript( self, node ):
+
+    base = self.expr( node.value )
+
+    if isinstance( node.slice, _ast.Index ):
+      return self.index( base, self.expr( node.slice.value ), node )
+
+    if isinstance( node.slice, _ast.Slice ):
+      return self.index( base, self.expr( node.slice ), node )
+
+    self.error( node, 'Extended slices are not supported!' )
+
+  # Slices are also produced by ConstantToSlice for slice constants
+  def expr_Slice( self, node ):
+
+    if node.step is not None:
+      self.error( node, 'Slices with steps are not supported!' )
+
+    lower = self.expr( node.lower ) if node.lower else None
+    upper = self.expr( node.upper ) if node.upper else None
+    if not ( _is_static( lower ) and _is_static( upper ) ):
+      self.error( node, 'Slice bounds must be constants!' )
+
+    lower = int( lower ) if lower is not None else None
+    upper = int( upper ) if upper is not None else None
+    return slice( lower, upper )
+
+  def expr_BinOp( self, node ):
+    return self.binop( node.op, self.expr( node.left ),
+                       self.expr( node.right ), node )
+
+  def expr_UnaryOp( self, node ):
+
+    operand = self.expr( node.operand )
+
+    if _is_static( operand ):
+      return self.static_op( node, lambda: {
+        _ast.Invert : lambda x: ~x,
+        _ast.Not    : lambda x: not x,
+        _ast.USub   : lambda x: -x,
+        _ast.UAdd   : lambda x: +x,
+      }[ type( node.op ) ]( operand ) )
+
+    operand = self.value( operand, node )
+
+    if isinstance( node.op, _ast.Not ):
+      return _Expr( '( ~{} )'.format( self.cond( operand ) ), 1, True )
+
+    if isinstance( node.op, _ast.Invert ):
+      if operand.is_bool:
+        return _Expr( '( ~{} )'.format( operand.code ), 1, True )
+      wide = operand.nbits > 64
+      return _Expr( '( ~{} & {} )'.format( operand.code,
+                      self.codegen.const( ( 1 << operand.nbits ) - 1, wide ) ),
+                    operand.nbits )
+
+    self.error( node, 'Unsupported unary operator on signals!' )
+
+  def expr_BoolOp( self, node ):
+
+    values = [ self.expr( x ) for x in node.values ]
+    is_and = isinstance( node.op, _ast.And )
+
+    # Short circuit on leading static operands, like Python
+
+    while len( values ) > 1 and _is_static( values[0] ):
+      if bool( values[0] ) != is_and:
+        return values[0]
+      values.pop( 0 )
+
+    if len( values ) == 1:
+      return values[0]
+
+    conds = []
+    for x in values:
+      if _is_static( x ):
+        if bool( x ) != is_and:
+          return _Expr( self.full_bool( not is_and ), 1, True )
+        continue
+      conds.append( self.cond( self.value( x, node ) ) )
+
+    op = ' & ' if is_and else ' | '
+    return _Expr( '( {} )'.format( op.join( conds ) ), 1, True )
+
+  def expr_Compare( self, node ):
+
+    ops = {
+      _ast.Eq    : '==',
+      _ast.NotEq : '!=',
+      _ast.Lt    : '<',
+      _ast.LtE   : '<=',
+      _ast.Gt    : '>',
+      _ast.GtE   : '>=',
+    }
+
+    left   = self.expr( node.left )
+    result = []
+
+    for op, right in zip( node.ops, node.comparators ):
+      right = self.expr( right )
+
+      if _is_static( left ) and _is_static( right ):
+        value = self.static_op( node, lambda: {
+          _ast.Eq    : lambda x, y: x == y,
+          _ast.NotEq : lambda x, y: x != y,
+          _ast.Lt    : lambda x, y: x <  y,
+          _ast.LtE   : lambda x, y: x <= y,
+          _ast.Gt    : lambda x, y: x >  y,
+          _ast.GtE   : lambda x, y: x >= y,
+          _ast.Is    : lambda x, y: x is y,
+          _ast.IsNot : lambda x, y: x is not y,
+          _ast.In    : lambda x, y: x in y,
+          _ast.NotIn : lambda x, y: x not in y,
+        }[ type( op ) ]( left, right ) )
+        if not value:
+          return value
+        left = right
+        continue
+
+      if type( op ) not in ops:
+        self.error( node, 'Unsupported comparison on signals!' )
+
+      a, b = self.value( left, node ), self.value( right, node )
+      wide = self.is_wide( a, b )
+      result.append( '( {} {} {} )'.format( self.code( a, wide ),
+                       ops[ type( op ) ], self.code( b, wide ) ) )
+      left = right
+
+    if not result:
+      return True
+
+    return _Expr( '( {} )'.format( ' & '.join( result ) ), 1, True )
+
+  def expr_IfExp( self, node ):
+
+    test = self.expr( node.test )
+
+    if _is_static( test ):
+      return self.expr( node.body if test else node.orelse )
+
+    a     = self.value( self.expr( node.body   ), node )
+    b     = self.value( self.expr( node.orelse ), node )
+    nbits = self.width( a, b )
+
+    return _Expr( '_np.where( {}, {}, {} )'.format( self.cond( test ),
+                    self.fit( a, nbits ), self.fit( b, nbits ) ), nbits )
+
+  def expr_Call( self, node ):
+
+    func = self.expr( node.func )
+    args = [ self.expr( x ) for x in node.args ]
+
+    if node.keywords or node.starargs or node.kwargs:
+      self.error( node, 'Keyword and star arguments are not supported!' )
+
+    # Calls on static values are evaluated at translation time
+
+    if _is_static( args ):
+      return self.static_op( node, lambda: func( *args ) )
+
+    if func is Bits:
+      if len( args ) != 2 or not _is_static( args[0] ):
+        self.error( node, 'Bits() width must be a constant!' )
+      nbits = int( args[0] )
+      value = self.value( args[1], node )
+      return _Expr( self.fit( value, nbits ), nbits )
+
+    if func is helpers.zext or func is helpers.sext:
+      if len( args ) != 2 or not _is_static( args[1] ):
+        self.error( node, 'Extension width must be a constant!' )
+      return self.extend( self.value( args[0], node ), int( args[1] ),
+                          func is helpers.sext, node )
+
+    if func is helpers.concat:
+      return self.concat( [ self.value( x, node ) for x in args ], node )
+
+    if func in [ helpers.reduce_and, helpers.reduce_or,
+                 helpers.reduce_xor ]:
+      if len( args ) != 1:
+        self.error( node, 'Reductions take a single argument!' )
+      return self.reduce( func, self.value( args[0], node ) )
+
+    self.error( node, 'Cannot call {} on signals!'.format( func ) )
+
+  #---------------------------------------------------------------------
+  # getattr
+  #---------------------------------------------------------------------
+  def getattr( self, base, attr, node ):
+
+    if isinstance( base, _Mux ):
+      return _Mux( base.sel, [ self.getattr( x, attr, node )
+                               for x in base.items ] )
+
+    if isinstance( base, _Expr ):
+      if attr == 'nbits':
+        return base.nbits
+      self.error( node, 'Unsupported attribute "{}" on a temporary!'
+                        .format( attr ) )
+
+    try:
+      return getattr( base, attr )
+    except AttributeError:
+      self.error( node, 'Unknown attribute "{}" of {}!'.format( attr, base ) )
+
+  #---------------------------------------------------------------------
+  # index
+  #---------------------------------------------------------------------
+  def index( self, base, idx, node ):
+
+    if isinstance( base, _Mux ):
+      return _Mux( base.sel, [ self.index( x, idx, node )
+                               for x in base.items ] )
+
+    # Lists are indexed statically or muxed
+
+    if isinstance( base, ( list, tuple ) ):
+      if _is_static( idx ):
+        idx = idx if isinstance( idx, slice ) else int( idx )
+        return base[ idx ]
+      return _Mux( self.value( idx, node ), list( base ) )
+
+    # Static bits of signals stay references so they can be written
+
+    if isinstance( base, ( Signal, _SignalSlice ) ):
+
+      if isinstance( base, _SignalSlice ):
+        offset, nbits = _slice_bounds( base.slice, base._signal.nbits )
+        signal        = base._signal
+      else:
+        offset, nbits = 0, base.nbits
+        signal        = base
+
+      if isinstance( idx, slice ):
+        start, width = _slice_bounds( idx, nbits )
+        return _SignalSlice( signal, slice( offset + start,
+                                            offset + start + width ) )
+
+      if _is_static( idx ):
+        return _SignalSlice( signal, offset + int( idx ) )
+
+    # Everything else is sliced by value
+
+    if _is_static( base ) and _is_static( idx ):
+      return self.static_op( node, lambda: base[ idx ] )
+
+    value = self.value( base, node )
+
+    if isinstance( idx, slice ):
+      start, width = _slice_bounds( idx, value.nbits )
+      return self.bits( value, start, width )
+
+    if _is_static( idx ):
+      return self.bits( value, int( idx ), 1 )
+
+    return self.bits( self.shift( _ast.RShift(), value,
+                                  self.value( idx, node ), node ), 0, 1 )
+
+  #---------------------------------------------------------------------
+  # binop
+  #---------------------------------------------------------------------
+  # Result widths follow the Bits operators: the wider operand for
+  # add/sub/logic, twice that for mul/div/mod, the left operand for
+  # shifts. Operands without a width (ints) take the other's width.
+  def binop( self, op, a, b, node ):
+
+    if _is_static( a ) and _is_static( b ):
+      return self.static_op( node, lambda: {
+        _ast.Add      : lambda x, y: x +  y,
+        _ast.Sub      : lambda x, y: x -  y,
+        _ast.Mult     : lambda x, y: x *  y,
+        _ast.Div      : lambda x, y: x // y,
+        _ast.FloorDiv : lambda x, y: x // y,
+        _ast.Mod      : lambda x, y: x %  y,
+        _ast.Pow      : lambda x, y: x ** y,
+        _ast.LShift   : lambda x, y: x << y,
+        _ast.RShift   : lambda x, y: x >> y,
+        _ast.BitAnd   : lambda x, y: x &  y,
+        _ast.BitOr    : lambda x, y: x |  y,
+        _ast.BitXor   : lambda x, y: x ^  y,
+      }[ type( op ) ]( a, b ) )
+
+    a  = self.value( a, node )
+    b  = self.value( b, node )
+    wa = self.nbits( a, None )
+    wb = self.nbits( b, None )
+
+    if isinstance( op, ( _ast.LShift, _ast.RShift ) ):
+      if wa is None:
+        self.error( node, 'Cannot shift an int by a signal value!' )
+      return self.shift( op, a, b, node )
+
+    simple = {
+      _ast.Add      : '+',
+      _ast.Sub      : '-',
+      _ast.BitAnd   : '&',
+      _ast.BitOr    : '|',
+      _ast.BitXor   : '^',
+    }
+    double = {
+      _ast.Mult     : '*',
+      _ast.Div      : '//',
+      _ast.FloorDiv : '//',
+      _ast.Mod      : '%',
+    }
+
+    nbits = max( wa, wb )
+    if   type( op ) in simple: sym = simple[ type( op ) ]
+    elif type( op ) in double: sym = double[ type( op ) ]; nbits *= 2
+    else:
+      self.error( node, 'Unsupported operator on signals!' )
+
+    # Bitwise operators on 1-bit conditions stay conditions
+
+    if isinstance( op, ( _ast.BitAnd, _ast.BitOr, _ast.BitXor ) ) and \
+       getattr( a, 'is_bool', False ) and getattr( b, 'is_bool', False ):
+      return _Expr( '( {} {} {} )'.format( a.code, sym, b.code ), 1, True )
+
+    wide = self.is_wide( a, b, nbits )
+    code = '( {} {} {} )'.format( self.code( a, wide ), sym,
+                                  self.code( b, wide ) )
+
+    # Bitwise operators on values of the right width need no masking
+
+    exact = isinstance( a, _Expr ) and isinstance( b, _Expr ) and \
+            isinstance( op, ( _ast.BitAnd, _ast.BitOr, _ast.BitXor ) )
+    if not exact:
+      code = '( {} & {} )'.format( code,
+               self.codegen.const( ( 1 << nbits ) - 1, wide ) )
+
+    return self.narrow( code, wide, nbits )
+
+  #---------------------------------------------------------------------
+  # shift
+  #---------------------------------------------------------------------
+  def shift( self, op, a, b, node ):
+
+    nbits = a.nbits
+    wide  = nbits > 64
+    left  = isinstance( op, _ast.LShift )
+
+    if _is_static( b ):
+      amount = int( b )
+      if left and amount >= nbits:
+        return _Expr( self.fit( 0, nbits ), nbits )
+      if not left and amount >= nbits:
+        return _Expr( self.fit( 0, nbits ), nbits )
+      if left:
+        code = '( ( {} << {} ) & {} )'.format( self.code( a, wide ),
+                 self.codegen.const( amount, wide ),
+                 self.codegen.const( ( 1 << nbits ) - 1, wide ) )
+      else:
+        code = '( {} >> {} )'.format( self.code( a, wide ),
+                                      self.codegen.const( amount, wide ) )
+      return _Expr( code, nbits )
+
+    if left:
+      code = '_shl( {}, {}, {} )'.format( self.code( a, wide ),
+               self.code( b, self.nbits( b ) > 64 ), nbits )
+    else:
+      code = '_shr( {}, {} )'.format( self.code( a, wide ),
+               self.code( b, self.nbits( b ) > 64 ) )
+    return _Expr( code, nbits )
+
+  #---------------------------------------------------------------------
+  # extend
+  #---------------------------------------------------------------------
+  def extend( self, value, nbits, signed, node ):
+
+    width = self.nbits( value )
+    if not signed or nbits <= width:
+      return _Expr( self.fit( value, nbits ), nbits )
+
+    wide = nbits > 64
+    ext  = ( ( 1 << nbits ) - 1 ) ^ ( ( 1 << width ) - 1 )
+    x    = self.code( value, wide )
+    k    = self.codegen.const
+    code = '( {x} | ( ( {z} - ( ( {x} >> {msb} ) & {one} ) ) & {ext} ) )' \
+           .format( x=x, z=k( 0, wide ), msb=k( width-1, wide ),
+                    one=k( 1, wide ), ext=k( ext, wide ) )
+    return _Expr( code, nbits )
+
+  #---------------------------------------------------------------------
+  # concat
+  #---------------------------------------------------------------------
+  def concat( self, values, node ):
+
+    if not all( isinstance( x, ( _Expr, Bits ) ) for x in values ):
+      self.error( node, 'concat() arguments must have a bitwidth!' )
+
+    nbits = sum( x.nbits for x in values )
+    wide  = nbits > 64
+    parts = []
+    shamt = nbits
+    for x in values:
+      shamt -= x.nbits
+      if shamt:
+        parts.append( '( {} << {} )'.format( self.code( x, wide ),
+                        self.codegen.const( shamt, wide ) ) )
+      else:
+        parts.append( self.code( x, wide ) )
+
+    return _Expr( '( {} )'.format( ' | '.join( parts ) ), nbits )
+
+  #---------------------------------------------------------------------
+  # reduce
+  #---------------------------------------------------------------------
+  def reduce( self, func, value ):
+
+    nbits = self.nbits( value )
+    wide  = nbits > 64
+    code  = self.code( value, wide )
+
+    if func is helpers.reduce_and:
+      return _Expr( '( {} == {} )'.format( code,
+                      self.codegen.const( ( 1 << nbits ) - 1, wide ) ),
+                    1, True )
+    if func is helpers.reduce_or:
+      return _Expr( '( {} != 0 )'.format( code ), 1, True )
+
+    return _Expr( '_parity( {} )'.format( code ), 1 )
+
+  #=====================================================================
+  # Values
+  #=====================================================================
+
+  #---------------------------------------------------------------------
+  # value
+  #---------------------------------------------------------------------
+  # Convert a resolved object to a value: an _Expr or a static int/Bits.
+  def value( self, x, node ):
+
+    if isinstance( x, ( _Expr, Bits, int, long ) ):
+      return x
+
+    if isinstance( x, bool ):
+      return int( x )
+
+    if isinstance( x, Signal ):
+      return self.load( x, 0, x.nbits )
+
+    if isinstance( x, _SignalSlice ):
+      start, nbits = _slice_bounds( x.slice, x._signal.nbits )
+      return self.load( x._signal, start, nbits )
+
+    if isinstance( x, _Mux ):
+      sel   = self.value( x.sel, node )
+      items = [ self.value( y, node ) for y in x.items ]
+      nbits = self.width( *items )
+      return _Expr( '_mux( {}, ( {}, ) )'.format(
+                      self.code( sel, self.nbits( sel ) > 64 ),
+                      ', '.join( self.fit( y, nbits ) for y in items ) ),
+                    nbits )
+
+    self.error( node, 'Cannot use {} as a value!'.format( x ) )
+
+  #---------------------------------------------------------------------
+  # load
+  #---------------------------------------------------------------------
+  def load( self, signal, start, nbits ):
+    k = self.codegen.net( signal )
+    self.reads.add( k )
+    return self.bits( _Expr( '_v[{}]'.format( k ),
+                             self.codegen.sim._net_nbits[ k ] ),
+                      start, nbits )
+
+  #---------------------------------------------------------------------
+  # bits
+  #---------------------------------------------------------------------
+  # Select nbits bits of value starting at start.
+  def bits( self, value, start, nbits ):
+
+    if start == 0 and nbits == value.nbits:
+      return value
+
+    wide = value.nbits > 64
+    code = self.code( value, wide )
+    if start:
+      code = '( {} >> {} )'.format( code, self.codegen.const( start, wide ) )
+    code = '( {} & {} )'.format( code,
+             self.codegen.const( ( 1 << nbits ) - 1, wide ) )
+
+    return self.narrow( code, wide, nbits )
+
+  #---------------------------------------------------------------------
+  # narrow
+  #---------------------------------------------------------------------
+  # Code computed with object vectors producing a narrow value is
+  # converted back to uint64.
+  def narrow( self, code, wide, nbits ):
+    if wide and nbits <= 64:
+      code = '{}.astype( _u64 )'.format( code )
+    return _Expr( code, nbits )
+
+  #---------------------------------------------------------------------
+  # fit
+  #---------------------------------------------------------------------
+  # Code for value truncated to nbits, using the representation of a
+  # net of dtype_nbits bits (defaults to nbits). Static values become
+  # constants.
+  def fit( self, value, nbits, dtype_nbits=None ):
+
+    dtype_nbits = dtype_nbits or nbits
+    wide        = dtype_nbits > 64
+    mask        = ( 1 << nbits ) - 1
+
+    if not isinstance( value, _Expr ):
+      return self.codegen.const( int( value ) & mask, wide )
+
+    code = self.code( value, wide or value.nbits > 64 )
+    if value.nbits > nbits:
+      code = '( {} & {} )'.format( code,
+               self.codegen.const( mask, wide or value.nbits > 64 ) )
+    if not wide and value.nbits > 64:
+      code = '{}.astype( _u64 )'.format( code )
+    return code
+
+  #---------------------------------------------------------------------
+  # code
+  #---------------------------------------------------------------------
+  # Code for an operand in a narrow (uint64) or wide (object) context.
+  def code( self, x, wide ):
+
+    if not isinstance( x, _Expr ):
+      return self.codegen.const( x, wide )
+
+    if x.is_bool:
+      return '{}.astype( {} )'.format( x.code, 'object' if wide else '_u64' )
+    if wide and x.nbits <= 64:
+      return '{}.astype( object )'.format( x.code )
+    return x.code
+
+  #---------------------------------------------------------------------
+  # cond
+  #---------------------------------------------------------------------
+  # Name of a bool vector holding the truth value of x.
+  def cond( self, x ):
+    x    = self.value( x, None )
+    code = x.code if x.is_bool else '( {} != 0 )'.format( x.code )
+    var  = self.codegen.temp( 'c' )
+    self.lines.append( '{} = {}'.format( var, code ) )
+    return var
+
+  #---------------------------------------------------------------------
+  # and_pred
+  #---------------------------------------------------------------------
+  def and_pred( self, pred, cond, emit=True ):
+
+    if pred is None or cond is None:
+      return pred if cond is None else cond
+
+    code = '( {} & {} )'.format( pred, cond )
+    if not emit:
+      return code
+
+    var = self.codegen.temp( 'p' )
+    self.lines.append( '{} = {}'.format( var, code ) )
+    return var
+
+  #---------------------------------------------------------------------
+  # helpers
+  #---------------------------------------------------------------------
+
+  def nbits( self, x, default=0 ):
+    if isinstance( x, ( _Expr, Bits ) ):
+      return x.nbits
+    return default
+
+  # Ints have no bitwidth, values merged from ints only are 64 bits.
+  def width( self, *values ):
+    return max( self.nbits( x ) for x in values ) or 64
+
+  def is_wide( self, a, b, nbits=0 ):
+    return nbits > 64 or self.nbits( a ) > 64 or self.nbits( b ) > 64
+
+  def full_bool( self, value ):
+    return '_np.full( {}, {}, bool )'.format( self.codegen.sim.nlanes,
+                                              value )
+
+  def static_op( self, node, func ):
+    try:
+      return func()
+    except Exception as e:
+      self.error( node, 'Cannot evaluate constant expression: {}'
+                        .format( e ) )
+
+  def error( self, node, message ):
+    raise BatchTranslationError( message, getattr( node, 'lineno', None ) )
+
+#=======================================================================
+# Runtime Helpers
+#=======================================================================
+# Functions called by the generated code.
+
+#-----------------------------------------------------------------------
+# _mux
+#-----------------------------------------------------------------------
+def _mux( sel, items ):
+  out = items[0]
+  for i in xrange( 1, len( items ) ):
+    out = np.where( sel == i, items[i], out )
+  return out
+
+#-----------------------------------------------------------------------
+# _shl
+#-----------------------------------------------------------------------
+def _shl( value, amount, nbits ):
+  if value.dtype == object:
+    return ( value << amount.astype( object ) ) & ( ( 1 << nbits ) - 1 )
+  big = amount >= nbits
+  out = value << np.where( big, np.uint64( 0 ), amount )
+  return np.where( big, np.uint64( 0 ), out & np.uint64( ( 1 << nbits ) - 1 ) )
+
+#-----------------------------------------------------------------------
+# _shr
+#-----------------------------------------------------------------------
+def _shr( value, amount ):
+  if value.dtype == object:
+    return value >> amount.astype( object )
+  big = amount >= 64
+  out = value >> np.where( big, np.uint64( 0 ), amount )
+  return np.where( big, np.uint64( 0 ), out )
+
+#-----------------------------------------------------------------------
+# _parity
+#-----------------------------------------------------------------------
+def _parity( value ):
+  if value.dtype == object:
+    return np.array( [ bin( x ).count( '1' ) & 1 for x in value ],
+                     dtype=np.uint64 )
+  for shamt in ( 32, 16, 8, 4, 2, 1 ):
+    value = value ^ ( value >> np.uint64( shamt ) )
+  return value & np.uint64( 1 )
@@ -0,0 +1,258 @@
+#=======================================================================
+# BatchSimulationTool_test.py
+#=======================================================================
+
+import pytest
+import random
+
+np = pytest.importorskip( 'numpy' )
+
+from pymtl import *
+
+from BatchSimulationTool import BatchTranslationError
+
+#-----------------------------------------------------------------------
+# check_lanes
+#-----------------------------------------------------------------------
+# Simulate nlanes copies of a model with random inputs using both the
+# BatchSimulationTool and one SimulationTool per lane, checking that all
+# outputs match on every cycle. Inputs and outputs are functions
+# returning a signal of the model they are given.
+def check_lanes( model_factory, inputs, outputs, nlanes=16, ncycles=20 ):
+
+  rng   = random.Random( 0xdeadbeef )
+
+  batch = BatchSimulationTool( model_factory, nlanes )
+  sims  = []
+  for i in range( nlanes ):
+    model = model_factory()
+    model.elaborate()
+    sims.append( SimulationTool( model ) )
+
+  batch.reset()
+  for sim in sims:
+    sim.reset()
+
+  for _ in range( ncycles ):
+
+    for port in inputs:
+      nbits  = port( batch.model ).nbits
+      values = [ rng.randrange( 1 << nbits ) for _ in range( nlanes ) ]
+      batch.write( port( batch.model ), values )
+      for sim, value in zip( sims, values ):
+        port( sim.model ).value = value
+
+    batch.eval_combinational()
+    for sim in sims:
+      sim.eval_combinational()
+
+    for port in outputs:
+      expected = [ port( sim.model ).uint() for sim in sims ]
+      assert [ int( x ) for x in batch.read( port( batch.model ) ) ] \
+             == expected
+
+    batch.cycle()
+    for sim in sims:
+      sim.cycle()
+
+  return batch
+
+#-----------------------------------------------------------------------
+# Datapath
+#-----------------------------------------------------------------------
+
+class Datapath( Model ):
+  def __init__( s, nbits, nports ):
+    s.in_   = [ InPort( nbits ) for _ in range( nports ) ]
+    s.sel   = InPort ( clog2( nports ) )
+    s.en    = InPort ( 1 )
+    s.out   = OutPort( nbits )
+    s.acc   = OutPort( nbits )
+    s.ones  = OutPort( clog2( nbits ) + 1 )
+    s.ext   = OutPort( 2*nbits )
+    s.cat   = OutPort( 2*nbits )
+    s.muxed = Wire   ( nbits )
+
+    @s.combinational
+    def mux():
+      s.muxed.value = s.in_[ s.sel ]
+
+    @s.combinational
+    def logic():
+      s.out.value = s.muxed + s.acc if s.en else s.muxed ^ ~s.acc
+
+      count = 0
+      for i in range( nbits ):
+        if s.muxed[i]:
+          count = count + 1
+      s.ones.value = count
+
+      s.ext.value = sext( s.muxed, 2*nbits )
+      s.cat.value = concat( s.muxed[0:nbits/2], s.acc,
+                            s.muxed[nbits/2:nbits] )
+
+    @s.posedge_clk
+    def seq():
+      if s.reset:
+        s.acc.next = 0
+      elif s.en:
+        s.acc.next = s.acc + s.muxed
+
+@pytest.mark.parametrize( 'nbits, nports', [ (8, 4), (64, 2) ] )
+def test_Datapath( nbits, nports ):
+  check_lanes( lambda: Datapath( nbits, nports ),
+    [ lambda m: m.in_[i] for i in range( nports ) ] +
+    [ lambda m: m.sel, lambda m: m.en ],
+    [ lambda m: m.out, lambda m: m.acc, lambda m: m.ones,
+      lambda m: m.ext, lambda m: m.cat ],
+  )
+
+#-----------------------------------------------------------------------
+# RegisterFile
+#-----------------------------------------------------------------------
+# Writes to lists indexed by signals and predicated writes to bits.
+
+class RegisterFile( Model ):
+  def __init__( s, nbits, nregs ):
+    s.waddr = InPort ( clog2( nregs ) )
+    s.wdata = InPort ( nbits )
+    s.wen   = InPort ( 1 )
+    s.raddr = InPort ( clog2( nregs ) )
+    s.rdata = OutPort( nbits )
+    s.bit   = InPort ( clog2( nbits ) )
+    s.flags = OutPort( nbits )
+    s.regs  = [ Wire( nbits ) for _ in range( nregs ) ]
+
+    @s.tick
+    def write():
+      if s.reset:
+        s.flags.next = 0
+      elif s.wen:
+        s.regs[ s.waddr ].next = s.wdata
+        s.flags.next = s.flags
+        for i in range( nbits ):
+          if s.bit == i:
+            s.flags.next[i] = 1
+
+    @s.combinational
+    def read():
+      s.rdata.value = s.regs[ s.raddr ]
+
+def test_RegisterFile():
+  check_lanes( lambda: RegisterFile( 16, 8 ),
+    [ lambda m: m.waddr, lambda m: m.wdata, lambda m: m.wen,
+      lambda m: m.raddr, lambda m: m.bit ],
+    [ lambda m: m.rdata, lambda m: m.flags ],
+  )
+
+#-----------------------------------------------------------------------
+# WideStruct
+#-----------------------------------------------------------------------
+# Nets wider than 64 bits, slice writes and structural slice
+# connections, including connections to constants.
+
+class WideStruct( Model ):
+  def __init__( s ):
+    s.in_  = InPort ( 32 )
+    s.acc  = OutPort( 100 )
+    s.hi   = OutPort( 36 )
+    s.lo   = OutPort( 8 )
+    s.tag  = OutPort( 16 )
+
+    s.connect( s.acc[64:100], s.hi        )
+    s.connect( s.acc[0:8],    s.lo        )
+    s.connect( 0xa5,          s.tag[0:8]  )
+    s.connect( s.in_[24:32],  s.tag[8:16] )
+
+    @s.posedge_clk
+    def seq():
+      if s.reset:
+        s.acc.next = 0
+      else:
+        s.acc.next = ( s.acc << 7 ) + zext( s.in_, 100 )
+        s.acc.next[0:4] = s.in_[4:8]
+
+def test_WideStruct():
+  check_lanes( WideStruct,
+    [ lambda m: m.in_ ],
+    [ lambda m: m.acc, lambda m: m.hi, lambda m: m.lo, lambda m: m.tag ],
+  )
+
+#-----------------------------------------------------------------------
+# Hierarchy
+#-----------------------------------------------------------------------
+# Submodules, BitStruct fields and a combinational chain declared out
+# of order.
+
+class MsgType( BitStructDefinition ):
+  def __init__( s ):
+    s.dest = BitField( 4 )
+    s.data = BitField( 8 )
+
+class Incr( Model ):
+  def __init__( s ):
+    s.in_ = InPort ( 8 )
+    s.out = OutPort( 8 )
+
+    @s.combinational
+    def logic():
+      s.out.value = s.in_ + 1
+
+class Hierarchy( Model ):
+  def __init__( s ):
+    s.in_  = InPort ( MsgType() )
+    s.out  = OutPort( MsgType() )
+    s.incr = Incr()
+
+    @s.combinational
+    def output():
+      s.out.dest.value = ~s.in_.dest
+      s.out.data.value = s.incr.out
+
+    @s.combinational
+    def input():
+      s.incr.in_.value = s.in_.data
+
+def test_Hierarchy():
+  check_lanes( Hierarchy,
+    [ lambda m: m.in_ ],
+    [ lambda m: m.out, lambda m: m.incr.out ],
+  )
+
+#-----------------------------------------------------------------------
+# test_write_read
+#-----------------------------------------------------------------------
+
+def test_write_read():
+
+  sim = BatchSimulationTool( lambda: Datapath( 8, 2 ), 4 )
+  m   = sim.model
+
+  sim.write( m.in_[0], 5 )
+  sim.write( m.in_[1], np.array([ 1, 2, 3, -1 ]) )
+  sim.write( m.sel,    [ 0, 1, 0, 1 ] )
+  sim.eval_combinational()
+
+  assert list( sim.read( m.muxed ) ) == [ 5, 2, 5, 0xff ]
+  assert sim.read( m.muxed, lane=3 ) == Bits( 8, 0xff )
+  assert list( sim.read( m.muxed[4:8] ) ) == [ 0, 0, 0, 0xf ]
+
+  with pytest.raises( ValueError ):
+    sim.write( m.sel, [ 0, 1 ] )
+
+#-----------------------------------------------------------------------
+# test_untranslatable
+#-----------------------------------------------------------------------
+
+class Untranslatable( Model ):
+  def __init__( s ):
+    s.in_ = InPort ( 8 )
+    s.out = OutPort( 8 )
+
+    @s.tick_fl
+    def logic():
+      s.out.next = s.in_
+
+def test_untranslatable():
+  with pytest.raises( BatchTranslationError ):
+    BatchSimulationTool( Untranslatable, 4 )
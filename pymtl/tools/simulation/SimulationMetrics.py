@@ -4,7 +4,35 @@
 
 from __future__ import print_function
 
+import sys
+import json
+import atexit
 import pickle
+import weakref
+import collections
+
+from array  import array
+from timeit import default_timer
+
+#-------------------------------------------------------------------------
+# Counters
+#-------------------------------------------------------------------------
+# The counters collected for each window of cycles, in the order they are
+# stored in each record. Counters collected both before and after the
+# sequential blocks run (input vs. clock) are adjacent, so the phase can
+# be added to the index of the input counter.
+
+COUNTERS = (
+  'input_add_events', 'clock_add_events',
+  'input_add_callbk', 'clock_add_callbk',
+  'input_comb_evals', 'clock_comb_evals',
+  'slice_comb_evals', 'redun_comb_evals',
+)
+
+NCOUNTERS = len( COUNTERS )
+
+def _counter_property( index ):
+  return property( lambda self: self._counter( index ).tolist() )
 
 #-------------------------------------------------------------------------
 # SimulationMetrics
@@ -12,29 +40,70 @@ import pickle
 # Utility class for storing various SimulationTool metrics. Useful for
 # gaining insight into simulator performace and determining the simulation
 # efficiency of hardware model implementations.
+#
+# Counters are summed over windows of window cycles (one by default), and
+# one record of NCOUNTERS unsigned ints is kept per window in a
+# preallocated array holding up to capacity records. Once it is full the
+# oldest records are overwritten, unless a filename is given, in which
+# case the records are streamed to that file (see read_metrics) and the
+# array only holds the records written since the last flush. Redundant
+# evals are detected by stamping each eval with the current cycle, so
+# the cost per cycle does not depend on the number of blocks.
 class SimulationMetrics( object ):
 
   #-----------------------------------------------------------------------
   # __init__
   #-----------------------------------------------------------------------
-  def __init__( self ):
+  def __init__( self, window = 1, capacity = 1 << 16, filename = None ):
+
+    if window < 1 or capacity < 1:
+      raise ValueError( "window and capacity must be positive!" )
+
+    self.window                                  = window
+    self.capacity                                = capacity
     self._ncycles                                = 0
-    self._pre_tick                               = True
+    self._phase                                  = 0
+    self._window_left                            = window
     self.num_modules                             = 0
     self.num_tick_blocks                         = 0
     self.num_posedge_clk_blocks                  = 0
     self.num_combinational_blocks                = 0
     self.num_slice_blocks                        = 0
-    self.input_add_events_per_cycle              = [ 0 ]
-    self.clock_add_events_per_cycle              = [ 0 ]
-    self.input_add_callbk_per_cycle              = [ 0 ]
-    self.clock_add_callbk_per_cycle              = [ 0 ]
-    self.input_comb_evals_per_cycle              = [ 0 ]
-    self.clock_comb_evals_per_cycle              = [ 0 ]
-    self.slice_comb_evals_per_cycle              = [ 0 ]
-    self.redun_comb_evals_per_cycle              = [ 0 ]
-    self.is_slice                                = dict()
-    self.has_run                                 = dict()
+
+    self._counts    = array( 'I', [ 0 ] * NCOUNTERS )
+    self._zeros     = array( 'I', [ 0 ] * NCOUNTERS )
+    self._data      = array( 'I', [ 0 ] ) * ( capacity * NCOUNTERS )
+    self._head      = 0
+    self._nrecords  = 0
+
+    self._epoch     = 1
+    self._stamps    = array( 'L' )
+    self._is_slice  = bytearray()
+
+    self._outfile   = None
+    if filename:
+      self._outfile = open( filename, 'wb' )
+      self._outfile.write( json.dumps( {
+        'window'    : window,
+        'counters'  : COUNTERS,
+        'itemsize'  : self._data.itemsize,
+        'byteorder' : sys.byteorder,
+      }) + '\n' )
+      _open_metrics.add( self )
+
+  #-----------------------------------------------------------------------
+  # *_per_cycle
+  #-----------------------------------------------------------------------
+  # Lists of the counters for each window held in memory, oldest first.
+
+  input_add_events_per_cycle = _counter_property( 0 )
+  clock_add_events_per_cycle = _counter_property( 1 )
+  input_add_callbk_per_cycle = _counter_property( 2 )
+  clock_add_callbk_per_cycle = _counter_property( 3 )
+  input_comb_evals_per_cycle = _counter_property( 4 )
+  clock_comb_evals_per_cycle = _counter_property( 5 )
+  slice_comb_evals_per_cycle = _counter_property( 6 )
+  redun_comb_evals_per_cycle = _counter_property( 7 )
 
   #-----------------------------------------------------------------------
   # comb_evals_per_cycle
@@ -52,6 +121,14 @@ class SimulationMetrics( object ):
     return [ x+y for x,y in zip( self.input_add_events_per_cycle,
                                  self.clock_add_events_per_cycle ) ]
 
+  #-----------------------------------------------------------------------
+  # first_window
+  #-----------------------------------------------------------------------
+  # Index of the oldest window held in memory.
+  @property
+  def first_window( self ):
+    return self._ncycles // self.window - self._nrecords
+
   #-----------------------------------------------------------------------
   # reg_model
   #-----------------------------------------------------------------------
@@ -65,31 +142,31 @@ class SimulationMetrics( object ):
   #-----------------------------------------------------------------------
   # reg_eval
   #-----------------------------------------------------------------------
-  # Register an eval block in the design.
+  # Register an eval block in the design. Evals are identified by their
+  # event queue id.
   def reg_eval( self, eval, is_slice = False ):
-    self.has_run [ eval ] = False
-    self.is_slice[ eval ] = is_slice
+    if eval.id >= len( self._stamps ):
+      nextra = eval.id + 1 - len( self._stamps )
+      self._stamps  .extend( [ 0 ] * nextra )
+      self._is_slice.extend( [ 0 ] * nextra )
+    self._is_slice[ eval.id ] = is_slice
     if is_slice:
       self.num_slice_blocks += 1
 
   #-----------------------------------------------------------------------
   # incr_metrics_cycle
   #-----------------------------------------------------------------------
-  # Should be called at the end of each simulation cycle. Initializes data
-  # structure storage to collect data for the next simulation cycle.
+  # Should be called at the end of each simulation cycle. Starts a new
+  # epoch for redundant eval detection, and stores the counters once
+  # the current window is complete.
   def incr_metrics_cycle( self ):
-    self._pre_tick                   = True
-    self._ncycles                   += 1
-    self.input_add_events_per_cycle += [ 0 ]
-    self.clock_add_events_per_cycle += [ 0 ]
-    self.input_add_callbk_per_cycle += [ 0 ]
-    self.clock_add_callbk_per_cycle += [ 0 ]
-    self.input_comb_evals_per_cycle += [ 0 ]
-    self.clock_comb_evals_per_cycle += [ 0 ]
-    self.slice_comb_evals_per_cycle += [ 0 ]
-    self.redun_comb_evals_per_cycle += [ 0 ]
-    for key in self.has_run:
-      self.has_run[ key ] = False
+    self._phase        = 0
+    self._ncycles     += 1
+    self._epoch       += 1
+    self._window_left -= 1
+    if not self._window_left:
+      self._window_left = self.window
+      self._store_window()
 
   #-----------------------------------------------------------------------
   # start_tick
@@ -97,17 +174,14 @@ class SimulationMetrics( object ):
   # Should be called before sequential logic blocks are executed.  Allows
   # collection of unique metrics for each phase of eval execution.
   def start_tick( self ):
-    self._pre_tick                   = False
+    self._phase = 1
 
   #-----------------------------------------------------------------------
   # incr_add_events
   #-----------------------------------------------------------------------
   # Increment the number of times add_event() was called.
   def incr_add_events( self ):
-    if self._pre_tick:
-      self.input_add_events_per_cycle[ self._ncycles ] += 1
-    else:
-      self.clock_add_events_per_cycle[ self._ncycles ] += 1
+    self._counts[ self._phase ] += 1
 
   #-----------------------------------------------------------------------
   # incr_add_events
@@ -115,28 +189,49 @@ class SimulationMetrics( object ):
   # Increment the number of callbacks we attempted to place on the event
   # queue.
   def incr_add_callbk( self ):
-    if self._pre_tick:
-      self.input_add_callbk_per_cycle[ self._ncycles ] += 1
-    else:
-      self.clock_add_callbk_per_cycle[ self._ncycles ] += 1
+    self._counts[ 2 + self._phase ] += 1
 
   #-----------------------------------------------------------------------
   # incr_comb_evals
   #-----------------------------------------------------------------------
   # Increment the number of evals we actually executed.
   def incr_comb_evals( self, eval ):
-    if self._pre_tick:
-      self.input_comb_evals_per_cycle[ self._ncycles ] += 1
-    else:
-      self.clock_comb_evals_per_cycle[ self._ncycles ] += 1
+    counts = self._counts
+    counts[ 4 + self._phase ] += 1
 
-    if   self.has_run[ eval ]:
-      self.redun_comb_evals_per_cycle[ self._ncycles ] += 1
+    id = eval.id
+    if self._stamps[ id ] == self._epoch:
+      counts[ 7 ] += 1
     else:
-      self.has_run[ eval ] = True
+      self._stamps[ id ] = self._epoch
 
-    if   self.is_slice[ eval ]:
-      self.slice_comb_evals_per_cycle[ self._ncycles ] += 1
+    if self._is_slice[ id ]:
+      counts[ 6 ] += 1
+
+  #-----------------------------------------------------------------------
+  # flush
+  #-----------------------------------------------------------------------
+  # Write all records held in memory to the output file, if any.
+  def flush( self ):
+    if self._outfile is None:
+      return
+    self._data[ : self._nrecords * NCOUNTERS ].tofile( self._outfile )
+    self._outfile.flush()
+    self._nrecords = 0
+    self._head     = 0
+
+  #-----------------------------------------------------------------------
+  # close
+  #-----------------------------------------------------------------------
+  # Flush and close the output file, if any. Counters of an incomplete
+  # window are not written.
+  def close( self ):
+    if self._outfile is None:
+      return
+    self.flush()
+    self._outfile.close()
+    self._outfile = None
+    _open_metrics.discard( self )
 
   #-----------------------------------------------------------------------
   # print_metrics
@@ -160,16 +255,11 @@ class SimulationMetrics( object ):
     print("          pre-tick          post-tick         other       ")
     print("cycle     adde  clbk  eval  adde  clbk  eval  slice  redun")
     print("--------  ----  ----  ----  ----  ----  ----  -----  -----")
-    for i in range( self._ncycles ):
+    records = self._records()
+    for i in range( len( records ) // NCOUNTERS ):
       print("{:8}  {:4}  {:4}  {:4}  {:4}  {:4}  {:4}  {:5}  {:5}".format(
-                   i, self.input_add_events_per_cycle[ i ],
-                      self.input_add_callbk_per_cycle[ i ],
-                      self.input_comb_evals_per_cycle[ i ],
-                      self.clock_add_events_per_cycle[ i ],
-                      self.clock_add_callbk_per_cycle[ i ],
-                      self.clock_comb_evals_per_cycle[ i ],
-                      self.slice_comb_evals_per_cycle[ i ],
-                      self.redun_comb_evals_per_cycle[ i ],
+                   ( self.first_window + i ) * self.window,
+                   *records[ i*NCOUNTERS : (i+1)*NCOUNTERS ]
                    ))
     print("-"*72)
 
@@ -179,9 +269,104 @@ class SimulationMetrics( object ):
   # Pickle metrics to a file.  Useful for loading in Python later for
   # for creating matplotlib plots.
   def pickle_metrics( self, filename ):
-    del self.is_slice
-    del self.has_run
-    pickle.dump( self, open( filename, 'wb' ) )
+    with open( filename, 'wb' ) as f:
+      pickle.dump( self, f, pickle.HIGHEST_PROTOCOL )
+
+  #-----------------------------------------------------------------------
+  # __getstate__
+  #-----------------------------------------------------------------------
+  # The output file and eval stamps are not pickled, and the records are
+  # pickled as a string (arrays are pickled as lists in Python 2).
+  def __getstate__( self ):
+    state = dict( self.__dict__ )
+    for name in ( '_outfile', '_stamps', '_is_slice' ):
+      del state[ name ]
+    state[ '_data' ] = self._data.tostring()
+    return state
+
+  #-----------------------------------------------------------------------
+  # __setstate__
+  #-----------------------------------------------------------------------
+  def __setstate__( self, state ):
+    self.__dict__.update( state )
+    self._data     = array( 'I', state[ '_data' ] )
+    self._outfile  = None
+    self._stamps   = array( 'L' )
+    self._is_slice = bytearray()
+
+  #-----------------------------------------------------------------------
+  # _store_window
+  #-----------------------------------------------------------------------
+  # Store the counters of the window which just ended and reset them.
+  def _store_window( self ):
+
+    base = self._head * NCOUNTERS
+    self._data[ base : base + NCOUNTERS ] = self._counts
+    self._counts[:] = self._zeros
+
+    self._head    += 1
+    self._nrecords = min( self._nrecords + 1, self.capacity )
+
+    if self._head == self.capacity:
+      self._head = 0
+      self.flush()
+
+  #-----------------------------------------------------------------------
+  # _records
+  #-----------------------------------------------------------------------
+  # Return all records held in memory, oldest first.
+  def _records( self ):
+    end = self._nrecords * NCOUNTERS
+    if self._nrecords < self.capacity:
+      return self._data[ : end ]
+    split = self._head * NCOUNTERS
+    return self._data[ split : end ] + self._data[ : split ]
+
+  #-----------------------------------------------------------------------
+  # _counter
+  #-----------------------------------------------------------------------
+  # Return an array with the given counter of all records in memory.
+  def _counter( self, index ):
+    return self._records()[ index :: NCOUNTERS ]
+
+#-------------------------------------------------------------------------
+# read_metrics
+#-------------------------------------------------------------------------
+# Read a file written by a SimulationMetrics created with a filename.
+# Returns the window size and a dictionary with an array of the values
+# of each counter, one per window.
+def read_metrics( filename ):
+
+  with open( filename, 'rb' ) as f:
+    header = json.loads( f.readline() )
+    data   = f.read()
+
+  records = array( 'I' )
+  if records.itemsize != header[ 'itemsize' ]:
+    raise ValueError( "{} was written with {}-byte counters, expected {}!"
+                      .format( filename, header[ 'itemsize' ],
+                               records.itemsize ) )
+
+  records.fromstring( data )
+  if header[ 'byteorder' ] != sys.byteorder:
+    records.byteswap()
+
+  ncounters = len( header[ 'counters' ] )
+  return header[ 'window' ], collections.OrderedDict(
+    ( name, records[ i :: ncounters ] )
+    for i, name in enumerate( header[ 'counters' ] )
+  )
+
+#-------------------------------------------------------------------------
+# _close_metrics
+#-------------------------------------------------------------------------
+# Make sure all records are written before the interpreter exits.
+_open_metrics = weakref.WeakSet()
+
+@atexit.register
+def _close_metrics():
+  for metrics in list( _open_metrics ):
+    metrics.close()
 
 #-------------------------------------------------------------------------
 # DummyMetrics
@@ -200,3 +385,137 @@ class DummyMetrics( object ):
   def incr_add_events( self ): pass
   def incr_add_callbk( self ): pass
   def incr_comb_evals( self, eval ): pass
+
+#-------------------------------------------------------------------------
+# BlockProfile
+#-------------------------------------------------------------------------
+# Wall-clock profile of the @combinational, @tick and @posedge_clk
+# blocks of a design, enabled with SimulationTool( model, profile=True ).
+# Each block is wrapped to record its number of calls, cumulative time
+# and self time (cumulative time minus the time spent in other profiled
+# blocks it calls). Blocks are keyed by the hierarchical name of their
+# model and the name of the block, e.g. 'top.mem.tick'; blocks sharing a
+# name in the same model share an entry. The profile can be rolled up
+# per model, and exported as JSON or as collapsed stacks for flamegraph
+# tools. Blocks which are not wrapped have no profiling overhead.
+class BlockProfile( object ):
+
+  #-----------------------------------------------------------------------
+  # __init__
+  #-----------------------------------------------------------------------
+  def __init__( self, timer = default_timer ):
+    self.timer   = timer
+    self._blocks = collections.OrderedDict()
+    self._stack  = []
+
+  #-----------------------------------------------------------------------
+  # wrap
+  #-----------------------------------------------------------------------
+  # Return a function which calls func, recording its time as the block
+  # func_name of the model named model_name.
+  def wrap( self, model_name, func_name, func ):
+
+    key = '{}.{}'.format( model_name, func_name )
+    if key not in self._blocks:
+      self._blocks[ key ] = [ model_name, func_name, 0, 0.0, 0.0 ]
+
+    stats = self._blocks[ key ]
+    stack = self._stack
+    timer = self.timer
+
+    def profiled():
+      stack.append( 0.0 )
+      start = timer()
+      try:
+        func()
+      finally:
+        elapsed   = timer() - start
+        stats[2] += 1
+        stats[3] += elapsed
+        stats[4] += elapsed - stack.pop()
+        if stack:
+          stack[-1] += elapsed
+
+    return profiled
+
+  #-----------------------------------------------------------------------
+  # blocks
+  #-----------------------------------------------------------------------
+  # Return a dictionary with the calls, cumulative and self time (in
+  # seconds) of each block.
+  def blocks( self ):
+    return collections.OrderedDict(
+      ( key, { 'model'      : model_name,
+               'block'      : func_name,
+               'calls'      : calls,
+               'cumulative' : cumulative,
+               'self'       : self_time } )
+      for key, ( model_name, func_name, calls, cumulative, self_time )
+      in self._blocks.items()
+    )
+
+  #-----------------------------------------------------------------------
+  # models
+  #-----------------------------------------------------------------------
+  # Return a dictionary with the block calls and self time of each
+  # model, and the total self time of the model and all its submodels.
+  def models( self ):
+
+    models = collections.OrderedDict()
+    def get( model_name ):
+      if model_name not in models:
+        models[ model_name ] = { 'calls' : 0, 'self' : 0.0, 'total' : 0.0 }
+      return models[ model_name ]
+
+    for model_name, func_name, calls, cumulative, self_time in \
+        self._blocks.values():
+
+      parts = model_name.split( '.' )
+      for i in range( 1, len( parts ) + 1 ):
+        get( '.'.join( parts[:i] ) )[ 'total' ] += self_time
+
+      get( model_name )[ 'calls' ] += calls
+      get( model_name )[ 'self'  ] += self_time
+
+    return models
+
+  #-----------------------------------------------------------------------
+  # dump_json
+  #-----------------------------------------------------------------------
+  # Write the block and model profiles to a JSON file.
+  def dump_json( self, filename ):
+    with open( filename, 'w' ) as f:
+      json.dump( { 'blocks' : self.blocks(), 'models' : self.models() },
+                 f, indent = 2 )
+
+  #-----------------------------------------------------------------------
+  # dump_collapsed
+  #-----------------------------------------------------------------------
+  # Write the self time of each block in microseconds as collapsed
+  # stacks (one 'top;sub;block time' line per block), the input format
+  # of flamegraph.pl and similar tools.
+  def dump_collapsed( self, filename ):
+    with open( filename, 'w' ) as f:
+      for model_name, func_name, calls, cumulative, self_time in \
+          self._blocks.values():
+        usecs = int( round( self_time * 1e6 ) )
+        if usecs:
+          f.write( '{};{} {}\n'.format( model_name.replace( '.', ';' ),
+                                        func_name, usecs ) )
+
+  #-----------------------------------------------------------------------
+  # print_profile
+  #-----------------------------------------------------------------------
+  # Print the nblocks blocks with the highest self time.
+  def print_profile( self, nblocks = 20 ):
+    blocks = sorted( self.blocks().items(), key = lambda x: -x[1]['self'] )
+    print("-"*72)
+    print("Block Profile")
+    print("-"*72)
+    print()
+    print("   calls   cumul(s)    self(s)  block")
+    print("--------  ---------  ---------  -----")
+    for key, stats in blocks[:nblocks]:
+      print("{:8}  {:9.4f}  {:9.4f}  {}".format(
+                   stats['calls'], stats['cumulative'], stats['self'], key ))
+    print("-"*72)
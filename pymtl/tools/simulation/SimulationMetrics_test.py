@@ -0,0 +1,234 @@
+#=======================================================================
+# SimulationMetrics_test.py
+#=======================================================================
+
+import json
+import pickle
+import pytest
+
+from pymtl import *
+
+from SimulationMetrics import SimulationMetrics, BlockProfile, read_metrics
+
+#-----------------------------------------------------------------------
+# Models
+#-----------------------------------------------------------------------
+
+class Incr( Model ):
+  def __init__( s ):
+    s.in_ = InPort ( 8 )
+    s.out = OutPort( 8 )
+    s.reg = Wire   ( 8 )
+
+    @s.posedge_clk
+    def seq():
+      s.reg.next = s.in_
+
+    @s.combinational
+    def comb():
+      s.out.value = s.reg + 1
+
+class Chain( Model ):
+  def __init__( s ):
+    s.in_   = InPort ( 8 )
+    s.out   = OutPort( 8 )
+    s.incrs = [ Incr() for _ in range( 2 ) ]
+    s.count = 0
+
+    s.connect( s.in_,          s.incrs[0].in_ )
+    s.connect( s.incrs[0].out, s.incrs[1].in_ )
+    s.connect( s.incrs[1].out, s.out          )
+
+    @s.tick
+    def count():
+      s.count += 1
+
+#-----------------------------------------------------------------------
+# test_profile
+#-----------------------------------------------------------------------
+
+@pytest.mark.parametrize( 'kwargs', [
+  {},
+  { 'schedule' : 'static' },
+])
+def test_profile( tmpdir, kwargs ):
+
+  model = Chain()
+  model.elaborate()
+  sim = SimulationTool( model, profile = True, **kwargs )
+
+  for i in range( 10 ):
+    model.in_.value = i
+    sim.cycle()
+  assert model.out == 10
+
+  blocks = sim.profile.blocks()
+  assert sorted( blocks ) == [ 'top.count',
+                               'top.incrs[0].comb', 'top.incrs[0].seq',
+                               'top.incrs[1].comb', 'top.incrs[1].seq' ]
+  assert blocks[ 'top.count'         ][ 'calls' ] == 10
+  assert blocks[ 'top.incrs[0].seq'  ][ 'calls' ] == 10
+  assert blocks[ 'top.incrs[0].comb' ][ 'calls' ] >= 10
+  for stats in blocks.values():
+    assert 0 <= stats[ 'self' ] <= stats[ 'cumulative' ]
+
+  models = sim.profile.models()
+  assert models[ 'top'          ][ 'calls' ] == 10
+  assert models[ 'top.incrs[0]' ][ 'self'  ] == \
+         blocks[ 'top.incrs[0].comb' ][ 'self' ] + \
+         blocks[ 'top.incrs[0].seq'  ][ 'self' ]
+  assert models[ 'top' ][ 'total' ] == \
+         pytest.approx( sum( x[ 'self' ] for x in blocks.values() ) )
+
+  # Exports
+
+  path = str( tmpdir.join( 'profile.json' ) )
+  sim.profile.dump_json( path )
+  with open( path ) as f:
+    data = json.load( f )
+  assert data[ 'blocks' ][ 'top.count' ][ 'calls' ] == 10
+  assert data[ 'models' ][ 'top.incrs[1]' ][ 'calls' ] >= 20
+
+  path = str( tmpdir.join( 'profile.folded' ) )
+  sim.profile.dump_collapsed( path )
+  with open( path ) as f:
+    for line in f:
+      stack, usecs = line.split()
+      assert stack.split( ';' )[0] == 'top'
+      assert int( usecs ) > 0
+
+#-----------------------------------------------------------------------
+# test_profile_compiled
+#-----------------------------------------------------------------------
+
+def test_profile_compiled():
+
+  model = Chain()
+  model.elaborate()
+  sim = SimulationTool( model, profile = True, compile_ticks = True )
+  sim.run( 5 )
+
+  blocks = sim.profile.blocks()
+  assert blocks[ 'top.seq_blocks' ][ 'calls' ] == 5
+  assert 'top.count' not in blocks
+
+#-----------------------------------------------------------------------
+# test_self_time
+#-----------------------------------------------------------------------
+# Time spent in nested profiled blocks is excluded from self time.
+
+def test_self_time():
+
+  ticks   = [ 0 ]
+  def timer():
+    return ticks[0]
+
+  profile = BlockProfile( timer )
+
+  def inner():
+    ticks[0] += 2
+
+  inner = profile.wrap( 'top.sub', 'inner', inner )
+
+  def outer():
+    ticks[0] += 1
+    inner()
+    ticks[0] += 1
+
+  outer = profile.wrap( 'top', 'outer', outer )
+  outer()
+  outer()
+
+  blocks = profile.blocks()
+  assert blocks[ 'top.outer'     ][ 'cumulative' ] == 8
+  assert blocks[ 'top.outer'     ][ 'self'       ] == 4
+  assert blocks[ 'top.sub.inner' ][ 'calls'      ] == 2
+  assert blocks[ 'top.sub.inner' ][ 'self'       ] == 4
+
+  models = profile.models()
+  assert models[ 'top'     ][ 'total' ] == 8
+  assert models[ 'top.sub' ][ 'total' ] == 4
+
+#-----------------------------------------------------------------------
+# test_metrics
+#-----------------------------------------------------------------------
+
+def test_metrics():
+
+  model = Chain()
+  model.elaborate()
+  sim = SimulationTool( model, collect_metrics = True )
+
+  for i in range( 10 ):
+    model.in_.value = i
+    sim.cycle()
+  assert model.out == 10
+
+  assert sim.metrics.num_modules              == 3
+  assert sim.metrics.num_combinational_blocks == 2
+  assert sum( sim.metrics.comb_evals_per_cycle ) >= 20
+
+#-----------------------------------------------------------------------
+# test_metrics_windows
+#-----------------------------------------------------------------------
+# A block sensitive to both an input and a register is evaluated twice
+# per cycle when both change.
+
+class AddReg( Model ):
+  def __init__( s ):
+    s.in_ = InPort ( 8 )
+    s.out = OutPort( 8 )
+    s.reg = Wire   ( 8 )
+
+    @s.posedge_clk
+    def seq():
+      s.reg.next = s.in_
+
+    @s.combinational
+    def comb():
+      s.out.value = s.in_ + s.reg
+
+def run_add_reg( metrics, ncycles ):
+  model = AddReg()
+  model.elaborate()
+  sim = SimulationTool( model, collect_metrics = metrics )
+  for i in range( ncycles ):
+    model.in_.value = i + 1
+    sim.cycle()
+  return sim
+
+def test_metrics_windows():
+
+  metrics = SimulationMetrics( window = 4, capacity = 2 )
+  run_add_reg( metrics, 14 )
+
+  # Only the last two complete windows are kept
+
+  assert metrics.first_window               == 1
+  assert metrics.input_comb_evals_per_cycle == [ 4, 4 ]
+  assert metrics.clock_comb_evals_per_cycle == [ 4, 4 ]
+  assert metrics.redun_comb_evals_per_cycle == [ 4, 4 ]
+  assert metrics.comb_evals_per_cycle       == [ 8, 8 ]
+
+def test_metrics_file( tmpdir ):
+
+  path    = str( tmpdir.join( 'metrics.bin' ) )
+  metrics = SimulationMetrics( window = 2, capacity = 3, filename = path )
+  run_add_reg( metrics, 21 )
+  metrics.close()
+
+  window, counters = read_metrics( path )
+  assert window == 2
+  assert list( counters[ 'input_comb_evals' ] ) == [ 2 ] * 10
+  assert list( counters[ 'redun_comb_evals' ] ) == [ 2 ] * 10
+
+def test_pickle_metrics( tmpdir ):
+
+  path    = str( tmpdir.join( 'metrics.pkl' ) )
+  metrics = SimulationMetrics()
+  run_add_reg( metrics, 5 )
+  metrics.pickle_metrics( path )
+
+  with open( path, 'rb' ) as f:
+    loaded = pickle.load( f )
+  assert loaded.comb_evals_per_cycle == metrics.comb_evals_per_cycle
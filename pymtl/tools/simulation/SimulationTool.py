@@ -13,9 +13,11 @@ import collections
 import inspect
 import warnings
 import sim_utils as sim
+import checkpoint
 
 from sys               import flags
-from SimulationMetrics import SimulationMetrics, DummyMetrics
+from SimulationMetrics import SimulationMetrics, DummyMetrics, BlockProfile
+from ...datatypes.Bits import Bits
 
 #-----------------------------------------------------------------------
 # SimulationTool
@@ -30,7 +32,33 @@ class SimulationTool( object ):
   # __init__
   #---------------------------------------------------------------------
   # Construct a simulator based on the provided model.
-  def __init__( self, model, collect_metrics = False ):
+  #
+  # collect_metrics is either a bool or a SimulationMetrics instance,
+  # e.g., one configured to aggregate counters over windows of cycles
+  # or to stream them to a file.
+  #
+  # The schedule argument selects how @combinational blocks are
+  # evaluated: 'event' (the default) dynamically drains an event queue
+  # of blocks whose inputs changed, while 'static' levelizes all blocks
+  # once at construction and evaluates them in that fixed order on every
+  # call to eval_combinational(). Designs with combinational cycles fall
+  # back to the event queue.
+  #
+  # If compile_ticks is True, all @tick and @posedge_clk blocks are
+  # compiled into a single generated function which also flops every
+  # register written by those blocks, removing the per-block and
+  # per-register call overhead from cycle().
+  #
+  # If profile is True, the time spent in each block is recorded in a
+  # BlockProfile available as sim.profile. With compile_ticks, all
+  # sequential blocks are profiled as a single seq_blocks block.
+  # Profiling turns off skipping idle cycles in run().
+  #
+  # If activity is True, value toggles and register writes are counted
+  # per net in an ActivityUtil available as sim.activity, which can be
+  # exported as a SAIF-like file with sim.activity.write_saif().
+  def __init__( self, model, collect_metrics = False, schedule = 'event',
+                compile_ticks = False, profile = False, activity = False ):
 
     # Check that the model has been elaborated
     if not model.is_elaborated():
@@ -38,13 +66,27 @@ class SimulationTool( object ):
                        "Provided model has not been elaborated yet!!!"
                        "".format( self.__class__.__name__ ) )
 
+    if schedule not in ( 'event', 'static' ):
+      raise ValueError( "Invalid schedule '{}', expected 'event' or "
+                        "'static'!".format( schedule ) )
+
     self.model                = model
     self.ncycles              = 0
 
     self._event_queue         = EventQueue()
     self._sequential_blocks   = []
     self._register_queue      = []
+    self._registers           = []
+    self._register_dirty      = bytearray()
+    self._memory_queue        = []
+    self._memories            = []
     self._current_func        = None
+    self._static_schedule     = None
+    self._vcd_util            = None
+    self.profile              = None
+    self.activity             = None
+    self._state_changed       = bytearray( 1 )
+    self._skip_idle           = not collect_metrics
 
     self._nets                = None # TODO: remove me
 
@@ -54,7 +96,9 @@ class SimulationTool( object ):
     # Only collect metrics if they are enabled, otherwise replace
     # with a dummy collection class.
 
-    if collect_metrics:
+    if isinstance( collect_metrics, SimulationMetrics ):
+      self.metrics            = collect_metrics
+    elif collect_metrics:
       self.metrics            = SimulationMetrics()
     else:
       self.metrics            = DummyMetrics()
@@ -77,6 +121,7 @@ class SimulationTool( object ):
     sequential_blocks       = sim.register_seq_blocks( model )
 
     sim.insert_signal_values( self, nets )
+    sim.register_memories   ( self, model )
 
     sim.register_comb_blocks  ( model, self._event_queue )
     sim.create_slice_callbacks( slice_connections, self._event_queue )
@@ -84,12 +129,58 @@ class SimulationTool( object ):
 
     self._nets              = nets
     self._sequential_blocks = sequential_blocks
+    self._models            = sim._get_all_models( model )
+
+    # Inline all sequential blocks into a single function if requested
+
+    if compile_ticks:
+      self._sequential_blocks = [ sim.compile_seq_blocks( model,
+                                    sequential_blocks, slice_connections,
+                                    self._state_changed ) ]
+
+    # Levelize the combinational logic if a static schedule was requested
+
+    if schedule == 'static':
+      self._static_schedule = sim.create_static_schedule( model,
+                                                          slice_connections )
+      if self._static_schedule is None:
+        warnings.warn( "Combinational cycle detected in {}, falling back "
+                       "to the event queue.".format( model.class_name ),
+                       Warning )
+      else:
+        self._enable_static_schedule()
+
+    # Wrap all blocks to profile them if requested. Idle cycles are not
+    # skipped so that the profile covers every simulated cycle.
+
+    if profile:
+      self._enable_profile( compile_ticks )
+      self._skip_idle = False
+
+    # Register the blocks each eval is counted against with the metrics
+
+    for m in self._models:
+      self.metrics.reg_model( m )
+      for func in m._newsenses:
+        self.metrics.reg_eval( func.cb )
+    for c in slice_connections:
+      if hasattr( c, '_slice_cb' ):
+        self.metrics.reg_eval( c._slice_cb, is_slice = True )
+
+    # Count toggles and register writes per net if requested. Idle
+    # cycles are not skipped so that all register writes are counted.
+
+    if activity:
+      from activity import ActivityUtil
+      self.activity   = ActivityUtil( self )
+      self._skip_idle = False
 
     # Setup vcd dumping if it's configured
 
     if hasattr( model, 'vcd_file' ) and model.vcd_file:
       from vcd import VCDUtil
-      VCDUtil( self, model.vcd_file )
+      self._vcd_util  = VCDUtil( self, model.vcd_file )
+      self._skip_idle = False
 
   #---------------------------------------------------------------------
   # reset
@@ -101,6 +192,169 @@ class SimulationTool( object ):
     self.cycle()
     self.model.reset.v = 0
 
+  #---------------------------------------------------------------------
+  # run
+  #---------------------------------------------------------------------
+  # Advances the simulator by up to ncycles clock cycles (without limit
+  # if ncycles is None), replacing the usual loop of line tracing and
+  # cycling until the model is done. Returns the number of cycles
+  # simulated.
+  #
+  # stop_signal stops the run before the first cycle in which it is
+  # true. It is either a signal, e.g., a done output port, whose value
+  # is checked directly, or a callable such as the done() method of a
+  # test harness.
+  #
+  # trace selects the line tracing done before each cycle: None for no
+  # tracing, 'every:K' to print the line trace of every cycle whose
+  # number is a multiple of K, 'last:N' to keep the line traces of the
+  # last N cycles and print them once run() returns or raises, or a
+  # callable which is called with the simulator.
+  #
+  # A cycle in which no register or MemoryArray changes value leaves the
+  # design in a state where the next cycle would do exactly the same, as
+  # long as sequential blocks only update state through .next writes.
+  # Models with @posedge_clk blocks that keep other state (plain Python
+  # attributes, or a wrapped Verilator, C++ or SystemC model) must
+  # override idle_cycles() to say so.
+  # After such a cycle, every model is asked how many of the following
+  # cycles it can skip with idle_cycles(), and the smallest answer is
+  # skipped in bulk by advancing ncycles and calling skip_cycles() on all
+  # models. Since the design does not change over skipped cycles,
+  # stop_signal is not checked for them. Cycles are never skipped when
+  # tracing, dumping VCD, profiling, counting activity or collecting
+  # metrics.
+  def run( self, ncycles, stop_signal = None, trace = None ):
+
+    stop_value = None
+    stop_func  = None
+    if stop_signal is not None:
+      stop_signal = getattr( stop_signal, '_signalvalue', stop_signal )
+      if isinstance( stop_signal, Bits ):
+        stop_value = stop_signal
+      elif callable( stop_signal ):
+        stop_func = stop_signal
+      else:
+        raise ValueError( "stop_signal must be a signal or a callable, "
+                          "not {!r}!".format( stop_signal ) )
+
+    line_trace, flush_trace = self._mk_line_tracer( trace )
+
+    start   = self.ncycles
+    end     = start + ncycles if ncycles is not None else None
+    cycle   = self.cycle
+    changed = self._state_changed
+    skip    = self._skip_idle and line_trace is None
+
+    try:
+
+      while end is None or self.ncycles < end:
+
+        if stop_value is not None and stop_value:
+          break
+        if stop_func is not None and stop_func():
+          break
+        if line_trace is not None:
+          line_trace( self )
+
+        changed[0] = 0
+        cycle()
+
+        if skip and not changed[0] and self.ncycles != end:
+          limit = None if end is None else end - self.ncycles
+          nskip = self._idle_cycles( limit )
+          if nskip:
+            for m in self._models:
+              m.skip_cycles( nskip )
+            self.ncycles += nskip
+
+    finally:
+      if flush_trace is not None:
+        flush_trace()
+
+    return self.ncycles - start
+
+  #---------------------------------------------------------------------
+  # _mk_line_tracer
+  #---------------------------------------------------------------------
+  # Returns the function to call before each cycle of run() for the
+  # given trace argument, and the function to call once run() is done.
+  # The 'last:N' tracer only keeps the line trace strings, the cycle
+  # numbers are formatted when they are printed.
+  def _mk_line_tracer( self, trace ):
+
+    if trace is None or callable( trace ):
+      return trace, None
+
+    mode, _, count = str( trace ).partition( ':' )
+    if mode not in ( 'every', 'last' ) or not count.isdigit() \
+       or int( count ) == 0:
+      raise ValueError( "Invalid trace '{}', expected None, 'every:K', "
+                        "'last:N' or a callable!".format( trace ) )
+
+    count = int( count )
+
+    if mode == 'every':
+      def line_trace( sim ):
+        if sim.ncycles % count == 0:
+          sim.print_line_trace()
+      return line_trace, None
+
+    lines = collections.deque( maxlen = count )
+    model = self.model
+    def line_trace( sim ):
+      lines.append( ( sim.ncycles, model.line_trace() ) )
+    def flush_trace():
+      for ncycles, line in lines:
+        print( "{:>3}:".format( ncycles ), line )
+    return line_trace, flush_trace
+
+  #---------------------------------------------------------------------
+  # _idle_cycles
+  #---------------------------------------------------------------------
+  # Returns how many cycles all models agree can be skipped, at most
+  # limit. Without a limit, nothing is skipped unless some model gives
+  # one.
+  def _idle_cycles( self, limit ):
+
+    nskip = limit
+    for m in self._models:
+      n = m.idle_cycles()
+      if n is not None and ( nskip is None or n < nskip ):
+        nskip = n
+        if not nskip:
+          break
+
+    return nskip or 0
+
+  #---------------------------------------------------------------------
+  # close_vcd
+  #---------------------------------------------------------------------
+  # Write out any buffered VCD value changes and close the VCD file.
+  # Buffered changes are also written when the interpreter exits.
+  def close_vcd( self ):
+    if self._vcd_util:
+      self._vcd_util.close()
+
+  #---------------------------------------------------------------------
+  # save_checkpoint
+  #---------------------------------------------------------------------
+  # Save the full state of the simulation to a file: the value of every
+  # net, pending register updates, MemoryArrays, the cycle count and the
+  # Python state registered with Model.register_state(). Raises a
+  # PyMTLError if the design contains @tick_fl blocks (which run as
+  # greenlets) or registered state which cannot be saved.
+  def save_checkpoint( self, path ):
+    checkpoint.save_checkpoint( self, path )
+
+  #---------------------------------------------------------------------
+  # restore_checkpoint
+  #---------------------------------------------------------------------
+  # Restore the state saved by save_checkpoint() from a simulator for the
+  # same design. VCD output is not rewound.
+  def restore_checkpoint( self, path ):
+    checkpoint.restore_checkpoint( self, path )
+
   #---------------------------------------------------------------------
   # print_line_trace
   #---------------------------------------------------------------------
@@ -142,9 +396,7 @@ class SimulationTool( object ):
       func()
 
     # Then flop the shadow state on all registers
-    while self._register_queue:
-      reg = self._register_queue.pop()
-      reg.flop()
+    self._flop_registers()
 
     # Call all events generated by synchronous logic
     self.eval_combinational()
@@ -169,9 +421,7 @@ class SimulationTool( object ):
       func()
 
     # Then flop the shadow state on all registers
-    while self._register_queue:
-      reg = self._register_queue.pop()
-      reg.flop()
+    self._flop_registers()
 
     # Call all events generated by synchronous logic
     self.eval_combinational()
@@ -186,6 +436,41 @@ class SimulationTool( object ):
   def eval_combinational( self ):
     pass
 
+  #---------------------------------------------------------------------
+  # _flop_registers
+  #---------------------------------------------------------------------
+  # Flop every register whose .next was written this cycle in a single
+  # batch. Each register is queued at most once (see
+  # insert_signal_values), and only registers whose value actually
+  # changes notify the combinational logic and update their slices.
+  # MemoryArrays with buffered .next writes are flopped afterwards. Any
+  # change is recorded in _state_changed for run().
+  def _flop_registers( self ):
+
+    registers = self._registers
+    dirty     = self._register_dirty
+    queue     = self._register_queue
+    changed   = False
+
+    while queue:
+      index = queue.pop()
+      dirty[ index ] = 0
+      reg   = registers[ index ]
+      value = reg._next
+      if value != reg:
+        reg.write_value( value )
+        reg.notify_sim_comb_update()
+        for func in reg._slices: func()
+        changed = True
+
+    memories = self._memory_queue
+    while memories:
+      if memories.pop().flop():
+        changed = True
+
+    if changed:
+      self._state_changed[0] = 1
+
   #---------------------------------------------------------------------
   # _debug_eval
   #---------------------------------------------------------------------
@@ -209,6 +494,116 @@ class SimulationTool( object ):
       func()
       self._current_func = None
 
+  #---------------------------------------------------------------------
+  # _dev_static_eval
+  #---------------------------------------------------------------------
+  # Implementation of eval_combinational() for the static schedule for
+  # use during develop-test-debug loops.
+  def _dev_static_eval( self ):
+    for func in self._static_schedule:
+      self._current_func = func
+      self.metrics.incr_comb_evals( func )
+      func()
+    self._current_func = None
+
+  #---------------------------------------------------------------------
+  # _perf_static_eval
+  #---------------------------------------------------------------------
+  # Implementation of eval_combinational() for the static schedule for
+  # use when benchmarking models.
+  def _perf_static_eval( self ):
+    for func in self._static_schedule:
+      func()
+
+  #---------------------------------------------------------------------
+  # _enable_static_schedule
+  #---------------------------------------------------------------------
+  # Switch eval_combinational() over to the static schedule. Every block
+  # runs on each call, so writes no longer need to notify the simulator:
+  # remove the comb update hooks from all nets and turn any remaining
+  # notifications (e.g., from BitSlices created before the switch) into
+  # no-ops. MemoryArrays likewise stop tracking which blocks read them.
+  def _enable_static_schedule( self ):
+
+    if flags.optimize:
+      self.eval_combinational = self._perf_static_eval
+    else:
+      self.eval_combinational = self._dev_static_eval
+
+    self.add_event = self._static_add_event
+
+    for group in self._nets:
+      svalue = next( iter( group ) )._signalvalue
+      if 'notify_sim_comb_update' in vars( svalue ):
+        del svalue.notify_sim_comb_update
+
+    for mvalue in self._memories:
+      del mvalue.current_reader, mvalue.wake
+      mvalue._readers.clear()
+
+  #---------------------------------------------------------------------
+  # _enable_profile
+  #---------------------------------------------------------------------
+  # Replace every sequential block and the callback of every
+  # combinational block with a function recording its time in a new
+  # BlockProfile. Wrapped combinational blocks still set _current_func
+  # to the block itself, so they are not rescheduled by their own writes.
+  def _enable_profile( self, compiled ):
+
+    self.profile = profile = BlockProfile()
+
+    names = {}
+    def visit( m, name ):
+      names[ id( m ) ] = name
+      for child in m.get_submodules():
+        visit( child, name + '.' + child.name )
+    visit( self.model, self.model.name )
+
+    def mk_comb_call( func ):
+      def call():
+        self._current_func = func
+        func()
+      return call
+
+    for m in self._models:
+      for func in m._newsenses:
+        func.cb    = profile.wrap( names[ id( m ) ], func.func_name,
+                                   mk_comb_call( func ) )
+        func.cb.id = func.id
+
+    # Blocks already on the event queue (or in the static schedule) are
+    # replaced with their callbacks. Slice callbacks are not wrapped.
+
+    fifo = self._event_queue.fifo
+    self._event_queue.fifo = collections.deque( getattr( f, 'cb', f )
+                                                for f in fifo )
+    if self._static_schedule is not None:
+      self._static_schedule = [ f.cb for f in self._static_schedule ]
+
+    # Sequential blocks are registered in this order by
+    # register_seq_blocks, unless they were compiled into a single block
+
+    if compiled:
+      seq_blocks, = self._sequential_blocks
+      self._sequential_blocks = [ profile.wrap( self.model.name,
+                                                'seq_blocks', seq_blocks ) ]
+      return
+
+    funcs = [ ( m, f ) for m in self._models
+                       for f in m.get_tick_blocks() +
+                                m.get_posedge_clk_blocks() ]
+    self._sequential_blocks = [
+      profile.wrap( names[ id( m ) ], f.func_name, seq_block )
+      for ( m, f ), seq_block in zip( funcs, self._sequential_blocks )
+    ]
+
+  #---------------------------------------------------------------------
+  # _static_add_event
+  #---------------------------------------------------------------------
+  # Replacement for add_event() when using the static schedule.
+  def _static_add_event( self, signal_value ):
+    pass
+
   #---------------------------------------------------------------------
   # add_event
   #---------------------------------------------------------------------
@@ -0,0 +1,168 @@
+#=======================================================================
+# SimulationTool_compile_test.py
+#=======================================================================
+
+import pytest
+
+#=======================================================================
+# Tests
+#=======================================================================
+
+# This imports all the SimulationTool tests. Below we will hack the
+# setup_sim() function call in each module to use a simulator with all
+# sequential blocks compiled into a single function.
+
+from SimulationTool_seq_test    import *
+from SimulationTool_comb_test   import *
+from SimulationTool_mix_test    import *
+from SimulationTool_struct_test import *
+from SimulationTool_wire_test   import *
+from SimulationTool_mem_test    import *
+
+#=======================================================================
+# Test Config
+#=======================================================================
+
+#-----------------------------------------------------------------------
+# local_setup_sim
+#-----------------------------------------------------------------------
+# - elaborate the module
+# - create a simulator with compiled sequential blocks
+#
+def local_setup_sim( model ):
+  model.elaborate()
+  sim = SimulationTool( model, compile_ticks=True )
+  return model, sim
+
+#=======================================================================
+# Compiled Sequential Block Tests
+#=======================================================================
+
+#-----------------------------------------------------------------------
+# test_EarlyReturn
+#-----------------------------------------------------------------------
+# An early return from an inlined block must only skip the rest of that
+# block, not the blocks registered after it.
+class EarlyReturn( Model ):
+  def __init__( s ):
+    s.en  = InPort ( 1 )
+    s.a   = OutPort( 8 )
+    s.b   = OutPort( 8 )
+
+    @s.tick
+    def block_a():
+      if not s.en:
+        return
+      s.a.next = s.a + 1
+
+    @s.tick
+    def block_b():
+      s.b.next = s.b + 1
+
+def test_EarlyReturn():
+
+  model      = EarlyReturn()
+  model, sim = local_setup_sim( model )
+
+  model.en.value = 0
+  sim.cycle()
+  assert model.a == 0
+  assert model.b == 1
+
+  model.en.value = 1
+  sim.cycle()
+  assert model.a == 1
+  assert model.b == 2
+
+#-----------------------------------------------------------------------
+# test_DeadNextWrite
+#-----------------------------------------------------------------------
+# A block containing a .next write which never executes must not flop
+# a net driven by a combinational block.
+class DeadNextWrite( Model ):
+  def __init__( s, bypass ):
+    s.in_ = InPort ( 8 )
+    s.out = OutPort( 8 )
+    s.tmp = Wire   ( 8 )
+
+    @s.combinational
+    def comb():
+      s.tmp.value = s.in_ + 1
+
+    if bypass:
+      s.connect( s.tmp, s.out )
+
+    @s.tick
+    def seq():
+      if bypass:
+        return
+      s.out.next = s.tmp
+
+@pytest.mark.parametrize( 'bypass', [ True, False ] )
+def test_DeadNextWrite( bypass ):
+
+  model      = DeadNextWrite( bypass )
+  model, sim = local_setup_sim( model )
+
+  model.in_.value = 4
+  sim.eval_combinational()
+  sim.cycle()
+  assert model.out == 5
+
+  model.in_.value = 8
+  sim.cycle()
+  assert model.out == 9
+
+#-----------------------------------------------------------------------
+# test_DefaultArgs
+#-----------------------------------------------------------------------
+# Blocks capturing loop variables with default arguments are inlined
+# with each default bound separately.
+class DefaultArgs( Model ):
+  def __init__( s ):
+    s.out = [ OutPort( 8 ) for _ in range( 4 ) ]
+
+    for i in range( 4 ):
+      @s.tick
+      def seq( i = i ):
+        s.out[i].next = i
+
+def test_DefaultArgs():
+
+  model      = DefaultArgs()
+  model, sim = local_setup_sim( model )
+
+  sim.cycle()
+  assert [ x.uint() for x in model.out ] == [ 0, 1, 2, 3 ]
+
+#-----------------------------------------------------------------------
+# test_ReboundGlobal
+#-----------------------------------------------------------------------
+# Global names are looked up when the compiled function runs, so
+# rebinding a global between cycles is seen by inlined blocks.
+INC = 1
+
+class ReboundGlobal( Model ):
+  def __init__( s ):
+    s.out = OutPort( 8 )
+
+    @s.tick
+    def seq():
+      s.out.next = s.out + INC
+
+def test_ReboundGlobal():
+
+  global INC
+
+  model      = ReboundGlobal()
+  model, sim = local_setup_sim( model )
+
+  try:
+    sim.cycle()
+    sim.cycle()
+    assert model.out == 2
+    INC = 9
+    sim.cycle()
+    assert model.out == 11
+  finally:
+    INC = 1
@@ -0,0 +1,230 @@
+#=======================================================================
+# SimulationTool_mem_test.py
+#=======================================================================
+# Tests using MemoryArrays for the SimulationTool class.
+
+import pytest
+
+from pymtl import *
+
+from SimulationTool_seq_test  import setup_sim, local_setup_sim
+
+#-----------------------------------------------------------------------
+# RegFile
+#-----------------------------------------------------------------------
+
+class RegFile( Model ):
+  def __init__( s, dtype, nregs ):
+    s.raddr = InPort ( clog2( nregs ) )
+    s.rdata = OutPort( dtype )
+    s.waddr = InPort ( clog2( nregs ) )
+    s.wdata = InPort ( dtype )
+    s.wen   = InPort ( 1 )
+
+    s.regs  = MemoryArray( nregs, dtype )
+
+    @s.combinational
+    def comb_logic():
+      s.rdata.value = s.regs[ s.raddr ]
+
+    @s.tick
+    def seq_logic():
+      if s.reset:
+        s.regs.next = 0
+      elif s.wen:
+        s.regs[ s.waddr ].next = s.wdata
+
+def write( sim, model, addr, data ):
+  model.waddr.value = addr
+  model.wdata.value = data
+  model.wen  .value = 1
+  sim.cycle()
+  model.wen  .value = 0
+
+def test_RegFile( setup_sim ):
+  model, sim = setup_sim( RegFile( 8, 8 ) )
+  sim.reset()
+
+  for i in range( 8 ):
+    write( sim, model, i, i + 0x10 )
+
+  for i in range( 8 ):
+    model.raddr.value = i
+    sim.eval_combinational()
+    assert model.rdata == i + 0x10
+
+  # Writes are only visible on the next cycle
+
+  model.raddr.value = 3
+  model.waddr.value = 3
+  model.wdata.value = 0xab
+  model.wen  .value = 1
+  sim.eval_combinational()
+  assert model.rdata == 0x13
+  sim.cycle()
+  assert model.rdata == 0xab
+
+  # Reset writes every entry
+
+  sim.reset()
+  for i in range( 8 ):
+    model.raddr.value = i
+    sim.eval_combinational()
+    assert model.rdata == 0
+
+def test_RegFile_too_big( setup_sim ):
+  model, sim = setup_sim( RegFile( 8, 8 ) )
+  with pytest.raises( ValueError ):
+    model.regs[0].next = 0x100
+  with pytest.raises( ValueError ):
+    model.regs.next = 0x100
+
+#-----------------------------------------------------------------------
+# ReadWakeup
+#-----------------------------------------------------------------------
+# A combinational block reading a single entry is only evaluated again
+# when that entry (or the address it read) changes.
+
+def test_ReadWakeup():
+  model = RegFile( 8, 64 )
+  model.elaborate()
+  sim = SimulationTool( model )
+  sim.reset()
+
+  # Count the blocks taken off the event queue
+
+  evals = []
+  deq   = sim._event_queue.deq
+  def counting_deq():
+    evals.append( deq() )
+    return evals[-1]
+  sim._event_queue.deq = counting_deq
+
+  model.raddr.value = 5
+  sim.cycle()
+  assert len( evals ) == 1
+
+  del evals[:]
+  write( sim, model, 6, 0x42 )
+  assert evals == []
+  assert model.rdata == 0
+
+  write( sim, model, 5, 0x42 )
+  assert len( evals ) == 1
+  assert model.rdata == 0x42
+
+  # Writing the value an entry already holds does not wake readers
+
+  del evals[:]
+  write( sim, model, 5, 0x42 )
+  assert evals == []
+
+#-----------------------------------------------------------------------
+# ByteMem
+#-----------------------------------------------------------------------
+# Writes to slices of an entry are merged with other writes to the same
+# entry in the same cycle.
+
+class ByteMem( Model ):
+  def __init__( s, nentries, nbytes ):
+    s.raddr = InPort ( clog2( nentries ) )
+    s.rdata = OutPort( nbytes * 8 )
+    s.waddr = InPort ( clog2( nentries ) )
+    s.wdata = InPort ( nbytes * 8 )
+    s.wben  = InPort ( nbytes )
+
+    s.mem   = MemoryArray( nentries, nbytes * 8 )
+
+    @s.combinational
+    def comb_logic():
+      s.rdata.value = s.mem[ s.raddr ]
+
+    @s.posedge_clk
+    def seq_logic():
+      if s.reset:
+        s.mem.next = 0xffffffff
+      else:
+        for i in range( nbytes ):
+          if s.wben[i]:
+            s.mem[ s.waddr ][ i*8:i*8+8 ].next = s.wdata[ i*8:i*8+8 ]
+
+def test_ByteMem( setup_sim ):
+  model, sim = setup_sim( ByteMem( 4, 4 ) )
+  sim.reset()
+
+  model.raddr.value = 2
+  model.waddr.value = 2
+  model.wdata.value = 0x12345678
+  model.wben .value = 0b0101
+  sim.cycle()
+  assert model.rdata == 0xff34ff78
+
+  model.wben .value = 0b1010
+  sim.cycle()
+  assert model.rdata == 0x12345678
+
+  model.raddr.value = 3
+  sim.eval_combinational()
+  assert model.rdata == 0xffffffff
+
+#-----------------------------------------------------------------------
+# StructMem
+#-----------------------------------------------------------------------
+
+class PairMsg( BitStructDefinition ):
+  def __init__( s ):
+    s.a = BitField( 4 )
+    s.b = BitField( 4 )
+
+class StructMem( Model ):
+  def __init__( s ):
+    s.addr = InPort ( 2 )
+    s.in_  = InPort ( PairMsg() )
+    s.out  = OutPort( 4 )
+
+    s.mem  = MemoryArray( 4, PairMsg() )
+
+    @s.combinational
+    def comb_logic():
+      s.out.value = s.mem[ s.addr ].a + s.mem[ s.addr ].b
+
+    @s.tick
+    def seq_logic():
+      s.mem[ s.addr ].next = s.in_
+
+def test_StructMem( setup_sim ):
+  model, sim = setup_sim( StructMem() )
+  model.addr.value = 1
+  model.in_ .value = 0x23
+  sim.cycle()
+  assert model.out == 5
+
+#-----------------------------------------------------------------------
+# MemoryArrayValue
+#-----------------------------------------------------------------------
+
+def test_MemoryArrayValue( setup_sim ):
+  model, sim = setup_sim( StructMem() )
+  model.addr.value = 1
+  model.in_ .value = 0x23
+  sim.cycle()
+  assert model.mem[1].a == 2
+  assert model.mem[1].b == 3
+  assert model.mem.uint_list() == [ 0, 0x23, 0, 0 ]
+  assert [ x.uint() for x in model.mem ] == [ 0, 0x23, 0, 0 ]
+  assert len( model.mem ) == 4
+
+  # Later writes to an entry in the same cycle take priority, and a
+  # write to the whole memory replaces earlier writes to single entries
+
+  model.mem[2].next = 0x11
+  model.mem[2].next = 0x12
+  model.mem[3].next = 0x13
+  sim.cycle()
+  assert model.mem.uint_list() == [ 0, 0x23, 0x12, 0x13 ]
+
+  model.mem[0].next = 0x44
+  model.mem.next    = 0x55
+  model.mem[3].next = 0x66
+  sim.cycle()
+  assert model.mem.uint_list() == [ 0x55, 0x23, 0x55, 0x66 ]
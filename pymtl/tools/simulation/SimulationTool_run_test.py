@@ -0,0 +1,241 @@
+#=======================================================================
+# SimulationTool_run_test.py
+#=======================================================================
+# Tests for running the SimulationTool over many cycles with run().
+
+import pytest
+
+from pymtl import *
+
+#-----------------------------------------------------------------------
+# Helpers
+#-----------------------------------------------------------------------
+
+def mk_sim( model, **kwargs ):
+  model.elaborate()
+  sim = SimulationTool( model, **kwargs )
+
+  # Count the cycles actually simulated
+
+  sim.ncalls = 0
+  cycle      = sim.cycle
+  def counting_cycle():
+    sim.ncalls += 1
+    cycle()
+  sim.cycle = counting_cycle
+
+  return model, sim
+
+sim_kwargs = pytest.mark.parametrize( 'kwargs', [
+  {},
+  { 'schedule' : 'static' },
+  { 'compile_ticks' : True },
+])
+
+#-----------------------------------------------------------------------
+# Countdown
+#-----------------------------------------------------------------------
+# Pulses out every period cycles, using a Python counter with hints.
+
+class Countdown( Model ):
+  def __init__( s, period ):
+    s.out     = OutPort( 1 )
+    s.count   = OutPort( 8 )
+    s.counter = period
+
+    @s.tick
+    def tick():
+      s.counter -= 1
+      if s.counter == 0:
+        s.counter    = period
+        s.out.next   = 1
+        s.count.next = s.count + 1
+      else:
+        s.out.next   = 0
+
+  def idle_cycles( s ):
+    return s.counter - 1
+
+  def skip_cycles( s, ncycles ):
+    s.counter -= ncycles
+
+@sim_kwargs
+def test_Countdown( kwargs ):
+
+  model, sim = mk_sim( Countdown( 100 ), **kwargs )
+  assert sim.run( 1000 ) == 1000
+  assert sim.ncycles     == 1000
+  assert model.count     == 10
+  assert sim.ncalls      <  50
+
+  # Same result as cycling one at a time
+
+  ref = Countdown( 100 )
+  ref.elaborate()
+  ref_sim = SimulationTool( ref, **kwargs )
+  for i in range( 1000 ):
+    ref_sim.cycle()
+  assert ref.count   == model.count
+  assert ref.counter == model.counter
+
+  # Skipped cycles never go past the requested number of cycles
+
+  assert sim.run( 150 ) == 150
+  assert model.count    == 11
+  assert model.counter  == ref.counter - 50
+
+#-----------------------------------------------------------------------
+# Until
+#-----------------------------------------------------------------------
+
+@sim_kwargs
+def test_Until( kwargs ):
+
+  model, sim = mk_sim( Countdown( 100 ), **kwargs )
+  assert sim.run( 1000, stop_signal = lambda: model.count == 3 ) == 300
+  assert sim.run( 1000, stop_signal = lambda: model.count == 3 ) == 0
+  assert sim.ncycles == 300
+
+@sim_kwargs
+def test_StopSignal( kwargs ):
+
+  model, sim = mk_sim( Countdown( 10 ), **kwargs )
+  assert sim.run( 1000, stop_signal = model.out ) == 10
+  assert model.out == 1
+
+  # The stop signal is checked before the first cycle
+
+  assert sim.run( 1000, stop_signal = model.out ) == 0
+
+  model, sim = mk_sim( Countdown( 10 ), **kwargs )
+  assert sim.run( None, stop_signal = lambda: model.count == 5 ) == 50
+
+  with pytest.raises( ValueError ):
+    sim.run( 10, stop_signal = 1 )
+
+#-----------------------------------------------------------------------
+# Trace
+#-----------------------------------------------------------------------
+
+class Counter( Model ):
+  def __init__( s ):
+    s.out = OutPort( 8 )
+
+    @s.posedge_clk
+    def seq():
+      s.out.next = s.out + 1
+
+  def line_trace( s ):
+    return str( s.out )
+
+def test_TraceEvery( capsys ):
+
+  model, sim = mk_sim( Counter() )
+  sim.run( 10, trace = 'every:4' )
+  out, err = capsys.readouterr()
+  assert out.splitlines() == [ '  0: 00', '  4: 04', '  8: 08' ]
+
+def test_TraceLast( capsys ):
+
+  model, sim = mk_sim( Counter() )
+  sim.run( 10, trace = 'last:2' )
+  out, err = capsys.readouterr()
+  assert out.splitlines() == [ '  8: 08', '  9: 09' ]
+
+  # The last lines are printed if the simulation fails
+
+  def fail():
+    if sim.ncycles == 13:
+      raise AssertionError()
+  with pytest.raises( AssertionError ):
+    sim.run( 10, stop_signal = fail, trace = 'last:2' )
+  out, err = capsys.readouterr()
+  assert out.splitlines() == [ ' 11: 0b', ' 12: 0c' ]
+
+def test_TraceFunc():
+
+  model, sim = mk_sim( Counter() )
+  lines = []
+  sim.run( 3, trace = lambda sim: lines.append( sim.model.line_trace() ) )
+  assert lines == [ '00', '01', '02' ]
+
+  with pytest.raises( ValueError ):
+    sim.run( 3, trace = 'first:3' )
+  with pytest.raises( ValueError ):
+    sim.run( 3, trace = 'every:0' )
+
+#-----------------------------------------------------------------------
+# ShiftReg
+#-----------------------------------------------------------------------
+# @posedge_clk blocks without hints are skipped once registers settle.
+
+class ShiftReg( Model ):
+  def __init__( s, nstages ):
+    s.in_  = InPort ( 8 )
+    s.out  = OutPort( 8 )
+    s.regs = [ Wire( 8 ) for _ in range( nstages ) ]
+    s.mem  = MemoryArray( 4, 8 )
+
+    @s.posedge_clk
+    def seq():
+      s.regs[0].next = s.in_
+      for i in range( 1, nstages ):
+        s.regs[i].next = s.regs[i-1]
+      s.mem[ s.in_[0:2] ].next = s.in_
+
+    @s.combinational
+    def comb():
+      s.out.value = s.regs[ nstages - 1 ]
+
+@sim_kwargs
+def test_ShiftReg( kwargs ):
+
+  model, sim = mk_sim( ShiftReg( 4 ), **kwargs )
+  model.in_.value = 7
+  assert sim.run( 1000 ) == 1000
+  assert model.out   == 7
+  assert sim.ncalls  == 5
+
+  # Input changes are seen on the next cycle
+
+  model.in_.value = 9
+  assert sim.run( 3 ) == 3
+  assert model.out    == 7
+  assert sim.run( 1 ) == 1
+  assert model.out    == 9
+
+#-----------------------------------------------------------------------
+# NoHints
+#-----------------------------------------------------------------------
+# @tick blocks are never skipped by default, and nothing is skipped
+# when collecting metrics.
+
+class Sampler( Model ):
+  def __init__( s ):
+    s.in_     = InPort( 8 )
+    s.samples = []
+
+    @s.tick
+    def tick():
+      s.samples.append( int( s.in_ ) )
+
+def test_NoHints():
+
+  model, sim = mk_sim( Sampler() )
+  assert sim.run( 100 ) == 100
+  assert sim.ncalls     == 100
+  assert len( model.samples ) == 100
+
+def test_CollectMetrics():
+
+  model, sim = mk_sim( Countdown( 10 ), collect_metrics = True )
+  assert sim.run( 100 ) == 100
+  assert sim.ncalls     == 100
+  assert model.count    == 10
+
+def test_Profile():
+
+  model, sim = mk_sim( Countdown( 10 ), profile = True )
+  assert sim.run( 100 ) == 100
+  assert sim.ncalls     == 100
+  assert model.count    == 10
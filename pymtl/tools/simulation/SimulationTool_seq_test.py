@@ -475,3 +475,29 @@ def test_GetMSB( setup_sim ):
   model.in_.value = 0b10000; sim.cycle(); assert model.out == 1
   model.in_.value = 0b00001; sim.cycle(); assert model.out == 0
 
+
+#-----------------------------------------------------------------------
+# MultipleNextWrites
+#-----------------------------------------------------------------------
+# Verify a register written several times in a cycle is only flopped
+# once, with the last value written.
+class MultipleNextWrites( Model ):
+  def __init__( s ):
+    s.in_ = InPort ( 8 )
+    s.out = OutPort( 8 )
+
+  def elaborate_logic( s ):
+    @s.posedge_clk
+    def logic():
+      s.out.next = 0
+      s.out.next = s.in_
+      s.out[0:4].next = 0
+
+def test_MultipleNextWrites( setup_sim ):
+  model      = MultipleNextWrites()
+  model, sim = setup_sim( model )
+
+  model.in_.value = 0xab; sim.cycle(); assert model.out == 0xa0
+  model.in_.value = 0x12; sim.cycle(); assert model.out == 0x10
+  assert sim._register_queue == []
+  assert not any( sim._register_dirty )
@@ -0,0 +1,143 @@
+#=======================================================================
+# SimulationTool_static_test.py
+#=======================================================================
+
+import pytest
+import warnings
+
+#=======================================================================
+# Tests
+#=======================================================================
+
+# This imports all the SimulationTool tests. Below we will hack the
+# setup_sim() function call in each module to use a simulator with a
+# static combinational schedule.
+
+from SimulationTool_seq_test    import *
+from SimulationTool_comb_test   import *
+from SimulationTool_mix_test    import *
+from SimulationTool_struct_test import *
+from SimulationTool_wire_test   import *
+from SimulationTool_mem_test    import *
+
+#=======================================================================
+# Test Config
+#=======================================================================
+
+#-----------------------------------------------------------------------
+# local_setup_sim
+#-----------------------------------------------------------------------
+# - elaborate the module
+# - create a simulator with a static schedule using the SimulationTool
+#
+def local_setup_sim( model ):
+  model.elaborate()
+  sim = SimulationTool( model, schedule='static' )
+  return model, sim
+
+#=======================================================================
+# Static Schedule Tests
+#=======================================================================
+
+#-----------------------------------------------------------------------
+# test_SliceWriteCheck
+#-----------------------------------------------------------------------
+# Overrides the test imported from SimulationTool_comb_test. With a
+# static schedule every block runs on each eval_combinational(), so
+# writing a slice without .v is still picked up.
+def test_SliceWriteCheck():
+
+  model      = SliceWriteCheck( 16 )
+  model, sim = local_setup_sim( model )
+  assert model.out == 0
+
+  model.in_.v = 8
+  sim.eval_combinational()
+  assert model.out == 0b1000
+
+  model.in_[0] = 1
+  sim.eval_combinational()
+  assert model.out == 0b1001
+  model.in_[4:8] = 0b1001
+  sim.eval_combinational()
+  assert model.out == 0b10011001
+
+#-----------------------------------------------------------------------
+# test_StaticScheduleOrder
+#-----------------------------------------------------------------------
+# Blocks are registered in reverse dependency order, a single call to
+# eval_combinational() must still propagate through the whole chain.
+class ReverseChain( Model ):
+  def __init__( s ):
+    s.in_ = InPort ( 8 )
+    s.out = OutPort( 8 )
+    s.a   = Wire   ( 8 )
+    s.b   = Wire   ( 8 )
+
+    @s.combinational
+    def stage2():
+      s.out.value = s.b + 1
+
+    @s.combinational
+    def stage1():
+      s.b.value = s.a + 1
+
+    @s.combinational
+    def stage0():
+      s.a.value = s.in_ + 1
+
+def test_StaticScheduleOrder():
+  model, sim = local_setup_sim( ReverseChain() )
+  assert sim._static_schedule is not None
+  names = [ f.func_name for f in sim._static_schedule ]
+  assert names == [ 'stage0', 'stage1', 'stage2' ]
+  model.in_.value = 4
+  sim.eval_combinational()
+  assert model.out == 7
+  model.in_.value = 9
+  sim.eval_combinational()
+  assert model.out == 12
+
+#-----------------------------------------------------------------------
+# test_StaticScheduleCycleFallback
+#-----------------------------------------------------------------------
+class CombLoop( Model ):
+  def __init__( s ):
+    s.in_ = InPort ( 8 )
+    s.out = OutPort( 8 )
+    s.a   = Wire   ( 8 )
+    s.b   = Wire   ( 8 )
+
+    @s.combinational
+    def block_a():
+      if s.in_ > 4: s.a.value = s.in_
+      else:         s.a.value = s.b
+
+    @s.combinational
+    def block_b():
+      s.b.value = s.a
+
+    @s.combinational
+    def block_out():
+      s.out.value = s.a
+
+def test_StaticScheduleCycleFallback():
+  model = CombLoop()
+  model.elaborate()
+  with warnings.catch_warnings( record=True ) as w:
+    warnings.simplefilter( 'always' )
+    sim = SimulationTool( model, schedule='static' )
+  assert sim._static_schedule is None
+  assert any( 'cycle' in str( x.message ) for x in w )
+  model.in_.value = 6
+  sim.eval_combinational()
+  assert model.out == 6
+
+#-----------------------------------------------------------------------
+# test_InvalidSchedule
+#-----------------------------------------------------------------------
+def test_InvalidSchedule():
+  model = ReverseChain()
+  model.elaborate()
+  with pytest.raises( ValueError ):
+    SimulationTool( model, schedule='levelized' )
@@ -0,0 +1,206 @@
+#=======================================================================
+# activity.py
+#=======================================================================
+# Switching activity tracking for SimulationTool. Rather than dumping
+# every value change to a VCD file and post-processing it, the simulator
+# only counts value toggles and register writes per net, which can be
+# exported as a SAIF-like file for power estimation tools.
+
+from __future__ import print_function
+
+import re
+import time
+
+from array       import array
+from collections import OrderedDict
+
+from vcd import walk_signal_defs, get_vcd_timescale
+
+#-----------------------------------------------------------------------
+# ActivityUtil
+#-----------------------------------------------------------------------
+# Hidden class used by the simulator tool for tracking activity. This
+# class takes a SimulationTool instance and augments it to count, for
+# each net in the simulator:
+#
+# - toggles: the number of bits which changed value, i.e., the popcount
+#   of old ^ new on every write which changes the net
+# - writes:  the number of cycles in which the net was written as a
+#   register through .next
+#
+# Counts are stored in flat arrays indexed by net id (the index of the
+# net in simulator._nets), and names() maps each net back to the
+# hierarchical names of all signals collapsed into it.
+class ActivityUtil( object ):
+
+  def __init__( self, simulator ):
+
+    nets  = simulator._registers
+    index = { id( net ) : i for i, net in enumerate( nets ) }
+
+    self._sim      = simulator
+    self._nets     = nets
+    self.toggles   = array( 'L', [ 0 ] ) * len( nets )
+    self.writes    = array( 'L', [ 0 ] ) * len( nets )
+    self._last     = [ net.uint() for net in nets ]
+    self._start    = simulator.ncycles
+
+    # Hierarchical names of each net, and a tree of ( name, signals,
+    # submodels ) scopes, in the same order as in a VCD
+
+    self._names    = [ [] for net in nets ]
+
+    path  = []
+    stack = [ ( None, [], [] ) ]
+    for kind, obj in walk_signal_defs( simulator.model ):
+      if   kind == 'scope':
+        path.append( obj.name )
+        scope = ( obj.name, [], [] )
+        stack[-1][2].append( scope )
+        stack.append( scope )
+      elif kind == 'upscope':
+        path.pop()
+        stack.pop()
+      else:
+        i = index[ id( obj._signalvalue ) ]
+        self._names[ i ].append( '.'.join( path + [ obj.name ] ) )
+        stack[-1][1].append( ( obj.name, i ) )
+
+    self._scope = stack[0][2][0]
+
+    self._insert_activity_callbacks()
+
+  #---------------------------------------------------------------------
+  # _insert_activity_callbacks
+  #---------------------------------------------------------------------
+  # Toggles are counted by a slice callback registered with each net,
+  # which executes immediately whenever the value of the net changes
+  # (see VCDUtil). Register writes are counted by wrapping the
+  # notify_sim_seq_update hook of each net, only the first time it is
+  # called within a cycle. Registers flopped by the function generated
+  # with compile_ticks no longer have this hook, writes to them are
+  # counted once per cycle by a new hook which only counts.
+  def _insert_activity_callbacks( self ):
+
+    sim     = self._sim
+    toggles = self.toggles
+    writes  = self.writes
+    last    = self._last
+    dirty   = sim._register_dirty
+    written = array( 'l', [ -1 ] ) * len( self._nets )
+
+    def create_toggle_cb( index, net ):
+      def toggle_cb():
+        value = net.uint()
+        toggles[ index ] += bin( value ^ last[ index ] ).count( '1' )
+        last[ index ] = value
+      return toggle_cb
+
+    def create_seq_update_cb( index, notify_sim_seq_update ):
+      def write_cb():
+        if not dirty[ index ]:
+          writes[ index ] += 1
+        notify_sim_seq_update()
+      return write_cb
+
+    def create_compiled_write_cb( index ):
+      def write_cb():
+        if written[ index ] != sim.ncycles:
+          written[ index ] = sim.ncycles
+          writes[ index ] += 1
+      return write_cb
+
+    for index, net in enumerate( self._nets ):
+      net.register_slice( create_toggle_cb( index, net ) )
+      if 'notify_sim_seq_update' in vars( net ):
+        net.notify_sim_seq_update = \
+          create_seq_update_cb( index, net.notify_sim_seq_update )
+      else:
+        net.notify_sim_seq_update = create_compiled_write_cb( index )
+
+  #---------------------------------------------------------------------
+  # reset
+  #---------------------------------------------------------------------
+  # Clear all counts, e.g., to exclude the reset sequence.
+  def reset( self ):
+    for i in range( len( self._nets ) ):
+      self.toggles[ i ] = 0
+      self.writes [ i ] = 0
+    self._start = self._sim.ncycles
+
+  #---------------------------------------------------------------------
+  # ncycles
+  #---------------------------------------------------------------------
+  # Number of cycles simulated since the counts were last cleared.
+  @property
+  def ncycles( self ):
+    return self._sim.ncycles - self._start
+
+  #---------------------------------------------------------------------
+  # names
+  #---------------------------------------------------------------------
+  # Hierarchical names of the signals collapsed into each net.
+  def names( self ):
+    return self._names
+
+  #---------------------------------------------------------------------
+  # counts
+  #---------------------------------------------------------------------
+  # Return an OrderedDict mapping the hierarchical name of every signal
+  # to the ( toggles, writes ) counts of its net.
+  def counts( self ):
+    counts = OrderedDict()
+    for index, names in enumerate( self._names ):
+      for name in names:
+        counts[ name ] = ( self.toggles[ index ], self.writes[ index ] )
+    return counts
+
+  #---------------------------------------------------------------------
+  # write_saif
+  #---------------------------------------------------------------------
+  # Write the toggle counts as a backward SAIF file. Counts are reported
+  # per net rather than per bit, and each cycle spans 100 time units of
+  # the VCD timescale.
+  def write_saif( self, filename ):
+
+    value, unit = re.match( r'\s*(\d+)\s*(\w+)',
+                            get_vcd_timescale( self._sim.model ) ).groups()
+
+    lines = [
+      '(SAIFILE',
+      '(SAIFVERSION "2.0")',
+      '(DIRECTION "backward")',
+      '(DESIGN "{}")'.format( self._sim.model.class_name ),
+      '(DATE "{}")'.format( time.asctime() ),
+      '(VENDOR "PyMTL")',
+      '(PROGRAM_NAME "SimulationTool")',
+      '(DIVIDER . )',
+      '(TIMESCALE {} {})'.format( value, unit ),
+      '(DURATION {})'.format( 100 * self.ncycles ),
+    ]
+
+    def write_scope( scope, indent ):
+      name, signals, submodels = scope
+      lines.append( '{}(INSTANCE {}'.format( indent, _escape( name ) ) )
+      if signals:
+        lines.append( '{}  (NET'.format( indent ) )
+        for signal, index in signals:
+          lines.append( '{}    ({} (TC {}) (IG 0))'.format( indent,
+                        _escape( signal ), self.toggles[ index ] ) )
+        lines.append( '{}  )'.format( indent ) )
+      for submodel in submodels:
+        write_scope( submodel, indent + '  ' )
+      lines.append( '{})'.format( indent ) )
+
+    write_scope( self._scope, '' )
+    lines.append( ')' )
+
+    with open( filename, 'w' ) as f:
+      f.write( '\n'.join( lines ) + '\n' )
+
+#-----------------------------------------------------------------------
+# _escape
+#-----------------------------------------------------------------------
+# Escape the characters which are not allowed in SAIF identifiers.
+def _escape( name ):
+  return re.sub( r'([\[\]\.\(\)])', r'\\\1', name )
@@ -0,0 +1,124 @@
+#=======================================================================
+# activity_test.py
+#=======================================================================
+
+import pytest
+
+from pymtl import *
+
+#-----------------------------------------------------------------------
+# Models
+#-----------------------------------------------------------------------
+
+class Toggler( Model ):
+  def __init__( s ):
+    s.in_  = InPort ( 8 )
+    s.out  = OutPort( 8 )
+    s.en   = InPort ( 1 )
+    s.reg  = Wire   ( 8 )
+
+    @s.posedge_clk
+    def seq():
+      if s.en:
+        s.reg.next = s.in_
+
+    @s.combinational
+    def comb():
+      s.out.value = ~s.reg
+
+class Pair( Model ):
+  def __init__( s ):
+    s.in_  = InPort ( 8 )
+    s.out  = OutPort( 8 )
+    s.en   = InPort ( 1 )
+    s.subs = [ Toggler() for _ in range( 2 ) ]
+
+    s.connect( s.in_,         s.subs[0].in_ )
+    s.connect( s.subs[0].out, s.subs[1].in_ )
+    s.connect( s.subs[1].out, s.out         )
+    s.connect( s.en,          s.subs[0].en  )
+    s.connect( s.en,          s.subs[1].en  )
+
+def run( kwargs ):
+  model = Pair()
+  model.elaborate()
+  sim = SimulationTool( model, activity = True, **kwargs )
+  sim.reset()
+  model.reset.value = 0
+  sim.activity.reset()
+
+  # Write the registers in 4 of 8 cycles, alternating 0x0f and 0xff
+
+  for i in range( 8 ):
+    model.en.value  = i < 4
+    model.in_.value = 0xff if i % 2 else 0x0f
+    sim.cycle()
+
+  return model, sim
+
+#-----------------------------------------------------------------------
+# test_counts
+#-----------------------------------------------------------------------
+
+@pytest.mark.parametrize( 'kwargs', [
+  {},
+  { 'schedule' : 'static' },
+])
+def test_counts( kwargs ):
+
+  model, sim = run( kwargs )
+  counts = sim.activity.counts()
+
+  # Connected signals share the counts of their net
+
+  assert counts[ 'top.in_' ] == counts[ 'top.subs[0].in_' ]
+  assert counts[ 'top.en'  ] == counts[ 'top.subs[1].en'  ]
+
+  # in_ toggles 4 bits on each of its 8 changes (starting from 0x00),
+  # en rises and falls once
+
+  assert counts[ 'top.in_' ][0] == 32
+  assert counts[ 'top.en'  ][0] == 2
+
+  # subs[0].reg: 00 (reset) -> 0f -> ff -> 0f -> ff
+
+  assert counts[ 'top.subs[0].reg' ] == ( 16, 4 )
+  assert counts[ 'top.subs[0].out' ] == ( 16, 0 )
+
+  # subs[1].reg: 00 -> ff -> f0 -> 00 -> f0
+
+  assert counts[ 'top.subs[1].reg' ] == ( 20, 4 )
+
+  assert sim.activity.ncycles == 8
+  assert [ 'top.in_', 'top.subs[0].in_' ] in sim.activity.names()
+
+def test_compiled():
+
+  model, sim = run( { 'compile_ticks' : True } )
+  counts = sim.activity.counts()
+
+  # Writes to compiled registers are counted the same way as writes to
+  # registers flopped through the register queue
+
+  assert dict( counts ) == dict( run( {} )[1].activity.counts() )
+  assert counts[ 'top.subs[0].reg' ] == ( 16, 4 )
+  assert counts[ 'top.subs[1].reg' ] == ( 20, 4 )
+
+#-----------------------------------------------------------------------
+# test_write_saif
+#-----------------------------------------------------------------------
+
+def test_write_saif( tmpdir ):
+
+  model, sim = run( {} )
+  path = str( tmpdir.join( 'activity.saif' ) )
+  sim.activity.write_saif( path )
+
+  with open( path ) as f:
+    text = f.read()
+
+  assert '(DURATION 800)'          in text
+  assert '(TIMESCALE 10 ps)'       in text
+  assert '(INSTANCE subs\\[1\\]'   in text
+  assert '(reg (TC 20) (IG 0))'    in text
+  assert text.count( '(' ) == text.count( ')' )
@@ -0,0 +1,215 @@
+#=======================================================================
+# analysis_cache.py
+#=======================================================================
+# Cache for the per-block analysis performed when constructing a
+# simulator.
+#
+# Every instance of a model class shares the same concurrent block code,
+# so the results of parsing and analyzing a block (the names it loads
+# and stores, the decorators applied to it, and whether it passed the
+# .value/.next lint checks) only need to be computed once per class.
+# Results are keyed on the class_name of the model (which already
+# includes a hash of its parameters), the location of the block, and a
+# hash of the source file containing the block, and are kept in memory
+# for the life of the process.
+#
+# If the PYMTL_ANALYSIS_CACHE_DIR environment variable is set, or a
+# directory is provided with set_cache_dir(), results are also stored
+# on disk so they can be reused across processes. Each entry is written
+# to a separate pickle file, and files are written to a temporary name
+# and then renamed, so concurrent processes may safely share the same
+# cache directory.
+
+import os
+import hashlib
+import tempfile
+import cPickle as pickle
+
+from ..ast_helpers import get_method_ast
+
+from ast_visitor import (
+  DetectLoadsAndStores,
+  DetectDecorators,
+  DetectIncorrectValueNext,
+  DetectMissingValueNext
+)
+
+_cache_dir    = os.environ.get( 'PYMTL_ANALYSIS_CACHE_DIR' )
+
+_asts         = {}
+_entries      = {}
+_file_hashes  = {}
+
+#-----------------------------------------------------------------------
+# set_cache_dir
+#-----------------------------------------------------------------------
+# Set the directory used to store analysis results on disk, or disable
+# the on-disk cache if path is None. Returns the previous directory.
+def set_cache_dir( path ):
+  global _cache_dir
+  prev, _cache_dir = _cache_dir, path
+  return prev
+
+#-----------------------------------------------------------------------
+# clear
+#-----------------------------------------------------------------------
+# Drop all analysis results held in memory. The on-disk cache, if any,
+# is left untouched.
+def clear():
+  _asts       .clear()
+  _entries    .clear()
+  _file_hashes.clear()
+
+#-----------------------------------------------------------------------
+# get_block_ast
+#-----------------------------------------------------------------------
+# Memoized version of get_method_ast(). Inner functions defined by the
+# same statement share a code object, so the AST is parsed once for all
+# instances of a model. The returned tree is shared and must not be
+# modified by the caller.
+def get_block_ast( func ):
+  code = func.func_code
+  try:
+    return _asts[ code ]
+  except KeyError:
+    result = _asts[ code ] = get_method_ast( func )
+    return result
+
+#-----------------------------------------------------------------------
+# loads_and_stores
+#-----------------------------------------------------------------------
+# Return the lists of names loaded and stored by the block func of
+# model, as detected by DetectLoadsAndStores.
+def loads_and_stores( model, func ):
+  entry = _get_entry( model, func )
+  if 'loads' not in entry:
+    tree, _ = get_block_ast( func )
+    loads, stores = DetectLoadsAndStores().enter( tree )
+    _update_entry( model, func, loads=loads, stores=stores )
+  return entry[ 'loads' ], entry[ 'stores' ]
+
+#-----------------------------------------------------------------------
+# decorators
+#-----------------------------------------------------------------------
+# Return the list of decorator names applied to the block func of model.
+def decorators( model, func ):
+  entry = _get_entry( model, func )
+  if 'decorators' not in entry:
+    tree, _ = get_block_ast( func )
+    _update_entry( model, func, decorators=DetectDecorators().enter( tree ) )
+  return entry[ 'decorators' ]
+
+#-----------------------------------------------------------------------
+# check_value_next
+#-----------------------------------------------------------------------
+# Check the block func of model for mistakes in the use of .value and
+# .next. Sequential blocks (kind='seq') may only write .next, and
+# combinational blocks (kind='comb') may only write .value. Only blocks
+# which pass are recorded, so a block with an error raises every time.
+def check_value_next( model, func, kind ):
+
+  if kind not in ( 'seq', 'comb' ):
+    raise ValueError( "Invalid block kind '{}', expected 'seq' or "
+                      "'comb'!".format( kind ) )
+
+  entry = _get_entry( model, func )
+  if ( 'lint_' + kind ) in entry:
+    return
+
+  tree, _ = get_block_ast( func )
+  if kind == 'seq':
+    DetectIncorrectValueNext( func, 'value' ).visit( tree )
+    DetectMissingValueNext  ( func, 'next'  ).visit( tree )
+  else:
+    DetectIncorrectValueNext( func, 'next'  ).visit( tree )
+    DetectMissingValueNext  ( func, 'value' ).visit( tree )
+
+  _update_entry( model, func, **{ 'lint_' + kind : True } )
+
+#-----------------------------------------------------------------------
+# _block_key
+#-----------------------------------------------------------------------
+# The key identifying the analysis results of a block: the class_name of
+# the model it belongs to, where it was defined, and a hash of the file
+# it was defined in.
+def _block_key( model, func ):
+  code = func.func_code
+  return ( model.class_name, code.co_filename, code.co_firstlineno,
+           code.co_name, _file_hash( code.co_filename ) )
+
+#-----------------------------------------------------------------------
+# _file_hash
+#-----------------------------------------------------------------------
+def _file_hash( filename ):
+  try:
+    return _file_hashes[ filename ]
+  except KeyError:
+    try:
+      with open( filename, 'rb' ) as fd:
+        digest = hashlib.sha1( fd.read() ).hexdigest()
+    except IOError:
+      digest = None
+    _file_hashes[ filename ] = digest
+    return digest
+
+#-----------------------------------------------------------------------
+# _get_entry
+#-----------------------------------------------------------------------
+# Return the (possibly empty) dictionary of analysis results for a
+# block, loading it from the on-disk cache if it is not in memory.
+def _get_entry( model, func ):
+
+  key = _block_key( model, func )
+  try:
+    return _entries[ key ]
+  except KeyError:
+    pass
+
+  entry = {}
+  path  = _entry_path( key )
+  if path and os.path.exists( path ):
+    try:
+      with open( path, 'rb' ) as fd:
+        entry = pickle.load( fd )
+    except Exception:
+      entry = {}
+
+  _entries[ key ] = entry
+  return entry
+
+#-----------------------------------------------------------------------
+# _update_entry
+#-----------------------------------------------------------------------
+# Add analysis results for a block, writing the entry through to the
+# on-disk cache if it is enabled.
+def _update_entry( model, func, **results ):
+
+  key   = _block_key( model, func )
+  entry = _entries[ key ]
+  entry.update( results )
+
+  path  = _entry_path( key )
+  if not path:
+    return
+
+  try:
+    os.makedirs( _cache_dir )
+  except OSError:
+    pass
+
+  try:
+    fd, tmp_path = tempfile.mkstemp( dir=_cache_dir, suffix='.tmp' )
+    with os.fdopen( fd, 'wb' ) as f:
+      pickle.dump( entry, f, pickle.HIGHEST_PROTOCOL )
+    os.rename( tmp_path, path )
+  except OSError:
+    pass
+
+#-----------------------------------------------------------------------
+# _entry_path
+#-----------------------------------------------------------------------
+def _entry_path( key ):
+  if not _cache_dir or key[-1] is None:
+    return None
+  name = hashlib.sha1( repr( key ) ).hexdigest()
+  return os.path.join( _cache_dir, name + '.pkl' )
@@ -0,0 +1,161 @@
+#=======================================================================
+# analysis_cache_test.py
+#=======================================================================
+
+import pytest
+
+from pymtl import *
+from pymtl import PyMTLError
+
+import analysis_cache
+
+#-----------------------------------------------------------------------
+# Fixtures
+#-----------------------------------------------------------------------
+
+@pytest.fixture
+def parses( monkeypatch ):
+
+  # Start each test with an empty in-memory cache and no cache directory,
+  # and count how many times a block is parsed.
+
+  monkeypatch.setattr( analysis_cache, '_asts',        {} )
+  monkeypatch.setattr( analysis_cache, '_entries',     {} )
+  monkeypatch.setattr( analysis_cache, '_file_hashes', {} )
+  monkeypatch.setattr( analysis_cache, '_cache_dir',   None )
+
+  calls = []
+  get_method_ast = analysis_cache.get_method_ast
+  def counting_get_method_ast( func ):
+    calls.append( func.func_name )
+    return get_method_ast( func )
+  monkeypatch.setattr( analysis_cache, 'get_method_ast',
+                       counting_get_method_ast )
+
+  return calls
+
+#-----------------------------------------------------------------------
+# Models
+#-----------------------------------------------------------------------
+
+class Router( Model ):
+  def __init__( s, nbits ):
+    s.in_ = InPort ( nbits )
+    s.out = OutPort( nbits )
+    s.tmp = Wire   ( nbits )
+
+    @s.combinational
+    def comb():
+      s.tmp.value = s.in_ + 1
+
+    @s.tick
+    def seq():
+      s.out.next = s.tmp
+
+class Mesh( Model ):
+  def __init__( s, nrouters ):
+    s.in_     = InPort ( 8 )
+    s.out     = OutPort( 8 )
+    s.routers = [ Router( 8 ) for _ in range( nrouters ) ]
+
+    s.connect( s.in_, s.routers[0].in_ )
+    for i in range( 1, nrouters ):
+      s.connect( s.routers[i-1].out, s.routers[i].in_ )
+    s.connect( s.routers[-1].out, s.out )
+
+def check_mesh( nrouters ):
+  model = Mesh( nrouters )
+  model.elaborate()
+  sim = SimulationTool( model )
+  model.in_.value = 3
+  sim.eval_combinational()
+  for _ in range( nrouters ):
+    sim.cycle()
+  assert model.out == 3 + nrouters
+
+#-----------------------------------------------------------------------
+# test_shared_across_instances
+#-----------------------------------------------------------------------
+
+def test_shared_across_instances( parses ):
+
+  check_mesh( 4 )
+  assert sorted( parses ) == [ 'comb', 'seq' ]
+
+  # A second simulator for the same design does not reparse anything
+
+  check_mesh( 4 )
+  assert sorted( parses ) == [ 'comb', 'seq' ]
+
+#-----------------------------------------------------------------------
+# test_keyed_on_class_name
+#-----------------------------------------------------------------------
+
+def test_keyed_on_class_name( parses ):
+
+  a = Router( 8 )
+  b = Router( 16 )
+  a.elaborate()
+  b.elaborate()
+  assert a.class_name != b.class_name
+
+  comb_a = a.get_combinational_blocks()[0]
+  comb_b = b.get_combinational_blocks()[0]
+  analysis_cache.loads_and_stores( a, comb_a )
+  analysis_cache.loads_and_stores( b, comb_b )
+
+  assert len( analysis_cache._entries ) == 2
+
+  # The AST is shared since both blocks have the same code object
+
+  assert parses == [ 'comb' ]
+
+#-----------------------------------------------------------------------
+# test_cache_dir
+#-----------------------------------------------------------------------
+
+def test_cache_dir( parses, tmpdir ):
+
+  analysis_cache.set_cache_dir( str( tmpdir ) )
+
+  check_mesh( 2 )
+  assert sorted( parses ) == [ 'comb', 'seq' ]
+  assert len( tmpdir.listdir() ) == 2
+
+  # A new process starts with an empty in-memory cache, but loads the
+  # analysis results from disk without reparsing
+
+  analysis_cache.clear()
+  del parses[:]
+
+  check_mesh( 2 )
+  assert parses == []
+
+#-----------------------------------------------------------------------
+# test_lint_errors_not_cached
+#-----------------------------------------------------------------------
+
+class BadBlock( Model ):
+  def __init__( s ):
+    s.in_ = InPort ( 8 )
+    s.out = OutPort( 8 )
+
+    @s.combinational
+    def comb():
+      s.out.next = s.in_
+
+def test_lint_errors_not_cached( parses ):
+
+  for _ in range( 2 ):
+    model = BadBlock()
+    model.elaborate()
+    with pytest.raises( PyMTLError ):
+      SimulationTool( model )
+
+def test_invalid_kind( parses ):
+
+  model = BadBlock()
+  model.elaborate()
+  with pytest.raises( ValueError ):
+    analysis_cache.check_value_next( model,
+      model.get_combinational_blocks()[0], 'posedge' )
@@ -0,0 +1,376 @@
+#=======================================================================
+# checkpoint.py
+#=======================================================================
+# Save and restore the full state of a SimulationTool.
+#
+# A checkpoint holds the current and next value of every net, the
+# registers with a pending .next write, the contents of all
+# MemoryArrays, the cycle count, the state of the global random number
+# generator, and the Python state registered by cycle-level and
+# functional-level models with Model.register_state().
+#
+# Net values are packed into arrays of unsigned longs (nets wider than a
+# long, usually 64 bits, are stored separately), and the whole
+# checkpoint is written as a single binary pickle, so restoring a
+# checkpoint only takes a single pass over the nets.
+#
+# Registered state is pickled with a few exceptions: Bits and BitStruct
+# values are stored as their value and type, and references to Models,
+# PortBundles and Signals (e.g., the ports an adapter drives) are not
+# stored at all and are kept as they are when restoring. Registered
+# containers and objects are restored in place, so other references to
+# them stay valid.
+#
+# Sequential blocks wrapped in greenlets (@tick_fl blocks) cannot be
+# checkpointed since the state of a paused greenlet cannot be saved.
+
+import os
+import sys
+import random
+import hashlib
+import tempfile
+import cPickle as pickle
+
+from array       import array
+from collections import deque
+
+from pymtl                    import PyMTLError
+from ...model.Model           import Model
+from ...model.PortBundle      import PortBundle
+from ...model.signals         import Signal
+from ...datatypes.Bits        import Bits, _new_bits
+from ...datatypes.BitStruct   import BitStruct
+
+import sim_utils
+
+CHECKPOINT_VERSION = 1
+
+_WORD_NBITS = array( 'L' ).itemsize * 8
+
+#-----------------------------------------------------------------------
+# save_checkpoint
+#-----------------------------------------------------------------------
+# Write the state of the simulator sim to the file path.
+def save_checkpoint( sim, path ):
+
+  _check_pausable_ticks( sim )
+
+  # Pack the values of all nets
+
+  order          = _net_order( sim )
+  narrow, wide   = _split_nets( sim, order )
+
+  narrow_values  = array( 'L', [ x._uint       for x in narrow ] )
+  narrow_nexts   = array( 'L', [ x._next._uint for x in narrow ] )
+
+  checkpoint = {
+    'version'        : CHECKPOINT_VERSION,
+    'class_name'     : sim.model.class_name,
+    'signature'      : _signature( sim, order ),
+    'word_nbits'     : _WORD_NBITS,
+    'ncycles'        : sim.ncycles,
+    'narrow_values'  : narrow_values.tostring(),
+    'narrow_nexts'   : narrow_nexts .tostring(),
+    'wide_values'    : [ ( x._uint, x._next._uint ) for x in wide ],
+    'register_queue' : _register_queue( sim, order ),
+    'memories'       : [ ( m._data, m._pending, m._fill )
+                         for m in sim._memories ],
+    'random'         : random.getstate(),
+    'state'          : _collect_state( sim ),
+  }
+
+  # Write to a temporary file first, so an interrupted save never leaves
+  # a truncated checkpoint behind
+
+  directory = os.path.dirname( os.path.abspath( path ) )
+  fd, tmp_path = tempfile.mkstemp( dir=directory, suffix='.tmp' )
+  try:
+    with os.fdopen( fd, 'wb' ) as f:
+      pickler = pickle.Pickler( f, pickle.HIGHEST_PROTOCOL )
+      pickler.persistent_id = _make_persistent_id( sim )
+      try:
+        pickler.dump( checkpoint )
+      except ( pickle.PicklingError, TypeError ) as e:
+        raise PyMTLError( "Cannot checkpoint the state registered by {}: "
+                          "{}".format( sim.model.class_name, e ) )
+    os.rename( tmp_path, path )
+  finally:
+    if os.path.exists( tmp_path ):
+      os.remove( tmp_path )
+
+#-----------------------------------------------------------------------
+# restore_checkpoint
+#-----------------------------------------------------------------------
+# Restore the state of the simulator sim from the file path, which must
+# have been saved from a simulator for the same design.
+def restore_checkpoint( sim, path ):
+
+  _check_pausable_ticks( sim )
+
+  with open( path, 'rb' ) as f:
+    unpickler = pickle.Unpickler( f )
+    unpickler.persistent_load = _persistent_load
+    checkpoint = unpickler.load()
+
+  if checkpoint[ 'version' ] != CHECKPOINT_VERSION:
+    raise ValueError( "Checkpoint {} has version {}, expected {}!".format(
+                      path, checkpoint[ 'version' ], CHECKPOINT_VERSION ) )
+
+  order = _net_order( sim )
+
+  if checkpoint[ 'word_nbits' ] != _WORD_NBITS:
+    raise ValueError( "Checkpoint {} was saved on a platform with {}-bit "
+                      "longs!".format( path, checkpoint[ 'word_nbits' ] ) )
+
+  if ( checkpoint[ 'class_name' ] != sim.model.class_name or
+       checkpoint[ 'signature'  ] != _signature( sim, order ) ):
+    raise ValueError( "Checkpoint {} was saved from {}, which does not "
+                      "match the simulated design {}!".format( path,
+                      checkpoint[ 'class_name' ], sim.model.class_name ) )
+
+  # Restore the values of all nets
+
+  narrow, wide  = _split_nets( sim, order )
+
+  narrow_values = array( 'L' )
+  narrow_nexts  = array( 'L' )
+  narrow_values.fromstring( checkpoint[ 'narrow_values' ] )
+  narrow_nexts .fromstring( checkpoint[ 'narrow_nexts'  ] )
+
+  for svalue, value, next in zip( narrow, narrow_values, narrow_nexts ):
+    svalue._uint       = value
+    svalue._next._uint = next
+
+  for svalue, ( value, next ) in zip( wide, checkpoint[ 'wide_values' ] ):
+    svalue._uint       = value
+    svalue._next._uint = next
+
+  # Requeue the registers with a pending .next write
+
+  dirty = sim._register_dirty
+  queue = sim._register_queue
+
+  for index in queue:
+    dirty[ index ] = 0
+  del queue[:]
+
+  for position in checkpoint[ 'register_queue' ]:
+    index = order[ position ]
+    dirty[ index ] = 1
+    queue.append( index )
+
+  # Restore the MemoryArrays
+
+  del sim._memory_queue[:]
+
+  for mvalue, ( data, pending, fill ) in zip( sim._memories,
+                                              checkpoint[ 'memories' ] ):
+    mvalue._data    = data
+    mvalue._pending = pending
+    mvalue._fill    = fill
+    mvalue._readers.clear()
+    if pending or fill is not None:
+      sim._memory_queue.append( mvalue )
+
+  # Restore the registered Python state
+
+  for ( m, name ), value in zip( _state_attrs( sim ), checkpoint[ 'state' ] ):
+    setattr( m, name, _restore( getattr( m, name ), value ) )
+
+  random.setstate( checkpoint[ 'random' ] )
+  sim.ncycles = checkpoint[ 'ncycles' ]
+
+  # Evaluate every combinational block in the design again on the next
+  # call to eval_combinational(), which also records the readers of
+  # memories
+
+  if sim._static_schedule is None:
+    for m in sim._models:
+      for func in m._newsenses:
+        sim._event_queue.enq( func.cb, func.id )
+
+#-----------------------------------------------------------------------
+# _check_pausable_ticks
+#-----------------------------------------------------------------------
+# Raise an error listing all greenlet-wrapped sequential blocks in the
+# design, since their paused state cannot be saved or restored.
+def _check_pausable_ticks( sim ):
+
+  pausable = [ '{}.{}'.format( m.name, func.func_name )
+               for m in sim_utils._get_all_models( sim.model )
+               for func in m.get_tick_blocks()
+               if hasattr( func, '_pausable_tick' ) ]
+
+  if pausable:
+    raise PyMTLError( "Cannot checkpoint {}, the following @tick_fl "
+                      "blocks are run as greenlets and their state cannot "
+                      "be saved: {}".format( sim.model.class_name,
+                                             ', '.join( pausable ) ) )
+
+#-----------------------------------------------------------------------
+# _split_nets
+#-----------------------------------------------------------------------
+# Return the SignalValues of the nets which fit in an unsigned long and
+# those which do not, in canonical net order.
+def _split_nets( sim, order ):
+  nets   = [ sim._registers[ i ] for i in order ]
+  narrow = [ x for x in nets if x.nbits <= _WORD_NBITS ]
+  wide   = [ x for x in nets if x.nbits >  _WORD_NBITS ]
+  return narrow, wide
+
+#-----------------------------------------------------------------------
+# _net_order
+#-----------------------------------------------------------------------
+# The order in which nets are numbered by the simulator depends on the
+# order of iteration over sets of Signals, so it changes between
+# simulators for the same design. Checkpoints instead store nets sorted
+# by the first hierarchical name ( e.g., top.src.out_val ) of the
+# signals in each net. Returns the simulator net index of each net in
+# that order.
+def _net_order( sim ):
+
+  paths = {}
+  def visit( m, prefix ):
+    for signal in m.get_ports() + m.get_wires():
+      paths[ id( signal ) ] = prefix + signal.name
+    for child in m.get_submodules():
+      visit( child, prefix + child.name + '.' )
+  visit( sim.model, '' )
+
+  keys = [ min( paths[ id( x ) ] for x in net if id( x ) in paths )
+           for net in sim._nets ]
+
+  return sorted( range( len( keys ) ), key=keys.__getitem__ )
+
+#-----------------------------------------------------------------------
+# _signature
+#-----------------------------------------------------------------------
+# Hash of the bitwidths of all nets, memories and the registered state,
+# used to detect checkpoints saved from a different design.
+def _signature( sim, order ):
+  layout = ( [ sim._registers[ i ].nbits for i in order ],
+             [ ( m.nentries, m.nbits ) for m in sim._memories ],
+             [ name for _, name in _state_attrs( sim ) ] )
+  return hashlib.sha1( repr( layout ) ).hexdigest()
+
+#-----------------------------------------------------------------------
+# _register_queue
+#-----------------------------------------------------------------------
+# Return the canonical positions of the registers with a pending .next
+# write.
+def _register_queue( sim, order ):
+  position = dict( ( index, i ) for i, index in enumerate( order ) )
+  return [ position[ index ] for index in sim._register_queue ]
+
+#-----------------------------------------------------------------------
+# _state_attrs
+#-----------------------------------------------------------------------
+# List the ( model, attribute name ) pairs of all registered state.
+def _state_attrs( sim ):
+  return [ ( m, name ) for m in sim_utils._get_all_models( sim.model )
+                       for name in m.get_state_names() ]
+
+#-----------------------------------------------------------------------
+# _collect_state
+#-----------------------------------------------------------------------
+def _collect_state( sim ):
+  state = []
+  for m, name in _state_attrs( sim ):
+    try:
+      state.append( getattr( m, name ) )
+    except AttributeError:
+      raise PyMTLError( "{} registered state '{}' which does not "
+                        "exist!".format( m.name, name ) )
+  return state
+
+#-----------------------------------------------------------------------
+# _make_persistent_id
+#-----------------------------------------------------------------------
+# Bits are stored as their value, BitStructs also store the definition
+# and arguments used to create their class. Models and the signals of
+# the design (including the SignalValues of nets) are not stored.
+def _make_persistent_id( sim ):
+
+  nets = set( id( x ) for x in sim._registers )
+
+  def persistent_id( obj ):
+
+    if isinstance( obj, ( Model, PortBundle, Signal ) ) or id( obj ) in nets:
+      return ( 'keep', )
+
+    if isinstance( obj, BitStruct ):
+      cls = type( obj )
+      if getattr( sys.modules.get( cls._module ), cls._classname, None ) \
+         is None:
+        raise pickle.PicklingError( "BitStruct {} is not defined at the "
+                                    "top level of a module".format(
+                                    cls._classname ) )
+      return ( 'bitstruct', cls._module, cls._classname, cls._args,
+               obj._uint )
+
+    if isinstance( obj, Bits ):
+      return ( 'bits', obj.nbits, obj._uint )
+
+    return None
+
+  return persistent_id
+
+#-----------------------------------------------------------------------
+# _persistent_load
+#-----------------------------------------------------------------------
+
+class _Keep( object ):
+  pass
+
+def _persistent_load( pid ):
+
+  if pid[0] == 'bitstruct':
+    _, module, classname, args, value = pid
+    __import__( module )
+    obj = getattr( sys.modules[ module ], classname )( *args )
+    obj._uint = value
+    return obj
+
+  if pid[0] == 'bits':
+    return _new_bits( pid[1], pid[2] )
+
+  return _Keep()
+
+#-----------------------------------------------------------------------
+# _restore
+#-----------------------------------------------------------------------
+# Return the restored value of an attribute whose current value is
+# current. Containers and plain objects of the same type are updated in
+# place, references which were not stored are kept.
+def _restore( current, value ):
+
+  if isinstance( value, _Keep ):
+    return current
+
+  if type( current ) is not type( value ) or isinstance( value, Bits ):
+    return value
+
+  if isinstance( current, ( list, bytearray ) ):
+    if isinstance( current, list ) and len( current ) == len( value ):
+      value = [ _restore( x, y ) for x, y in zip( current, value ) ]
+    current[:] = value
+
+  elif isinstance( current, deque ):
+    current.clear()
+    current.extend( value )
+
+  elif isinstance( current, dict ):
+    current.clear()
+    current.update( value )
+
+  elif isinstance( current, random.Random ):
+    current.setstate( value.getstate() )
+
+  elif hasattr( current, '__dict__' ) and not isinstance( current, type ):
+    for name, x in value.__dict__.items():
+      setattr( current, name, _restore( getattr( current, name, None ), x ) )
+
+  else:
+    return value
+
+  return current
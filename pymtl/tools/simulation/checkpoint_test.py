@@ -0,0 +1,304 @@
+#=======================================================================
+# checkpoint_test.py
+#=======================================================================
+
+import pytest
+import random
+
+from copy        import deepcopy
+from collections import deque
+
+from pymtl import *
+from pymtl import PyMTLError
+
+#-----------------------------------------------------------------------
+# Models
+#-----------------------------------------------------------------------
+
+class Accumulator( Model ):
+  def __init__( s ):
+    s.in_   = InPort ( 8 )
+    s.out   = OutPort( 8 )
+    s.wide  = OutPort( 100 )
+    s.hist  = OutPort( 8 )
+
+    s.acc   = Wire( 8 )
+    s.lo    = Wire( 4 )
+    s.mem   = MemoryArray( 8, 8 )
+
+    s.connect( s.lo, s.acc[0:4] )
+
+    @s.posedge_clk
+    def seq():
+      if s.reset:
+        s.acc.next  = 0
+        s.wide.next = 0
+        s.mem.next  = 0
+      else:
+        s.acc.next  = s.acc + s.in_
+        s.wide.next = ( s.wide << 7 ) | s.acc
+        s.mem[ s.acc[0:3] ].next = s.in_
+
+    @s.combinational
+    def comb():
+      s.out.value  = s.acc + s.lo
+      s.hist.value = s.mem[ s.in_[0:3] ]
+
+class Harness( Model ):
+  def __init__( s ):
+    s.in_  = InPort ( 8 )
+    s.out  = OutPort( 8 )
+    s.accs = [ Accumulator() for _ in range( 2 ) ]
+
+    s.connect( s.in_,          s.accs[0].in_ )
+    s.connect( s.accs[0].out,  s.accs[1].in_ )
+    s.connect( s.accs[1].hist, s.out )
+
+def outputs( model ):
+  return ( int( model.out ), int( model.accs[0].wide ),
+           int( model.accs[1].wide ) )
+
+def drive( model, sim, ncycles ):
+  trace = []
+  for i in range( ncycles ):
+    model.in_.value = ( 7 * sim.ncycles + 3 ) % 256
+    sim.cycle()
+    trace.append( outputs( model ) )
+  return trace
+
+def mk_sim( **kwargs ):
+  model = Harness()
+  model.elaborate()
+  return model, SimulationTool( model, **kwargs )
+
+#-----------------------------------------------------------------------
+# test_roundtrip
+#-----------------------------------------------------------------------
+
+@pytest.mark.parametrize( 'kwargs', [
+  {},
+  { 'schedule' : 'static' },
+  { 'compile_ticks' : True },
+])
+def test_roundtrip( tmpdir, kwargs ):
+
+  path = str( tmpdir.join( 'sim.ckpt' ) )
+
+  model, sim = mk_sim( **kwargs )
+  sim.reset()
+  drive( model, sim, 30 )
+
+  # Include a pending .next write in the checkpoint
+
+  model.accs[0].acc.next = 5
+  sim.save_checkpoint( path )
+  expected = drive( model, sim, 30 )
+
+  # Restore into a new simulator for the same design
+
+  model, sim = mk_sim( **kwargs )
+  sim.restore_checkpoint( path )
+  assert sim.ncycles == 32
+  assert drive( model, sim, 30 ) == expected
+
+  # Rewind the same simulator
+
+  sim.restore_checkpoint( path )
+  assert drive( model, sim, 30 ) == expected
+
+#-----------------------------------------------------------------------
+# test_submodel_memory
+#-----------------------------------------------------------------------
+# Combinational blocks of submodels which read a memory must be woken by
+# writes to the memory after a restore.
+
+class MemReader( Model ):
+  def __init__( s ):
+    s.addr    = InPort ( 2 )
+    s.wr_en   = InPort ( 1 )
+    s.wr_data = InPort ( 8 )
+    s.rd_data = OutPort( 8 )
+
+    s.mem     = MemoryArray( 4, 8 )
+
+    @s.posedge_clk
+    def seq():
+      if s.wr_en:
+        s.mem[ s.addr ].next = s.wr_data
+
+    @s.combinational
+    def comb():
+      s.rd_data.value = s.mem[ s.addr ]
+
+class MemTop( Model ):
+  def __init__( s ):
+    s.addr    = InPort ( 2 )
+    s.wr_en   = InPort ( 1 )
+    s.wr_data = InPort ( 8 )
+    s.rd_data = OutPort( 8 )
+
+    s.reader  = MemReader()
+    s.connect_auto( s.reader )
+
+@pytest.mark.parametrize( 'kwargs', [
+  {},
+  { 'compile_ticks' : True },
+])
+def test_submodel_memory( tmpdir, kwargs ):
+
+  path = str( tmpdir.join( 'sim.ckpt' ) )
+
+  def write( model, sim, data ):
+    model.addr   .value = 2
+    model.wr_en  .value = 1
+    model.wr_data.value = data
+    sim.cycle()
+    model.wr_en  .value = 0
+    sim.eval_combinational()
+
+  model = MemTop()
+  model.elaborate()
+  sim = SimulationTool( model, **kwargs )
+  sim.reset()
+  write( model, sim, 0x33 )
+  assert model.rd_data == 0x33
+  sim.save_checkpoint( path )
+
+  # Restore into a new simulator, then rewind the same simulator
+
+  model = MemTop()
+  model.elaborate()
+  sim = SimulationTool( model, **kwargs )
+
+  for data in [ 0x55, 0x77 ]:
+    sim.restore_checkpoint( path )
+    sim.eval_combinational()
+    assert model.rd_data == 0x33
+    write( model, sim, data )
+    assert model.rd_data == data
+
+#-----------------------------------------------------------------------
+# test_registered_state
+#-----------------------------------------------------------------------
+
+class PairMsg( BitStructDefinition ):
+  def __init__( s, nbits ):
+    s.a = BitField( nbits )
+    s.b = BitField( nbits )
+
+class InAdapter( object ):
+  def __init__( s, in_ ):
+    s.in_  = in_
+    s.data = deque( maxlen=4 )
+
+class RandomSink( Model ):
+  def __init__( s ):
+    s.in_     = InPort( PairMsg( 4 ) )
+    s.adapter = InAdapter( s.in_ )
+    s.rgen    = random.Random( 0x1234 )
+    s.log     = []
+    s.count   = 0
+
+    s.register_state( 'adapter', 'rgen', 'log', 'count' )
+
+    @s.tick
+    def tick():
+      if s.rgen.random() < 0.5:
+        s.adapter.data.append( deepcopy( s.in_ ) )
+      if len( s.adapter.data ) == 4:
+        s.log.append( s.adapter.data.popleft().a )
+      s.count += 1
+
+def test_registered_state( tmpdir ):
+
+  path = str( tmpdir.join( 'sim.ckpt' ) )
+
+  def run( model, sim ):
+    for i in range( 20 ):
+      model.in_.value = sim.ncycles % 256
+      sim.cycle()
+    return list( model.log ), list( model.adapter.data ), model.count
+
+  model = RandomSink()
+  model.elaborate()
+  sim = SimulationTool( model )
+  run( model, sim )
+  sim.save_checkpoint( path )
+  expected = run( model, sim )
+
+  model   = RandomSink()
+  model.elaborate()
+  sim     = SimulationTool( model )
+  adapter = model.adapter
+  in_     = adapter.in_
+  log     = model.log
+  sim.restore_checkpoint( path )
+
+  # Objects and containers are restored in place, and references to
+  # ports are left untouched
+
+  assert model.adapter is adapter
+  assert model.log     is log
+  assert adapter.in_   is in_
+  assert type( adapter.data[0] ) is type( model.in_ )
+
+  assert run( model, sim ) == expected
+
+#-----------------------------------------------------------------------
+# test_mismatch
+#-----------------------------------------------------------------------
+
+def test_mismatch( tmpdir ):
+
+  path = str( tmpdir.join( 'sim.ckpt' ) )
+
+  model, sim = mk_sim()
+  sim.save_checkpoint( path )
+
+  model = Accumulator()
+  model.elaborate()
+  sim = SimulationTool( model )
+  with pytest.raises( ValueError ):
+    sim.restore_checkpoint( path )
+
+#-----------------------------------------------------------------------
+# test_pausable_tick
+#-----------------------------------------------------------------------
+
+class PausableTick( Model ):
+  def __init__( s ):
+    s.out = OutPort( 8 )
+
+    @s.tick_fl
+    def logic():
+      s.out.next = s.out + 1
+
+def test_pausable_tick( tmpdir ):
+
+  model = PausableTick()
+  model.elaborate()
+  sim = SimulationTool( model )
+
+  with pytest.raises( PyMTLError ) as excinfo:
+    sim.save_checkpoint( str( tmpdir.join( 'sim.ckpt' ) ) )
+  assert 'logic' in str( excinfo.value )
+  assert tmpdir.listdir() == []
+
+#-----------------------------------------------------------------------
+# test_unpicklable_state
+#-----------------------------------------------------------------------
+
+class UnpicklableState( Model ):
+  def __init__( s ):
+    s.func = lambda: 0
+    s.register_state( 'func' )
+
+def test_unpicklable_state( tmpdir ):
+
+  model = UnpicklableState()
+  model.elaborate()
+  sim = SimulationTool( model )
+
+  with pytest.raises( PyMTLError ):
+    sim.save_checkpoint( str( tmpdir.join( 'sim.ckpt' ) ) )
+  assert tmpdir.listdir() == []
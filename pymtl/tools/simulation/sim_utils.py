@@ -2,18 +2,18 @@
 # sim_utils.py
 #=======================================================================
 
+import ast
+import inspect
 import warnings
+import collections
 import greenlet
 
-from ..ast_helpers            import get_method_ast
-from ...datatypes.SignalValue import SignalValue
+from ..ast_helpers                 import get_method_ast
+from ...datatypes.SignalValue      import SignalValue
+from ...datatypes.Bits             import Bits
+from ...datatypes.MemoryArrayValue import MemoryArrayValue
 
-from ast_visitor import (
-  DetectLoadsAndStores,
-  DetectDecorators,
-  DetectIncorrectValueNext,
-  DetectMissingValueNext
-)
+import analysis_cache
 
 #-----------------------------------------------------------------------
 # collect_signals
@@ -107,15 +107,28 @@ def insert_signal_values( sim, nets ):
   #-------------------------------------------------------------------
   # create_seq_update_cb
   #-------------------------------------------------------------------
-  def create_seq_update_cb( sim, svalue ):
+  # Registers are queued by their index into sim._registers. The dirty
+  # bitmap makes sure each register is queued at most once per cycle no
+  # matter how many times its .next is written.
+  def create_seq_update_cb( sim, index ):
+    queue = sim._register_queue
+    dirty = sim._register_dirty
     def notify_sim_seq_update():
-      sim._register_queue.append( svalue )
+      if not dirty[ index ]:
+        dirty[ index ] = 1
+        queue.append( index )
     return notify_sim_seq_update
 
+  # Preallocate the register state: one slot per net for the SignalValue
+  # and its dirty bit.
+
+  sim._registers      = [ None ] * len( nets )
+  sim._register_dirty = bytearray( len( nets ) )
+
   # Each grouping represents a single SignalValue object. Perform a swap
   # so that all attributes currently pointing to Signal objects in this
   # grouping instead point to the SignalValue.
-  for group in nets:
+  for index, group in enumerate( nets ):
 
     # Get an element out of the set and use it to determine the bitwidth
     # of the net, needed to create a properly sized SignalValue object.
@@ -133,7 +146,8 @@ def insert_signal_values( sim, nets ):
     # Add a callback to the SignalValue to notify SimulationTool every
     # time a sequential update occurs (.next is written).
     # TODO: currently all signals get this, necessary?
-    svalue.notify_sim_seq_update = create_seq_update_cb ( sim, svalue )
+    svalue.notify_sim_seq_update = create_seq_update_cb ( sim, index  )
+    sim._registers[ index ]      = svalue
 
     # Create a callback for the SignalValue to notify SimulationTool
     # every time a combinational update occurs (.value is written).
@@ -166,39 +180,71 @@ def insert_signal_values( sim, nets ):
 # Sequential logic blocks get executed any time cycle() is called.
 def register_seq_blocks( model ):
 
-  all_models = []
-  def create_model_list( current ):
-    all_models.append( current )
-    for m in current.get_submodules():
-      create_model_list( m )
-
-  create_model_list( model )
-
   sequential_blocks = []
-  for i in all_models:
+  for i in _get_all_models( model ):
     for func in i.get_tick_blocks() + i.get_posedge_clk_blocks():
 
-      # Grab the AST and src code of each function
-      tree, src = get_method_ast( func )
-
-      # Check there were no mistakes in use of .value/.next
-      DetectIncorrectValueNext( func, 'value' ).visit( tree )
-      DetectMissingValueNext  ( func, 'next'  ).visit( tree )
+      # Check there were no mistakes in use of .value/.next. The AST of
+      # each function is parsed and analyzed once per model class.
+      analysis_cache.check_value_next( i, func, 'seq' )
 
       # If function is decorated with tick_fl, wrap it with a greenlet
-      if 'tick_fl' in DetectDecorators().enter( tree ):
+      if 'tick_fl' in analysis_cache.decorators( i, func ):
         func = _pausable_tick( func )
 
       sequential_blocks.append( func )
 
     for func in i.get_combinational_blocks():
-
-      tree, _ = get_method_ast( func )
-      DetectIncorrectValueNext( func, 'next'  ).visit( tree )
-      DetectMissingValueNext  ( func, 'value' ).visit( tree )
+      analysis_cache.check_value_next( i, func, 'comb' )
 
   return sequential_blocks
 
+#-----------------------------------------------------------------------
+# register_memories
+#-----------------------------------------------------------------------
+# Replace each MemoryArray in the design with a MemoryArrayValue. The
+# entries written through .next are flopped along with the registers,
+# and readers are recorded per entry: a combinational block is only put
+# on the event queue when an entry it read during its last evaluation
+# changes (or, through its regular sensitivity list, when the address
+# it read changes).
+def register_memories( sim, model ):
+
+  def wake( readers ):
+    for func in readers:
+      if func != sim._current_func:
+        sim._event_queue.enq( func.cb, func.id )
+
+  for m in _get_all_models( model ):
+    for memory in m.get_memories():
+
+      mvalue = MemoryArrayValue( memory.nentries, memory.dtype )
+
+      mvalue.notify_sim_seq_update = \
+        lambda mvalue=mvalue: sim._memory_queue.append( mvalue )
+      mvalue.current_reader = lambda: sim._current_func
+      mvalue.wake           = wake
+
+      setattr( m, memory.name, mvalue )
+      memory._signalvalue = mvalue
+      sim._memories.append( mvalue )
+
+#-----------------------------------------------------------------------
+# _get_all_models
+#-----------------------------------------------------------------------
+# Utility function to list all models in the design in pre-order, the
+# same order used to register sequential blocks.
+def _get_all_models( model ):
+
+  all_models = []
+  def create_model_list( current ):
+    all_models.append( current )
+    for m in current.get_submodules():
+      create_model_list( m )
+
+  create_model_list( model )
+  return all_models
+
 #---------------------------------------------------------------------
 # register_comb_blocks
 #---------------------------------------------------------------------
@@ -211,8 +257,7 @@ def register_comb_blocks( model, event_queue ):
   # TODO: do before or after we swap value nodes?
 
   for func in model.get_combinational_blocks():
-    tree, _ = get_method_ast( func )
-    loads, stores = DetectLoadsAndStores().enter( tree )
+    loads, stores = analysis_cache.loads_and_stores( model, func )
     for name in loads:
       _add_senses( func, model, name )
 
@@ -230,13 +275,16 @@ def register_comb_blocks( model, event_queue ):
     #self.metrics.reg_eval( func_ptr.cb )
     for signal_value in sensitivity_list:
 
-      # Only add "notify_sim" funcs if @comb blocks are sensitive to us
-      signal_value.notify_sim_comb_update = signal_value._ucb
+      # Only add "notify_sim" funcs if @comb blocks are sensitive to us.
+      # MemoryArrays instead wake up the readers of each entry directly
+      # (see register_memories).
+      if not isinstance( signal_value, MemoryArrayValue ):
+        signal_value.notify_sim_comb_update = signal_value._ucb
+        signal_value.register_callback( func_ptr )
 
       # Prime the simulation by putting all events on the event_queue
       # This will make sure all nodes come out of reset in a consistent
       # state. TODO: put this in reset() instead?
-      signal_value.register_callback( func_ptr )
       event_queue.enq( func_ptr.cb, func_ptr.id )
 
       #self._DEBUG_signal_cbs[ signal_value ].append( func_ptr )
@@ -251,28 +299,44 @@ def register_comb_blocks( model, event_queue ):
 # Utility function to recursively add signals/lists of signals to
 # the sensitivity list.
 def _add_senses( func, model, name ):
+  model._newsenses[ func ].extend( _name_to_signal_values( model, name ) )
+
+#-----------------------------------------------------------------------
+# _name_to_signal_values
+#-----------------------------------------------------------------------
+# Utility function to recursively turn a name acquired from the ast into
+# a list of the net SignalValues it refers to.
+def _name_to_signal_values( model, name ):
   obj = _attr_name_to_object( model, name )
   # If name_to_object returned a tuple, this is a list inside of a
   # for loop.  Iteratively go through each object in the list and
-  # recursively call add_senses on it.
+  # recursively call _name_to_signal_values on it.
   if   isinstance( obj, tuple ):
     obj_list, list_name, attr = obj
+    svalues = []
     for i, o in enumerate( obj_list ):
       obj_name = "{}[{}]{}".format( list_name, i, attr )
-      _add_senses( func, model, obj_name )
+      svalues.extend( _name_to_signal_values( model, obj_name ) )
+    return svalues
+
+  # MemoryArrays are a single object covering all entries
+  elif isinstance( obj, MemoryArrayValue ):
+    return [ obj ]
 
-  # If this is a signal value, add it to the sensitivity list
+  # If this is a signal value, return the net it belongs to
   elif isinstance( obj, SignalValue ):
 
     # Distinguish between attributes storing signals (InPort/OutPort/Wire)
     # and SignalValues (e.g., Bits), by checking the _ucb attribute.
     target_bits = obj._target_bits
     if hasattr( target_bits, '_ucb' ):
-      model._newsenses[ func ].append( target_bits )
+      return [ target_bits ]
     elif model._debug:
       warnings.warn( "Cannot add SignalValue '{}' to sensitivity list."
                      "".format( name ), Warning )
 
+  return []
+
 #-----------------------------------------------------------------------
 # _attr_name_to_object
 #-----------------------------------------------------------------------
@@ -298,16 +362,29 @@ def _attr_name_to_object( model, name ):
   # list. Return a tuple containing the list object, the list name
   # and the attribute string the appears after the list indexing.
   try:
-    x = eval( name )
-    if   isinstance( x, SignalValue ): return x
-    elif isinstance( x, list        ): return ( x, name, extra )
-    else:                              raise NameError
+    x = eval( _compile_name( name ) )
+    if   isinstance( x, SignalValue      ): return x
+    elif isinstance( x, MemoryArrayValue ): return x
+    elif isinstance( x, list             ): return ( x, name, extra )
+    else:                                   raise NameError
   except NameError:
     if model._debug:
       warnings.warn( "Cannot add variable '{}' to sensitivity list."
                      "".format( name ), Warning )
     return None
 
+#-----------------------------------------------------------------------
+# _compile_name
+#-----------------------------------------------------------------------
+# The same names are resolved for every instance of a model, so compile
+# each name once rather than parsing it on every call to eval.
+_compiled_names = {}
+def _compile_name( name ):
+  try:
+    return _compiled_names[ name ]
+  except KeyError:
+    code = _compiled_names[ name ] = compile( name, '<string>', 'eval' )
+    return code
 
 #-----------------------------------------------------------------------
 # create_slice_callbacks
@@ -329,6 +406,7 @@ def create_slice_callbacks( slice_connects, event_queue ):
     # and put it on the combinational event queue.
     else:
       func_ptr     = _create_slice_cb_closure( c )
+      c._slice_cb  = func_ptr
       signal_value = c.src_node._signalvalue
       signal_value.register_slice( func_ptr )
       func_ptr.id = event_queue.get_id()
@@ -346,6 +424,22 @@ def _create_slice_cb_closure( c ):
   dest      = c.dest_node._signalvalue
   src_addr  = c.src_slice  if c.src_slice  != None else slice( None )
   dest_bits = dest[ c.dest_slice ] if c.dest_slice != None else dest
+
+  # For Bits we can read the sliced bits straight out of the source
+  # value, without creating a new BitSlice each time the callback fires.
+  if isinstance( src, Bits ):
+    if isinstance( src_addr, slice ):
+      start = int( src_addr.start ) if src_addr.start is not None else 0
+      stop  = int( src_addr.stop  ) if src_addr.stop  is not None else \
+              src.nbits
+    else:
+      start = int( src_addr )
+      stop  = start + 1
+    mask = ( 1 << ( stop - start ) ) - 1
+    def slice_cb():
+      dest_bits.v = ( src._uint >> start ) & mask
+    return slice_cb
+
   def slice_cb():
     # We need to slice the src each time.  This is because writing
     # to a BitSlice will updates the Bits it was sliced from, but
@@ -354,6 +448,347 @@ def _create_slice_cb_closure( c ):
   return slice_cb
 
 
+#-----------------------------------------------------------------------
+# create_static_schedule
+#-----------------------------------------------------------------------
+# Levelize all @combinational blocks and slice callbacks registered by
+# register_comb_blocks() and create_slice_callbacks() into a single
+# fixed evaluation order. Each block is placed after every block which
+# writes a net it reads, so a single pass over the schedule leaves all
+# nets in a consistent state. Returns None if the blocks contain a
+# combinational cycle, in which case the simulator must fall back to the
+# event queue.
+def create_static_schedule( model, slice_connects ):
+
+  # Nets are keyed by id() throughout since SignalValues compare (and
+  # BitStructs hash) by value.
+
+  reads  = collections.OrderedDict()
+  writes = {}
+
+  # Collect the nets read and written by each @combinational block. The
+  # reads are exactly the sensitivity list, the writes are found by
+  # re-parsing the block and resolving each store to its net.
+
+  def visit_models( m ):
+    for func in m.get_combinational_blocks():
+      if func not in m._newsenses:
+        continue
+      _, stores = analysis_cache.loads_and_stores( m, func )
+      reads [ func ] = set( id( x ) for x in m._newsenses[ func ] )
+      writes[ func ] = set()
+      for name in stores:
+        writes[ func ].update( id( x ) for x in
+                               _name_to_signal_values( m, name ) )
+    for subm in m.get_submodules():
+      visit_models( subm )
+
+  visit_models( model )
+
+  # Slice callbacks read the net on the source side of the connection
+  # and write the net on the destination side.
+
+  for c in slice_connects:
+    func = getattr( c, '_slice_cb', None )
+    if func is not None:
+      reads [ func ] = set([ id( c.src_node ._signalvalue ) ])
+      writes[ func ] = set([ id( c.dest_node._signalvalue ) ])
+
+  return levelize_blocks( reads, writes )
+
+#-----------------------------------------------------------------------
+# levelize_blocks
+#-----------------------------------------------------------------------
+# Order the blocks described by the reads and writes dictionaries (each
+# mapping a block to the set of nets it reads or writes) so that every
+# block comes after all blocks writing a net it reads. Blocks are
+# seeded in the iteration order of reads, which should be an
+# OrderedDict for the schedule to be deterministic. Returns None if the
+# blocks contain a cycle.
+def levelize_blocks( reads, writes ):
+
+  # Build the dependency graph: an edge from each writer of a net to
+  # each reader of that net. Self-edges are ignored, the event queue
+  # never reschedules the block that is currently executing either.
+
+  writers = collections.defaultdict( set )
+  for func, nets in writes.items():
+    for net in nets:
+      writers[ net ].add( func )
+
+  succs   = { func: set() for func in reads }
+  indeg   = { func: 0     for func in reads }
+  for func, nets in reads.items():
+    for net in nets:
+      for writer in writers[ net ]:
+        if writer is not func and func not in succs[ writer ]:
+          succs[ writer ].add( func )
+          indeg[ func ] += 1
+
+  # Kahn's algorithm, seeded in registration order so the schedule is
+  # deterministic from run to run.
+
+  ready    = collections.deque( f for f in reads if indeg[ f ] == 0 )
+  schedule = []
+  while ready:
+    func = ready.popleft()
+    schedule.append( func )
+    for succ in succs[ func ]:
+      indeg[ succ ] -= 1
+      if indeg[ succ ] == 0:
+        ready.append( succ )
+
+  if len( schedule ) != len( reads ):
+    return None
+
+  return schedule
+
+#-----------------------------------------------------------------------
+# compile_seq_blocks
+#-----------------------------------------------------------------------
+# Generate a single function which executes every sequential block
+# registered by register_seq_blocks() in order, then flops every register
+# whose .next is written by one of those blocks. Where possible the body
+# of each block is inlined into the generated function to avoid the
+# per-block call overhead. Blocks we cannot safely inline (greenlet
+# wrapped @tick_fl blocks, blocks defining functions, classes or
+# lambdas, using global, exec or yield, or returning from inside a loop)
+# are called instead.
+#
+# Registers flopped by the generated function no longer notify the
+# simulator when their .next is written, all other writes still go
+# through the simulator register queue. Since these registers are
+# flopped whether or not their .next was written this cycle, nets with
+# any other driver (a .value write in any block, a slice connection, or
+# a top-level input port) are never flopped by the generated function.
+# When a register flopped by the generated function changes value, the
+# first byte of the changed bytearray (if given) is set to 1.
+#
+# Global names referenced by inlined blocks are looked up in the globals
+# of their module every time the function runs, so rebinding a global
+# during simulation behaves as it does for the uncompiled blocks.
+def compile_seq_blocks( model, sequential_blocks, slice_connects,
+                        changed = None ):
+
+  body       = []
+  namespace  = { '_changed' : bytearray( 1 ) if changed is None else changed }
+  registers  = collections.OrderedDict()
+
+  funcs = [ f for m in _get_all_models( model )
+              for f in m.get_tick_blocks() + m.get_posedge_clk_blocks() ]
+  assert len( funcs ) == len( sequential_blocks )
+
+  # Find every net driven other than through .next. A block may contain
+  # .next writes which never execute (e.g., TestRandomDelay returns
+  # early when connected straight through), flopping those nets every
+  # cycle would clobber the value written by their actual driver.
+
+  drivers = set( id( x._signalvalue ) for x in model.get_inports() )
+  for c in slice_connects:
+    drivers.add( id( c.dest_node._signalvalue ) )
+  for m in _get_all_models( model ):
+    for func in m.get_combinational_blocks() + m.get_tick_blocks() + \
+                m.get_posedge_clk_blocks():
+      _, stores = analysis_cache.loads_and_stores( m, func )
+      for name in stores:
+        if not name.endswith( ('.next', '.n') ):
+          drivers.update( id( x ) for x in _name_to_signal_values( m, name ) )
+
+  for i, ( func, seq_block ) in enumerate( zip( funcs, sequential_blocks ) ):
+
+    tree, _ = get_method_ast( func )
+    funcdef = tree.body[0]
+
+    # Find all registers whose .next is written by this block. Writes
+    # through a list index could target any element, flopping all of
+    # them unconditionally would clobber the others, so these writes are
+    # left to the register queue.
+
+    _, stores = analysis_cache.loads_and_stores( func._model, func )
+    for name in stores:
+      if name.endswith( ('.next', '.n') ):
+        name = name.rsplit( '.', 1 )[0]
+        if isinstance( _attr_name_to_object( func._model, name ), tuple ):
+          continue
+        for svalue in _name_to_signal_values( func._model, name ):
+          if isinstance( svalue, MemoryArrayValue ):
+            continue
+          if id( svalue ) not in registers and id( svalue ) not in drivers:
+            registers[ id( svalue ) ] = svalue
+
+    # Inline the block if possible, otherwise call it
+
+    stmts = None
+    if seq_block is func:
+      stmts = _inline_seq_block( func, funcdef, '_{}_'.format( i ), namespace )
+
+    if stmts is None:
+      namespace[ '_f{}'.format( i ) ] = seq_block
+      stmts = ast.parse( '_f{}()'.format( i ) ).body
+
+    body.extend( stmts )
+
+  # Flop every register found above, then stop notifying the simulator
+  # about writes to their .next since they are flopped every cycle.
+
+  for i, svalue in enumerate( registers.values() ):
+    namespace[ '_r{}'.format( i ) ] = svalue
+    body.extend( ast.parse( 'if _r{0}._next != _r{0}:\n'
+                            '  _r{0}.v = _r{0}._next\n'
+                            '  _changed[0] = 1'.format( i ) ).body )
+    if 'notify_sim_seq_update' in vars( svalue ):
+      del svalue.notify_sim_seq_update
+
+  if not body:
+    body = [ ast.Pass() ]
+
+  # Generate the function and exec it
+
+  module = ast.Module( body = [
+    ast.FunctionDef( name = 'seq_blocks', args = ast.arguments(
+                       args = [], vararg = None, kwarg = None, defaults = [] ),
+                     body = body, decorator_list = [] )
+  ])
+  ast.fix_missing_locations( module )
+
+  code = compile( module, '<compiled seq_blocks: {}>'.format( model.name ),
+                  'exec' )
+  exec code in namespace
+
+  return namespace[ 'seq_blocks' ]
+
+#-----------------------------------------------------------------------
+# _inline_seq_block
+#-----------------------------------------------------------------------
+# Utility function to rename all names used by the body of a sequential
+# block so it can be inlined into the compiled function. Locals are
+# prefixed, free variables are prefixed and bound to their value in
+# namespace (their cells can no longer be rebound once the enclosing
+# constructor has returned), and globals are looked up in the globals
+# dict of the block bound in namespace. Returns None if the block can't
+# be inlined.
+def _inline_seq_block( func, funcdef, prefix, namespace ):
+
+  if not _InlineChecker().check( funcdef ):
+    return None
+
+  code     = func.func_code
+  closure  = func.func_closure or ()
+  try:
+    freevars = dict( zip( code.co_freevars,
+                          [ c.cell_contents for c in closure ] ) )
+  except ValueError:
+    return None
+
+  # Arguments are only supported if they all have defaults (commonly used
+  # to capture loop variables), each becomes a local initialized to its
+  # default value.
+
+  args     = code.co_varnames[ :code.co_argcount ]
+  defaults = func.func_defaults or ()
+  if code.co_flags & ( inspect.CO_VARARGS | inspect.CO_VARKEYWORDS ) or \
+     len( defaults ) != len( args ):
+    return None
+
+  func_globals = func.func_globals
+  globals_name = '_g' + prefix
+  namespace[ globals_name ] = func_globals
+  renamer      = _RenameNames( prefix, code.co_varnames, freevars,
+                               func_globals, globals_name, namespace )
+
+  body = []
+  for name, value in zip( args, defaults ):
+    namespace[ prefix + name + '_default' ] = value
+    body.extend( ast.parse( '{0}{1} = {0}{1}_default'
+                            .format( prefix, name ) ).body )
+
+  body.extend( renamer.visit( stmt ) for stmt in funcdef.body )
+
+  # Early returns become breaks out of a loop executing exactly once.
+
+  if _InlineChecker().has_return( funcdef ):
+    body = [ _ReturnToBreak().visit( stmt ) for stmt in body ]
+    body = [ ast.While( test = ast.Num( 1 ), orelse = [],
+                        body = body + [ ast.Break() ] ) ]
+
+  return body
+
+#-----------------------------------------------------------------------
+# _InlineChecker
+#-----------------------------------------------------------------------
+class _InlineChecker( ast.NodeVisitor ):
+
+  def check( self, funcdef ):
+    self.ok    = True
+    self.loops = 0
+    for stmt in funcdef.body:
+      self.visit( stmt )
+    return self.ok
+
+  def has_return( self, funcdef ):
+    return any( isinstance( x, ast.Return )
+                for stmt in funcdef.body for x in ast.walk( stmt ) )
+
+  def visit_Return( self, node ):
+    if self.loops or node.value is not None:
+      self.ok = False
+
+  def visit_loop( self, node ):
+    self.loops += 1
+    self.generic_visit( node )
+    self.loops -= 1
+
+  visit_For   = visit_loop
+  visit_While = visit_loop
+
+  def visit_unsupported( self, node ):
+    self.ok = False
+
+  visit_FunctionDef = visit_unsupported
+  visit_ClassDef    = visit_unsupported
+  visit_Lambda      = visit_unsupported
+  visit_Yield       = visit_unsupported
+  visit_Global      = visit_unsupported
+  visit_Exec        = visit_unsupported
+
+#-----------------------------------------------------------------------
+# _ReturnToBreak
+#-----------------------------------------------------------------------
+class _ReturnToBreak( ast.NodeTransformer ):
+
+  def visit_Return( self, node ):
+    return ast.copy_location( ast.Break(), node )
+
+#-----------------------------------------------------------------------
+# _RenameNames
+#-----------------------------------------------------------------------
+class _RenameNames( ast.NodeTransformer ):
+
+  def __init__( self, prefix, local_names, freevars, func_globals,
+                globals_name, ns ):
+    self.prefix       = prefix
+    self.local_names  = local_names
+    self.freevars     = freevars
+    self.func_globals = func_globals
+    self.globals_name = globals_name
+    self.ns           = ns
+
+  def visit_Name( self, node ):
+    name = node.id
+    if   name in self.local_names:
+      pass
+    elif name in self.freevars:
+      self.ns[ self.prefix + name ] = self.freevars[ name ]
+    elif name in self.func_globals:
+      value = ast.Name( id = self.globals_name, ctx = ast.Load() )
+      index = ast.Index( value = ast.Str( s = name ) )
+      return ast.copy_location( ast.Subscript( value = value, slice = index,
+                                               ctx = node.ctx ), node )
+    else:
+      return node
+    return ast.copy_location( ast.Name( id = self.prefix + name,
+                                        ctx = node.ctx ), node )
+
 #---------------------------------------------------------------------
 # _pausable_tick
 #---------------------------------------------------------------------
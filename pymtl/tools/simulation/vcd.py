@@ -15,6 +15,12 @@ from __future__ import print_function
 
 import time
 import sys
+import gzip
+import atexit
+import weakref
+
+# Size of the buffer used when writing VCD files
+VCD_BUFFER_SIZE = 1 << 20
 
 #-----------------------------------------------------------------------
 # get_vcd_timescale
@@ -57,6 +63,26 @@ def write_vcd_header( o, model ):
 def mangle_name( name ):
   return name.replace('[','(').replace(']',')')
 
+#-----------------------------------------------------------------------
+# walk_signal_defs
+#-----------------------------------------------------------------------
+# Recursive descent of the model hierarchy shared by all tools which
+# report values per signal. Yields ('scope', model) when entering each
+# model, ('var', signal) for each of its ports and wires, and
+# ('upscope', model) after all of its submodels have been visited.
+def walk_signal_defs( model ):
+
+  yield 'scope', model
+
+  for i in model.get_ports() + model.get_wires():
+    yield 'var', i
+
+  for submodel in model.get_submodules():
+    for event in walk_signal_defs( submodel ):
+      yield event
+
+  yield 'upscope', model
+
 #-----------------------------------------------------------------------
 # write_vcd_signal_defs
 #-----------------------------------------------------------------------
@@ -65,39 +91,33 @@ def write_vcd_signal_defs( o, model ):
   vcd_symbol = _gen_vcd_symbol()
   all_nets   = set()
 
-  # Inner utility function to perform recursive descent of the model.
-  def recurse_models( model, level ):
+  for kind, obj in walk_signal_defs( model ):
 
     # Create a new scope for this module
-    print( "$scope module {name} $end".format( name=model.name ), file=o )
+    if   kind == 'scope':
+      print( "$scope module {name} $end".format( name=obj.name ), file=o )
+
+    elif kind == 'upscope':
+      print( "$upscope $end", file=o )
 
     # Define all signals for this model.
-    for i in model.get_ports() + model.get_wires():
+    else:
 
       # Multiple signals may be collapsed into a single net in the
       # simulator if they are connected. Generate new vcd symbols per
       # net, not per signal as an optimization.
-      net = i._signalvalue
+      net = obj._signalvalue
       if not hasattr( net, '_vcd_symbol' ):
         net._vcd_symbol = vcd_symbol.next()
-        net._vcd_is_clk = i.name == 'clk'
+        net._vcd_is_clk = obj.name == 'clk'
       symbol = net._vcd_symbol
 
       print( "$var {type} {nbits} {symbol} {name} $end".format(
-          type='reg', nbits=i.nbits, symbol=symbol, name=mangle_name(i.name),
+          type='reg', nbits=obj.nbits, symbol=symbol, name=mangle_name(obj.name),
       ), file=o )
 
       all_nets.add( net )
 
-    # Recursively visit all submodels.
-    for submodel in model.get_submodules():
-      recurse_models( submodel, level+1 )
-
-    print( "$upscope $end", file=o )
-
-  # Begin recursive descent from the top-level model.
-  recurse_models( model, 0 )
-
   # Once all models and their signals have been defined, end the
   # definition section of the vcd and print the initial values of all
   # nets in the design.
@@ -109,40 +129,6 @@ def write_vcd_signal_defs( o, model ):
 
   return all_nets
 
-#-----------------------------------------------------------------------
-# insert_vcd_callbacks
-#-----------------------------------------------------------------------
-# Add callbacks which write the vcd file for each net in the design.
-def insert_vcd_callbacks( sim, nets ):
-
-  # A utility function which creates callbacks that write a nets current
-  # value to the vcd file. The returned callback function is a closure
-  # which is executed by the simulator whenever the net's value changes.
-  def create_vcd_callback( sim, net ):
-
-    # Each signal writes its binary value and unique identifier to the
-    # specified vcd file
-    if not net._vcd_is_clk:
-      cb = lambda: print( 'b%s %s\n' % (net.bin(), net._vcd_symbol),
-                          file=sim.vcd )
-
-    # The clock signal additionally must update the vcd time stamp
-    else:
-      cb = lambda: print( '#%s\nb%s %s\n' % (100*sim.ncycles+50*net.uint(),
-                          net.bin(), net._vcd_symbol),
-                          file=sim.vcd )
-
-    # Return the callback
-    return cb
-
-  # For each net in the simulator, create a callback and register it with
-  # the net to be fired whenever the value changes. We repurpose the
-  # existing callback facilities designed for slices (these execute
-  # immediately), rather than the default callback mechanism (these are
-  # put on the event queue to execute later).
-  for net in nets:
-    net.register_slice( create_vcd_callback( sim, net ) )
-
 #-----------------------------------------------------------------------
 # _gen_vcd_symbol
 #-----------------------------------------------------------------------
@@ -176,25 +162,172 @@ def _gen_vcd_symbol():
 # Hidden class used by the simulator tool for generating VCD output.
 # This class takes a SimulationTool instance and augments it to generate
 # VCD output.
+#
+# Rather than writing each value change as it happens, the callback
+# registered with each net only records the index of the net the first
+# time it changes within a timestamp. The recorded nets are written as a
+# single coalesced block whenever the clock changes (which advances the
+# timestamp) and at the end of every cycle, so each net is formatted at
+# most once per timestamp. Output files are opened with a large buffer,
+# and are gzip compressed if the file name ends in '.gz'.
+#
+# Changes made after the last cycle are written by flush() or close(),
+# or when the interpreter exits.
 class VCDUtil():
 
   def __init__(self, simulator, outfile=None):
 
     # Select the output for VCD
 
+    self._owns_file = isinstance( outfile, str )
+
     if not outfile:
       outfile = sys.stdout
+    elif isinstance(outfile, str) and outfile.endswith( '.gz' ):
+      outfile = gzip.open( outfile, 'wb' )
     elif isinstance(outfile, str):
-      outfile = open( outfile, 'w' )
+      outfile = open( outfile, 'w', VCD_BUFFER_SIZE )
     else:
       outfile = outfile
 
     # Write out vcd header, signal definitions, and initial state
 
     write_vcd_header( outfile, simulator.model )
-    nets = write_vcd_signal_defs( outfile, simulator.model )
+    nets = list( write_vcd_signal_defs( outfile, simulator.model ) )
 
     # Enable vcd mode on the simulator, set simulator output file name
 
     simulator.vcd = outfile
-    insert_vcd_callbacks( simulator, nets )
+
+    self.outfile     = outfile
+    self._sim        = simulator
+    self._nets       = nets
+    self._symbols    = [ net._vcd_symbol for net in nets ]
+    self._changed    = bytearray( len( nets ) )
+    self._pending    = []
+    self._time       = 0
+    self._last_time  = None
+    self._clk_line   = None
+
+    self._insert_vcd_callbacks()
+
+    # Write out the changes of each cycle once the cycle has finished
+
+    cycle = simulator.cycle
+    def vcd_cycle():
+      cycle()
+      self._write_changes()
+    simulator.cycle = vcd_cycle
+
+    _open_vcd_utils.add( self )
+
+  #---------------------------------------------------------------------
+  # _insert_vcd_callbacks
+  #---------------------------------------------------------------------
+  # For each net in the simulator, create a callback and register it with
+  # the net to be fired whenever the value changes. We repurpose the
+  # existing callback facilities designed for slices (these execute
+  # immediately), rather than the default callback mechanism (these are
+  # put on the event queue to execute later).
+  def _insert_vcd_callbacks( self ):
+
+    changed = self._changed
+    pending = self._pending
+
+    # Each signal records that it changed in the current timestamp
+    def create_vcd_callback( index ):
+      def vcd_cb():
+        if not changed[ index ]:
+          changed[ index ] = 1
+          pending.append( index )
+      return vcd_cb
+
+    # The clock signal instead ends the current timestamp, and its new
+    # value is written at the start of the next one
+    def create_clk_callback( net, symbol ):
+      def clk_cb():
+        self._write_changes()
+        self._time     = 100*self._sim.ncycles + 50*net.uint()
+        self._clk_line = 'b%s %s\n' % ( net.bin(), symbol )
+      return clk_cb
+
+    for index, net in enumerate( self._nets ):
+      if net._vcd_is_clk:
+        net.register_slice( create_clk_callback( net, net._vcd_symbol ) )
+      else:
+        net.register_slice( create_vcd_callback( index ) )
+
+  #---------------------------------------------------------------------
+  # _write_changes
+  #---------------------------------------------------------------------
+  # Write the current value of every net which changed since the last
+  # call in a single block, preceded by the current timestamp unless it
+  # has already been written.
+  def _write_changes( self ):
+
+    pending  = self._pending
+    clk_line = self._clk_line
+    if not pending and clk_line is None:
+      return
+
+    changed  = self._changed
+    self._clk_line = None
+
+    # Drop changes made after the output file was closed
+
+    if self.outfile is None:
+      for index in pending:
+        changed[ index ] = 0
+      del pending[:]
+      return
+
+    nets     = self._nets
+    symbols  = self._symbols
+
+    lines = []
+    if self._time != self._last_time:
+      lines.append( '#%d\n' % self._time )
+      self._last_time = self._time
+
+    if clk_line is not None:
+      lines.append( clk_line )
+
+    for index in pending:
+      changed[ index ] = 0
+      lines.append( 'b%s %s\n' % ( nets[ index ].bin(), symbols[ index ] ) )
+
+    del pending[:]
+    self.outfile.write( ''.join( lines ) )
+
+  #---------------------------------------------------------------------
+  # flush
+  #---------------------------------------------------------------------
+  # Write out all pending value changes and flush the output file.
+  def flush( self ):
+    self._write_changes()
+    self.outfile.flush()
+
+  #---------------------------------------------------------------------
+  # close
+  #---------------------------------------------------------------------
+  # Write out all pending value changes and close the output file if it
+  # was opened by this class.
+  def close( self ):
+    if self.outfile is None:
+      return
+    self.flush()
+    if self._owns_file:
+      self.outfile.close()
+    self.outfile = None
+    _open_vcd_utils.discard( self )
+
+#-----------------------------------------------------------------------
+# _close_vcd_utils
+#-----------------------------------------------------------------------
+# Make sure all value changes are written before the interpreter exits.
+_open_vcd_utils = weakref.WeakSet()
+
+@atexit.register
+def _close_vcd_utils():
+  for vcd_util in list( _open_vcd_utils ):
+    vcd_util.close()
@@ -17,6 +17,7 @@ from SimulationTool_comb_test   import *
 from SimulationTool_mix_test    import *
 from SimulationTool_struct_test import *
 from SimulationTool_wire_test   import *
+from SimulationTool_mem_test    import *
 
 #=======================================================================
 # Test Config
@@ -37,3 +38,95 @@ def local_setup_sim( model ):
 
   sim = SimulationTool( model )
   return model, sim
+
+#=======================================================================
+# VCD Output Tests
+#=======================================================================
+
+import gzip
+
+class VCDCounter( Model ):
+  def __init__( s ):
+    s.en  = InPort ( 1 )
+    s.out = OutPort( 8 )
+    s.inc = OutPort( 8 )
+
+    @s.combinational
+    def comb():
+      s.inc.value = s.out + 1
+
+    @s.tick
+    def seq():
+      if   s.reset: s.out.next = 0
+      elif s.en:    s.out.next = s.inc
+
+#-----------------------------------------------------------------------
+# read_vcd
+#-----------------------------------------------------------------------
+# Parse the value change section of a vcd file into a list of
+# ( time, { name: value } ) tuples, checking that timestamps increase
+# and that each net changes at most once per timestamp.
+def read_vcd( lines ):
+
+  symbols = {}
+  blocks  = [ ( None, {} ) ]
+  for line in lines:
+    fields = line.split()
+    if not fields:
+      continue
+    if fields[0] == '$var' and fields[4] not in symbols.values():
+      symbols[ fields[3] ] = fields[4]
+    elif fields[0].startswith( '#' ):
+      time = int( fields[0][1:] )
+      assert blocks[-1][0] is None or time > blocks[-1][0]
+      blocks.append( ( time, {} ) )
+    elif fields[0].startswith( 'b' ):
+      assert symbols[ fields[1] ] not in blocks[-1][1]
+      blocks[-1][1][ symbols[ fields[1] ] ] = int( fields[0][1:], 2 )
+
+  return blocks
+
+def check_vcd( vcd_file, open_file ):
+
+  model = VCDCounter()
+  model.vcd_file = vcd_file
+  model.elaborate()
+  sim = SimulationTool( model )
+
+  sim.reset()
+  model.en.value = 1
+  for i in range( 4 ):
+    sim.cycle()
+  model.en.value = 0
+  sim.cycle()
+  sim.close_vcd()
+
+  with open_file( vcd_file ) as fd:
+    blocks = read_vcd( fd.readlines() )
+
+  # Initial values, the changes made before the first cycle, then two
+  # timestamps per cycle
+
+  assert blocks[0][0] is None
+  assert blocks[0][1][ 'out' ] == 0
+  assert blocks[1] == ( 0, { 'reset': 1, 'inc': 1 } )
+  assert [ time for time, _ in blocks[2:] ] == range( 50, 700, 50 )
+  assert [ values[ 'clk' ] for _, values in blocks[2:] ] == [1,0]*6 + [1]
+
+  # Each cycle the changes caused by the clock edge are coalesced with
+  # the input changes made before the next falling edge
+
+  assert blocks[-1][1] == { 'clk': 1 }
+  assert blocks[-3][1] == { 'clk': 1, 'out': 4, 'inc': 5, 'en': 0 }
+  assert blocks[-5][1] == { 'clk': 1, 'out': 3, 'inc': 4 }
+
+  # Closing twice and cycling after closing are harmless
+
+  sim.close_vcd()
+  sim.cycle()
+
+def test_vcd_output( tmpdir ):
+  check_vcd( str( tmpdir.join( 'test.vcd' ) ), open )
+
+def test_vcd_gzip( tmpdir ):
+  check_vcd( str( tmpdir.join( 'test.vcd.gz' ) ), gzip.open )
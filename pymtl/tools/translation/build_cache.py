@@ -0,0 +1,111 @@
+#=======================================================================
+# build_cache.py
+#=======================================================================
+# Global cache of translated and compiled models, shared by all
+# processes and checkouts on the same machine.
+#
+# Each entry is a directory named after the model and a hash of
+# everything its build depends on. Entries are built in a temporary
+# directory while holding a lock file for the entry, and then renamed
+# into place, so an entry directory is always complete. Concurrent
+# workers needing the same entry wait for the lock and then use the
+# entry built by the first worker.
+
+from __future__ import print_function
+
+import os
+import fcntl
+import shutil
+import hashlib
+import tempfile
+
+from contextlib import contextmanager
+
+#-----------------------------------------------------------------------
+# get_cache_dir
+#-----------------------------------------------------------------------
+# The cache lives in PYMTL_TRANSLATION_CACHE_DIR, which defaults to
+# ~/.cache/pymtl/translation.
+
+def get_cache_dir():
+
+  cache_dir = os.environ.get( 'PYMTL_TRANSLATION_CACHE_DIR',
+                 os.path.join( os.path.expanduser( '~' ), '.cache', 'pymtl',
+                               'translation' ) )
+
+  if not os.path.exists( cache_dir ):
+    try:
+      os.makedirs( cache_dir )
+    except OSError:
+      if not os.path.isdir( cache_dir ):
+        raise
+
+  return cache_dir
+
+#-----------------------------------------------------------------------
+# hash_key
+#-----------------------------------------------------------------------
+# Hash any number of strings into a short key.
+
+def hash_key( *parts ):
+  h = hashlib.sha1()
+  for part in parts:
+    h.update( part )
+    h.update( '\0' )
+  return h.hexdigest()[:20]
+
+#-----------------------------------------------------------------------
+# file_lock
+#-----------------------------------------------------------------------
+# Hold an exclusive lock on a file for the duration of a with block.
+# The lock is released by the operating system if the process dies.
+
+@contextmanager
+def file_lock( filename ):
+  with open( filename, 'a' ) as fd:
+    fcntl.flock( fd, fcntl.LOCK_EX )
+    try:
+      yield
+    finally:
+      fcntl.flock( fd, fcntl.LOCK_UN )
+
+#-----------------------------------------------------------------------
+# cached_build
+#-----------------------------------------------------------------------
+# Return the path of the cache entry for name and key, calling build()
+# to populate it on a miss. build() is called with the current working
+# directory set to an empty temporary directory, and should write all
+# its outputs there using relative paths.
+
+def cached_build( name, key, build ):
+
+  cache_dir = get_cache_dir()
+  entry     = os.path.join( cache_dir, '{}_{}'.format( name, key ) )
+
+  # Entries are only ever created by a rename, so an existing entry is
+  # always complete
+
+  if os.path.isdir( entry ):
+    return entry
+
+  with file_lock( entry + '.lock' ):
+
+    # Another worker may have built the entry while we waited
+
+    if os.path.isdir( entry ):
+      return entry
+
+    temp_dir = tempfile.mkdtemp( prefix='.{}_'.format( name ), dir=cache_dir )
+    cwd      = os.getcwd()
+    try:
+      os.chdir( temp_dir )
+      build()
+    except:
+      shutil.rmtree( temp_dir, ignore_errors=True )
+      raise
+    finally:
+      os.chdir( cwd )
+
+    os.rename( temp_dir, entry )
+
+  return entry
@@ -0,0 +1,92 @@
+#=======================================================================
+# build_cache_test.py
+#=======================================================================
+
+import os
+import time
+import pytest
+import multiprocessing
+
+from build_cache import cached_build, hash_key
+
+#-----------------------------------------------------------------------
+# Helpers
+#-----------------------------------------------------------------------
+
+@pytest.fixture
+def cache_dir( tmpdir, monkeypatch ):
+  cache_dir = tmpdir.join( 'cache' )
+  monkeypatch.setenv( 'PYMTL_TRANSLATION_CACHE_DIR', str( cache_dir ) )
+  return cache_dir
+
+def slow_build( log_file ):
+  def build():
+    with open( log_file, 'a' ) as fd:
+      fd.write( '{}\n'.format( os.getpid() ) )
+    time.sleep( 0.2 )
+    with open( 'libModel.so', 'w' ) as fd:
+      fd.write( 'built' )
+  return build
+
+def worker( log_file ):
+  entry = cached_build( 'Model', hash_key( 'module Model;' ),
+                        slow_build( log_file ) )
+  with open( os.path.join( entry, 'libModel.so' ) ) as fd:
+    return fd.read()
+
+#-----------------------------------------------------------------------
+# test_cached_build
+#-----------------------------------------------------------------------
+
+def test_cached_build( cache_dir, tmpdir ):
+
+  log_file = str( tmpdir.join( 'log' ) )
+  cwd      = os.getcwd()
+
+  assert worker( log_file ) == 'built'
+  assert worker( log_file ) == 'built'
+  assert len( open( log_file ).readlines() ) == 1
+  assert os.getcwd() == cwd
+
+  # A different key is a different entry
+
+  entry = cached_build( 'Model', hash_key( 'module Model2;' ),
+                        slow_build( log_file ) )
+  assert os.path.exists( os.path.join( entry, 'libModel.so' ) )
+  assert len( open( log_file ).readlines() ) == 2
+
+#-----------------------------------------------------------------------
+# test_failed_build
+#-----------------------------------------------------------------------
+
+def test_failed_build( cache_dir ):
+
+  def build():
+    open( 'partial.o', 'w' ).close()
+    raise ValueError()
+
+  with pytest.raises( ValueError ):
+    cached_build( 'Model', hash_key( 'module Model;' ), build )
+
+  # Nothing but the lock file is left behind
+
+  assert [ x.ext for x in cache_dir.listdir() ] == [ '.lock' ]
+
+#-----------------------------------------------------------------------
+# test_concurrent_build
+#-----------------------------------------------------------------------
+# Concurrent workers build each entry exactly once.
+
+def test_concurrent_build( cache_dir, tmpdir ):
+
+  log_file = str( tmpdir.join( 'log' ) )
+
+  pool = multiprocessing.Pool( 4 )
+  try:
+    results = pool.map( worker, [ log_file ] * 8 )
+  finally:
+    pool.close()
+    pool.join()
+
+  assert results == [ 'built' ] * 8
+  assert len( open( log_file ).readlines() ) == 1
@@ -0,0 +1,61 @@
+#=======================================================================
+# cffi_helpers.py
+#=======================================================================
+# Build and load CFFI extension modules in API mode.
+#
+# In ABI mode (ffi.dlopen), every call into a shared library goes
+# through libffi, and the arguments are converted at run time from the
+# cdef. In API mode, CFFI generates a C extension module with one
+# compiled stub per function, so calls cost about as much as calling a
+# builtin. The extension module is linked against the shared library of
+# the model and finds it in its own directory, so both can be moved
+# together (e.g., into a cache entry).
+
+from __future__ import print_function
+
+import os
+import imp
+
+from cffi import FFI
+
+#-----------------------------------------------------------------------
+# create_cffi_module
+#-----------------------------------------------------------------------
+# Compile the extension module module_name in the current directory.
+# cdef declares the interface, in which structs may end with '...;' to
+# leave out fields Python does not need, and header is the C source
+# defining everything cdef declares. lib_file is the shared library
+# implementing the functions, in the current directory. Returns the
+# file name of the module.
+
+def create_cffi_module( module_name, cdef, header, lib_file, flags='' ):
+
+  library = os.path.splitext( lib_file )[0]
+  if library.startswith( 'lib' ):
+    library = library[3:]
+
+  ffi = FFI()
+  ffi.cdef( cdef )
+  ffi.set_source( module_name, header,
+    include_dirs       = [ '.' ],
+    libraries          = [ library ],
+    library_dirs       = [ '.' ],
+    extra_compile_args = flags.split(),
+    extra_link_args    = [ '-Wl,-rpath,$ORIGIN' ],
+  )
+
+  module_file = module_name + '.so'
+  ffi.compile( tmpdir='.', target=module_file )
+
+  return module_file
+
+#-----------------------------------------------------------------------
+# load_cffi_module
+#-----------------------------------------------------------------------
+# Import the extension module module_name from directory, and return it.
+# Modules with the same name in different directories (e.g., different
+# cache entries of the same model) are different modules.
+
+def load_cffi_module( module_name, directory ):
+  return imp.load_dynamic( module_name,
+           os.path.join( os.path.abspath( directory ), module_name + '.so' ) )
@@ -8,6 +8,9 @@ from cpp_helpers             import gen_cheader, gen_cdef, gen_pywrapper
 from ..ast_helpers           import get_method_ast, print_simple_ast, print_ast
 from ...datatypes.SignalValue import SignalValueWrapper
 from ..simulation            import sim_utils
+from ..simulation.SimulationTool import EventQueue
+from ...model.ConnectionEdge  import ConnectionEdge
+from ...model.signals         import Constant
 
 import sys
 import ast, _ast
@@ -26,11 +29,17 @@ def CLogicTransl( model, o=sys.stdout ):
     c_functions = StringIO.StringIO()
     c_variables = StringIO.StringIO()
 
-    signals    = sim_utils.collect_signals( model )
-    nets, _    = sim_utils.signals_to_nets( signals )
-    seq_blocks = sim_utils.register_seq_blocks( model )
+    # MemoryArrays are translated the same way as lists of Wires
+    model._expand_memories()
+
+    signals          = sim_utils.collect_signals( model )
+    nets, slice_conn = sim_utils.signals_to_nets( signals )
+    seq_blocks       = sim_utils.register_seq_blocks( model )
     # TODO: update translation so that this is unneeded?
-    sim_utils.insert_signal_values( None, nets )
+    sim_utils.insert_signal_values( _TranslationState(), nets )
+
+    # Levelize all combinational blocks and slice connections
+    comb_schedule = levelize_comb_logic( model, slice_conn )
 
     # Visit tick functions, save register information
     ast_next  = []
@@ -40,6 +49,20 @@ def CLogicTransl( model, o=sys.stdout ):
       ast_next.extend( r )
       localvars.update( l )
 
+    # Visit combinational blocks, translate slice connections
+    net_names  = { id( list( n )[0]._signalvalue ) : 'net_{:05}'.format( i )
+                   for i, n in enumerate( nets ) }
+    comb_calls = []
+    for i, func in enumerate( comb_schedule ):
+      if isinstance( func, ConnectionEdge ):
+        comb_calls.append( translate_slice( func, i, net_names, c_functions ) )
+      else:
+        r, l = translate_func( func, c_functions )
+        ast_next.extend( r )
+        localvars.update( l )
+        comb_calls.append( '{}_{}'.format( mangle_idxs( func._model.name ),
+                                          func.func_name ) )
+
     # Print signal declarations, use reg information
     top_ports, all_ports, shadows = declare_signals(nets, ast_next, c_variables)
 
@@ -65,7 +88,7 @@ def CLogicTransl( model, o=sys.stdout ):
     print >> c_variables
     print >> c_variables, '/* LOCALS ' + '-'*60 + '*/'
     for var, obj in localvars.items():
-      rvar = var.replace('.','_')
+      rvar = c_name( var )
       if rvar not in all_ports:
         if   isinstance( obj, int ):
           var_type = get_type( obj, o )
@@ -75,7 +98,7 @@ def CLogicTransl( model, o=sys.stdout ):
           var_type = get_type( obj[0], o )
           split = var.split('.')
           pfx = '_'.join( split[0:2] )
-          sfx = '_'+'_'.join( split[2:]  ) if split[2:] else ''
+          sfx = '_'+c_name( '.'.join( split[2:] ) ) if split[2:] else ''
           vx = [ '&{}_IDX{:03}{}'.format(pfx,i,sfx) for i in range(len(obj)) ]
           # Declare the variables if they don't exist yet
           for x in vx:
@@ -109,17 +132,48 @@ def CLogicTransl( model, o=sys.stdout ):
 
     print   >> o, 'unsigned int ncycles;\n\n'
 
+    # Create the levelized combinational evaluation
+    print   >> o, '/* eval_comb */'
+    print   >> o, 'static inline void eval_comb() {'
+    for x in comb_calls:
+      print >> o, '  {}();'.format( x )
+    print   >> o, '}'
+    print   >> o
+
+    # Utility functions to copy ports to and from the interface
+    def set_inports():
+      print   >> o
+      print   >> o, '  /* Set inports */'
+      print   >> o, '  top_clk   = _top_clk;'
+      print   >> o, '  top_reset = _top_reset;'
+      for name, _, _ in top_inports[2:]:
+        print >> o, '  {} = top->{};'.format( name, name[4:] )
+
+    def set_outports():
+      print   >> o
+      print   >> o, '  /* Assign all outputs */'
+      for name, _, _ in top_outports:
+        print >> o, '  top->{} = {};'.format( name[4:], name )
+
+    # Create the eval function, which only evaluates the combinational
+    # logic for the current inputs
+    print   >> o, '/* eval */'
+    print   >> o, 'void eval({}) {{'.format( '\n'+params+'\n' )
+    set_inports()
+    print   >> o
+    print   >> o, '  eval_comb();'
+    set_outports()
+    print   >> o, '}'
+    print   >> o
+
     # Create the cycle function
     print   >> o, '/* cycle */'
     print   >> o, 'void cycle({}) {{'.format( '\n'+params+'\n' )
 
-    # Set input ports from params
+    # Set input ports from params, settle the combinational logic
+    set_inports()
     print   >> o
-    print   >> o, '  /* Set inports */'
-    print   >> o, '  top_clk   = _top_clk;'
-    print   >> o, '  top_reset = _top_reset;'
-    for name, _, _ in top_inports[2:]:
-      print >> o, '  {} = top->{};'.format( name, name[4:] )
+    print   >> o, '  eval_comb();'
 
     # Execute all ticks
     print   >> o
@@ -132,17 +186,26 @@ def CLogicTransl( model, o=sys.stdout ):
     print   >> o
     print   >> o, '  /* Update all registers */'
     for s in shadows:
-      print >> o, '  {0} = {0}_next;'.format( s )
+      print >> o, '  {0} = {0}_NEXT;'.format( s )
 
     # Update params from output ports
     print   >> o
-    print   >> o, '  /* Assign all outputs */'
-    for name, _, _ in top_outports:
-      print >> o, '  top->{} = {};'.format( name[4:], name )
+    print   >> o, '  eval_comb();'
+    set_outports()
 
     print   >> o, '}'
     print   >> o
 
+    # Create the cycle_n function, which runs n cycles with the same
+    # inputs without returning to Python
+    print   >> o, '/* cycle_n */'
+    print   >> o, 'void cycle_n({}) {{'.format(
+                  '\n    unsigned int   n,\n'+params+'\n' )
+    print   >> o, '  for ( unsigned int i = 0; i < n; i++ )'
+    print   >> o, '    cycle( _top_clk, _top_reset, top );'
+    print   >> o, '}'
+    print   >> o
+
     # Create the cdef and Python wrapper
     cdef        = gen_cdef( params, top_ports[2:] )
     CSimWrapper = gen_pywrapper( top_inports, top_outports )
@@ -169,29 +232,35 @@ def declare_signals( nets, ast_next, o ):
     # returns the type, if it is an object/class generate the C def
     type_ = get_type( net[0].dtype(), o ) # TODO: add obj decl to extern
 
-    # declare the net
+    # declare the net, initialized with its value after elaboration
+    # (e.g., constants and slices of constants)
     cname = 'net_{:05}'.format( id_ )
-    print   >>o, '{}  {} = 0;'.format( type_, cname);
+    value = net[0]._signalvalue.uint()
+    print   >>o, '{}  {} = {};'.format( type_, cname, value );
 
     # create references for each signal connected to the net
     for signal in net:
 
+      # constants have no name, their value is set above
+      if isinstance( signal, Constant ):
+        continue
+
       name = mangle_name( signal.fullname )
       print >>o, '{} &{}      =  {};'      .format( type_, name, cname );
 
       # only create "next" if this signal was written to in @tick
-      # NOTE: this will declare "net_next" twice if two different signals
+      # NOTE: this will declare "net_NEXT" twice if two different signals
       #       attached to the net write next; this is okay because that is
       #       invalid code!
       sig = re.sub('\[[0-9]*\]', '', signal.name)
       mod = mangle_idxs( signal.parent.name )
       fullname = mod + '.' + sig
       if fullname in ast_next:
-        print >>o, '{}  {}_next = 0;'      .format( type_, cname );
-        print >>o, '{} &{}_next = {}_next;'.format( type_, name, cname );
+        print >>o, '{}  {}_NEXT = 0;'      .format( type_, cname );
+        print >>o, '{} &{}_NEXT = {}_NEXT;'.format( type_, name, cname );
         shadows.append( name )
 
-        all_ports.append( name+'_next' )
+        all_ports.append( name+'_NEXT' )
       all_ports.append( name )
 
       # ports attached to top will be exposed in the CSim wrapper
@@ -220,7 +289,9 @@ def get_type( signal, o=None ):
     return 'unsigned int'
   elif isinstance( signal, Bits ):
     assert not isinstance( signal, BitStruct )
-    return 'unsigned int'    # TODO: make a setbitwidth object
+    if signal.nbits > 64:
+      raise Exception( "Bits wider than 64 bits are not translatable!" )
+    return 'unsigned int' if signal.nbits <= 32 else 'unsigned long long'
   elif isinstance( signal, SignalValueWrapper ):
     if not o:
       raise Exception( "NESTED TYPES NOT ALLOWED" )
@@ -252,6 +323,60 @@ def declare_class( signal, o ):
   print   >> o, "};"
   return class_name
 
+#-----------------------------------------------------------------------
+# levelize_comb_logic
+#-----------------------------------------------------------------------
+# Order all @combinational blocks and slice connections using the same
+# analysis as the static schedule of SimulationTool, so that a single
+# pass over the schedule settles all nets. Slice connections are
+# returned as ConnectionEdges.
+def levelize_comb_logic( model, slice_connects ):
+
+  event_queue = EventQueue()
+  sim_utils.register_comb_blocks  ( model, event_queue )
+  sim_utils.create_slice_callbacks( slice_connects, event_queue )
+
+  schedule = sim_utils.create_static_schedule( model, slice_connects )
+  if schedule is None:
+    raise Exception( "Cannot translate {} to C++, combinational cycle "
+                     "detected!".format( model.class_name ) )
+
+  slices = { c._slice_cb : c for c in slice_connects
+             if hasattr( c, '_slice_cb' ) }
+  return [ slices.get( func, func ) for func in schedule ]
+
+#-----------------------------------------------------------------------
+# translate_slice
+#-----------------------------------------------------------------------
+# Translate a connection with bit slices into a function copying the
+# sliced bits of the source net into the destination net.
+def translate_slice( c, index, net_names, o ):
+
+  def bounds( addr, nbits ):
+    if   addr is None:
+      return 0, nbits
+    elif isinstance( addr, slice ):
+      start = int( addr.start ) if addr.start is not None else 0
+      stop  = int( addr.stop  ) if addr.stop  is not None else nbits
+      return start, stop
+    else:
+      return int( addr ), int( addr ) + 1
+
+  src        = net_names[ id( c.src_node ._signalvalue ) ]
+  dest       = net_names[ id( c.dest_node._signalvalue ) ]
+  slo, shi   = bounds( c.src_slice,  c.src_node .nbits )
+  dlo, dhi   = bounds( c.dest_slice, c.dest_node.nbits )
+  mask       = ( 1 << ( shi - slo ) ) - 1
+
+  fname = 'slice_{:05}'.format( index )
+  print >> o, '  // slice connection: {}'.format( c )
+  print >> o, '  void {}() {{'.format( fname )
+  print >> o, '    {0} = ( {0} & ~0x{1:x}ULL ) | ( ( ( {2} >> {3} ) & 0x{4:x}ULL ) << {5} );' \
+              .format( dest, mask << dlo, src, slo, mask, dlo )
+  print >> o, '  }\n'
+
+  return fname
+
 #-----------------------------------------------------------------------
 # translate_func
 #-----------------------------------------------------------------------
@@ -269,7 +394,8 @@ def translate_func( func, o, model=None ):
   tree = RemoveCopy().visit( tree )
   tree = ReorderSubscriptNext().visit( tree )
   #print_simple_ast( tree )                         # DEBUG
-  InferTypes( model, func ).visit( tree )
+  types = InferTypes( model, func )
+  types.visit( tree )
   #print_simple_ast( tree )                         # DEBUG
   #print src                                        # DEBUG
   #new_tree = TypeAST( model, func ).visit( tree )  # DEBUG
@@ -281,7 +407,7 @@ def translate_func( func, o, model=None ):
     print >> behavioral_code, "  // " + line
 
   # Print the Verilog translation
-  visitor = TranslateLogic( model, func, behavioral_code )
+  visitor = TranslateLogic( model, func, behavioral_code, types.temps )
   #visitor.visit( new_tree )
   visitor.visit( tree )
 
@@ -339,9 +465,10 @@ opmap = {
 class TranslateLogic( ast.NodeVisitor ):
 
 
-  def __init__( self, model, func, o ):
+  def __init__( self, model, func, o, temps=None ):
     self.model  = model
     self.func   = func
+    self.temps  = temps or {}
 
     self.o      = o
     self.ident  = 0
@@ -386,6 +513,14 @@ class TranslateLogic( ast.NodeVisitor ):
         )
     #print >> self.o, '    printf("EXECUTING {}_{}\\n");'.format(
     #                             self.model.name, node.name )
+
+    # Declare the local temporaries of the block, wide enough for the
+    # largest value assigned to them
+    arg_names = [ x.id for x in node.args.args ]
+    for name, value in sorted( self.temps.items() ):
+      if name not in arg_names:
+        print >> self.o, '    {} {} = 0;'.format( get_type( value ), name )
+
     # Visit each line in the function, translate one at a time.
     self.ident += 2
     for x in node.body:
@@ -399,13 +534,63 @@ class TranslateLogic( ast.NodeVisitor ):
   def visit_Assign(self, node):
     # TODO: implement multiple left hand targets?
     assert len(node.targets) == 1
+    target = node.targets[0]
+
+    # Writes to the .next of an entire MemoryArray write every entry
+    if is_memory_fill( target ):
+      self.visit( expand_memory_fill( target, node ) )
+      return
+
+    # Writes to bit slices only update the sliced bits of the target
+    if is_bit_slice( target ):
+      lower, mask = self.slice_bounds( target.slice )
+      name        = self.expr( target.value )
+      print >> self.o, (self.ident+2)*" ",
+      print >> self.o, "{0} {1} ( {0} & ~( {2} << {3} ) ) | ( ( ( {4} ) & " \
+                       "{2} ) << {3} );".format( name, self.assign, mask,
+                       lower, self.expr( node.value ) )
+      return
+
+    # Truncate the value written to Bits narrower than their C type
+    mask = bits_mask( getattr( target, '_object', None ) )
+
     #if debug:
     print >> self.o, (self.ident+2)*" ",
-    self.visit( node.targets[0] )
+    self.visit( target )
     print >> self.o, "{}".format( self.assign ),
+    if mask: print >> self.o, '(',
     self.visit( node.value )
+    if mask: print >> self.o, ') & {}'.format( mask ),
     print >> self.o, ';'
 
+  #---------------------------------------------------------------------
+  # expr
+  #---------------------------------------------------------------------
+  # Translate an expression into a string rather than the output.
+  def expr( self, node ):
+    stash  = self.o
+    self.o = StringIO.StringIO()
+    self.visit( node )
+    value  = self.o.getvalue().strip()
+    self.o = stash
+    return value
+
+  #---------------------------------------------------------------------
+  # slice_bounds
+  #---------------------------------------------------------------------
+  # Return the lower bound and the mask of a bit index or slice.
+  def slice_bounds( self, node ):
+    if isinstance( node, _ast.Index ):
+      return self.expr( node.value ), '1ULL'
+    assert node.step == None
+    lower, upper = node.lower, node.upper
+    if isinstance( lower, _ast.Num ) and isinstance( upper, _ast.Num ):
+      mask = '0x{:x}ULL'.format( ( 1 << ( upper.n - lower.n ) ) - 1 )
+    else:
+      mask = '( ( 1ULL << ( ( {} ) - ( {} ) ) ) - 1 )'.format(
+               self.expr( upper ), self.expr( lower ) )
+    return self.expr( lower ), mask
+
   #---------------------------------------------------------------------
   # visit_AugAssign
   #---------------------------------------------------------------------
@@ -445,6 +630,16 @@ class TranslateLogic( ast.NodeVisitor ):
   # visit_UnaryOp
   #---------------------------------------------------------------------
   def visit_UnaryOp(self, node):
+
+    # Inverting Bits narrower than their C type also sets the upper bits,
+    # truncate the result to the bitwidth of the operand
+    nbits = infer_nbits( node.operand )
+    if isinstance( node.op, _ast.Invert ) and nbits not in [ None, 32, 64 ]:
+      print >> self.o, '( ~',
+      self.visit(node.operand)
+      print >> self.o, '& 0x{:x}ULL )'.format( ( 1 << nbits ) - 1 ),
+      return
+
     print >> self.o, opmap[type(node.op)],
     self.visit(node.operand)
 
@@ -496,12 +691,20 @@ class TranslateLogic( ast.NodeVisitor ):
       #TypeAST( self.model, self.func ).visit( node )
       self.localvars[name] = node._object
 
-    print >> self.o, name.replace('.','_'),
+    print >> self.o, c_name( name ),
 
   #---------------------------------------------------------------------
   # visit_Name
   #---------------------------------------------------------------------
   def visit_Name( self, node ):
+
+    # Integer constants from the closure or the globals of the block are
+    # emitted as literals
+    obj = getattr( node, '_object', None )
+    if node.id not in self.temps and isinstance( obj, (int, long, Bits) ):
+      print >> self.o, int_literal( obj ),
+      return
+
     name = VariableName( self ).visit( node ).replace('.', '_')
 
     print >> self.o, name,
@@ -510,6 +713,16 @@ class TranslateLogic( ast.NodeVisitor ):
   # visit_Subscript
   #---------------------------------------------------------------------
   def visit_Subscript( self, node ):
+
+    # Bit indexing and slicing of Bits
+    if is_bit_slice( node ):
+      lower, mask = self.slice_bounds( node.slice )
+      print >> self.o, '( (',
+      self.visit( node.value )
+      print >> self.o, '>> {} ) & {} )'.format( lower, mask ),
+      return
+
+    # Indexing of lists
     print >> self.o, '(*',
     self.visit( node.value )
     print >> self.o, '[',
@@ -718,7 +931,7 @@ class TranslateLogic( ast.NodeVisitor ):
   def visit_Assert(self, node):
     print >> self.o, self.ident*' ' + '  assert(',
     self.visit( node.test )
-    print >> self.o, ')',
+    print >> self.o, ');'
 
   #---------------------------------------------------------------------
   # visit_Return
@@ -820,6 +1033,10 @@ class VariableName( ast.NodeVisitor ):
     self.model  = self.parent.model
 
   def visit_Attribute( self, node ):
+    # Signals of submodels are named after the submodel only
+    obj = getattr( node.value, '_object', None )
+    if isinstance( obj, Model ) and obj is not self.model:
+      return obj.name + '.' + node.attr
     return self.visit( node.value ) + '.' + node.attr
 
   def visit_Subscript( self, node ):
@@ -895,9 +1112,23 @@ class InferTypes( ast.NodeVisitor ):
     self.func        = func
     self.closed_vars = get_closure_dict( func )
     self.current_obj = None
+    self.temps       = {}
     if not self.closed_vars:
       self.closed_vars['s'] = model
 
+  def visit_Assign( self, node ):
+    self.visit( node.value )
+
+    # Local temporaries are typed as Bits wide enough for all values
+    # assigned to them, 64 bits if the width cannot be inferred
+    for target in node.targets:
+      if isinstance( target, _ast.Name ) and target.id not in self.closed_vars:
+        nbits = infer_nbits( node.value ) or 64
+        old   = self.temps.get( target.id )
+        if not old or nbits > old.nbits:
+          self.temps[ target.id ] = Bits( nbits )
+      self.visit( target )
+
   def visit_Subscript( self, node ):
     self.visit( node.slice )
     self.visit( node.value )
@@ -931,6 +1162,10 @@ class InferTypes( ast.NodeVisitor ):
     if node.id in self.closed_vars:
       new_node = node
       new_obj  = PyObj( node.id, self.closed_vars[ node.id ] )
+    elif node.id in self.temps:
+      new_obj  = PyObj( node.id, self.temps[ node.id ] )
+    elif isinstance( self.func.func_globals.get( node.id ), (int, long, Bits) ):
+      new_obj  = PyObj( node.id, self.func.func_globals[ node.id ] )
     else:
       print "WARNING: variable {} type is unknown".format( node.id )
       new_obj  = None
@@ -989,4 +1224,134 @@ def mangle_name( name ):
 # Regex to match list indexing
 indexing = re.compile("(\[)(?P<idx>.*?)(\])")
 
+#-----------------------------------------------------------------------
+# c_name
+#-----------------------------------------------------------------------
+# Return the C name of a dotted variable name. The .next of a register
+# becomes the _NEXT shadow variable, in capitals like the _IDX of list
+# indices so it does not clash with signals named *_next.
+def c_name( name ):
+  parts = name.split('.')
+  if parts[-1] == 'next':
+    parts[-1] = 'NEXT'
+  return '_'.join( parts )
+
+#-----------------------------------------------------------------------
+# is_bit_slice
+#-----------------------------------------------------------------------
+# Return True if the subscript indexes or slices the bits of a signal,
+# rather than indexing a list.
+def is_bit_slice( node ):
+  return isinstance( node, _ast.Subscript ) and \
+         isinstance( getattr( node.value, '_object', None ), Bits )
+
+#-----------------------------------------------------------------------
+# bits_mask
+#-----------------------------------------------------------------------
+# Return the mask truncating values to the bitwidth of a Bits object, or
+# None if the C type holding the Bits is exactly as wide.
+def bits_mask( obj ):
+  if not isinstance( obj, Bits ) or obj.nbits in [ 32, 64 ]:
+    return None
+  return '0x{:x}ULL'.format( ( 1 << obj.nbits ) - 1 )
+
+#-----------------------------------------------------------------------
+# int_literal
+#-----------------------------------------------------------------------
+# Return a C literal for an integer or Bits constant.
+def int_literal( value ):
+  value = value.uint() if isinstance( value, Bits ) else int( value )
+  return str( value ) if -2**31 <= value < 2**31 else '{}LL'.format( value )
+
+#-----------------------------------------------------------------------
+# const_value
+#-----------------------------------------------------------------------
+# Return the value of a constant expression node, or None.
+def const_value( node ):
+  if isinstance( node, _ast.Num ):
+    return node.n
+  obj = getattr( node, '_object', None )
+  if isinstance( obj, (int, long) ) and not isinstance( node, _ast.Subscript ):
+    return obj
+  return None
+
+#-----------------------------------------------------------------------
+# infer_nbits
+#-----------------------------------------------------------------------
+# Return the bitwidth of the value of an expression annotated by
+# InferTypes, or None if it cannot be inferred (e.g., plain integers).
+def infer_nbits( node ):
+
+  if is_bit_slice( node ):
+    if isinstance( node.slice, _ast.Index ):
+      return 1
+    lower = const_value( node.slice.lower )
+    upper = const_value( node.slice.upper )
+    if lower is not None and upper is not None:
+      return upper - lower
+    return node.value._object.nbits
+
+  if isinstance( node, _ast.Call ) and isinstance( node.func, _ast.Name ):
+    if node.func.id in [ 'zext', 'sext' ] and len( node.args ) == 2:
+      return const_value( node.args[1] )
+    return infer_nbits( node.args[0] ) if node.args else None
+
+  if isinstance( node, (_ast.Compare, _ast.BoolOp) ):
+    return 1
+  if isinstance( node, _ast.UnaryOp ):
+    return 1 if isinstance( node.op, _ast.Not ) else infer_nbits( node.operand )
+
+  if   isinstance( node, _ast.BinOp ): operands = [ node.left, node.right ]
+  elif isinstance( node, _ast.IfExp ): operands = [ node.body, node.orelse ]
+  else:                                operands = []
+  if operands:
+    nbits = [ infer_nbits( x ) for x in operands ]
+    nbits = [ x for x in nbits if x ]
+    return max( nbits ) if nbits else None
+
+  obj = getattr( node, '_object', None )
+  return obj.nbits if isinstance( obj, Bits ) else None
+
+#-----------------------------------------------------------------------
+# is_memory_fill
+#-----------------------------------------------------------------------
+# Return True if the assignment target is the .next of an entire
+# MemoryArray (expanded into a list of Wires), e.g. s.mem.next = 0.
+def is_memory_fill( target ):
+  return isinstance( target, _ast.Attribute ) and \
+         target.attr in [ 'next', 'n' ] and \
+         hasattr( getattr( target.value, '_object', None ), '_memory' )
+
+#-----------------------------------------------------------------------
+# expand_memory_fill
+#-----------------------------------------------------------------------
+# Rewrite a write to the .next of an entire MemoryArray into a loop
+# writing the .next of each entry:
+#
+#   s.mem.next = x  ->  for mem_i in range( N ): s.mem.next[ mem_i ] = x
+#
+def expand_memory_fill( target, node ):
+
+  wires   = target.value._object
+  loopvar = '{}_i'.format( wires.name )
 
+  index   = _ast.Index( value=_ast.Name( id=loopvar, ctx=_ast.Load() ) )
+  entry   = _ast.Subscript( value=target, slice=index, ctx=_ast.Store() )
+  entry._object = wires[0]
+
+  iter    = _ast.Call( func=_ast.Name( id='range', ctx=_ast.Load() ),
+                       args=[ _ast.Num( n=len( wires ) ) ], keywords=[],
+                       starargs=None, kwargs=None )
+  assign  = _ast.Assign( targets=[ entry ], value=node.value )
+  return _ast.For( target=_ast.Name( id=loopvar, ctx=_ast.Store() ),
+                   iter=iter, body=[ assign ], orelse=[] )
+
+#-----------------------------------------------------------------------
+# _TranslationState
+#-----------------------------------------------------------------------
+# Stand-in for the simulator state written by insert_signal_values.
+class _TranslationState( object ):
+  def __init__( self ):
+    self._register_queue = []
+  def add_event( self, svalue ):
+    pass
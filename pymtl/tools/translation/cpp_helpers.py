@@ -4,9 +4,12 @@
 
 from __future__ import print_function
 
+import os
+
 from pymtl                import *
 from ...model.signal_lists import PortList
 from cffi                 import FFI
+from cffi_helpers         import create_cffi_module
 
 # Create position independent code
 #cc_src = "g++ -O3 -fPIC -c -o {in}.cc {in}.h {out.o}"
@@ -34,9 +37,12 @@ def gen_cdef( cycle_params, top_ports ):
     str_ += '  {} {};  // {}\n'.format( type_, name[4:], net )
   str_   += '} iface_t;\n\n'
 
+  str_   += 'void eval({});\n\n'.format('\n'+cycle_params+'\n')
   str_   += 'void cycle({});\n\n'.format('\n'+cycle_params+'\n')
+  str_   += 'void cycle_n({});\n\n'.format(
+              '\n    unsigned int   n,\n'+cycle_params+'\n')
 
-  str_   += 'unsigned int  ncycles;\n'
+  str_   += 'extern unsigned int ncycles;\n'
   return str_
 
 #-----------------------------------------------------------------------
@@ -53,7 +59,10 @@ def gen_cheader( cycle_params, top_ports ):
     str_ += '    {} {};  // {}\n'.format( type_, name[4:], net )
   str_   += '  } iface_t;\n\n'
 
+  str_   += '  extern void eval({}  );\n'.format('\n'+cycle_params+'\n')
   str_   += '  extern void cycle({}  );\n'.format('\n'+cycle_params+'\n')
+  str_   += '  extern void cycle_n({}  );\n'.format(
+              '\n    unsigned int   n,\n'+cycle_params+'\n')
   str_   += '  extern unsigned int ncycles;\n'
 
   str_   += '};\n'
@@ -143,9 +152,15 @@ def gen_pywrapper( top_inports, top_outports ):
       self.cycle( reset=1 )
       self.cycle( reset=1 )
 
+    def eval( self, clk=0, reset=0 ):
+      self._cmodule.eval( clk, reset, self._top )
+
     def cycle( self, clk=0, reset=0 ):
       self._cmodule.cycle( clk, reset, self._top )
 
+    def cycle_n( self, n, clk=0, reset=0 ):
+      self._cmodule.cycle_n( n, clk, reset, self._top )
+
     @property
     def ncycles( self ):
       return self._cmodule.ncycles
@@ -162,26 +177,29 @@ def create_cpp_py_wrapper( model, cdef, lib_file, wrapper_filename ):
 
   # translate pymtl      to cpp, cdef
   # compile   cpp        to so
-  # create    so,cdef    w  cffi
+  # create    so,cdef    w  cffi (API mode extension module)
   # create    pymtl_wrap w  pymtl_cppnames
 
+  # The cdef only holds plain C declarations, so it doubles as the
+  # source of the extension module
+  module_name = '_{}_cpp'.format( model.class_name )
+  create_cffi_module( module_name, cdef, cdef, lib_file )
+
   port_defs   = []
   set_inputs  = []
-  set_outputs = []
+  set_comb    = []
+  set_next    = []
 
   for x in model.get_ports( preserve_hierarchy=True ):
     recurse_port_hierarchy( x, port_defs )
 
   for x in model.get_inports():
     if x.name in ['clk', 'reset']: continue  # TODO: remove me!
-    decl    = "lambda: setattr( s._top, '{}', s.{}.uint() )" \
-              .format( x.cpp_name[4:], x.name )
-    call    = "s._cffi_update[ s.{} ] = {}".format( x.name, decl )
-    set_inputs.append( call )
+    set_inputs.append( "s._top.{} = s.{}".format( x.cpp_name[4:], x.name ) )
 
   for x in model.get_outports():
-    decl = "s.{}.value = s._top.{}".format( x.name, x.cpp_name[4:] )
-    set_outputs.append( decl )
+    set_comb.append( "s.{}.value = s._top.{}".format( x.name, x.cpp_name[4:] ) )
+    set_next.append( "s.{}.next  = s._top.{}".format( x.name, x.cpp_name[4:] ) )
 
   # pretty printing
   indent_four = '\n    '
@@ -194,11 +212,12 @@ def create_cpp_py_wrapper( model, cdef, lib_file, wrapper_filename ):
     py_src = template.read()
     py_src = py_src.format(
         model_name  = model.class_name,
-        cdef        = cdef,
-        lib_file    = lib_file,
+        module_name = module_name,
         port_defs   = indent_four.join( port_defs ),
-        set_inputs  = indent_four.join( set_inputs ),
-        set_outputs = indent_six .join( set_outputs ),
+        set_inputs  = indent_six .join( set_inputs ),
+        set_comb    = indent_six .join( set_comb ),
+        set_next    = indent_six .join( set_next ),
+        set_outputs = indent_four.join( set_comb ),
     )
 
     output.write( py_src )
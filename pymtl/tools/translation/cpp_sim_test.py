@@ -0,0 +1,178 @@
+#=======================================================================
+# cpp_sim_test.py
+#=======================================================================
+
+import pytest
+import random
+import re
+
+from pymtl       import *
+from cpp_sim     import get_cpp
+from pclib.rtl   import Adder, Incrementer, Mux, RegEnRst
+from pclib.rtl   import RoundRobinArbiter, NormalQueue, RegisterFile
+from pclib.rtl   import SRAMBitsComb_rst_1rw
+
+#-----------------------------------------------------------------------
+# Test Config
+#-----------------------------------------------------------------------
+# Skip all tests in module if g++ is not installed
+
+pytestmark = requires_gxx
+
+#-----------------------------------------------------------------------
+# Models
+#-----------------------------------------------------------------------
+
+class CppIncr( Model ):
+  def __init__( s ):
+    s.in_ = InPort ( 8 )
+    s.out = OutPort( 8 )
+    s.reg = Wire   ( 8 )
+
+    @s.posedge_clk
+    def seq():
+      if s.reset:
+        s.reg.next = 0
+      else:
+        s.reg.next = s.in_
+
+    # Results wider than 8 bits are truncated
+
+    @s.combinational
+    def comb():
+      s.out.value = s.reg + 0xf1
+
+class CppSlices( Model ):
+  def __init__( s ):
+    s.in_ = InPort ( 8 )
+    s.out = OutPort( 8 )
+    s.bit = OutPort( 1 )
+    s.reg = Wire   ( 8 )
+
+    @s.posedge_clk
+    def seq():
+      s.reg[0:4].next = s.in_[4:8]
+      s.reg[4:8].next = s.reg[0:4]
+
+    @s.combinational
+    def comb():
+      s.out.value      = s.reg
+      s.out[6:8].value = s.in_[0:2]
+      s.bit.value      = s.in_[3] ^ s.reg[7]
+
+class CppDesign( Model ):
+  def __init__( s ):
+    s.in_    = InPort ( 8 )
+    s.out    = OutPort( 8 )
+    s.hi     = OutPort( 4 )
+    s.swap   = OutPort( 8 )
+    s.bit    = OutPort( 1 )
+    s.incrs  = [ CppIncr() for _ in range( 2 ) ]
+    s.slices = CppSlices()
+
+    s.connect( s.in_,           s.incrs[0].in_     )
+    s.connect( s.incrs[0].out,  s.incrs[1].in_     )
+    s.connect( s.incrs[1].out,  s.slices.in_       )
+    s.connect( s.slices.out,    s.out              )
+    s.connect( s.slices.bit,    s.bit              )
+    s.connect( s.incrs[1].out[4:8], s.hi           )
+    s.connect( s.swap[0:4],     s.incrs[0].out[4:8] )
+    s.connect( s.swap[4:8],     s.in_[0:4]         )
+
+def run( model, ncycles ):
+  model.elaborate()
+  sim = SimulationTool( model )
+  sim.reset()
+  trace = []
+  for i in range( ncycles ):
+    model.in_.value = ( 37 * i ) % 256
+    sim.eval_combinational()
+    trace.append( ( int( model.out ), int( model.hi ),
+                    int( model.swap ), int( model.bit ) ) )
+    sim.cycle()
+  return trace
+
+#-----------------------------------------------------------------------
+# test_cpp
+#-----------------------------------------------------------------------
+# The C++ model matches the Python simulation, including combinational
+# paths from the inputs to the outputs within the same cycle.
+
+def test_cpp( tmpdir, monkeypatch ):
+
+  monkeypatch.chdir( tmpdir )
+
+  expected = run( CppDesign(), 20 )
+  cmodel   = get_cpp( CppDesign() )
+  assert run( cmodel, 20 ) == expected
+
+  # Run many cycles in a single call
+
+  ncycles = cmodel.ncycles
+  cmodel.cycle_n( 100 )
+  assert cmodel.ncycles == ncycles + 100
+
+#-----------------------------------------------------------------------
+# test_pclib
+#-----------------------------------------------------------------------
+# The C++ model of pclib RTL, which uses temporaries, closure constants,
+# asserts, lists of ports and MemoryArrays, matches the Python
+# simulation for random inputs, also when running many cycles at once.
+
+def lookup( model, name ):
+  obj = model
+  for field in re.findall( r'\w+|\[\d+\]', name ):
+    obj = obj[ int( field[1:-1] ) ] if field[0] == '[' else getattr( obj, field )
+  return obj
+
+def run_random( model, ncycles, seed ):
+  model.elaborate()
+  sim = SimulationTool( model )
+  sim.reset()
+
+  rng      = random.Random( seed )
+  inports  = sorted( x.name for x in model.get_inports()
+                     if x.name not in [ 'clk', 'reset' ] )
+  outports = sorted( x.name for x in model.get_outports() )
+
+  def outputs():
+    return [ ( x, int( lookup( model, x ) ) ) for x in outports ]
+
+  trace = []
+  for i in range( ncycles ):
+    for name in inports:
+      port = lookup( model, name )
+      port.value = rng.getrandbits( port.nbits )
+    sim.eval_combinational()
+    trace.append( outputs() )
+    sim.cycle()
+
+  return trace, sim, outputs
+
+@pytest.mark.parametrize( 'name, model_class', [
+  ( 'Adder',             lambda: Adder( 16 )                        ),
+  ( 'Incrementer',       lambda: Incrementer( 16, 3 )               ),
+  ( 'Mux',               lambda: Mux( 8, 4 )                        ),
+  ( 'RegEnRst',          lambda: RegEnRst( 16, reset_value=0x1234 ) ),
+  ( 'RoundRobinArbiter', lambda: RoundRobinArbiter( 4 )             ),
+  ( 'NormalQueue',       lambda: NormalQueue( 4, 16 )               ),
+  ( 'RegisterFile',      lambda: RegisterFile( Bits( 16 ), 8, 2 )   ),
+  ( 'SRAM',              lambda: SRAMBitsComb_rst_1rw( 8, 16, 7 )   ),
+])
+def test_pclib( tmpdir, monkeypatch, name, model_class ):
+
+  monkeypatch.chdir( tmpdir )
+
+  expected, sim, outputs = run_random( model_class(), 50, 0xbeef )
+  cmodel                 = get_cpp( model_class() )
+  trace, _, coutputs     = run_random( cmodel, 50, 0xbeef )
+  assert trace == expected
+
+  # Run the next 100 cycles with the same inputs in a single call
+
+  for i in range( 100 ):
+    sim.cycle()
+  sim.eval_combinational()
+
+  cmodel.cycle_n( 100 )
+  assert coutputs() == outputs()
@@ -1,31 +1,36 @@
 from pymtl import *
-from cffi  import FFI
+
+from pymtl.tools.translation.cffi_helpers import load_cffi_module
 
 class {model_name}( Model ):
 
-  def __init__( s ):
+  # CFFI extension module (API mode) calling into the shared library
 
-    ffi = FFI()
-    ffi.cdef('''
-      {cdef}
-    ''')
+  _cpp_module = load_cffi_module( '{module_name}', '.' )
+
+  def __init__( s ):
 
-    s._cmodule = ffi.dlopen('./{lib_file}')
-    s._top     = ffi.new("iface_t *")
+    s._cmodule = s._cpp_module.lib
+    s._top     = s._cpp_module.ffi.new("iface_t *")
 
     class BundleProxy( PortBundle ):
       flip = False
 
     {port_defs}
 
-    # Set Input Callbacks
-    s._cffi_update = {{}}
-    {set_inputs}
-
   def elaborate_logic( s ):
 
-    #@s.combinational
-    #def logic():
+    @s.combinational
+    def logic():
+
+      # Set inputs
+      {set_inputs}
+
+      # Evaluate combinational logic
+      s._cmodule.eval( s.clk, s.reset, s._top )
+
+      # Set outputs
+      {set_comb}
 
     @s.tick
     def seq_logic():
@@ -34,7 +39,19 @@ class {model_name}( Model ):
       s._cmodule.cycle( s.clk, s.reset, s._top )
 
       # Set outputs
-      {set_outputs}
+      {set_next}
+
+  # The state of the C++ model is not visible to the simulator, so
+  # cycles can never be skipped
+
+  def idle_cycles( s ):
+    return 0
+
+  def cycle_n( s, n ):
+    s._cmodule.cycle_n( n, s.clk, s.reset, s._top )
+
+    # Set outputs
+    {set_outputs}
 
   @property
   def ncycles( s ):
@@ -5,15 +5,23 @@
 from __future__ import print_function
 
 import os
+import re
 import shutil
+import hashlib
+import platform
+import collections
 
 import verilog_structural
 from ...tools.simulation.vcd import get_vcd_timescale
+from ...tools.simulation     import sim_utils, analysis_cache
 
 from subprocess          import check_output, STDOUT, CalledProcessError
-from ...model.signals    import InPort, OutPort
+from multiprocessing     import cpu_count
+from multiprocessing.pool import ThreadPool
+from ...model.signals    import InPort, OutPort, Signal, MemoryArray
 from ...model.PortBundle import PortBundle
 from exceptions          import VerilatorCompileError
+from cffi_helpers        import create_cffi_module
 
 #-----------------------------------------------------------------------
 # verilog_to_pymtl
@@ -21,7 +29,8 @@ from exceptions          import VerilatorCompileError
 # Create a PyMTL compatible interface for Verilog HDL.
 
 def verilog_to_pymtl( model, verilog_file, c_wrapper_file,
-                      lib_file, py_wrapper_file, vcd_en, lint, verilator_xinit ):
+                      lib_file, py_wrapper_file, vcd_en, lint, verilator_xinit,
+                      build_profile=None ):
 
   model_name = model.class_name
 
@@ -43,7 +52,10 @@ def verilog_to_pymtl( model, verilog_file, c_wrapper_file,
 
   # Create Shared C Library
   create_shared_lib( model_name, c_wrapper_file, lib_file,
-                     vcd_en, vlinetrace )
+                     vcd_en, vlinetrace, build_profile )
+
+  # Create CFFI extension module calling into the library
+  create_cffi_wrapper( model, lib_file, vlinetrace )
 
   # Create PyMTL wrapper for CFFI interface to Verilated model
   create_verilator_py_wrapper( model, py_wrapper_file, lib_file,
@@ -136,21 +148,6 @@ def create_c_wrapper( model, c_wrapper_file, vcd_en, vlinetrace, verilator_xinit
   template_filename = template_dir + os.path.sep + 'verilator_wrapper.templ.c'
   ports = model.get_ports()
 
-  # Utility function for creating port declarations
-  def port_to_decl( port ):
-    code = '{data_type} * {verilator_name};'
-
-    verilator_name = port.verilator_name
-    bitwidth       = port.nbits
-
-    if   bitwidth <= 8:  data_type = 'unsigned char'
-    elif bitwidth <= 16: data_type = 'unsigned short'
-    elif bitwidth <= 32: data_type = 'unsigned int'
-    elif bitwidth <= 64: data_type = 'unsigned long'
-    else:                data_type = 'unsigned int'
-
-    return code.format( **locals() )
-
   # Utility function for creating port initializations
   def port_to_init( port ):
     code = 'm->{verilator_name} = {dereference}model->{verilator_name};'
@@ -162,47 +159,416 @@ def create_c_wrapper( model, c_wrapper_file, vcd_en, vlinetrace, verilator_xinit
     return code.format( **locals() )
 
   # Create port declaration, initialization, and extern statements
-  indent_zero = '\n'
   indent_two  = '\n  '
   indent_four = '\n    '
-  indent_six  = '\n      '
 
-  port_externs = indent_two .join( [ port_to_decl( x ) for x in ports ] )
-  port_decls   = indent_zero.join( [ port_to_decl( x ) for x in ports ] )
+  port_externs = indent_four.join( [ port_to_decl( x ) for x in ports ] )
   port_inits   = indent_two .join( [ port_to_init( x ) for x in ports ] )
 
+  # Create the parameters and statements of set_inputs
+  input_params = ''.join( ', ' + x for x in set_inputs_params( model ) )
+  input_args   = ''.join( ', ' + x.split()[-1]
+                          for x in set_inputs_params( model ) )
+  set_inputs   = sum( [ set_inputs_stmts( x ) for x in model.get_inports()
+                       if x.name != 'clk' ], [] )
+
+  # Create the statements copying ports from/to the run_cycles buffers
+  in_layout, in_nwords   = get_run_layout( model.get_inports()  )
+  out_layout, out_nwords = get_run_layout( model.get_outports() )
+
+  run_inputs  = sum( [ run_input_stmts ( *x ) for x in in_layout  ], [] )
+  run_outputs = sum( [ run_output_stmts( *x ) for x in out_layout ], [] )
+
+  # Create the copies of the outputs last passed to PyMTL, and the
+  # statements comparing against them. Registered outputs are skipped
+  # when only the combinational logic was evaluated.
+  comb_outputs = get_comb_outputs( model )
+
+  out_prevs   = []
+  out_updates = []
+  for k, port in enumerate( model.get_outports() ):
+    out_prevs.append( port_to_prev( port ) )
+    update = update_output_stmt( port, k )
+    if port in comb_outputs:
+      out_updates.append( update )
+    else:
+      out_updates.append( 'if ( !comb_only ) ' + update )
+
   # Convert verilator_xinit to number
   if   ( verilator_xinit == "zeros" ) : verilator_xinit_num = 0
   elif ( verilator_xinit == "ones"  ) : verilator_xinit_num = 1
   elif ( verilator_xinit == "rand"  ) : verilator_xinit_num = 2
   else : print( "Not valid choice" )
 
+  # Generate the header of the C interface, next to the source
+  header_filename = template_dir + os.path.sep + 'verilator_wrapper.templ.h'
+  header_file     = os.path.join( os.path.dirname( c_wrapper_file ),
+                                  model.class_name + '_v.h' )
+
+  with open( header_filename, 'r' ) as template, \
+       open( header_file,     'w' ) as output:
+
+    output.write( template.read().format(
+      model_name        = model.class_name,
+      port_externs      = port_externs,
+      out_prevs         = indent_four.join( out_prevs ),
+      set_inputs_params = input_params,
+      dump_vcd          = '1' if vcd_en else '0',
+      vlinetrace        = '1' if vlinetrace else '0',
+    ))
+
   # Generate the source code using the template
   with open( template_filename , 'r' ) as template, \
        open( c_wrapper_file,     'w' ) as output:
 
     c_src = template.read()
     c_src = c_src.format( model_name    = model.class_name,
-                          port_externs  = port_externs,
-                          port_decls    = port_decls,
                           port_inits    = port_inits,
+                          run_inputs    = indent_four.join( run_inputs  ),
+                          run_outputs   = indent_four.join( run_outputs ),
+                          run_outputs_get = indent_two.join( run_outputs ),
+                          run_in_nwords  = in_nwords,
+                          run_out_nwords = out_nwords,
+                          out_updates    = indent_two .join( out_updates ),
+                          set_inputs_params = input_params,
+                          set_inputs_args   = input_args,
+                          set_inputs     = indent_two .join( set_inputs ),
                           # What was this for? -cbatten
                           # vcd_prefix    = vcd_file[:-4],
                           vcd_timescale = get_vcd_timescale( model ),
-                          dump_vcd      = '1' if vcd_en else '0',
-                          vlinetrace    = '1' if vlinetrace else '0',
 
                           verilator_xinit_num = verilator_xinit_num,
                         )
 
     output.write( c_src )
 
-  return port_decls.replace( indent_zero, indent_six )
+  return get_cdef( model, vlinetrace )
 
 #-----------------------------------------------------------------------
-# create_shared_lib
+# port_to_decl
+#-----------------------------------------------------------------------
+# Declaration of the pointer to a port of the Verilated model.
+
+def port_to_decl( port ):
+  code = '{data_type} * {verilator_name};'
+
+  verilator_name = port.verilator_name
+  data_type      = port_to_ctype( port )
+
+  return code.format( **locals() )
+
+#-----------------------------------------------------------------------
+# port_to_ctype
+#-----------------------------------------------------------------------
+# C type Verilator uses for a port, or for each word of ports wider than
+# 64 bits.
+
+def port_to_ctype( port ):
+  bitwidth = port.nbits
+
+  if   bitwidth <= 8:  return 'unsigned char'
+  elif bitwidth <= 16: return 'unsigned short'
+  elif bitwidth <= 32: return 'unsigned int'
+  elif bitwidth <= 64: return 'unsigned long'
+  else:                return 'unsigned int'
+
+#-----------------------------------------------------------------------
+# set_inputs_params
+#-----------------------------------------------------------------------
+# Parameters of set_inputs in the C wrapper: one per input port except
+# the clock, or one per 32-bit word of ports wider than 64 bits.
+
+def set_inputs_params( model ):
+  params = []
+  for port in model.get_inports():
+    if port.name == 'clk': continue
+    ctype = port_to_ctype( port )
+    for idx, offset in get_indices( port ):
+      params.append( '{} {}'.format( ctype, set_inputs_param( port, idx ) ) )
+  return params
+
+def set_inputs_param( port, idx ):
+  if port.nbits <= 64:
+    return port.verilator_name
+  return '{}__{}'.format( port.verilator_name, idx )
+
+#-----------------------------------------------------------------------
+# set_inputs_stmts
+#-----------------------------------------------------------------------
+# C statements of set_inputs setting a port from its parameters.
+
+def set_inputs_stmts( port ):
+  if port.nbits <= 64:
+    return [ '*m->{0} = {0};'.format( port.verilator_name ) ]
+  return [ 'm->{}[{}] = {};'.format( port.verilator_name, idx,
+                                      set_inputs_param( port, idx ) )
+           for idx, offset in get_indices( port ) ]
+
+#-----------------------------------------------------------------------
+# get_cdef
+#-----------------------------------------------------------------------
+# CFFI declarations of the C interface of the wrapper. The names of the
+# exposed methods start with a $, which is replaced by their prefix in
+# the library (empty, unless the model was merged with others into one
+# library, see verilator_merge.py). Only the fields of the struct
+# accessed from Python are declared, partial declarations end with the
+# '...;' API mode needs to complete them.
+
+def get_cdef( model, vlinetrace, partial=False ):
+
+  name  = model.class_name
+  decls = [ port_to_decl( x ) for x in model.get_ports() ]
+  decls.extend([ 'void * model;', 'int _vcd_en;' ])
+  if partial:
+    decls.append( '...;' )
+
+  params = ''.join( ', ' + x for x in set_inputs_params( model ) )
+
+  cdef = [ 'typedef struct {{' ]
+  cdef.extend( '  ' + x for x in decls )
+  cdef.extend([
+    '}} V{0}_t;',
+    '',
+    'V{0}_t * $create_model( const char * );',
+    'void $destroy_model( V{0}_t *);',
+    'void $eval( V{0}_t * );',
+    'int  $eval_comb( V{0}_t *, unsigned char * );',
+    'int  $eval_tick( V{0}_t *, unsigned char * );',
+    'int  $sync_outputs( V{0}_t *, unsigned char * );',
+    'void $run_cycles( V{0}_t *, unsigned long, const uint32_t *, uint32_t * );',
+    'void $set_inputs( V{0}_t *{1} );',
+    'int  $eval_inputs( V{0}_t *, unsigned char *{1} );',
+    'void $get_outputs( V{0}_t *, uint32_t * );',
+    'void $trace_on( V{0}_t *, unsigned long );',
+    'void $trace_off( V{0}_t * );',
+  ])
+  if vlinetrace:
+    cdef.append( 'void $trace( V{0}_t *, char * );' )
+
+  return '\n'.join( cdef ).format( name, params )
+
+#-----------------------------------------------------------------------
+# create_cffi_wrapper
+#-----------------------------------------------------------------------
+# Build the CFFI extension module (API mode) of the wrapper, which calls
+# into the shared library of the model.
+
+def create_cffi_wrapper( model, lib_file, vlinetrace ):
+
+  create_cffi_module(
+    module_name = '_{}_v'.format( model.class_name ),
+    cdef        = get_cdef( model, vlinetrace, partial=True ).replace( '$', '' ),
+    header      = '#include "{}_v.h"'.format( model.class_name ),
+    lib_file    = lib_file,
+  )
+
+#-----------------------------------------------------------------------
+# port_to_prev
+#-----------------------------------------------------------------------
+# Declaration of the copy of an output port last passed to PyMTL. The
+# double underscore cannot clash with a port name, since Verilator
+# mangles double underscores in names.
+
+def port_to_prev( port ):
+  name = port.verilator_name
+  if   port.nbits <= 8:  return 'unsigned char  {}__prev;'.format( name )
+  elif port.nbits <= 16: return 'unsigned short {}__prev;'.format( name )
+  elif port.nbits <= 32: return 'unsigned int   {}__prev;'.format( name )
+  elif port.nbits <= 64: return 'unsigned long  {}__prev;'.format( name )
+  else:
+    return 'unsigned int   {}__prev[{}];'.format( name, ( port.nbits-1 )/32+1 )
+
+#-----------------------------------------------------------------------
+# update_output_stmt
+#-----------------------------------------------------------------------
+# C statement flagging the k-th output port in the changed array if it
+# differs from the copy last passed to PyMTL, and updating the copy.
+
+def update_output_stmt( port, k ):
+  name = port.verilator_name
+  if port.nbits <= 64:
+    return ( 'n += changed[{k}] = ( m->{n}__prev != *m->{n} ); '
+             'm->{n}__prev = *m->{n};'.format( k=k, n=name ) )
+  return ( 'n += changed[{k}] = ( memcmp( m->{n}__prev, m->{n}, '
+           'sizeof( m->{n}__prev ) ) != 0 ); '
+           'memcpy( m->{n}__prev, m->{n}, sizeof( m->{n}__prev ) );'
+           .format( k=k, n=name ) )
+
+#-----------------------------------------------------------------------
+# get_comb_outputs
 #-----------------------------------------------------------------------
-# Compile the cpp wrapper into a shared library.
+# Return the set of output ports of the model with a combinational path
+# from an input port, that is, the outputs which may change when only
+# the inputs change. All other outputs are driven by registers and only
+# change on a clock edge.
+#
+# Paths go through connections and @combinational blocks, where every
+# signal a block writes depends on every signal it reads. Black boxes
+# and models without any blocks or submodels (e.g., imported Verilog)
+# are opaque, so all their outputs depend on all their inputs.
+
+def get_comb_outputs( model ):
+
+  signals = sim_utils.collect_signals( model )
+  nets, slice_connects = sim_utils.signals_to_nets( signals )
+
+  net_ids = {}
+  for i, net in enumerate( nets ):
+    for signal in net:
+      net_ids[ signal ] = i
+
+  # Build the graph of combinational dependencies between nets
+
+  succs = collections.defaultdict( set )
+
+  # MemoryArrays (and unconnected constants) are nodes of their own
+
+  def node( x ):
+    return net_ids.get( x, id( x ) )
+
+  def add_edges( srcs, dests ):
+    for src in srcs:
+      succs[ node( src ) ].update( node( x ) for x in dests )
+
+  for c in slice_connects:
+    add_edges( [ c.src_node ], [ c.dest_node ] )
+
+  def visit_models( m ):
+    blocks = m.get_combinational_blocks()
+    if m.vblackbox or not ( blocks or m.get_tick_blocks() or
+                            m.get_posedge_clk_blocks() or m.get_submodules() ):
+      add_edges( m.get_inports(), m.get_outports() )
+    for func in blocks:
+      loads, stores = analysis_cache.loads_and_stores( m, func )
+      add_edges( name_to_signals( m, loads ), name_to_signals( m, stores ) )
+    for subm in m.get_submodules():
+      visit_models( subm )
+
+  visit_models( model )
+
+  # Find all nets reachable from the inputs
+
+  reached = set()
+  pending = [ net_ids[ x ] for x in model.get_inports() if x.name != 'clk' ]
+  while pending:
+    net = pending.pop()
+    if net not in reached:
+      reached.add( net )
+      pending.extend( succs[ net ] )
+
+  return set( x for x in model.get_outports() if net_ids[ x ] in reached )
+
+#-----------------------------------------------------------------------
+# name_to_signals
+#-----------------------------------------------------------------------
+# Resolve the names loaded or stored by a block (e.g., 's.subs[?].out')
+# to the signals and MemoryArrays of the model they refer to. Indexing
+# a list refers to all of its elements, anything following a signal or
+# MemoryArray (slices, fields, entries, .value) refers to the signal or
+# MemoryArray itself. Names of local variables and other attributes
+# resolve to nothing.
+
+def name_to_signals( model, names ):
+
+  signals = []
+  for name in names:
+
+    tokens = re.findall( r'\[\?\]|[^.\[\]]+', name )
+    if not tokens or tokens[0] not in ( 's', 'self' ):
+      continue
+
+    objs = [ model ]
+    for token in tokens[1:]:
+      next_objs = []
+      for obj in objs:
+        if isinstance( obj, ( Signal, MemoryArray ) ):
+          next_objs.append( obj )
+        elif token == '[?]':
+          if isinstance( obj, list ):
+            next_objs.extend( obj )
+        elif not isinstance( obj, list ):
+          try:
+            next_objs.append( getattr( obj, token ) )
+          except AttributeError:
+            pass
+      objs = next_objs
+
+    # Lists of signals (e.g., loops over ports) may be nested
+
+    while objs:
+      obj = objs.pop()
+      if   isinstance( obj, list        ): objs.extend( obj )
+      elif isinstance( obj, Signal      ): signals.append( obj._signal )
+      elif isinstance( obj, MemoryArray ): signals.append( obj )
+
+  return signals
+
+#-----------------------------------------------------------------------
+# get_run_layout
+#-----------------------------------------------------------------------
+# Layout of the ports in the per-cycle vectors of the run_cycles
+# buffers. Each port takes up (nbits-1)/32+1 consecutive 32-bit words,
+# least-significant word first. Returns a list of (port, offset, nwords)
+# and the total number of words per cycle. The clock is never part of a
+# vector.
+
+def get_run_layout( ports ):
+  layout = []
+  offset = 0
+  for port in ports:
+    if port.name == 'clk': continue
+    nwords = ( port.nbits - 1 ) / 32 + 1
+    layout.append( ( port, offset, nwords ) )
+    offset += nwords
+  return layout, offset
+
+#-----------------------------------------------------------------------
+# run_input_stmts
+#-----------------------------------------------------------------------
+# C statements setting a port of the Verilated model from the words at
+# the given offset of the input vector. Verilator expects the unused
+# upper bits to be zero, so we mask them off.
+
+def run_input_stmts( port, offset, nwords ):
+  name = port.verilator_name
+  mask = '0x{:x}'.format( ( 1 << ( ( port.nbits - 1 ) % 32 + 1 ) ) - 1 )
+
+  if port.nbits <= 32:
+    return [ '*m->{} = in[{}] & {};'.format( name, offset, mask ) ]
+
+  if port.nbits <= 64:
+    return [ '*m->{} = ( (vluint64_t) ( in[{}] & {} ) << 32 ) | in[{}];'
+             .format( name, offset+1, mask, offset ) ]
+
+  stmts = [ 'm->{}[{}] = in[{}];'.format( name, i, offset+i )
+            for i in range( nwords-1 ) ]
+  stmts.append( 'm->{}[{}] = in[{}] & {};'
+                .format( name, nwords-1, offset+nwords-1, mask ) )
+  return stmts
+
+#-----------------------------------------------------------------------
+# run_output_stmts
+#-----------------------------------------------------------------------
+# C statements recording a port of the Verilated model into the words at
+# the given offset of the output vector.
+
+def run_output_stmts( port, offset, nwords ):
+  name = port.verilator_name
+
+  if port.nbits <= 32:
+    return [ 'out[{}] = *m->{};'.format( offset, name ) ]
+
+  if port.nbits <= 64:
+    return [ 'out[{}] = (uint32_t) *m->{};'        .format( offset,   name ),
+             'out[{}] = (uint32_t) ( *m->{} >> 32 );'.format( offset+1, name ) ]
+
+  return [ 'out[{}] = m->{}[{}];'.format( offset+i, name, i )
+           for i in range( nwords ) ]
+
+#-----------------------------------------------------------------------
+# BUILD_PROFILES
+#-----------------------------------------------------------------------
+# Compiler flags used to build the shared library.
 #
 # Verilator suggests:
 #
@@ -244,9 +610,15 @@ def create_c_wrapper( model, c_wrapper_file, vcd_en, vlinetrace, verilator_xinit
 #
 # http://www.veripool.org/projects/verilator/wiki/Manual-verilator
 
-# I have added a new feature which compiles all of the standard Verilator
-# code into a static library and then simply links this in. This reduces
-# compile times.
+# The 'quick' profile turns optimization off, since build time dominates
+# short tests. The 'fast' and 'native' profiles are meant for long
+# simulations; 'native' code only runs on the machine that built it.
+
+BUILD_PROFILES = {
+  'quick'  : '-O0',
+  'fast'   : '-O2',
+  'native' : '-O3 -march=native',
+}
 
 def try_cmd( name, cmd ):
 
@@ -310,13 +682,15 @@ def make_lib( output_file, input_files ):
 
   try_cmd( "Make library", ranlib_cmd )
 
-def create_shared_lib( model_name, c_wrapper_file, lib_file,
-                       vcd_en, vlinetrace ):
+#-----------------------------------------------------------------------
+# get_verilator_include_dir
+#-----------------------------------------------------------------------
+# We need to find out where the verilator include directories are
+# globally installed. We first check the PYMTL_VERILATOR_INCLUDE_DIR
+# environment variable, and if that does not exist then we fall back on
+# using pkg-config.
 
-  # We need to find out where the verilator include directories are
-  # globally installed. We first check the PYMTL_VERILATOR_INCLUDE_DIR
-  # environment variable, and if that does not exist then we fall back on
-  # using pkg-config.
+def get_verilator_include_dir():
 
   verilator_include_dir = os.environ.get('PYMTL_VERILATOR_INCLUDE_DIR')
   if verilator_include_dir is None:
@@ -373,48 +747,128 @@ Error:
         error   = e.output,
       ))
 
+  return verilator_include_dir
+
+#-----------------------------------------------------------------------
+# get_build_flags
+#-----------------------------------------------------------------------
+# Return the compiler flags for a build profile. If no profile is given,
+# the PYMTL_VERILATOR_BUILD environment variable selects the profile,
+# which defaults to 'quick' to minimize compile times for short tests.
+
+def get_build_flags( profile=None ):
+
+  if profile is None:
+    profile = os.environ.get( 'PYMTL_VERILATOR_BUILD', 'quick' )
+
+  try:
+    return BUILD_PROFILES[ profile ]
+  except KeyError:
+    raise ValueError( "Invalid build profile '{}', expected one of: {}"
+                      .format( profile, ', '.join( sorted( BUILD_PROFILES ) ) ) )
+
+#-----------------------------------------------------------------------
+# get_runtime_objects
+#-----------------------------------------------------------------------
+# The standard Verilator runtime sources are identical for every model,
+# so they are compiled once per machine, Verilator installation and set
+# of flags and the objects are cached in PYMTL_VERILATOR_CACHE_DIR
+# (~/.cache/pymtl/verilator by default). The objects are linked directly
+# into each shared library, so, just like when compiling the runtime
+# sources into each library, every library has its own copy of the
+# Verilator global state. Objects are compiled to a temporary file and
+# renamed, so concurrent builds never see a partially written object.
+
+def get_runtime_objects( sources, flags, include_dirs ):
+
+  cache_dir = os.environ.get( 'PYMTL_VERILATOR_CACHE_DIR',
+                 os.path.join( os.path.expanduser( '~' ), '.cache', 'pymtl',
+                               'verilator' ) )
+  if not os.path.exists( cache_dir ):
+    try:
+      os.makedirs( cache_dir )
+    except OSError:
+      if not os.path.isdir( cache_dir ):
+        raise
+
+  # Objects are keyed by everything that affects the generated code
+
+  def object_path( source ):
+    stat = os.stat( source )
+    key  = hashlib.sha1( '\0'.join([
+             os.path.abspath( source ), str( stat.st_size ),
+             str( stat.st_mtime ), flags, ' '.join( include_dirs ),
+             platform.node(), platform.machine(), get_compiler_version(),
+           ]) ).hexdigest()[:16]
+    name = os.path.splitext( os.path.basename( source ) )[0]
+    return os.path.join( cache_dir, '{}_{}.o'.format( name, key ) )
+
+  objs    = [ object_path( x ) for x in sources ]
+  missing = [ ( x, o ) for x, o in zip( sources, objs )
+              if not os.path.exists( o ) ]
+
+  def compile_runtime( job ):
+    source, obj = job
+    temp = '{}.{}.tmp'.format( obj, os.getpid() )
+    compile( flags + ' -fPIC -c', include_dirs, temp, [ source ] )
+    os.rename( temp, obj )
+
+  parallel_map( compile_runtime, missing )
+
+  return objs
+
+#-----------------------------------------------------------------------
+# get_compiler_version
+#-----------------------------------------------------------------------
+
+_compiler_version = []
+
+def get_compiler_version():
+  if not _compiler_version:
+    _compiler_version.append( check_output( [ 'g++', '--version' ] ) )
+  return _compiler_version[0]
+
+#-----------------------------------------------------------------------
+# parallel_map
+#-----------------------------------------------------------------------
+# Run func on every item using a pool of threads, one per core unless
+# the PYMTL_VERILATOR_JOBS environment variable says otherwise. Each
+# thread spends its time waiting on a compiler subprocess, so threads
+# are enough to use all cores.
+
+def parallel_map( func, items ):
+
+  jobs = int( os.environ.get( 'PYMTL_VERILATOR_JOBS', 0 ) ) or cpu_count()
+  jobs = min( jobs, len( items ) )
+
+  if jobs <= 1:
+    return map( func, items )
+
+  pool = ThreadPool( jobs )
+  try:
+    return pool.map( func, items )
+  finally:
+    pool.close()
+    pool.join()
+
+#-----------------------------------------------------------------------
+# create_shared_lib
+#-----------------------------------------------------------------------
+# The generated classes are compiled into separate objects in parallel
+# with the flags of the selected build profile, and linked with the
+# cached Verilator runtime objects into the shared library.
+
+def create_shared_lib( model_name, c_wrapper_file, lib_file,
+                       vcd_en, vlinetrace, profile=None ):
+
+  verilator_include_dir = get_verilator_include_dir()
+
   include_dirs = [
     verilator_include_dir,
     verilator_include_dir+"/vltstd",
   ]
 
-  # Compile standard Verilator code if libverilator.a does not exist.
-  # Originally, I was also including verilated_dpi.cpp in this library,
-  # but for some reason that screws up line tracing. Somehow there is
-  # some kind of global state or something that is shared across the
-  # shared libraries or something. I was able to fix it by recompiling
-  # verilated_dpi if linetracing is enabled. Actually, the line tracing
-  # doesn't work -- if you use this line tracing approach, so we are back
-  # to always recomping everyting every time for now.
-
-  # if not os.path.exists( "libverilator.a" ):
-  #
-  #   compile(
-  #     flags        = "-O3 -c",
-  #     include_dirs = include_dirs,
-  #     output_file  = "verilator.o",
-  #     input_files  = [ verilator_include_dir+"/verilated.cpp" ]
-  #   )
-  #
-  #   compile(
-  #     flags        = "-O3 -c",
-  #     include_dirs = include_dirs,
-  #     output_file  = "verilator_vcd_c.o",
-  #     input_files  = [ verilator_include_dir+"/verilated_vcd_c.cpp" ]
-  #   )
-  #
-  #   # compile(
-  #   #   flags        = "-O3 -c",
-  #   #   include_dirs = include_dirs,
-  #   #   output_file  = "verilator_dpi.o",
-  #   #   input_files  = [ verilator_include_dir+"/verilated_dpi.cpp" ]
-  #   # )
-  #
-  #   make_lib(
-  #     output_file  = "libverilator.a",
-  #     # input_files  = [ "verilator.o", "verilator_vcd_c.o", "verilator_dpi.o" ]
-  #     input_files  = [ "verilator.o", "verilator_vcd_c.o" ]
-  #    )
+  flags = get_build_flags( profile )
 
   obj_dir_prefix = "obj_dir_{m}/V{m}".format( m=model_name )
 
@@ -440,24 +894,91 @@ Error:
 
   cpp_sources_list += [
     obj_dir_prefix+"__Syms.cpp",
+    c_wrapper_file,
+  ]
+
+  runtime_sources_list = [
     verilator_include_dir+"/verilated.cpp",
     verilator_include_dir+"/verilated_dpi.cpp",
-    c_wrapper_file,
   ]
 
   if vcd_en:
     cpp_sources_list += [
-      verilator_include_dir+"/verilated_vcd_c.cpp",
       obj_dir_prefix+"__Trace.cpp",
       obj_dir_prefix+"__Trace__Slow.cpp",
     ]
+    runtime_sources_list += [
+      verilator_include_dir+"/verilated_vcd_c.cpp",
+    ]
+
+  def compile_source( source ):
+    obj = "obj_dir_{m}/{f}.o".format( m=model_name,
+            f=os.path.splitext( os.path.basename( source ) )[0] )
+    compile( flags + ' -fPIC -c', include_dirs, obj, [ source ] )
+    return obj
+
+  objs  = get_runtime_objects( runtime_sources_list, flags, include_dirs )
+  objs  = parallel_map( compile_source, cpp_sources_list ) + objs
+
+  compile(
+    flags        = flags + " -fPIC -shared",
+    include_dirs = [],
+    output_file  = lib_file,
+    input_files  = objs,
+  )
+
+#-----------------------------------------------------------------------
+# create_merged_lib
+#-----------------------------------------------------------------------
+# Link several verilated models into one shared library with a single
+# copy of the Verilator runtime. models is a list of (model name, build
+# directory) pairs, where each build directory holds the objects built
+# by create_shared_lib. The C wrappers of all models are included by
+# c_wrapper_file and compiled again with prefixed method names, all
+# other objects are reused.
+
+def create_merged_lib( c_wrapper_file, lib_file, models, profile=None ):
+
+  verilator_include_dir = get_verilator_include_dir()
+
+  include_dirs = [
+    verilator_include_dir,
+    verilator_include_dir+"/vltstd",
+  ]
+
+  flags = get_build_flags( profile )
+
+  objs   = []
+  vcd_en = False
+  for model_name, build_dir in models:
+    obj_dir     = os.path.join( build_dir, 'obj_dir_'+model_name )
+    wrapper_obj = '{}_v.o'.format( model_name )
+    objs.extend( os.path.join( obj_dir, x ) for x in sorted( os.listdir( obj_dir ) )
+                 if x.endswith( '.o' ) and x != wrapper_obj )
+    vcd_en |= os.path.exists( os.path.join( obj_dir,
+                              'V{}__Trace.o'.format( model_name ) ) )
+
+  runtime_sources_list = [
+    verilator_include_dir+"/verilated.cpp",
+    verilator_include_dir+"/verilated_dpi.cpp",
+  ]
+
+  if vcd_en:
+    runtime_sources_list += [
+      verilator_include_dir+"/verilated_vcd_c.cpp",
+    ]
+
+  wrapper_obj = os.path.splitext( c_wrapper_file )[0] + '.o'
+  compile( flags + ' -fPIC -c', include_dirs, wrapper_obj, [ c_wrapper_file ] )
+
+  objs = [ wrapper_obj ] + objs
+  objs = objs + get_runtime_objects( runtime_sources_list, flags, include_dirs )
 
   compile(
-    # flags        = "-O1 -fstrict-aliasing -fPIC -shared -L. -lverilator",
-    flags        = "-O0 -fPIC -shared",
-    include_dirs = include_dirs,
+    flags        = flags + " -fPIC -shared",
+    include_dirs = [],
     output_file  = lib_file,
-    input_files  = cpp_sources_list,
+    input_files  = objs,
   )
 
 #-----------------------------------------------------------------------
@@ -470,24 +991,40 @@ def create_verilator_py_wrapper( model, wrapper_filename, lib_file,
   template_dir      = os.path.dirname( os.path.abspath( __file__ ) )
   template_filename = template_dir + os.path.sep + 'verilator_wrapper.templ.py'
 
-  port_defs  = []
-  set_inputs = []
-  set_comb   = []
-  set_next   = []
+  port_defs = []
 
   from cpp_helpers import recurse_port_hierarchy
   for x in model.get_ports( preserve_hierarchy=True ):
     recurse_port_hierarchy( x, port_defs )
 
+  # All inputs are passed to the single call evaluating the
+  # combinational logic
+
+  inputs = []
   for port in model.get_inports():
     if port.name == 'clk': continue
-    input_ = set_input_stmt( port )
-    set_inputs.extend( input_ )
+    for idx, offset in get_indices( port ):
+      inputs.append( 's.{}{}'.format( port.name, offset ) )
+
+  # Only the outputs with a combinational path from the inputs are
+  # updated after evaluating the combinational logic, all outputs are
+  # updated after a clock edge. Only outputs which changed are written.
+
+  comb_outputs = get_comb_outputs( model )
+  outports     = model.get_outports()
+
+  set_comb    = update_outputs_stmts( 'eval_inputs', 'value',
+                  [ x for x in outports if x in comb_outputs ], outports,
+                  inputs )
+  set_next    = update_outputs_stmts( 'eval_tick',    'next',  outports, outports )
+  set_outputs = update_outputs_stmts( 'sync_outputs', 'value', outports, outports )
+
+  in_layout, in_nwords   = get_run_layout( model.get_inports()  )
+  out_layout, out_nwords = get_run_layout( model.get_outports() )
 
-  for port in model.get_outports():
-    comb, next_ = set_output_stmt( port )
-    set_comb.extend( comb  )
-    set_next.extend( next_ )
+  def layout_repr( layout ):
+    return repr( [ ( port.name, offset, nwords )
+                   for port, offset, nwords in layout ] )
 
   # pretty printing
   indent_four = '\n    '
@@ -500,12 +1037,16 @@ def create_verilator_py_wrapper( model, wrapper_filename, lib_file,
     py_src = template.read()
     py_src = py_src.format(
         model_name  = model.class_name,
-        port_decls  = cdefs,
-        lib_file    = lib_file,
+        cdef        = cdefs.replace( '\n', indent_six ),
         port_defs   = indent_four.join( port_defs ),
-        set_inputs  = indent_six .join( set_inputs ),
         set_comb    = indent_six .join( set_comb ),
         set_next    = indent_six .join( set_next ),
+        set_outputs = indent_four.join( set_outputs ),
+        noutputs    = max( len( outports ), 1 ),
+        in_layout   = layout_repr( in_layout  ),
+        out_layout  = layout_repr( out_layout ),
+        in_nwords   = in_nwords,
+        out_nwords  = out_nwords,
         vlinetrace  = '1' if vlinetrace else '0',
     )
 
@@ -528,11 +1069,15 @@ def get_indices( port ):
 #-----------------------------------------------------------------------
 # set_input_stmt
 #-----------------------------------------------------------------------
-def set_input_stmt( port ):
+# m is the expression for the C struct of the model, and model the one
+# for the PyMTL wrapper.
+def set_input_stmt( port, m='s._m', model='s' ):
   inputs = []
   for idx, offset in get_indices( port ):
-    inputs.append( 's._m.{v_name}[{idx}] = s.{py_name}{offset}' \
-                    .format( v_name  = port.verilator_name,
+    inputs.append( '{m}.{v_name}[{idx}] = {model}.{py_name}{offset}' \
+                    .format( m       = m,
+                             model   = model,
+                             v_name  = port.verilator_name,
                              py_name = port.name,
                              idx     = idx,
                              offset  = offset )
@@ -542,21 +1087,43 @@ def set_input_stmt( port ):
 #-----------------------------------------------------------------------
 # set_output_stmt
 #-----------------------------------------------------------------------
-# TODO: no way to distinguish between combinational and sequential
-#       outputs, so we set outputs both ways...
-#       This seems broken, but I can't think of a better way.
-def set_output_stmt( port ):
-  comb, next_ = [], []
+def set_output_stmt( port, sigtype, m='s._m', model='s' ):
+  outputs = []
   for idx, offset in get_indices( port ):
-    assign = 's.{py_name}{offset}.{sigtype} = s._m.{v_name}[{idx}]' \
-             .format( v_name  = port.verilator_name,
-                      py_name = port.name,
-                      idx     = idx,
-                      offset  = offset,
-                      sigtype = '{sigtype}' )
-    comb .append( assign.format( sigtype = 'value' ) )
-    next_.append( assign.format( sigtype = 'next'  ) )
-  return comb, next_
+    outputs.append( '{model}.{py_name}{offset}.{sigtype} = {m}.{v_name}[{idx}]' \
+                    .format( m       = m,
+                             model   = model,
+                             v_name  = port.verilator_name,
+                             py_name = port.name,
+                             idx     = idx,
+                             offset  = offset,
+                             sigtype = sigtype )
+                  )
+  return outputs
+
+#-----------------------------------------------------------------------
+# update_outputs_stmts
+#-----------------------------------------------------------------------
+# Statements calling func of the C wrapper with args following the
+# model and the changed flags, which flags the outputs that changed
+# since they were last written, and writing the given ports if they
+# were flagged. The flags are indexed by the position of each port in
+# outports. The call is always the test of an if statement, so the
+# simulator sees the ports passed in args as loads.
+def update_outputs_stmts( func, sigtype, ports, outports, args=[] ):
+  call = 's._ffi.{}( s._m, s._changed'.format( func )
+  if args:
+    stmts = [ 'if {},'.format( call ) ]
+    stmts.extend( '      {},'.format( x ) for x in args[:-1] )
+    stmts.append( '      {} ):'.format( args[-1] ) )
+  else:
+    stmts = [ 'if {} ):'.format( call ) ]
+  if not ports:
+    stmts.append( '  pass' )
+  for port in ports:
+    stmts.append( '  if s._changed[{}]:'.format( outports.index( port ) ) )
+    stmts.extend( '    ' + x for x in set_output_stmt( port, sigtype ) )
+  return stmts
 
 #-----------------------------------------------------------------------
 # verilator_mangle
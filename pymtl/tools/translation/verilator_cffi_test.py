@@ -0,0 +1,382 @@
+#=======================================================================
+# verilator_cffi_test.py
+#=======================================================================
+# Tests for building the shared library of a verilated model. A stub
+# Verilator runtime and stub generated classes are used, so these tests
+# only require g++.
+
+import os
+import imp
+import pytest
+
+from array          import array
+from cffi           import FFI
+from pymtl          import *
+from verilator_cffi import create_shared_lib, get_build_flags, compile
+from verilator_cffi import create_c_wrapper, create_verilator_py_wrapper
+from verilator_cffi import create_cffi_wrapper
+from verilator_cffi import get_comb_outputs
+from pclib.rtl      import Reg, Incrementer
+
+#-----------------------------------------------------------------------
+# Test Config
+#-----------------------------------------------------------------------
+# Skip all tests in module if g++ is not installed
+
+pytestmark = requires_gxx
+
+#-----------------------------------------------------------------------
+# Stub sources
+#-----------------------------------------------------------------------
+
+def write( path, text ):
+  with open( str( path ), 'w' ) as f:
+    f.write( text )
+
+@pytest.fixture
+def stub( tmpdir, monkeypatch ):
+
+  include_dir = tmpdir.mkdir( 'include' )
+  include_dir.mkdir( 'vltstd' )
+  write( include_dir.join( 'verilated.cpp'     ), 'int verilated() { return 1; }\n' )
+  write( include_dir.join( 'verilated_dpi.cpp' ), 'int verilated_dpi() { return 2; }\n' )
+
+  build_dir = tmpdir.mkdir( 'build' )
+  obj_dir   = build_dir.mkdir( 'obj_dir_Stub' )
+  write( obj_dir.join( 'VStub_classes.mk' ),
+         'VM_CLASSES_FAST += \\\n\tVStub \\\n\tVStub_sub \\\n\n'
+         'VM_CLASSES_SLOW += \\\n\n' )
+  write( obj_dir.join( 'VStub.cpp'       ), 'int stub() { return 3; }\n' )
+  write( obj_dir.join( 'VStub_sub.cpp'   ), 'int stub_sub() { return 4; }\n' )
+  write( obj_dir.join( 'VStub__Syms.cpp' ), 'int stub_syms() { return 5; }\n' )
+  write( build_dir.join( 'Stub_v.cpp' ),
+         'int verilated(); int verilated_dpi(); int stub(); int stub_sub();\n'
+         'int stub_syms();\n'
+         'extern "C" int eval() {\n'
+         '  return verilated() + verilated_dpi() + stub() + stub_sub()\n'
+         '         + stub_syms();\n'
+         '}\n' )
+
+  cache_dir = tmpdir.join( 'cache' )
+  monkeypatch.setenv( 'PYMTL_VERILATOR_INCLUDE_DIR', str( include_dir ) )
+  monkeypatch.setenv( 'PYMTL_VERILATOR_CACHE_DIR',   str( cache_dir   ) )
+  monkeypatch.chdir( build_dir )
+
+  return cache_dir
+
+def build_and_eval( profile ):
+  create_shared_lib( 'Stub', 'Stub_v.cpp', 'libStub_v.so', False, False,
+                     profile )
+  ffi = FFI()
+  ffi.cdef( 'int eval();' )
+  return ffi.dlopen( os.path.abspath( 'libStub_v.so' ) ).eval()
+
+#-----------------------------------------------------------------------
+# test_build
+#-----------------------------------------------------------------------
+
+def test_build( stub ):
+
+  assert build_and_eval( 'quick' ) == 15
+
+  # Runtime objects are compiled once and reused
+
+  objs  = sorted( stub.listdir() )
+  mtime = [ x.mtime() for x in objs ]
+  assert len( objs ) == 2
+  assert build_and_eval( 'quick' ) == 15
+  assert sorted( stub.listdir() ) == objs
+  assert [ x.mtime() for x in objs ] == mtime
+
+  # Every profile has its own runtime objects
+
+  assert build_and_eval( 'fast' ) == 15
+  assert len( stub.listdir() ) == 4
+
+#-----------------------------------------------------------------------
+# test_build_flags
+#-----------------------------------------------------------------------
+
+def test_build_flags( monkeypatch ):
+
+  monkeypatch.delenv( 'PYMTL_VERILATOR_BUILD', raising=False )
+  assert get_build_flags()         == '-O0'
+  assert get_build_flags( 'fast' ) == '-O2'
+
+  monkeypatch.setenv( 'PYMTL_VERILATOR_BUILD', 'native' )
+  assert get_build_flags()         == '-O3 -march=native'
+
+  with pytest.raises( ValueError ):
+    get_build_flags( 'O9' )
+
+#-----------------------------------------------------------------------
+# test_comb_outputs
+#-----------------------------------------------------------------------
+
+class Opaque( Model ):
+  def __init__( s ):
+    s.in_ = InPort ( 8 )
+    s.out = OutPort( 8 )
+
+class Outputs( Model ):
+  def __init__( s ):
+    s.in_  = InPort ( 8 )
+    s.sel  = InPort ( 1 )
+    s.regd = OutPort( 8 )
+    s.incr = OutPort( 8 )
+    s.thru = OutPort( 8 )
+    s.hi   = OutPort( 4 )
+    s.bbox = OutPort( 8 )
+    s.lst  = OutPort[2]( 8 )
+
+    s.reg  = Reg( 8 )
+    s.inc  = Incrementer( 8 )
+    s.opq  = Opaque()
+
+    s.connect( s.in_,     s.reg.in_  )
+    s.connect( s.reg.out, s.regd     )
+    s.connect( s.reg.out, s.inc.in_  )
+    s.connect( s.inc.out, s.incr     )
+    s.connect( s.in_[4:8], s.hi      )
+    s.connect( s.in_,     s.opq.in_  )
+    s.connect( s.opq.out, s.bbox     )
+
+    @s.combinational
+    def comb():
+      s.thru.value = s.in_ if s.sel else s.reg.out
+      for i in range( 2 ):
+        s.lst[i].value = s.reg.out
+
+def test_comb_outputs():
+
+  model = Outputs()
+  model.elaborate()
+
+  # Outputs computed from registers by other models are not
+  # combinational, outputs of opaque models depend on their inputs.
+  # Every output written by a block depends on every input it reads.
+
+  comb = sorted( x.name for x in get_comb_outputs( model ) )
+  assert comb == [ 'bbox', 'hi', 'lst[0]', 'lst[1]', 'thru' ]
+
+#-----------------------------------------------------------------------
+# test_run_cycles
+#-----------------------------------------------------------------------
+# The wrappers are generated for a stub Verilated class which behaves
+# like the Stub model: in_ is registered into out, mid and wide are
+# copied to mout and wout.
+
+class Stub( Model ):
+  def __init__( s ):
+    s.in_  = InPort ( 8  )
+    s.mid  = InPort ( 40 )
+    s.wide = InPort ( 70 )
+    s.out  = OutPort( 8  )
+    s.mout = OutPort( 40 )
+    s.wout = OutPort( 70 )
+
+    @s.posedge_clk
+    def seq():
+      if s.reset:
+        s.out.next = 0
+      else:
+        s.out.next = s.in_
+
+    @s.combinational
+    def comb():
+      s.mout.value = s.mid
+      s.wout.value = s.wide
+
+stub_header = """\
+class V{0} {{
+ public:
+  unsigned char clk, reset, in_, out, prev_clk;
+  unsigned long mid, mout;
+  unsigned int  wide[3], wout[3];
+  V{0}() : clk( 0 ), reset( 0 ), in_( 0 ), out( 0 ), prev_clk( 0 ),
+           mid( 0 ), mout( 0 ) {{
+    for ( int i = 0; i < 3; i++ ) wide[i] = wout[i] = 0;
+  }}
+  void eval() {{
+    if ( clk && !prev_clk ) out = reset ? 0 : in_;
+    prev_clk = clk;
+    mout     = mid;
+    for ( int i = 0; i < 3; i++ ) wout[i] = wide[i];
+  }}
+  void final() {{}}
+}};
+"""
+
+@pytest.fixture
+def stub_wrapper( tmpdir, monkeypatch ):
+
+  include_dir = tmpdir.mkdir( 'include' )
+  write( include_dir.join( 'verilated.h' ),
+         '#pragma once\n#include <stdlib.h>\n#include <string.h>\n'
+         'typedef unsigned long long vluint64_t;\n'
+         'struct Verilated {\n'
+         '  static void randReset( int ) {}\n'
+         '  static void traceEverOn( bool ) {}\n'
+         '};\n' )
+  write( include_dir.join( 'verilated_vcd_c.h' ), '' )
+  write( include_dir.join( 'verilated.cpp'     ), '' )
+  write( include_dir.join( 'verilated_dpi.cpp' ), '' )
+  monkeypatch.setenv( 'PYMTL_VERILATOR_INCLUDE_DIR', str( include_dir ) )
+  monkeypatch.setenv( 'PYMTL_VERILATOR_CACHE_DIR',
+                      str( tmpdir.join( 'cache' ) ) )
+
+  model = Stub()
+  model.elaborate()
+  for port in model.get_ports():
+    port.verilator_name = port.name
+
+  name      = model.class_name
+  build_dir = tmpdir.mkdir( 'build' )
+  write( build_dir.mkdir( 'obj_dir_' + name ).join( 'V{}.h'.format( name ) ),
+         stub_header.format( name ) )
+  monkeypatch.chdir( build_dir )
+
+  cdefs = create_c_wrapper( model, name + '_v.cpp', False, False, 'zeros' )
+  compile( '-O0 -fPIC -shared', [ str( include_dir ) ], 'lib{}_v.so'.format( name ),
+           [ name + '_v.cpp' ] )
+  create_cffi_wrapper( model, 'lib{}_v.so'.format( name ), False )
+  create_verilator_py_wrapper( model, name + '_v.py', 'lib{}_v.so'.format( name ),
+                               cdefs, False )
+
+  module = imp.load_source( 'Stub_v_' + str( tmpdir.basename ),
+                            str( build_dir.join( name + '_v.py' ) ) )
+  return getattr( module, name )
+
+def run_stub( model, ncycles ):
+  model.elaborate()
+  sim = SimulationTool( model )
+  sim.reset()
+  trace = []
+  for i in range( ncycles ):
+    model.in_ .value = i
+    model.mid .value = ( i / 3 ) << 35
+    model.wide.value = ( i / 2 ) << 66
+    sim.eval_combinational()
+    trace.append( ( int( model.out ), int( model.mout ), int( model.wout ) ) )
+    sim.cycle()
+  return trace, sim
+
+def test_wrapper( stub_wrapper ):
+
+  expected, _ = run_stub( Stub(), 10 )
+  model       = stub_wrapper()
+  trace, sim  = run_stub( model, 10 )
+  assert trace == expected
+
+  # Evaluating the combinational logic only flags the combinational
+  # outputs which changed, a clock edge flags all outputs which changed
+
+  outputs = [ x[0] for x in model.out_layout ]
+
+  model._m.in_[0] = 0x42
+  assert model._ffi.eval_comb( model._m, model._changed ) == 0
+  model._m.mid[0] = 1
+  assert model._ffi.eval_comb( model._m, model._changed ) == 1
+  assert model._changed[ outputs.index( 'mout' ) ]
+  assert model._ffi.eval_tick( model._m, model._changed ) == 1
+  assert model._changed[ outputs.index( 'out' ) ]
+
+  # All outputs can be read with a single call
+
+  offsets = dict( ( name, offset ) for name, offset, _ in model.out_layout )
+  vector  = model.get_outputs()
+  assert len( vector ) == model.out_nwords
+  assert vector[ offsets[ 'out'  ] ] == 0x42
+  assert vector[ offsets[ 'mout' ] ] == 1
+
+def test_run_cycles( stub_wrapper ):
+
+  model = stub_wrapper()
+  model.elaborate()
+  sim = SimulationTool( model )
+
+  layout = dict( ( name, ( offset, nwords ) )
+                 for name, offset, nwords in model.in_layout )
+  assert layout[ 'wide' ][1] == 3
+  assert model.in_nwords == 7 and model.out_nwords == 6
+
+  # Build the input vectors, with reset asserted in the first cycle
+
+  def pack( layout, nwords, values ):
+    vector = [ 0 ] * nwords
+    for name, offset, n in layout:
+      for i in range( n ):
+        vector[ offset+i ] = ( values[ name ] >> ( 32*i ) ) & 0xffffffff
+    return vector
+
+  inputs = [ { 'reset' : int( i == 0 ), 'in_' : i + 0x100,
+               'mid'   : i << 35,       'wide' : ( i << 66 ) | i }
+             for i in range( 10 ) ]
+
+  in_buf = array( 'I' )
+  for values in inputs:
+    in_buf.extend( pack( model.in_layout, model.in_nwords, values ) )
+
+  out_buf = model.run_cycles( in_buf )
+
+  # in_ is truncated to 8 bits, out is registered
+
+  expected = array( 'I' )
+  for i, values in enumerate( inputs ):
+    outputs = { 'out'  : 0 if i < 2 else i - 1,
+                'mout' : values[ 'mid'  ],
+                'wout' : values[ 'wide' ] }
+    expected.extend( pack( model.out_layout, model.out_nwords, outputs ) )
+
+  assert out_buf == expected
+
+  # The ports of the wrapper show the outputs after the last clock edge,
+  # and the simulator picks up from there
+
+  assert model.out  == 9
+  assert model.wout == ( 9 << 66 ) | 9
+
+  model.in_.value = 0x42
+  sim.cycle()
+  assert model.out  == 0x42
+
+  # Buffers must hold whole vectors of 32-bit words
+
+  with pytest.raises( ValueError ):
+    model.run_cycles( in_buf[:-1] )
+  with pytest.raises( ValueError ):
+    model.run_cycles( array( 'H', [ 0 ] * 14 ) )
+  with pytest.raises( ValueError ):
+    model.run_cycles( in_buf, array( 'I', [ 0 ] ) )
+
+def test_trace_without_vcd( stub_wrapper ):
+
+  # The stub is built without tracing, so it can neither dump a VCD file
+  # nor turn tracing on and off
+
+  model = stub_wrapper()
+  model.elaborate()
+  with pytest.raises( Exception ):
+    model.trace_on( 5 )
+  with pytest.raises( Exception ):
+    model.trace_off()
+
+  model = stub_wrapper()
+  model.vcd_file = 'stub.vcd'
+  with pytest.raises( Exception ):
+    model.elaborate()
+
+  # A model which can be rebuilt with tracing switches to the rebuilt
+  # library, which still has to dump (the stub never has tracing)
+
+  builds = []
+  def build_traced():
+    builds.append( stub_wrapper )
+    return stub_wrapper
+
+  model = stub_wrapper()
+  model._build_traced = build_traced
+  model.vcd_file = 'stub.vcd'
+  with pytest.raises( Exception ):
+    model.elaborate()
+  assert builds == [ stub_wrapper ]
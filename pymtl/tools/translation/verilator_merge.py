@@ -0,0 +1,374 @@
+#=======================================================================
+# verilator_merge.py
+#=======================================================================
+# Merge all verilated models of a design into one shared library.
+#
+# Each model wrapped with TranslationTool (including imported Verilog)
+# has its own shared library, with its own copy of the Verilator
+# runtime, and is evaluated from its own blocks. merge_verilated links
+# all of them into a single library and replaces their blocks with one
+# pair of blocks on the top-level model, which evaluate all instances
+# in C. Connections between two verilated instances are copied in C
+# and never go through Python.
+
+from __future__ import print_function
+
+import os
+import sys
+import imp
+import collections
+
+from cffi import FFI
+
+import verilog_structural
+from verilator_cffi   import get_comb_outputs, get_build_flags
+from verilator_cffi   import create_merged_lib, verilator_mangle
+from verilator_cffi   import set_input_stmt, set_output_stmt
+from build_cache      import cached_build, hash_key
+from ..simulation     import sim_utils
+from ...model.signals import InPort, OutPort
+
+#-----------------------------------------------------------------------
+# merge_verilated
+#-----------------------------------------------------------------------
+def merge_verilated( model, build_profile=None ):
+  """Merge all verilated submodels of a design into one shared library.
+
+  model:         an elaborated Model instance, which must not have been
+                 simulated yet
+  build_profile: compiler optimization profile of the merged library,
+                 see TranslationTool
+
+  The blocks of the verilated submodels are replaced by one
+  @combinational and one @posedge_clk block on model. Output ports
+  only driving other verilated submodels are only updated in C, so
+  their PyMTL values are stale. Returns the list of merged submodels.
+  """
+
+  if hasattr( model, '_verilated_group' ):
+    raise Exception( "Verilated submodels of {} were already merged!"
+                     .format( model.name ) )
+
+  members = find_verilated( model )
+  if not members:
+    return []
+
+  for m in members:
+    for port in m.get_ports():
+      port.verilog_name   = verilog_structural.mangle_name( port.name )
+      port.verilator_name = verilator_mangle( port.verilog_name )
+
+  # The first instance of each merged model (whose build may differ from
+  # its class if it was rebuilt with tracing), and the offset of the
+  # changed flags of each instance
+
+  classes = collections.OrderedDict()
+  offsets = []
+  noutputs = 0
+  for m in members:
+    first = classes.setdefault( m._verilator_name, m )
+    if first._verilator_dir != m._verilator_dir:
+      raise Exception( "Cannot merge instances of {} built both with and "
+                       "without tracing!".format( m._verilator_name ) )
+    offsets.append( noutputs )
+    noutputs += len( m.get_outports() )
+
+  drivers, internal = get_internal_drivers( model, members )
+  order   = get_eval_order( members, drivers )
+
+  c_src, py_src, group_cdef = create_merged_srcs( members, classes, offsets,
+                                                  drivers, internal, order )
+
+  # Build the merged library, or get it from the translation cache
+
+  key = hash_key( get_build_flags( build_profile ), c_src, py_src )
+
+  def build():
+    with open( 'merged_v.cpp', 'w' ) as fd:
+      fd.write( c_src )
+    with open( 'merged_v.py', 'w' ) as fd:
+      fd.write( py_src )
+    create_merged_lib( 'merged_v.cpp', 'libmerged_v.so',
+                       [ ( x, y._verilator_dir ) for x, y in classes.items() ],
+                       build_profile )
+
+  entry = cached_build( 'merged', key, build )
+
+  module_name = 'merged_v_{}'.format( key )
+  if module_name not in sys.modules:
+    imp.load_source( module_name, os.path.join( entry, 'merged_v.py' ) )
+
+  ffi = FFI()
+  ffi.cdef( ''.join( cls._verilator_cdef.replace( '$', 'V{}_'.format( name ) )
+                     for name, cls in classes.items() ) + group_cdef )
+  lib = ffi.dlopen( os.path.join( entry, 'libmerged_v.so' ) )
+
+  # Construct the instances in the merged library in place of the ones
+  # in the library of each model
+
+  group = ffi.new( 'merged_t *' )
+  for k, m in enumerate( members ):
+
+    m._ffi.destroy_model( m._m )
+
+    m.ffi             = ffi
+    m._ffi            = _Methods( lib, 'V{}_'.format( m._verilator_name ) )
+    m._m              = m._ffi.create_model( ffi.new( 'char[]',
+                                             m._verilator_vcd_file ) )
+    m._changed        = ffi.new( 'unsigned char[]', len( m._changed ) )
+    m._line_trace_str = ffi.new( 'char[512]' )
+    m._convert_string = ffi.string
+
+    m._combinational_blocks = []
+    m._posedge_clk_blocks   = []
+
+    setattr( group, 'm{}'.format( k ), m._m )
+    setattr( model, '_verilated_{}'.format( k ), m )
+    setattr( model, '_verilated_m{}'.format( k ), m._m )
+
+  model._verilated_ffi     = ffi
+  model._verilated_lib     = lib
+  model._verilated_group   = group
+  model._verilated_changed = ffi.new( 'unsigned char[]', max( noutputs, 1 ) )
+
+  sys.modules[ module_name ].register( model )
+
+  return members
+
+#-----------------------------------------------------------------------
+# find_verilated
+#-----------------------------------------------------------------------
+# Return all verilated submodels of model in depth-first order.
+
+def find_verilated( model ):
+  found = []
+  for m in model.get_submodules():
+    if hasattr( m, '_verilator_cdef' ):
+      found.append( m )
+    else:
+      found.extend( find_verilated( m ) )
+  return found
+
+#-----------------------------------------------------------------------
+# get_internal_drivers
+#-----------------------------------------------------------------------
+# Return a dictionary mapping each input port of a member driven by the
+# output port of another member to that output port, and the set of
+# those output ports which do not drive anything else, so PyMTL never
+# needs their value. Sliced nets are left to PyMTL.
+
+def get_internal_drivers( model, members ):
+
+  owners = set()
+  for m in members:
+    owners.update( m.get_ports() )
+
+  nets, slice_connects = sim_utils.signals_to_nets(
+                           sim_utils.collect_signals( model ) )
+
+  sliced = set()
+  for c in slice_connects:
+    sliced.add( c.src_node  )
+    sliced.add( c.dest_node )
+
+  drivers  = {}
+  internal = set()
+  for net in nets:
+    if any( x in sliced or x.name == 'clk' for x in net ):
+      continue
+    outs = [ x for x in net if x in owners and isinstance( x, OutPort ) ]
+    ins  = [ x for x in net if x in owners and isinstance( x, InPort  ) ]
+    if len( outs ) == 1 and ins:
+      for x in ins:
+        drivers[ x ] = outs[0]
+      if len( outs ) + len( ins ) == len( net ):
+        internal.add( outs[0] )
+
+  return drivers, internal
+
+#-----------------------------------------------------------------------
+# get_eval_order
+#-----------------------------------------------------------------------
+# Order the members so that each member comes after the members driving
+# its inputs through combinational outputs, where possible. Members in
+# a cycle are kept in their original order, settle() in the merged
+# library iterates until they converge.
+
+def get_eval_order( members, drivers ):
+
+  index = dict( ( m, k ) for k, m in enumerate( members ) )
+
+  comb_outputs = set()
+  for m in members:
+    comb_outputs.update( get_comb_outputs( m ) )
+
+  preds = [ set() for m in members ]
+  for dest, src in drivers.items():
+    if src in comb_outputs:
+      preds[ index[ dest.parent ] ].add( index[ src.parent ] )
+
+  order   = []
+  pending = range( len( members ) )
+  while pending:
+    ready = [ k for k in pending if not ( preds[k] - set( order ) ) ]
+    k     = ready[0] if ready else pending[0]
+    order.append( k )
+    pending.remove( k )
+
+  return order
+
+#-----------------------------------------------------------------------
+# create_merged_srcs
+#-----------------------------------------------------------------------
+# Generate the C source of the merged library, the Python source of
+# the blocks evaluating it, and the CFFI declarations of the group of
+# instances.
+
+def create_merged_srcs( members, classes, offsets, drivers, internal,
+                        order ):
+
+  template_dir = os.path.dirname( os.path.abspath( __file__ ) )
+
+  # Include the C wrapper of each model
+
+  includes = []
+  for name, cls in classes.items():
+    includes.extend([
+      '#include "{}"'.format( os.path.join( cls._verilator_dir,
+                                            name + '_v.cpp' ) ),
+      '#undef DUMP_VCD',
+      '#undef VLINETRACE',
+      '#undef EXPORT',
+    ])
+
+  # The group holds a pointer to each instance
+
+  group_cdef = [ 'typedef struct {' ]
+  group_cdef.extend( '  V{}_t * m{};'.format( m._verilator_name, k )
+                     for k, m in enumerate( members ) )
+  group_cdef.extend([
+    '} merged_t;',
+    'int eval_all_comb( merged_t *, unsigned char * );',
+    'int eval_all_tick( merged_t *, unsigned char * );',
+  ])
+
+  index = dict( ( m, k ) for k, m in enumerate( members ) )
+
+  # Copy the internal inputs of each instance, evaluate it if dirty
+
+  settle_stmts = []
+  for k in order:
+    m = members[k]
+    settle_stmts.append( '// {} ({})'.format( m.name, m._verilator_name ) )
+    for port in m.get_inports():
+      if port in drivers:
+        src  = drivers[ port ]
+        dest = 'g->m{}->{}'.format( k, port.verilator_name )
+        src  = 'g->m{}->{}'.format( index[ src.parent ], src.verilator_name )
+        if port.nbits <= 64:
+          settle_stmts.extend([
+            'if ( *{0} != *{1} ) {{'.format( dest, src ),
+            '  *{0} = *{1};'.format( dest, src ),
+          ])
+        else:
+          nbytes = ( ( port.nbits - 1 ) / 32 + 1 ) * 4
+          settle_stmts.extend([
+            'if ( memcmp( {0}, {1}, {2} ) ) {{'.format( dest, src, nbytes ),
+            '  memcpy( {0}, {1}, {2} );'.format( dest, src, nbytes ),
+          ])
+        settle_stmts.extend([
+          '  dirty[{}] = 1;'.format( k ),
+          '}',
+        ])
+    settle_stmts.extend([
+      'if ( dirty[{}] ) {{'.format( k ),
+      '  V{}_eval( g->m{} );'.format( m._verilator_name, k ),
+      '  dirty[{}] = 0;'.format( k ),
+      '  nevals++;',
+      '}',
+      '',
+    ])
+
+  sync_stmts = [ 'n += V{}_sync_outputs( g->m{}, changed + {} );'
+                 .format( m._verilator_name, k, offsets[k] )
+                 for k, m in enumerate( members ) ]
+
+  tick_stmts = []
+  for k, m in enumerate( members ):
+    tick_stmts.extend([
+      '*g->m{}->clk = 0;'.format( k ),
+      'V{}_eval( g->m{} );'.format( m._verilator_name, k ),
+      '*g->m{}->clk = 1;'.format( k ),
+      'V{}_eval( g->m{} );'.format( m._verilator_name, k ),
+    ])
+
+  # Set the inputs which are not driven by other instances, and the
+  # outputs which do not only drive other instances
+
+  set_inputs = []
+  set_comb   = []
+  set_next   = []
+  for k, m in enumerate( members ):
+    model_expr = 's._verilated_{}'.format( k )
+    m_expr     = 's._verilated_m{}'.format( k )
+    for port in m.get_inports():
+      if port.name != 'clk' and port not in drivers:
+        set_inputs.extend( set_input_stmt( port, m_expr, model_expr ) )
+    for i, port in enumerate( m.get_outports() ):
+      if port in internal:
+        continue
+      flag = '  if s._verilated_changed[{}]:'.format( offsets[k] + i )
+      set_comb.append( flag )
+      set_next.append( flag )
+      set_comb.extend( '    ' + x for x in
+                       set_output_stmt( port, 'value', m_expr, model_expr ) )
+      set_next.extend( '    ' + x for x in
+                       set_output_stmt( port, 'next',  m_expr, model_expr ) )
+
+  if set_comb:
+    set_comb = [ 'if n:' ] + set_comb
+    set_next = [ 'if n:' ] + set_next
+
+  # pretty printing
+  indent_two  = '\n  '
+  indent_four = '\n    '
+
+  with open( os.path.join( template_dir, 'verilator_merged.templ.c' ) ) as fd:
+    c_src = fd.read().format(
+      includes     = '\n'.join( includes ),
+      group_cdef   = indent_two .join( group_cdef ),
+      ninstances   = len( members ),
+      settle_stmts = indent_four.join( settle_stmts ),
+      sync_stmts   = indent_two .join( sync_stmts ),
+      tick_stmts   = indent_two .join( tick_stmts ),
+    )
+
+  with open( os.path.join( template_dir, 'verilator_merged.templ.py' ) ) as fd:
+    py_src = fd.read().format(
+      set_inputs = indent_four.join( set_inputs ),
+      set_comb   = indent_four.join( set_comb ),
+      set_next   = indent_four.join( set_next ),
+    )
+
+  return c_src, py_src, '\n'.join( group_cdef )
+
+#-----------------------------------------------------------------------
+# _Methods
+#-----------------------------------------------------------------------
+# Exposed methods of one model in the merged library, under the names
+# the wrapper of the model uses. Methods the library does not define
+# (e.g., trace without line tracing) are left out.
+
+class _Methods( object ):
+
+  names = [ 'create_model', 'destroy_model', 'eval', 'eval_comb',
+            'eval_tick', 'sync_outputs', 'run_cycles', 'set_inputs',
+            'eval_inputs', 'get_outputs', 'trace_on', 'trace_off',
+            'trace' ]
+
+  def __init__( self, lib, prefix ):
+    for name in self.names:
+      try:
+        setattr( self, name, getattr( lib, prefix + name ) )
+      except AttributeError:
+        pass
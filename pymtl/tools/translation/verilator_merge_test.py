@@ -0,0 +1,82 @@
+#=======================================================================
+# verilator_merge_test.py
+#=======================================================================
+# Tests for merging verilated models into one shared library, using the
+# stub wrappers of verilator_cffi_test so they only require g++.
+
+import pytest
+
+from pymtl               import *
+from verilator_merge     import merge_verilated
+from verilator_cffi_test import Stub, stub_wrapper, run_stub
+
+#-----------------------------------------------------------------------
+# Test Config
+#-----------------------------------------------------------------------
+# Skip all tests in module if g++ is not installed
+
+pytestmark = requires_gxx
+
+#-----------------------------------------------------------------------
+# Pair
+#-----------------------------------------------------------------------
+# Two Stub instances in series. The registered and combinational outputs
+# of the first one only drive the second one, wout also drives out2.
+
+class Pair( Model ):
+  def __init__( s, stub_class=Stub ):
+    s.in_  = InPort ( 8  )
+    s.mid  = InPort ( 40 )
+    s.wide = InPort ( 70 )
+    s.out  = OutPort( 8  )
+    s.mout = OutPort( 40 )
+    s.wout = OutPort( 70 )
+    s.out2 = OutPort( 70 )
+
+    s.a = stub_class()
+    s.b = stub_class()
+
+    s.connect( s.in_,    s.a.in_  )
+    s.connect( s.mid,    s.a.mid  )
+    s.connect( s.wide,   s.a.wide )
+    s.connect( s.a.out,  s.b.in_  )
+    s.connect( s.a.mout, s.b.mid  )
+    s.connect( s.a.wout, s.b.wide )
+    s.connect( s.a.wout, s.out2   )
+    s.connect( s.b.out,  s.out    )
+    s.connect( s.b.mout, s.mout   )
+    s.connect( s.b.wout, s.wout   )
+
+#-----------------------------------------------------------------------
+# test_merge
+#-----------------------------------------------------------------------
+
+def test_merge( stub_wrapper, tmpdir, monkeypatch ):
+
+  monkeypatch.setenv( 'PYMTL_TRANSLATION_CACHE_DIR',
+                      str( tmpdir.join( 'translation' ) ) )
+
+  ref         = Pair()
+  expected, _ = run_stub( ref, 10 )
+
+  model = Pair( stub_wrapper )
+  model.elaborate()
+  members = merge_verilated( model )
+  assert members == [ model.a, model.b ]
+
+  # merge_verilated replaced the blocks of the elaborated model, so it
+  # must not be elaborated again
+
+  model.elaborate = lambda : None
+
+  trace, sim = run_stub( model, 10 )
+  assert trace == expected
+  assert model.out2 == ref.out2
+
+  # All blocks of the members were replaced by the merged blocks
+
+  assert not model.a.get_combinational_blocks()
+  assert not model.b.get_posedge_clk_blocks()
+
+  with pytest.raises( Exception ):
+    merge_verilated( model )
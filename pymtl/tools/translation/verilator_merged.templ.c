@@ -0,0 +1,118 @@
+//======================================================================
+// merged_v.cpp
+//======================================================================
+// Verilated models merged into a single shared library. The C wrappers
+// of all models are included with their exposed methods prefixed by the
+// model name, followed by the methods evaluating all instances of the
+// design together.
+
+#include "verilated.h"
+#include "string.h"
+
+//----------------------------------------------------------------------
+// sc_time_stamp
+//----------------------------------------------------------------------
+// Shared by all models, see verilator_wrapper.templ.c.
+
+vluint64_t g_main_time = 0;
+
+double sc_time_stamp()
+{{
+  return g_main_time;
+}}
+
+//----------------------------------------------------------------------
+// C wrappers
+//----------------------------------------------------------------------
+
+#define PYMTL_MERGED_LIB 1
+
+{includes}
+
+//----------------------------------------------------------------------
+// CFFI Interface
+//----------------------------------------------------------------------
+
+extern "C" {{
+  {group_cdef}
+}}
+
+//----------------------------------------------------------------------
+// settle()
+//----------------------------------------------------------------------
+// Copy the outputs of each instance to the inputs of the instances they
+// are connected to, and evaluate the instances which are dirty or whose
+// inputs changed, until no instance needs to be evaluated. Instances
+// are visited in dependency order, so this usually takes one pass plus
+// one more checking that nothing changed. Returns -1 if the instances
+// do not settle.
+
+static int settle( merged_t * g, unsigned char * dirty ) {{
+
+  for ( int pass = 0; pass <= {ninstances}; pass++ ) {{
+
+    int nevals = 0;
+
+    {settle_stmts}
+
+    if ( nevals == 0 )
+      return 0;
+
+  }}
+
+  return -1;
+
+}}
+
+//----------------------------------------------------------------------
+// sync_all()
+//----------------------------------------------------------------------
+// Flag the outputs of all instances which changed since they were last
+// passed to PyMTL. The flags of each instance follow the flags of the
+// instances before it.
+
+static int sync_all( merged_t * g, unsigned char * changed ) {{
+
+  int n = 0;
+  {sync_stmts}
+  return n;
+
+}}
+
+//----------------------------------------------------------------------
+// eval_all_comb()
+//----------------------------------------------------------------------
+// Evaluate all instances after inputs set from PyMTL changed, and flag
+// the outputs which changed.
+
+int eval_all_comb( merged_t * g, unsigned char * changed ) {{
+
+  unsigned char dirty[{ninstances}];
+  memset( dirty, 1, sizeof( dirty ) );
+
+  if ( settle( g, dirty ) )
+    return -1;
+
+  return sync_all( g, changed );
+
+}}
+
+//----------------------------------------------------------------------
+// eval_all_tick()
+//----------------------------------------------------------------------
+// Clock all instances, propagate the new outputs between instances,
+// and flag the outputs which changed.
+
+int eval_all_tick( merged_t * g, unsigned char * changed ) {{
+
+  unsigned char dirty[{ninstances}];
+  memset( dirty, 0, sizeof( dirty ) );
+
+  {tick_stmts}
+
+  if ( settle( g, dirty ) )
+    return -1;
+
+  return sync_all( g, changed );
+
+}}
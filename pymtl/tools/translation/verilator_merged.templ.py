@@ -0,0 +1,35 @@
+#=======================================================================
+# merged_v.py
+#=======================================================================
+# Blocks evaluating all verilated models of a design merged into one
+# shared library, registered on the top-level model by merge_verilated.
+# Inputs driven by other verilated models are set in C, all other inputs
+# are set here. Outputs are written when they change, unless they only
+# drive other verilated models.
+
+def register( s ):
+
+  @s.combinational
+  def verilated_comb():
+
+    # set inputs
+    {set_inputs}
+
+    # evaluate all models, set the outputs which changed
+    n = s._verilated_lib.eval_all_comb( s._verilated_group,
+                                        s._verilated_changed )
+    if n < 0:
+      raise Exception( "Merged verilated models did not settle, "
+                       "check for combinational loops!" )
+    {set_comb}
+
+  @s.posedge_clk
+  def verilated_tick():
+
+    # clock all models, double buffer the outputs which changed
+    n = s._verilated_lib.eval_all_tick( s._verilated_group,
+                                        s._verilated_changed )
+    if n < 0:
+      raise Exception( "Merged verilated models did not settle, "
+                       "check for combinational loops!" )
+    {set_next}
@@ -6,35 +6,41 @@ from __future__ import print_function
 
 import os
 import sys
-import filecmp
+import imp
 import verilog
 
-from os.path        import exists
-from verilator_cffi import verilog_to_pymtl
+from subprocess     import check_output, STDOUT, CalledProcessError
+from verilator_cffi import verilog_to_pymtl, get_build_flags
+from cpp_helpers    import recurse_port_hierarchy
+from build_cache    import cached_build, hash_key
 
 #-----------------------------------------------------------------------
 # TranslationTool
 #-----------------------------------------------------------------------
-def TranslationTool( model_inst, lint=False, enable_blackbox=False, verilator_xinit="zeros" ):
+def TranslationTool( model_inst, lint=False, enable_blackbox=False,
+                     verilator_xinit="zeros", build_profile=None ):
   """Translates a PyMTL model into Python-wrapped Verilog.
 
   model_inst:      an un-elaborated Model instance
   lint:            run verilator linter, warnings are fatal
                    (disables -Wno-lint flag)
   enable_blackbox: also generate a .v file with black boxes
+  build_profile:   compiler optimization profile, 'quick' (-O0), 'fast'
+                   (-O2) or 'native' (-O3 -march=native), defaults to
+                   the PYMTL_VERILATOR_BUILD environment variable
   """
 
   model_inst.elaborate()
 
-  # Translate the PyMTL module to Verilog, if we've already done
-  # translation check if there's been any changes to the source
+  # Translate the PyMTL module to Verilog. Each process writes its own
+  # temporary file, which is atomically renamed over the Verilog file
+  # left in the current directory for the user.
   model_name      = model_inst.class_name
   verilog_file    = model_name + '.v'
-  temp_file       = model_name + '.v.tmp'
+  temp_file       = '{}.v.{}.tmp'.format( model_name, os.getpid() )
   c_wrapper_file  = model_name + '_v.cpp'
   py_wrapper_file = model_name + '_v.py'
   lib_file        = 'lib{}_v.so'.format( model_name )
-  obj_dir         = 'obj_dir_' + model_name
   blackbox_file   = model_name + '_blackbox' + '.v'
 
   vcd_en   = True
@@ -48,41 +54,38 @@ def TranslationTool( model_inst, lint=False, enable_blackbox=False, verilator_xi
   # Write the output to a temporary file
   with open( temp_file, 'w+' ) as fd:
     verilog.translate( model_inst, fd, verilator_xinit=verilator_xinit )
+    fd.seek( 0 )
+    verilog_src = fd.read()
 
   # write Verilog with black boxes
   if enable_blackbox:
     with open( blackbox_file, 'w+' ) as fd:
       verilog.translate( model_inst, fd, enable_blackbox=True, verilator_xinit=verilator_xinit )
 
-  # Check if the temporary file matches an existing file (caching)
-
-  cached = False
-  if (     exists(verilog_file)
-       and exists(py_wrapper_file)
-       and exists(lib_file)
-       and exists(obj_dir) ):
-
-    cached = filecmp.cmp( temp_file, verilog_file )
-
-    # if not cached:
-    #   os.system( ' diff %s %s'%( temp_file, verilog_file ))
-
   # Rename temp to actual output
   os.rename( temp_file, verilog_file )
 
-  # Verilate the module only if we've updated the verilog source
-  if not cached:
-    #print( "NOT CACHED", verilog_file )
+  # Verilate the module only if there is no cached build for the same
+  # Verilog source and build configuration
+
+  key = translation_key( model_inst, verilog_src, vcd_en, lint,
+                         verilator_xinit, get_build_flags( build_profile ) )
+
+  def build():
+    with open( verilog_file, 'w' ) as fd:
+      fd.write( verilog_src )
     verilog_to_pymtl( model_inst, verilog_file, c_wrapper_file,
                       lib_file, py_wrapper_file, vcd_en, lint,
-                      verilator_xinit )
-  #else:
-  #  print( "CACHED", verilog_file )
+                      verilator_xinit, build_profile )
 
-  # Use some trickery to import the verilated version of the model
-  sys.path.append( os.getcwd() )
-  __import__( py_wrapper_file[:-3] )
-  imported_module = sys.modules[ py_wrapper_file[:-3] ]
+  entry = cached_build( model_name, key, build )
+
+  # Import the python wrapper from the cache entry, which loads the
+  # shared library next to it
+  module_name = '{}_v_{}'.format( model_name, key )
+  if module_name not in sys.modules:
+    imp.load_source( module_name, os.path.join( entry, py_wrapper_file ) )
+  imported_module = sys.modules[ module_name ]
 
   # Get the model class from the module, instantiate and elaborate it
   model_class = imported_module.__dict__[ model_name ]
@@ -92,3 +95,50 @@ def TranslationTool( model_inst, lint=False, enable_blackbox=False, verilator_xi
     model_inst.vcd_file = vcd_file
 
   return model_inst
+
+#-----------------------------------------------------------------------
+# translation_key
+#-----------------------------------------------------------------------
+# Hash everything the verilated model depends on: the generated Verilog,
+# the Verilator version, the build configuration, the port interface of
+# the Python wrapper and the wrapper templates.
+
+def translation_key( model, verilog_src, vcd_en, lint, verilator_xinit,
+                     build_flags ):
+
+  port_defs = []
+  for x in model.get_ports( preserve_hierarchy=True ):
+    recurse_port_hierarchy( x, port_defs )
+
+  templates = []
+  for name in [ 'verilator_wrapper.templ.c', 'verilator_wrapper.templ.h',
+                'verilator_wrapper.templ.py' ]:
+    with open( os.path.join( _template_dir, name ) ) as fd:
+      templates.append( fd.read() )
+
+  return hash_key(
+    verilog_src,
+    get_verilator_version(),
+    build_flags,
+    verilator_xinit,
+    repr( ( vcd_en, lint, getattr( model, 'vlinetrace', False ) ) ),
+    '\n'.join( port_defs ),
+    *templates
+  )
+
+_template_dir = os.path.dirname( os.path.abspath( __file__ ) )
+
+#-----------------------------------------------------------------------
+# get_verilator_version
+#-----------------------------------------------------------------------
+
+_verilator_version = []
+
+def get_verilator_version():
+  if not _verilator_version:
+    try:
+      version = check_output( [ 'verilator', '--version' ], stderr=STDOUT )
+    except ( OSError, CalledProcessError ):
+      version = ''
+    _verilator_version.append( version )
+  return _verilator_version[0]
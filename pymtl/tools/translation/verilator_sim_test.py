@@ -2,6 +2,7 @@
 # verilator_sim_test.py
 #=======================================================================
 
+from array          import array
 from pymtl          import SimulationTool
 from verilator_sim  import TranslationTool
 from pymtl          import requires_verilator
@@ -46,3 +47,22 @@ def test_reg8():
 
 def test_reg16():
   reg_test( Reg(16) )
+
+def test_reg_run_cycles():
+
+  vmodel = TranslationTool( Reg(8) )
+  vmodel.elaborate()
+
+  sim = SimulationTool( vmodel )
+  sim.reset()
+
+  # Each input vector holds reset and in_, see vmodel.in_layout
+
+  layout  = dict( ( x[0], x[1] ) for x in vmodel.in_layout )
+  in_buf  = array( 'I', [ 0 ] * ( 4 * vmodel.in_nwords ) )
+  for i in range( 4 ):
+    in_buf[ i * vmodel.in_nwords + layout['in_'] ] = i + 10
+
+  out_buf = vmodel.run_cycles( in_buf )
+  assert list( out_buf ) == [ 0, 10, 11, 12 ]
+  assert vmodel.out == 13
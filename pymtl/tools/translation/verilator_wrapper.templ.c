@@ -8,56 +8,18 @@
 #include "obj_dir_{model_name}/V{model_name}.h"
 #include "stdio.h"
 #include "stdint.h"
+#include "string.h"
 #include "verilated.h"
 #include "verilated_vcd_c.h"
 
-// set to true when VCD tracing is enabled in Verilator
-#define DUMP_VCD {dump_vcd}
-
-// set to true when Verilog module has line tracing
-#define VLINETRACE {vlinetrace}
+// exposed port interface and methods
+#include "{model_name}_v.h"
 
 #if VLINETRACE
 #include "obj_dir_{model_name}/V{model_name}__Syms.h"
 #include "svdpi.h"
 #endif
 
-//----------------------------------------------------------------------
-// CFFI Interface
-//----------------------------------------------------------------------
-// simulation methods and model interface ports exposed to CFFI
-
-extern "C" {{
-  typedef struct {{
-
-    // Exposed port interface
-    {port_externs}
-
-    // Verilator model
-    void * model;
-
-    // VCD state
-    int _vcd_en;
-
-    // VCD tracing helpers
-    #if DUMP_VCD
-    void *        tfp;
-    unsigned int  trace_time;
-    unsigned char prev_clk;
-    #endif
-
-  }} V{model_name}_t;
-
-  // Exposed methods
-  V{model_name}_t * create_model( const char * );
-  void destroy_model( V{model_name}_t *);
-  void eval( V{model_name}_t * );
-
-  #if VLINETRACE
-  void trace( V{model_name}_t *, char * );
-  #endif
-}}
-
 //----------------------------------------------------------------------
 // sc_time_stamp
 //----------------------------------------------------------------------
@@ -65,6 +27,8 @@ extern "C" {{
 // $time in Verilog. See:
 // http://www.veripool.org/projects/verilator/wiki/Faq
 
+#ifndef PYMTL_MERGED_LIB
+
 vluint64_t g_main_time = 0;
 
 double sc_time_stamp()
@@ -72,20 +36,26 @@ double sc_time_stamp()
   return g_main_time;
 }}
 
+#else
+
+extern vluint64_t g_main_time;
+
+#endif
+
 //----------------------------------------------------------------------
 // create_model()
 //----------------------------------------------------------------------
 // Construct a new verilator simulation, initialize interface signals
 // exposed via CFFI, and setup VCD tracing if enabled.
 
-V{model_name}_t * create_model( const char *vcd_filename ) {{
+V{model_name}_t * EXPORT( create_model )( const char *vcd_filename ) {{
 
   V{model_name}_t * m;
   V{model_name}   * model;
 
   Verilated::randReset( {verilator_xinit_num} );
 
-  m     = (V{model_name}_t *) malloc( sizeof(V{model_name}_t) );
+  m     = (V{model_name}_t *) calloc( 1, sizeof(V{model_name}_t) );
   model = new V{model_name}();
 
   m->model = (void *) model;
@@ -104,9 +74,11 @@ V{model_name}_t * create_model( const char *vcd_filename ) {{
     tfp->spTrace()->set_time_resolution( "{vcd_timescale}" );
     tfp->open( vcd_filename );
 
-    m->tfp        = (void *) tfp;
-    m->trace_time = 0;
-    m->prev_clk   = 0;
+    m->tfp         = (void *) tfp;
+    m->trace_time  = 0;
+    m->prev_clk    = 0;
+    m->trace_en    = 1;
+    m->trace_start = 0;
   }}
   #endif
 
@@ -121,7 +93,7 @@ V{model_name}_t * create_model( const char *vcd_filename ) {{
 //----------------------------------------------------------------------
 // Finalize the Verilator simulation, close files, call destructors.
 
-void destroy_model( V{model_name}_t * m ) {{
+void EXPORT( destroy_model )( V{model_name}_t * m ) {{
 
   V{model_name} * model = (V{model_name} *) m->model;
 
@@ -147,7 +119,7 @@ void destroy_model( V{model_name}_t * m ) {{
 //----------------------------------------------------------------------
 // Simulate one time-step in the Verilated model.
 
-void eval( V{model_name}_t * m ) {{
+void EXPORT( eval )( V{model_name}_t * m ) {{
 
   V{model_name} * model = (V{model_name} *) m->model;
 
@@ -164,14 +136,161 @@ void eval( V{model_name}_t * m ) {{
     }}
     m->prev_clk = model->clk;
 
-    // dump current signal values
-    VerilatedVcdC * tfp = (VerilatedVcdC *) m->tfp;
-    tfp->dump( m->trace_time );
-    tfp->flush();
+    // dump current signal values, if tracing is on and the start of
+    // the trace window was reached
+    if ( m->trace_en && m->trace_time >= m->trace_start ) {{
+      VerilatedVcdC * tfp = (VerilatedVcdC *) m->tfp;
+      tfp->dump( m->trace_time );
+      tfp->flush();
+    }}
+
+  }}
+  #endif
+
+}}
+
+//----------------------------------------------------------------------
+// update_outputs()
+//----------------------------------------------------------------------
+// Flag the outputs which differ from the values last passed to PyMTL in
+// the changed array, which has one entry per output port. When
+// comb_only is set, outputs which are only driven by registers are
+// skipped. Returns the number of changed outputs.
+
+static int V{model_name}_update_outputs( V{model_name}_t * m,
+                                        unsigned char * changed,
+                                        int comb_only ) {{
+
+  int n = 0;
+  {out_updates}
+  return n;
+
+}}
+
+//----------------------------------------------------------------------
+// eval_comb()
+//----------------------------------------------------------------------
+// Evaluate the combinational logic after the inputs changed, and flag
+// the combinational outputs which changed.
+
+int EXPORT( eval_comb )( V{model_name}_t * m, unsigned char * changed ) {{
+  EXPORT( eval )( m );
+  return V{model_name}_update_outputs( m, changed, 1 );
+}}
+
+//----------------------------------------------------------------------
+// eval_tick()
+//----------------------------------------------------------------------
+// Clock the model, and flag all outputs which changed.
+
+int EXPORT( eval_tick )( V{model_name}_t * m, unsigned char * changed ) {{
+  *m->clk = 0;
+  EXPORT( eval )( m );
+  *m->clk = 1;
+  EXPORT( eval )( m );
+  return V{model_name}_update_outputs( m, changed, 0 );
+}}
+
+//----------------------------------------------------------------------
+// sync_outputs()
+//----------------------------------------------------------------------
+// Flag all outputs which changed without evaluating the model.
+
+int EXPORT( sync_outputs )( V{model_name}_t * m, unsigned char * changed ) {{
+  return V{model_name}_update_outputs( m, changed, 0 );
+}}
+
+//----------------------------------------------------------------------
+// run_cycles()
+//----------------------------------------------------------------------
+// Simulate n cycles without returning to Python. Each cycle reads one
+// vector of {run_in_nwords} words from in_buf into the input ports,
+// evaluates the combinational logic, records one vector of
+// {run_out_nwords} words from the output ports into out_buf, and then
+// clocks the model. The layout of the vectors is described in
+// get_run_layout in verilator_cffi.py.
+
+void EXPORT( run_cycles )( V{model_name}_t * m, unsigned long n,
+                           const uint32_t * in_buf, uint32_t * out_buf ) {{
+
+  for ( unsigned long i = 0; i < n; i++ ) {{
+
+    const uint32_t * in  = in_buf  + i * {run_in_nwords};
+    uint32_t *       out = out_buf + i * {run_out_nwords};
+
+    // set inputs and evaluate combinational logic
+    {run_inputs}
+    EXPORT( eval )( m );
+
+    // record outputs
+    {run_outputs}
+
+    // clock the model
+    *m->clk = 0;
+    EXPORT( eval )( m );
+    *m->clk = 1;
+    EXPORT( eval )( m );
 
   }}
+
+}}
+
+//----------------------------------------------------------------------
+// set_inputs()
+//----------------------------------------------------------------------
+// Set all input ports except the clock with a single call. Ports wider
+// than 64 bits are passed as 32-bit words, least-significant word
+// first.
+
+void EXPORT( set_inputs )( V{model_name}_t * m{set_inputs_params} ) {{
+  {set_inputs}
+}}
+
+//----------------------------------------------------------------------
+// eval_inputs()
+//----------------------------------------------------------------------
+// Set all input ports like set_inputs(), then evaluate the
+// combinational logic like eval_comb().
+
+int EXPORT( eval_inputs )( V{model_name}_t * m, unsigned char * changed{set_inputs_params} ) {{
+  EXPORT( set_inputs )( m{set_inputs_args} );
+  return EXPORT( eval_comb )( m, changed );
+}}
+
+//----------------------------------------------------------------------
+// get_outputs()
+//----------------------------------------------------------------------
+// Record all output ports into one vector of {run_out_nwords} words,
+// with the same layout as the output vectors of run_cycles().
+
+void EXPORT( get_outputs )( V{model_name}_t * m, uint32_t * out ) {{
+  {run_outputs_get}
+}}
+
+//----------------------------------------------------------------------
+// trace_on()
+//----------------------------------------------------------------------
+// Dump signal values from the given cycle on, counting the cycles since
+// the model was created. Each cycle is two clock toggles, that is 100
+// time units of the VCD file. Does nothing without VCD tracing.
+
+void EXPORT( trace_on )( V{model_name}_t * m, unsigned long start_cycle ) {{
+  #if DUMP_VCD
+  m->trace_en    = 1;
+  m->trace_start = start_cycle * 100;
   #endif
+}}
 
+//----------------------------------------------------------------------
+// trace_off()
+//----------------------------------------------------------------------
+// Stop dumping signal values. The simulation time keeps advancing, so a
+// later trace window starts at the right time.
+
+void EXPORT( trace_off )( V{model_name}_t * m ) {{
+  #if DUMP_VCD
+  m->trace_en = 0;
+  #endif
 }}
 
 //----------------------------------------------------------------------
@@ -183,7 +302,7 @@ void eval( V{model_name}_t * m ) {{
 // it everywhere.
 
 #if VLINETRACE
-void trace( V{model_name}_t * m, char* str ) {{
+void EXPORT( trace )( V{model_name}_t * m, char* str ) {{
 
   V{model_name} * model = (V{model_name} *) m->model;
 
@@ -0,0 +1,85 @@
+//======================================================================
+// V{model_name}_v.h
+//======================================================================
+// C interface of the wrapper of a Verilator-generated C++ model. It is
+// included by the wrapper itself and by the CFFI extension module
+// calling it, so it must remain valid C.
+
+#ifndef V{model_name}_V_H
+#define V{model_name}_V_H
+
+#include "stdint.h"
+
+// set to true when VCD tracing is enabled in Verilator
+#define DUMP_VCD {dump_vcd}
+
+// set to true when Verilog module has line tracing
+#define VLINETRACE {vlinetrace}
+
+// When several models are merged into one shared library (see
+// verilator_merge.py), the exposed methods are prefixed with the model
+// name so they do not clash.
+#ifdef PYMTL_MERGED_LIB
+#define EXPORT( name ) V{model_name}_##name
+#else
+#define EXPORT( name ) name
+#endif
+
+//----------------------------------------------------------------------
+// CFFI Interface
+//----------------------------------------------------------------------
+// simulation methods and model interface ports exposed to CFFI
+
+#ifdef __cplusplus
+extern "C" {{
+#endif
+
+  typedef struct {{
+
+    // Exposed port interface
+    {port_externs}
+
+    // Verilator model
+    void * model;
+
+    // VCD state
+    int _vcd_en;
+
+    // VCD tracing helpers
+    #if DUMP_VCD
+    void *        tfp;
+    unsigned int  trace_time;
+    unsigned char prev_clk;
+    unsigned char trace_en;
+    unsigned int  trace_start;
+    #endif
+
+    // Output values last passed to PyMTL
+    {out_prevs}
+
+  }} V{model_name}_t;
+
+  // Exposed methods
+  V{model_name}_t * EXPORT( create_model )( const char * );
+  void EXPORT( destroy_model )( V{model_name}_t *);
+  void EXPORT( eval )( V{model_name}_t * );
+  int  EXPORT( eval_comb )( V{model_name}_t *, unsigned char * );
+  int  EXPORT( eval_tick )( V{model_name}_t *, unsigned char * );
+  int  EXPORT( sync_outputs )( V{model_name}_t *, unsigned char * );
+  void EXPORT( run_cycles )( V{model_name}_t *, unsigned long,
+                             const uint32_t *, uint32_t * );
+  void EXPORT( set_inputs )( V{model_name}_t *{set_inputs_params} );
+  int  EXPORT( eval_inputs )( V{model_name}_t *, unsigned char *{set_inputs_params} );
+  void EXPORT( get_outputs )( V{model_name}_t *, uint32_t * );
+  void EXPORT( trace_on )( V{model_name}_t *, unsigned long );
+  void EXPORT( trace_off )( V{model_name}_t * );
+
+  #if VLINETRACE
+  void EXPORT( trace )( V{model_name}_t *, char * );
+  #endif
+
+#ifdef __cplusplus
+}}
+#endif
+
+#endif
@@ -6,8 +6,10 @@
 
 import os
 
+from array import array
 from pymtl import *
-from cffi  import FFI
+
+from pymtl.tools.translation.cffi_helpers import load_cffi_module
 
 #-----------------------------------------------------------------------
 # {model_name}
@@ -15,36 +17,34 @@ from cffi  import FFI
 class {model_name}( Model ):
   id_ = 0
 
-  def __init__( s ):
-
-    # initialize FFI, define the exposed interface
-    s.ffi = FFI()
-    s.ffi.cdef('''
-      typedef struct {{
+  # Interface of the shared library. The names of the exposed methods
+  # start with a $, which is replaced by their prefix in the library
+  # (empty, unless the model was merged with others into one library,
+  # see verilator_merge.py).
 
-        // Exposed port interface
-        {port_decls}
+  _verilator_cdef = '''
+      {cdef}
+  '''
 
-        // Verilator model
-        void * model;
+  # Name of the verilated model, and the directory holding the shared
+  # library and all build products, which is the entry of the model in
+  # the translation cache
 
-        // VCD state
-        int _vcd_en;
+  _verilator_name = '{model_name}'
+  _verilator_dir  = os.path.dirname( os.path.abspath( __file__ ) )
 
-      }} V{model_name}_t;
+  # CFFI extension module (API mode) calling into the shared library
 
-      V{model_name}_t * create_model( const char * );
-      void destroy_model( V{model_name}_t *);
-      void eval( V{model_name}_t * );
-      void trace( V{model_name}_t *, char * );
+  _verilator_module = load_cffi_module( '_{model_name}_v', _verilator_dir )
 
-    ''')
+  def __init__( s ):
 
-    # Import the shared library containing the model. We defer
-    # construction to the elaborate_logic function to allow the user to
-    # set the vcd_file.
+    # Get the FFI and the exposed methods of the shared library
+    # containing the model. We defer construction to the
+    # elaborate_logic function to allow the user to set the vcd_file.
 
-    s._ffi = s.ffi.dlopen('./{lib_file}')
+    s.ffi  = s._verilator_module.ffi
+    s._ffi = s._verilator_module.lib
 
     # dummy class to emulate PortBundles
     class BundleProxy( PortBundle ):
@@ -53,18 +53,35 @@ class {model_name}( Model ):
     # define the port interface
     {port_defs}
 
+    # layout of the run_cycles input and output vectors as a list of
+    # (port name, word offset, number of words)
+    s.in_layout  = {in_layout}
+    s.out_layout = {out_layout}
+    s.in_nwords  = {in_nwords}
+    s.out_nwords = {out_nwords}
+
     # increment instance count
     {model_name}.id_ += 1
 
     # Defer vcd dumping until later
     s.vcd_file = None
 
+    # Flags set by the C wrapper for each output port which changed
+    s._changed = s.ffi.new("unsigned char[{noutputs}]")
+
     # Buffer for line tracing
     s._line_trace_str = s.ffi.new("char[512]")
     s._convert_string = s.ffi.string
 
+  # Function building the same model with tracing and returning its
+  # wrapper class, used if the model was built without tracing and is
+  # asked to dump a VCD file (see VerilogModel)
+
+  _build_traced = None
+
   def __del__( s ):
-    s._ffi.destroy_model( s._m )
+    if hasattr( s, '_m' ):
+      s._ffi.destroy_model( s._m )
 
   def elaborate_logic( s ):
 
@@ -78,33 +95,122 @@ class {model_name}( Model ):
 
     # Construct the model.
 
+    s._verilator_vcd_file = verilator_vcd_file
     s._m = s._ffi.create_model( s.ffi.new("char[]", verilator_vcd_file) )
 
-    @s.combinational
-    def logic():
+    # Switch to the shared library of a build with tracing if needed
+
+    if verilator_vcd_file and not s._m._vcd_en and s._build_traced:
+      s._ffi.destroy_model( s._m )
+
+      traced = s._build_traced()
+      s._verilator_module = traced._verilator_module
+      s._verilator_dir    = traced._verilator_dir
 
-      # set inputs
-      {set_inputs}
+      s.ffi  = s._verilator_module.ffi
+      s._ffi = s._verilator_module.lib
+      s._m   = s._ffi.create_model( s.ffi.new("char[]", verilator_vcd_file) )
 
-      # execute combinational logic
-      s._ffi.eval( s._m )
+      s._changed        = s.ffi.new("unsigned char[{noutputs}]")
+      s._line_trace_str = s.ffi.new("char[512]")
+      s._convert_string = s.ffi.string
 
-      # set outputs
-      # FIXME: currently write all outputs, not just combinational outs
+    if verilator_vcd_file and not s._m._vcd_en:
+      raise Exception( "{model_name} was built without tracing, so it "
+                       "cannot dump to " + verilator_vcd_file + "!" )
+
+    @s.combinational
+    def logic():
+
+      # set inputs and execute combinational logic with a single call,
+      # set the combinational outputs which changed
       {set_comb}
 
     @s.posedge_clk
     def tick():
 
-      s._m.clk[0] = 0
-      s._ffi.eval( s._m )
-      s._m.clk[0] = 1
-      s._ffi.eval( s._m )
-
-      # double buffer register outputs
-      # FIXME: currently write all outputs, not just registered outs
+      # clock the model, double buffer the outputs which changed
       {set_next}
 
+  # Simulate one cycle for each input vector in in_buf without leaving
+  # the verilated model. Each cycle sets the inputs, evaluates the
+  # combinational logic, records the outputs into out_buf and clocks
+  # the model. The buffers hold 32-bit words and can be anything that
+  # supports the buffer protocol, e.g. array('I') or a contiguous NumPy
+  # uint32 array. out_buf is allocated as an array('I') if not given.
+  # The wrapper must be simulated by a SimulationTool. Its outputs are
+  # updated when done, but its inputs are left unchanged.
+
+  def run_cycles( s, in_buf, out_buf=None ):
+
+    in_ptr = s._buffer( in_buf )
+    ncycles, extra = divmod( len( in_ptr ), s.in_nwords )
+    if extra:
+      raise ValueError( 'Input buffer must hold a multiple of {{}} words'
+                        .format( s.in_nwords ) )
+
+    if out_buf is None:
+      out_buf = array( 'I', [0] ) * ( ncycles * s.out_nwords )
+    out_ptr = s._buffer( out_buf )
+    if len( out_ptr ) < ncycles * s.out_nwords:
+      raise ValueError( 'Output buffer must hold at least {{}} words'
+                        .format( ncycles * s.out_nwords ) )
+
+    s._ffi.run_cycles( s._m, ncycles, in_ptr, out_ptr )
+
+    # set the outputs which changed
+    {set_outputs}
+
+    return out_buf
+
+  # Read all outputs of the verilated model with a single call, into one
+  # vector of out_nwords words laid out like the output vectors of
+  # run_cycles. out_buf is allocated as an array('I') if not given.
+
+  def get_outputs( s, out_buf=None ):
+
+    if out_buf is None:
+      out_buf = array( 'I', [0] ) * s.out_nwords
+    out_ptr = s._buffer( out_buf )
+    if len( out_ptr ) < s.out_nwords:
+      raise ValueError( 'Output buffer must hold at least {{}} words'
+                        .format( s.out_nwords ) )
+
+    s._ffi.get_outputs( s._m, out_ptr )
+
+    return out_buf
+
+  def _buffer( s, buf ):
+    if getattr( buf, 'itemsize', 4 ) != 4:
+      raise ValueError( 'Buffers must hold 32-bit words' )
+    return s.ffi.from_buffer( 'uint32_t[]', buf )
+
+  # Control the VCD dump of the verilated model, which needs the model to
+  # be built with tracing (i.e., vcd_file was set when translating it,
+  # or it can be rebuilt with tracing) and vcd_file to be set before
+  # elaboration. Dumping is on from the
+  # first cycle by default. trace_on dumps all cycles from start_cycle
+  # on, counting the cycles since elaboration, until trace_off.
+
+  def trace_on( s, start_cycle=0 ):
+    s._check_trace()
+    s._ffi.trace_on( s._m, start_cycle )
+
+  def trace_off( s ):
+    s._check_trace()
+    s._ffi.trace_off( s._m )
+
+  def _check_trace( s ):
+    if not s._m._vcd_en:
+      raise Exception( "{model_name} is not dumping a VCD file, it must be "
+                       "built with tracing and have a vcd_file!" )
+
+  # The state of the verilated model is not visible to the simulator, so
+  # cycles can never be skipped
+
+  def idle_cycles( s ):
+    return 0
+
   def line_trace( s ):
     if {vlinetrace}:
       s._ffi.trace( s._m, s._line_trace_str )
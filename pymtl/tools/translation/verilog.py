@@ -6,6 +6,7 @@
 from __future__ import print_function
 
 import sys
+import ast, _ast
 import collections
 import tempfile
 
@@ -13,6 +14,10 @@ from subprocess         import check_output, STDOUT, CalledProcessError
 from verilog_structural import *
 from verilog_behavioral import translate_logic_blocks
 from exceptions         import IVerilogCompileError
+from exceptions         import VerilogTranslationError
+from ..ast_helpers      import get_method_ast, get_closure_dict
+from ...datatypes.BitStruct import BitStruct
+from ...model.signals   import MemoryArray
 
 from ..integration      import verilog
 
@@ -22,6 +27,10 @@ from ..integration      import verilog
 # Generates Verilog source from a PyMTL model.
 def translate( model, o=sys.stdout, enable_blackbox=False, verilator_xinit='zeros' ):
 
+  # MemoryArrays are translated the same way as lists of Wires
+  check_memories( model )
+  model._expand_memories()
+
   # List of models to translate
   translation_queue = collections.OrderedDict()
 
@@ -49,6 +58,56 @@ def translate( model, o=sys.stdout, enable_blackbox=False, verilator_xinit='zero
   # Append source code for imported modules and dependecies
   verilog.import_sources( append_queue, o )
 
+#-----------------------------------------------------------------------
+# check_memories
+#-----------------------------------------------------------------------
+# Raise an error for MemoryArrays which cannot be translated. Accesses to
+# the BitStruct fields of list elements are not translated, so reading or
+# writing a field of an entry in a MemoryArray of BitStructs would be
+# silently dropped. Entries which are only accessed whole are fine.
+def check_memories( model ):
+
+  memories = [ x for x in model.get_memories()
+               if isinstance( x.dtype, BitStruct ) ]
+
+  if memories:
+    blocks = ( model.get_posedge_clk_blocks()
+             + model.get_combinational_blocks() )
+    for func in blocks:
+      for memory, field in get_memory_field_accesses( func ):
+        if memory in memories:
+          raise VerilogTranslationError(
+            'Cannot translate access to field "{}" of MemoryArray "{}"!\n'
+            'Please read or write the entries of a MemoryArray of '
+            'BitStructs whole.'.format( field, memory.fullname )
+          )
+
+  for submodel in model.get_submodules():
+    check_memories( submodel )
+
+#-----------------------------------------------------------------------
+# get_memory_field_accesses
+#-----------------------------------------------------------------------
+# Yield ( memory, field ) for each s.mem[ i ].field expression in func.
+def get_memory_field_accesses( func ):
+
+  closed_vars = get_closure_dict( func ) if func.func_closure else {}
+
+  def lookup( node ):
+    if   isinstance( node, _ast.Name ):
+      return closed_vars.get( node.id, func.func_globals.get( node.id ) )
+    elif isinstance( node, _ast.Attribute ):
+      return getattr( lookup( node.value ), node.attr, None )
+
+  tree, src = get_method_ast( func )
+  for node in ast.walk( tree ):
+    if ( isinstance( node, _ast.Attribute )
+         and isinstance( node.value, _ast.Subscript )
+         and node.attr not in ['next', 'value', 'n', 'v'] ):
+      memory = lookup( node.value.value )
+      if isinstance( memory, MemoryArray ):
+        yield memory, node.attr
+
 #-----------------------------------------------------------------------
 # translate_module
 #-----------------------------------------------------------------------
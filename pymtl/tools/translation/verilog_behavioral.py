@@ -119,6 +119,7 @@ def ast_pipeline( tree, model, func ):
   tree = visitors.AnnotateWithObjects( model, func ).visit( tree )
   tree = visitors.RemoveModule       (             ).visit( tree )
   tree = visitors.SimplifyDecorator  (             ).visit( tree )
+  tree = visitors.ExpandMemoryFill   (             ).visit( tree )
   tree = visitors.AnnotateAssignments(             ).visit( tree )
   tree = visitors.RemoveValueNext    (             ).visit( tree )
   tree = visitors.RemoveSelf         ( model       ).visit( tree )
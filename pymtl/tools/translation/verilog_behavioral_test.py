@@ -20,6 +20,7 @@ from ..simulation.SimulationTool_seq_test    import *
 from ..simulation.SimulationTool_comb_test   import *
 from ..simulation.SimulationTool_mix_test    import *
 from ..simulation.SimulationTool_transl_test import *
+from ..simulation.SimulationTool_mem_test    import *
 
 # Skip all tests in module if verilator is not installed
 
@@ -113,6 +114,8 @@ pytestmark = requires_verilator
    test_translation_keyword_args, VerilogTranslationError ),
   ('Non-literal Bits constructors not supported',
    test_translation_issue_123, VerilogTranslationError ),
+  ('MemoryArrays of BitStructs are not translatable.',
+   test_StructMem, VerilogTranslationError ),
 
 ]]
 
@@ -135,6 +138,10 @@ pytestmark = requires_verilator
      test_MissingValueInCombinationalBlock,),
     ('PyMTLErrors are raised only in the simulator',
      test_MissingListValueInCombinationalBlock,),
+    ('MemoryArray entries are only accessible in the simulator',
+     test_RegFile_too_big,),
+    ('MemoryArray entries are only accessible in the simulator',
+     test_MemoryArrayValue,),
 ]]
 
 #-----------------------------------------------------------------------
@@ -155,3 +162,44 @@ def local_setup_sim( model ):
   model.elaborate()
   sim = SimulationTool( model )
   return model, sim
+
+#-----------------------------------------------------------------------
+# test_StructMem_not_translatable
+#-----------------------------------------------------------------------
+# Field accesses to the entries of a MemoryArray of BitStructs would be
+# dropped, so translation fails rather than generating wrong Verilog.
+
+def test_StructMem_not_translatable():
+  with pytest.raises( VerilogTranslationError ):
+    TranslationTool( StructMem() )
+
+#-----------------------------------------------------------------------
+# test_NormalQueue_BitStruct
+#-----------------------------------------------------------------------
+# The RegisterFile in NormalQueue is a MemoryArray of the message type,
+# whose entries are only accessed whole, so it must still translate.
+
+def test_NormalQueue_BitStruct():
+
+  from pclib.rtl  import NormalQueue
+  from pclib.ifcs import MemReqMsg
+
+  dtype = MemReqMsg( 8, 32, 32 )
+  model, sim = local_setup_sim( NormalQueue( 4, dtype ) )
+  sim.reset()
+
+  msgs = [ dtype.mk_wr( i, 0x1000+4*i, 0, 0xcafe0000+i ) for i in range(3) ]
+
+  model.deq.rdy.value = 0
+  for msg in msgs:
+    model.enq.val.value = 1
+    model.enq.msg.value = msg
+    sim.cycle()
+  model.enq.val.value = 0
+
+  model.deq.rdy.value = 1
+  for msg in msgs:
+    sim.eval_combinational()
+    assert model.deq.val == 1
+    assert model.deq.msg == msg
+    sim.cycle()
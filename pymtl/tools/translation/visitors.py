@@ -414,6 +414,49 @@ class SimplifyDecorator( ast.NodeTransformer ):
 
     return ast.copy_location( new_node, node )
 
+#-------------------------------------------------------------------------
+# ExpandMemoryFill
+#-------------------------------------------------------------------------
+# Replace writes to the .next of an entire MemoryArray (replaced by a
+# WireList before translation) with a loop writing each entry:
+#
+#   s.mem.next = x  ->  for mem$i in range( N ): s.mem[ mem$i ].next = x
+#
+class ExpandMemoryFill( ast.NodeTransformer ):
+
+  def visit_Assign( self, node ):
+
+    lhs = node.targets[0]
+    if not ( isinstance( lhs, ast.Attribute ) and
+             lhs.attr in ['next', 'n'] and
+             not isinstance( lhs.value, ast.Subscript ) and
+             hasattr( lhs.value._object, '_memory' ) ):
+      return node
+
+    wires   = lhs.value._object
+    loopvar = '{}$i'.format( wires.name )
+
+    def name( id, ctx ):
+      node = _ast.Name( id=id, ctx=ctx )
+      node._object = None
+      return node
+
+    index  = _ast.Index( value=name( loopvar, _ast.Load() ) )
+    entry  = _ast.Subscript( value=lhs.value, slice=index, ctx=_ast.Load() )
+    target = _ast.Attribute( value=entry, attr=lhs.attr, ctx=_ast.Store() )
+    entry ._object = wires
+    target._object = wires[0]
+
+    stop   = _ast.Num( n=len( wires ) )
+    iter   = _ast.Call( func=name( 'range', _ast.Load() ), args=[ stop ],
+                        keywords=[], starargs=None, kwargs=None )
+    assign = _ast.Assign( targets=[ target ], value=node.value )
+    loop   = _ast.For( target=name( loopvar, _ast.Store() ), iter=iter,
+                       body=[ ast.copy_location( assign, node ) ],
+                       orelse=[] )
+
+    return ast.fix_missing_locations( ast.copy_location( loop, node ) )
+
 #-------------------------------------------------------------------------
 # ThreeExprLoops
 #-------------------------------------------------------------------------